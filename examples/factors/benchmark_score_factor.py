@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pandas as pd
+
+from zvdata.factor import ScoreFactor
+from zvdata.utils.pd_utils import index_df_with_category_xfield
+from zvt.domain import Stock1dKdata
+
+
+def make_panel(entity_size=4000, days=1000, nan_ratio=0.05, seed=0):
+    """
+    the random depth panel indexed by (entity_id,timestamp),the values are rounded for the ties
+
+    """
+    timestamps = pd.bdate_range('2016-01-01', periods=days)
+    index = pd.MultiIndex.from_product([['stock_sz_{:06d}'.format(i) for i in range(entity_size)], timestamps],
+                                       names=['entity_id', 'timestamp'])
+    rng = np.random.default_rng(seed)
+
+    df = pd.DataFrame({'close': rng.standard_normal(len(index)).round(1),
+                       'volume': rng.integers(0, 20, len(index)).astype(float)}, index=index)
+    for col in df.columns:
+        df.loc[rng.random(len(df)) < nan_ratio, col] = np.nan
+    return df
+
+
+def make_factor(score_levels=[0.1, 0.3, 0.5, 0.7, 0.9]) -> ScoreFactor:
+    return ScoreFactor(Stock1dKdata, entity_ids=['stock_sz_000001'], provider='joinquant',
+                       columns=[Stock1dKdata.close, Stock1dKdata.volume], auto_load=False,
+                       breadth_computing_param={'score_levels': list(score_levels)})
+
+
+def score_quantile_by_apply(factor: ScoreFactor, depth_df: pd.DataFrame):
+    """
+    scoring by the .loc loop of the timestamps and apply(axis=1),the way before the vectorized score_quantile
+
+    """
+    score_levels = sorted(factor.breadth_computing_param['score_levels'], reverse=True)
+
+    quantile = depth_df.groupby(level=1).quantile(score_levels)
+    quantile.index.names = [factor.time_field, 'score']
+
+    result_df = depth_df.copy()
+    result_df.reset_index(inplace=True, level='entity_id')
+    result_df['quantile'] = None
+    for timestamp in quantile.index.levels[0]:
+        length = len(result_df.loc[result_df.index == timestamp, 'quantile'])
+        result_df.loc[result_df.index == timestamp, 'quantile'] = [quantile.loc[timestamp].to_dict()] * length
+
+    def calculate_score(df, factor_name, quantile):
+        original_value = df[factor_name]
+        score_map = quantile.get(factor_name)
+        min_score = score_levels[-1]
+
+        if original_value < score_map.get(min_score):
+            return 0
+
+        for score in score_levels[:-1]:
+            if original_value >= score_map.get(score):
+                return score
+
+    for factor_name in factor.factors:
+        result_df[factor_name] = result_df.apply(lambda x: calculate_score(x, factor_name, x['quantile']), axis=1)
+
+    result_df = result_df.reset_index()
+    result_df = index_df_with_category_xfield(result_df, category_field=factor.category_field,
+                                              xfield=factor.time_field)
+    result_df = result_df.loc[:, factor.factors]
+
+    result_df = result_df.loc[~result_df.index.duplicated(keep='first')]
+
+    return quantile, result_df
+
+
+if __name__ == '__main__':
+    factor = make_factor()
+
+    depth_df = make_panel(entity_size=4000, days=1000)
+    start = time.time()
+    factor.score_quantile(depth_df)
+    print('score_quantile:{:.2f}s,rows:{}'.format(time.time() - start, len(depth_df)))
+
+    # the old path scans all the rows for every timestamp,use less days
+    depth_df = make_panel(entity_size=4000, days=50)
+    start = time.time()
+    quantile, result_df = factor.score_quantile(depth_df)
+    print('score_quantile:{:.2f}s,rows:{}'.format(time.time() - start, len(depth_df)))
+
+    start = time.time()
+    expected_quantile, expected_result_df = score_quantile_by_apply(factor, depth_df)
+    print('score by apply:{:.2f}s,rows:{}'.format(time.time() - start, len(depth_df)))
+
+    pd.testing.assert_frame_equal(quantile, expected_quantile)
+    pd.testing.assert_frame_equal(result_df, expected_result_df)
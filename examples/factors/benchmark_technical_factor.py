@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pandas as pd
+
+from zvt.api.computing import ma, macd
+from zvt.factors.technical_factor import TechnicalFactor
+
+
+def make_panel(entity_size=4000, days=500):
+    """
+    the random daily kdata panel indexed by (entity_id,timestamp)
+
+    """
+    timestamps = pd.bdate_range('2017-01-01', periods=days)
+    index = pd.MultiIndex.from_product([['stock_sz_{:06d}'.format(i) for i in range(entity_size)], timestamps],
+                                       names=['entity_id', 'timestamp'])
+    closes = 10 + np.random.default_rng(0).standard_normal(len(index)).cumsum() * 0.01
+    return pd.DataFrame({'close': closes, 'qfq_close': closes}, index=index)
+
+
+def depth_computing_by_entity(factor: TechnicalFactor):
+    """
+    computing the indicators entity by entity,the way before the panel computing
+
+    """
+    dfs = []
+    for entity_id, df in factor.data_df.groupby(level=0):
+        df = df.copy()
+        for idx, indicator in enumerate(factor.indicators):
+            s = df[factor.get_close_col(indicator)]
+            if indicator == 'ma':
+                window = factor.indicators_param[idx].get('window')
+                df['ma{}'.format(window)] = ma(s, window=window)
+            if indicator == 'macd':
+                df['diff'], df['dea'], df['macd'] = macd(s, **factor.indicators_param[idx])
+        dfs.append(df)
+    return pd.concat(dfs)
+
+
+if __name__ == '__main__':
+    factor = TechnicalFactor(entity_ids=['stock_sz_000001'], start_timestamp='2017-01-01', end_timestamp='2019-01-01',
+                             indicators=['ma', 'ma', 'macd'],
+                             indicators_param=[{'window': 5}, {'window': 10}, {'slow': 26, 'fast': 12, 'n': 9}],
+                             auto_load=False)
+    factor.data_df = make_panel()
+
+    start = time.time()
+    factor.depth_computing()
+    print('panel computing:{:.2f}s,rows:{}'.format(time.time() - start, len(factor.depth_df)))
+
+    start = time.time()
+    depth_df = depth_computing_by_entity(factor)
+    print('computing by entity:{:.2f}s'.format(time.time() - start))
+
+    pd.testing.assert_frame_equal(factor.depth_df, depth_df[factor.depth_df.columns])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.schema import CreateTable
+
+from zvdata.api import read_sql_fast
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvt.domain import Index1dKdata
+
+
+def make_kdata(entity_size=500, days=1000):
+    """
+    the random daily kdata records of the entities
+
+    """
+    timestamps = pd.bdate_range('2016-01-01', periods=days)
+    rng = np.random.default_rng(0)
+    records = []
+    for i in range(entity_size):
+        entity_id = 'index_sz_{:06d}'.format(i)
+        closes = 10 + rng.standard_normal(days).cumsum() * 0.01
+        for timestamp, close in zip(timestamps, closes):
+            records.append({'id': '{}_{}'.format(entity_id, timestamp.date()), 'entity_id': entity_id,
+                            'timestamp': timestamp.to_pydatetime(), 'provider': 'exchange', 'code': entity_id[-6:],
+                            'level': '1d', 'open': close, 'close': close, 'high': close, 'low': close,
+                            'volume': float(i), 'turnover': None})
+    return records
+
+
+if __name__ == '__main__':
+    origin_data_path = context['data_path']
+    with tempfile.TemporaryDirectory() as data_path:
+        set_data_path(data_path)
+        try:
+            get_db_engine('exchange', data_schema=Index1dKdata).execute(CreateTable(Index1dKdata.__table__))
+
+            session = get_db_session('exchange', data_schema=Index1dKdata)
+            session.bulk_insert_mappings(Index1dKdata, make_kdata())
+            session.commit()
+
+            query = session.query(Index1dKdata)
+
+            start = time.time()
+            df = read_sql_fast(query)
+            print('read_sql_fast:{:.2f}s,rows:{}'.format(time.time() - start, len(df)))
+
+            start = time.time()
+            category_df = read_sql_fast(query, category=True)
+            print('read_sql_fast with category:{:.2f}s,memory:{:.1f}MB->{:.1f}MB'.format(
+                time.time() - start, df.memory_usage(deep=True).sum() / 2 ** 20,
+                category_df.memory_usage(deep=True).sum() / 2 ** 20))
+
+            start = time.time()
+            expected = pd.read_sql(query.statement, session.bind)
+            print('read_sql:{:.2f}s'.format(time.time() - start))
+
+            pd.testing.assert_frame_equal(df, expected)
+            session.close()
+        finally:
+            set_data_path(origin_data_path)
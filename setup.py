@@ -132,10 +132,10 @@ setup(
     #
     # Similar to `install_requires` above, these must be valid existing
     # projects.
-    # extras_require={  # Optional
-    #     'dev': ['check-manifest'],
-    #     'test': ['coverage'],
-    # },
+    extras_require={  # Optional
+        # the parquet storage of the kdata,ZVT_KDATA_STORAGE=parquet
+        'parquet': ['pyarrow>=1.0.0'],
+    },
 
     # If there are data files included in your packages that need to be
     # installed, specify them here.
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session, get_adjuster
+from zvdata.result_cache import ResultCache
+from zvdata.reader import DataReader
+from zvt.api.adjust import AdjustEngine, adjust_engine, get_adjust_engine
+from zvt.api.technical import get_kdata
+from zvt.domain import StockAdjustFactor, Stock1dKdata, Stock1mKdata
+from zvt.utils.time_utils import to_time_str
+
+
+def test_adjust_engine():
+    entity_id = 'stock_sz_000001'
+    engine = AdjustEngine()
+    try:
+        # the daily factors are saved as the change points
+        factors = pd.Series([1.0, 1.0, 1.0, 1.2, 1.2], index=pd.date_range('2019-01-01', periods=5))
+        assert engine.save_factors(entity_id, factors)
+        assert engine.get_version(entity_id) == 1
+        assert engine.get_factors(entity_id).to_dict() == {pd.Timestamp('2019-01-01'): 1.0,
+                                                           pd.Timestamp('2019-01-04'): 1.2}
+        assert not engine.save_factors(entity_id, factors)
+
+        kdata = pd.DataFrame({'entity_id': entity_id, 'timestamp': pd.date_range('2019-01-01', periods=5),
+                              'close': [10.0, 11.0, 12.0, 10.0, 11.0]})
+        kdata = engine.adjust_kdata(kdata, entity_id)
+        assert np.allclose(kdata['hfq_close'], [10.0, 11.0, 12.0, 12.0, 13.2])
+        assert np.allclose(kdata['qfq_close'], kdata['hfq_close'] / 1.2)
+
+        # the factor changed,the version is bumped and the qfq is computed from the hfq
+        assert engine.save_factors(entity_id, pd.Series([1.2, 1.5], index=pd.date_range('2019-01-05', periods=2)))
+        assert engine.get_version(entity_id) == 2
+        assert engine.get_latest_factor(entity_id) == 1.5
+
+        kdata = engine.fill_qfq(kdata.set_index(['entity_id', 'timestamp']))
+        assert np.allclose(kdata['qfq_close'], kdata['hfq_close'] / 1.5)
+
+        # persisted
+        assert AdjustEngine().get_factors(entity_id).equals(engine.get_factors(entity_id))
+    finally:
+        session = engine.get_session()
+        session.query(StockAdjustFactor).filter(StockAdjustFactor.entity_id == entity_id).delete()
+        session.commit()
+
+
+def test_get_kdata_after_factor_changed():
+    entity_id = 'stock_sz_999999'
+    kdata_session = get_db_session(provider='joinquant', data_schema=Stock1dKdata)
+    try:
+        # recorded with the factor 1.2
+        factors = pd.Series([1.0, 1.2], index=pd.date_range('2019-01-01', periods=2))
+        assert adjust_engine.save_factors(entity_id, factors)
+        kdata_session.add_all([Stock1dKdata(id='{}_{}'.format(entity_id, to_time_str(timestamp)), entity_id=entity_id,
+                                            provider='joinquant', code='999999', level='1d', timestamp=timestamp,
+                                            close=10.0, hfq_close=10.0 * factor, qfq_close=10.0 * factor / 1.2) for
+                               timestamp, factor in factors.items()])
+        kdata_session.commit()
+
+        kdata = get_kdata(entity_id=entity_id, provider='joinquant', columns=['timestamp', 'qfq_close'])
+        assert list(kdata.columns) == ['timestamp', 'qfq_close']
+        assert np.allclose(kdata['qfq_close'], [10.0 / 1.2, 10.0])
+
+        result_cache = ResultCache()
+        reader = result_cache.get(DataReader, data_schema=Stock1dKdata, provider='joinquant', entity_ids=[entity_id],
+                                  columns=['entity_id', 'timestamp', 'qfq_close'])
+
+        # the factor changed after recording,e.g,saved by the recorder in the other process
+        assert AdjustEngine().save_factors(entity_id, pd.Series([1.5], index=[pd.Timestamp('2019-01-03')]))
+
+        # the stored qfq is out of date,the qfq read is computed with the latest factor
+        the_reader = result_cache.get(DataReader, data_schema=Stock1dKdata, provider='joinquant',
+                                      entity_ids=[entity_id], columns=['entity_id', 'timestamp', 'qfq_close'])
+        assert the_reader is not reader
+        assert np.allclose(the_reader.data_df['qfq_close'], [10.0 / 1.5, 12.0 / 1.5])
+
+        kdata = get_kdata(entity_id=entity_id, provider='joinquant', columns=['timestamp', 'qfq_close'])
+        assert np.allclose(kdata['qfq_close'], [10.0 / 1.5, 12.0 / 1.5])
+
+        kdata = get_kdata(entity_id=entity_id, provider='joinquant')
+        assert np.allclose(kdata['qfq_close'], [10.0 / 1.5, 12.0 / 1.5])
+        assert np.allclose(kdata['close'], [10.0, 10.0])
+    finally:
+        kdata_session.query(Stock1dKdata).filter(Stock1dKdata.entity_id == entity_id).delete()
+        kdata_session.commit()
+
+        session = adjust_engine.get_session()
+        session.query(StockAdjustFactor).filter(StockAdjustFactor.entity_id == entity_id).delete()
+        session.commit()
+        adjust_engine.clear()
+
+
+def test_adjuster_of_provider(tmpdir):
+    assert get_adjuster(provider='joinquant', data_schema=Stock1dKdata) is adjust_engine
+    assert get_adjuster(provider='netease', data_schema=Stock1dKdata) is get_adjust_engine('netease')
+    assert get_adjust_engine('netease') is not adjust_engine
+    # only the providers of the schema
+    assert get_adjuster(provider='netease', data_schema=Stock1mKdata) is None
+
+    entity_id = 'stock_sz_000001'
+    origin_data_path = context['data_path']
+    adjust_engine.clear()
+    set_data_path(str(tmpdir))
+    try:
+        for provider in ['joinquant', 'netease']:
+            for data_schema in [Stock1dKdata, StockAdjustFactor]:
+                get_db_engine(provider, data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+
+            session = get_db_session(provider=provider, data_schema=Stock1dKdata)
+            session.add(Stock1dKdata(id='{}_2019-01-01'.format(entity_id), entity_id=entity_id, provider=provider,
+                                     code='000001', level='1d', timestamp=pd.Timestamp('2019-01-01'), close=10.0,
+                                     hfq_close=20.0, qfq_close=1.0))
+            session.commit()
+
+        # no factors in the tmp db,the saved qfq is kept
+        assert get_kdata(entity_id=entity_id, provider='joinquant')['qfq_close'].tolist() == [1.0]
+
+        # the netease kdata is not adjusted by the joinquant factors
+        assert adjust_engine.save_factors(entity_id, pd.Series([4.0], index=[pd.Timestamp('2019-01-01')]))
+        assert get_kdata(entity_id=entity_id, provider='joinquant')['qfq_close'].tolist() == [5.0]
+        assert get_kdata(entity_id=entity_id, provider='netease')['qfq_close'].tolist() == [1.0]
+
+        assert get_adjust_engine('netease').save_factors(entity_id,
+                                                         pd.Series([2.0], index=[pd.Timestamp('2019-01-01')]))
+        assert get_kdata(entity_id=entity_id, provider='netease')['qfq_close'].tolist() == [10.0]
+    finally:
+        set_data_path(origin_data_path)
+
+    # the factors of the tmp db are not used after the data path changed
+    assert adjust_engine.factors == {}
+    assert get_adjust_engine('netease').factors == {}
+    assert adjust_engine.data_path == origin_data_path
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from zvt.api import computing
+from zvt.api.computing import ma, macd, ema, rsi, boll, atr, kdj, rolling_max, rolling_min, MaState, EmaState, \
+    MacdState, RsiState, BollState, AtrState, KdjState, RollingMaxState, RollingMinState
+
+
+# the rolling of pandas>=1.3 is computed in the same way as the states
+exact_rolling = tuple(int(x) for x in pd.__version__.split('.')[:2]) >= (1, 3)
+
+
+def assert_streaming_equal(expected, actual):
+    if exact_rolling:
+        np.testing.assert_array_equal(expected, actual)
+    else:
+        rtol, atol = computing.streaming_tolerance
+        np.testing.assert_allclose(actual, expected, rtol=rtol, atol=atol)
+
+
+def get_panel():
+    timestamps = pd.date_range('2019-01-01', periods=100)
+    index = pd.MultiIndex.from_product([['stock_sz_000001', 'stock_sz_000002', 'stock_sz_000003'], timestamps],
+                                       names=['entity_id', 'timestamp'])
+    s = pd.Series(10 + np.random.default_rng(0).standard_normal(len(index)).cumsum(), index=index)
+    # the entity with less data
+    return s.drop(s.index[150:180])
+
+
+def assert_panel_computing(s):
+    ma_values = ma(s, window=10)
+    ema_values = ema(s, window=12)
+    diff, dea, m = macd(s, slow=26, fast=12, n=9)
+
+    for entity_id, entity_s in s.groupby(level=0):
+        positions = s.index.get_level_values(0) == entity_id
+        entity_s = entity_s.reset_index(level=0, drop=True)
+
+        np.testing.assert_array_equal(ma_values[positions].values, ma(entity_s, window=10).values)
+        np.testing.assert_array_equal(ema_values[positions].values, ema(entity_s, window=12).values)
+        for panel_values, values in zip((diff, dea, m), macd(entity_s, slow=26, fast=12, n=9)):
+            np.testing.assert_array_equal(panel_values[positions].values, values.values)
+
+
+def test_panel_computing():
+    assert_panel_computing(get_panel())
+
+
+def test_panel_computing_not_contiguous():
+    # the entities are interleaved,e.g,sorted by timestamp
+    s = get_panel().swaplevel().sort_index().swaplevel()
+    assert_panel_computing(s)
+
+
+def test_panel_computing_without_groupby_ewm(monkeypatch):
+    # pandas < 1.2
+    monkeypatch.setattr(computing, '_groupby_ewm', False)
+    assert_panel_computing(get_panel())
+    assert_panel_computing(get_panel().swaplevel().sort_index().swaplevel())
+
+
+def test_streaming_computing():
+    rng = np.random.default_rng(0)
+    close = pd.Series(10 + rng.standard_normal(200).cumsum())
+    close[[20, 21, 80]] = np.nan
+    # the same values
+    close[100:120] = close[99]
+    high = close + rng.random(200)
+    low = close - rng.random(200)
+
+    for func, state_class, inputs, param in [(ma, MaState, [close], {'window': 10}),
+                                             (ema, EmaState, [close], {'window': 12}),
+                                             (macd, MacdState, [close], {'slow': 26, 'fast': 12, 'n': 9}),
+                                             (rsi, RsiState, [close], {'window': 14}),
+                                             (boll, BollState, [close], {'window': 20}),
+                                             (atr, AtrState, [high, low, close], {'window': 14}),
+                                             (kdj, KdjState, [high, low, close], {'n': 9}),
+                                             (rolling_max, RollingMaxState, [close], {'window': 20}),
+                                             (rolling_min, RollingMinState, [close], {'window': 20})]:
+        state = state_class(**param)
+        results = []
+        for i, row in enumerate(zip(*[s.values for s in inputs])):
+            # go on with the restored snapshot
+            if i == 100:
+                state = state_class.restore(pickle.loads(pickle.dumps(state.snapshot())))
+            results.append(state.update(*row))
+
+        expected = func(*inputs, **param)
+        if type(expected) != tuple:
+            expected, results = (expected,), [(result,) for result in results]
+        for values, streaming_values in zip(expected, zip(*results)):
+            assert_streaming_equal(values.values, np.array(streaming_values))
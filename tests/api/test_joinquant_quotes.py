@@ -1,3 +1,5 @@
+import pandas as pd
+
 from zvdata.domain import get_db_session
 from zvdata.structs import IntervalLevel
 from ..context import init_context
@@ -20,3 +22,14 @@ def test_jq_603220_kdata():
     df = technical.get_kdata(entity_id='stock_sh_603220', session=day_1h_session, level=IntervalLevel.LEVEL_1HOUR,
                              provider='joinquant')
     print(df)
+
+
+def test_jq_kdata_fast_read():
+    from zvdata.api import get_data
+    from zvt.domain import Stock1dKdata
+
+    df = get_data(data_schema=Stock1dKdata, provider='joinquant', codes=['603220'], fast=False,
+                  session=day_k_session)
+    fast_df = get_data(data_schema=Stock1dKdata, provider='joinquant', codes=['603220'], fast=True,
+                       session=day_k_session)
+    pd.testing.assert_frame_equal(df, fast_df)
@@ -5,7 +5,7 @@ from ..context import init_context
 init_context()
 
 from zvt.api.rules import coin_finished_timestamp, iterate_timestamps, is_open_time, is_close_time, \
-    is_in_finished_timestamps, is_in_trading, is_trading_date
+    is_in_finished_timestamps, is_in_trading, is_trading_date, set_holidays, load_holidays
 from zvt.utils.time_utils import is_same_time
 
 
@@ -15,6 +15,20 @@ def test_is_trading_date():
     assert not is_trading_date(entity_type='stock', exchange=None, timestamp='2019-06-23')
 
 
+def test_holidays(tmpdir):
+    tmpdir.join('stock.txt').write('# national day\n2019-10-01\n2019-10-02\n')
+    holidays = load_holidays(entity_type='stock', exchange='sh', holiday_path=str(tmpdir))
+    assert len(holidays) == 2
+
+    try:
+        set_holidays(entity_type='stock', exchange='sh', dates=['2019-10-01', '2019-10-02'])
+        assert not is_trading_date(entity_type='stock', exchange='sh', timestamp='2019-10-01')
+        assert not is_trading_date(entity_type='stock', exchange='sh', timestamp='2019-10-02 09:30')
+        assert is_trading_date(entity_type='stock', exchange='sh', timestamp='2019-10-08')
+    finally:
+        set_holidays(entity_type='stock', exchange='sh', dates=[])
+
+
 def test_is_open_close_time():
     timestamps = iterate_timestamps(entity_type='coin', exchange='binance',
                                     level=IntervalLevel.LEVEL_1MIN, start_timestamp='2019-05-01',
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session, session_scope, sqlite_pragmas
+from zvt.domain import Index1dKdata
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    get_db_engine('exchange', data_schema=Index1dKdata).execute(CreateTable(Index1dKdata.__table__))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def get_kdata(the_id, close=1.0):
+    return Index1dKdata(id=the_id, entity_id='index_sh_000001', timestamp=pd.Timestamp('2019-01-01'), close=close)
+
+
+def get_pragma(engine, pragma):
+    return engine.execute('PRAGMA {}'.format(pragma)).scalar()
+
+
+def test_sqlite_pragmas(data_path):
+    engine = get_db_engine('exchange', data_schema=Index1dKdata)
+    assert get_pragma(engine, 'journal_mode') == 'wal'
+    # NORMAL
+    assert get_pragma(engine, 'synchronous') == 1
+    # MEMORY
+    assert get_pragma(engine, 'temp_store') == 2
+    assert get_pragma(engine, 'busy_timeout') == sqlite_pragmas['busy_timeout']
+    assert get_pragma(engine, 'query_only') == 0
+
+    reader_engine = get_db_engine('exchange', data_schema=Index1dKdata, readonly=True)
+    assert reader_engine is not engine
+    assert reader_engine is get_db_engine('exchange', data_schema=Index1dKdata, readonly=True)
+    assert get_pragma(reader_engine, 'query_only') == 1
+    # set by the writer in the db file
+    assert get_pragma(reader_engine, 'journal_mode') == 'wal'
+
+
+def test_overwrite_sqlite_pragmas(data_path, monkeypatch):
+    monkeypatch.setitem(sqlite_pragmas, 'synchronous', 'FULL')
+    monkeypatch.setitem(sqlite_pragmas, 'mmap_size', None)
+    # the engines are created again with the pragmas
+    set_data_path(data_path)
+
+    engine = get_db_engine('exchange', data_schema=Index1dKdata)
+    assert get_pragma(engine, 'synchronous') == 2
+    # not set
+    assert get_pragma(engine, 'mmap_size') == 0
+
+
+def test_readonly_session(data_path):
+    session = get_db_session('exchange', data_schema=Index1dKdata)
+    session.add(get_kdata('test_1'))
+    session.commit()
+
+    reader = get_db_session('exchange', data_schema=Index1dKdata, readonly=True)
+    try:
+        assert [item.id for item in reader.query(Index1dKdata).all()] == ['test_1']
+
+        reader.add(get_kdata('test_2'))
+        with pytest.raises(OperationalError):
+            reader.commit()
+        reader.rollback()
+    finally:
+        reader.close()
+
+    # the reader could read while the writer is in the transaction
+    session.add(get_kdata('test_3'))
+    session.flush()
+    reader = get_db_session('exchange', data_schema=Index1dKdata, readonly=True)
+    try:
+        assert [item.id for item in reader.query(Index1dKdata).all()] == ['test_1']
+    finally:
+        reader.close()
+    session.commit()
+    session.close()
+
+    # the readers share the pooled engine in the threads
+    def read(_):
+        with session_scope('exchange', data_schema=Index1dKdata, readonly=True) as the_session:
+            return sorted(item.id for item in the_session.query(Index1dKdata).all())
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(read, range(8))) == [['test_1', 'test_3']] * 8
+
+
+def test_session_scope(data_path):
+    with session_scope('exchange', data_schema=Index1dKdata) as session:
+        session.add(get_kdata('test_1'))
+    # committed and closed
+    assert not session.new
+    assert session.query(Index1dKdata).count() == 1
+
+    # rollback on error
+    with pytest.raises(ValueError):
+        with session_scope('exchange', data_schema=Index1dKdata) as session:
+            session.add(get_kdata('test_2'))
+            session.flush()
+            raise ValueError('bad data')
+    assert session.query(Index1dKdata).count() == 1
+
+    # not committed for readonly
+    with session_scope('exchange', data_schema=Index1dKdata, readonly=True) as session:
+        assert session.query(Index1dKdata).count() == 1
+
+    with session_scope('exchange', data_schema=Index1dKdata) as session:
+        session.query(Index1dKdata).filter(Index1dKdata.id == 'test_1').update({'close': 2.0})
+    with session_scope('exchange', data_schema=Index1dKdata, readonly=True) as session:
+        assert session.query(Index1dKdata.close).scalar() == 2.0
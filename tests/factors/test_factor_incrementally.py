@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.factor import ScoreFactor
+from zvt.api.adjust import adjust_engine
+from zvt.domain import Stock1dKdata, StockAdjustFactor
+from zvt.factors.technical_factor import TechnicalFactor
+
+entity_ids = ['stock_sz_000001', 'stock_sz_000002', 'stock_sz_000003']
+timestamps = pd.bdate_range('2019-01-02', periods=60)
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    # the factors loaded from the other dbs
+    adjust_engine.clear()
+    set_data_path(str(tmpdir))
+    for data_schema in [Stock1dKdata, StockAdjustFactor]:
+        get_db_engine('joinquant', data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+    # the factors loaded from the tmp db
+    adjust_engine.clear()
+
+
+def add_kdata(start, end):
+    rng = np.random.RandomState(start)
+    session = get_db_session('joinquant', data_schema=Stock1dKdata)
+    for i, entity_id in enumerate(entity_ids):
+        close = 10 * (i + 1) + rng.randn(end - start).cumsum()
+        session.add_all([Stock1dKdata(id='{}_{}'.format(entity_id, timestamp.date()), entity_id=entity_id,
+                                      provider='joinquant', code=entity_id[-6:], level='1d', timestamp=timestamp,
+                                      open=price, close=price, high=price + 1, low=price - 1, qfq_open=price,
+                                      qfq_close=price, qfq_high=price + 1, qfq_low=price - 1,
+                                      volume=float(rng.randint(100, 1000)), turnover=price * 100)
+                         for timestamp, price in zip(timestamps[start:end], close)])
+    session.commit()
+
+
+class SampleScoreFactor(ScoreFactor):
+    def __init__(self, depth_computing_param, **kwargs) -> None:
+        super().__init__(Stock1dKdata, entity_ids=entity_ids, start_timestamp=timestamps[0],
+                         end_timestamp='2019-12-31', columns=[Stock1dKdata.close, Stock1dKdata.volume],
+                         provider='joinquant', depth_computing_param=depth_computing_param,
+                         breadth_computing_param={'score_levels': [0.1, 0.5, 0.9]}, **kwargs)
+
+
+def assert_computed_incrementally(get_factor):
+    add_kdata(0, 40)
+    factor = get_factor()
+
+    computed = []
+    factor.compute = lambda: computed.append(True)
+
+    add_kdata(40, 60)
+    assert factor.move_on(to_timestamp=timestamps[-1], timeout=1)
+    # not the whole data
+    assert not computed
+    assert len(factor.data_df) == 60 * len(entity_ids)
+
+    full = get_factor()
+    pd.testing.assert_frame_equal(factor.depth_df, full.depth_df, check_like=True)
+    if full.result_df is not None:
+        pd.testing.assert_frame_equal(factor.result_df, full.result_df, check_like=True)
+    return factor, full
+
+
+def test_technical_factor_incrementally(data_path):
+    factor, _ = assert_computed_incrementally(
+        lambda: TechnicalFactor(entity_ids=entity_ids, start_timestamp=timestamps[0], end_timestamp='2019-12-31',
+                                provider='joinquant', indicators=['ma', 'macd', 'rsi', 'kdj'],
+                                indicators_param=[{'window': 5}, {'slow': 26, 'fast': 12, 'n': 9}, {'window': 6},
+                                                  {'streaming': True}]))
+    assert factor.depth_df['ma5'].notna().sum() == (60 - 4) * len(entity_ids)
+
+
+@pytest.mark.parametrize('depth_computing_param', [{'window': '10D', 'on': 'timestamp'},
+                                                   {'window': 5, 'on': 'close'}])
+def test_score_factor_incrementally(data_path, depth_computing_param):
+    factor, full = assert_computed_incrementally(lambda: SampleScoreFactor(depth_computing_param))
+    assert len(factor.result_df) == 60 * len(entity_ids)
+    pd.testing.assert_frame_equal(factor.quantile, full.quantile)
+
+
+def test_score_factor_without_depth_incrementally(data_path):
+    assert_computed_incrementally(lambda: SampleScoreFactor(None, depth_computing_method=None))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from examples.factors.benchmark_score_factor import make_panel, make_factor, score_quantile_by_apply
+
+
+@pytest.mark.parametrize('entity_size,days,nan_ratio,seed', [(50, 20, 0.05, 0), (200, 10, 0.3, 1), (3, 5, 0.5, 2)])
+def test_score_quantile(entity_size, days, nan_ratio, seed):
+    factor = make_factor()
+    depth_df = make_panel(entity_size=entity_size, days=days, nan_ratio=nan_ratio, seed=seed)
+
+    quantile, result_df = factor.score_quantile(depth_df)
+    expected_quantile, expected_result_df = score_quantile_by_apply(factor, depth_df)
+
+    pd.testing.assert_frame_equal(quantile, expected_quantile)
+    pd.testing.assert_frame_equal(result_df, expected_result_df)
+
+
+def test_score_quantile_ties():
+    factor = make_factor(score_levels=[0.2, 0.5, 0.8])
+    depth_df = make_panel(entity_size=30, days=5, nan_ratio=0, seed=3)
+    # all the same in the first timestamp,all nan in the last one
+    timestamps = depth_df.index.get_level_values(1)
+    depth_df.loc[timestamps == timestamps[0], 'close'] = 1.0
+    depth_df.loc[timestamps == timestamps[-1], 'volume'] = np.nan
+
+    quantile, result_df = factor.score_quantile(depth_df)
+    expected_quantile, expected_result_df = score_quantile_by_apply(factor, depth_df)
+
+    pd.testing.assert_frame_equal(quantile, expected_quantile)
+    pd.testing.assert_frame_equal(result_df, expected_result_df)
+    assert (result_df.loc[(slice(None), timestamps[0]), 'close'] == 0.8).all()
+
+
+def test_score_quantile_not_unique():
+    factor = make_factor()
+    depth_df = make_panel(entity_size=20, days=5, seed=4)
+    # groupby for the duplicated index
+    depth_df = pd.concat([depth_df, depth_df.iloc[:3]])
+
+    quantile, result_df = factor.score_quantile(depth_df)
+    expected_quantile, expected_result_df = score_quantile_by_apply(factor, depth_df)
+
+    pd.testing.assert_frame_equal(quantile, expected_quantile)
+    pd.testing.assert_frame_equal(result_df, expected_result_df)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import zvdata.reader
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.reader import DataReader, DataListener
+from zvt.domain import Index1dKdata
+
+entity_ids = ['index_sh_000001', 'index_sh_000002', 'index_sz_399001']
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    get_db_engine('exchange', data_schema=Index1dKdata).execute(CreateTable(Index1dKdata.__table__))
+
+    # the first recorded to 2019-01-05,the others to 2019-01-03
+    add_kdata(entity_ids[:1], '2019-01-01', '2019-01-05')
+    add_kdata(entity_ids[1:], '2019-01-01', '2019-01-03')
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def add_kdata(the_entity_ids, start, end):
+    session = get_db_session('exchange', data_schema=Index1dKdata)
+    session.add_all([Index1dKdata(id='{}_{}'.format(entity_id, timestamp.date()), entity_id=entity_id,
+                                  provider='exchange', code=entity_id[-6:], level='1d', timestamp=timestamp,
+                                  close=float(i * 100 + timestamp.day)) for i, entity_id in enumerate(the_entity_ids)
+                     for timestamp in pd.date_range(start, end)])
+    session.commit()
+
+
+class SampleListener(DataListener):
+    def __init__(self) -> None:
+        # (category,the added timestamps)
+        self.added = []
+        self.changed = 0
+
+    def on_data_loaded(self, data: pd.DataFrame) -> object:
+        pass
+
+    def on_data_changed(self, data: pd.DataFrame) -> object:
+        self.changed += 1
+
+    def on_category_data_added(self, category: str, added_data: pd.DataFrame) -> object:
+        self.added.append((category, added_data.index.get_level_values(1).strftime('%m-%d').tolist()))
+
+
+def get_reader(**kwargs):
+    reader = DataReader(data_schema=Index1dKdata, entity_ids=entity_ids, provider='exchange',
+                        start_timestamp='2019-01-01', end_timestamp='2019-01-05',
+                        columns=[Index1dKdata.entity_id, Index1dKdata.timestamp, Index1dKdata.close], **kwargs)
+    reader.move_on_sleeping_time = 0.01
+    reader.move_on_max_sleeping_time = 0.04
+    return reader
+
+
+def test_move_on_batch(data_path, monkeypatch):
+    reader = get_reader()
+    reader.load_step = 2
+    listener = SampleListener()
+    reader.register_data_listener(listener)
+
+    queries = []
+    query_added_data = reader.query_added_data
+
+    def counting_query_added_data(categories, *args, **kwargs):
+        queries.append(categories)
+        return query_added_data(categories, *args, **kwargs)
+
+    reader.query_added_data = counting_query_added_data
+
+    get_data_calls = []
+    get_data = zvdata.reader.get_data
+
+    def counting_get_data(*args, **kwargs):
+        df = get_data(*args, **kwargs)
+        get_data_calls.append(0 if df is None else len(df))
+        return df
+
+    monkeypatch.setattr(zvdata.reader, 'get_data', counting_get_data)
+
+    add_kdata(entity_ids[:1], '2019-01-06', '2019-01-06')
+    add_kdata(entity_ids[1:2], '2019-01-04', '2019-01-06')
+
+    start_time = time.time()
+    assert reader.move_on(to_timestamp='2019-01-06', timeout=0.2)
+    # wait the last one with backoff until timeout
+    assert 0.2 <= time.time() - start_time < 1
+    assert queries[0] == entity_ids
+    assert all(categories == entity_ids[2:] for categories in queries[1:])
+    assert 3 < len(queries) < 10
+    # the categories are grouped by the recorded timestamp and queried in chunks of load_step,only the data after
+    # the recorded timestamp of the group is read
+    assert len(get_data_calls) == 2 + len(queries) - 1
+    assert get_data_calls[:2] == [1, 3]
+
+    # the data of the first one before its recorded timestamp is not added again
+    assert listener.added == [(entity_ids[0], ['01-06']), (entity_ids[1], ['01-04', '01-05', '01-06'])]
+    assert listener.changed == 1
+
+    df = reader.data_df
+    assert df.index.is_unique
+    assert df.index.is_monotonic_increasing
+    assert len(df) == 6 + 6 + 3
+
+    # the same as loading all
+    the_reader = get_reader(auto_load=False)
+    the_reader.end_timestamp = pd.Timestamp('2019-01-06')
+    the_reader.load_data()
+    pd.testing.assert_frame_equal(df, the_reader.data_df)
+
+    # nothing added
+    assert not reader.move_on(to_timestamp='2019-01-06', timeout=0)
+    assert listener.changed == 1
+
+
+def test_move_on_batch_parity(data_path):
+    readers = [get_reader(), get_reader()]
+
+    add_kdata(entity_ids[:1], '2019-01-06', '2019-01-07')
+    add_kdata(entity_ids[1:], '2019-01-04', '2019-01-06')
+
+    assert readers[0].move_on(to_timestamp='2019-01-06', timeout=0.1)
+    assert readers[1].move_on(to_timestamp='2019-01-06', timeout=0.1, batch=False)
+    pd.testing.assert_frame_equal(readers[0].data_df, readers[1].data_df)
+    assert readers[0].data_df.index.get_level_values(1).max() == pd.Timestamp('2019-01-06')
+
+
+def test_merge_added_data(data_path):
+    reader = get_reader(auto_load=False)
+
+    rng = np.random.RandomState(0)
+    categories = ['c{}'.format(i) for i in range(10)]
+    timestamps = pd.date_range('2019-01-01', periods=20)
+
+    dfs = []
+    for category in categories:
+        size = rng.randint(0, 20)
+        dfs.append(pd.DataFrame({'entity_id': category, 'timestamp': timestamps[:size], 'close': rng.randn(size)}))
+    data_df = pd.concat(dfs).set_index(['entity_id', 'timestamp'], drop=False)
+    # the added data of the category is after its data
+    split = timestamps[rng.randint(0, 20, len(categories))][pd.factorize(data_df['entity_id'], sort=True)[0]]
+
+    reader.data_df = data_df[data_df['timestamp'].values < split]
+    # some categories are only added
+    added = data_df[data_df['timestamp'].values >= split]
+    added = added[added['entity_id'] != 'c0']
+
+    reader.merge_added_data(added)
+
+    expected = pd.concat([data_df[data_df['timestamp'].values < split], added]).sort_index()
+    pd.testing.assert_frame_equal(reader.data_df, expected)
+    assert reader.data_df.index.is_monotonic_increasing
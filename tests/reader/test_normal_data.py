@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+
+from zvdata.normal_data import NormalData
+
+
+def test_normal_data_with_gap():
+    index = pd.MultiIndex.from_tuples([('stock_sz_000001', pd.Timestamp('2019-01-01')),
+                                       ('stock_sz_000001', pd.Timestamp('2019-01-03')),
+                                       ('stock_sz_000002', pd.Timestamp('2019-01-02')),
+                                       ('stock_sz_000002', pd.Timestamp('2019-01-03'))],
+                                      names=['entity_id', 'timestamp'])
+    normal_data = NormalData(pd.DataFrame({'close': [1.0, 2.0, 3.0, 4.0]}, index=index))
+
+    assert normal_data.entity_ids == ['stock_sz_000001', 'stock_sz_000002']
+    assert normal_data.entity_size == 2
+    assert normal_data.row_count == 3
+    assert normal_data.get_table_type() == 'multiple_multiple_single'
+
+    # aligned to the union index
+    df = normal_data.entity_map_df['stock_sz_000002']
+    assert df.index.tolist() == pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-03']).tolist()
+    np.testing.assert_array_equal(df['close'].values, [np.nan, 3.0, 4.0])
+    assert len(normal_data.panel) == 6
+
+
+def test_normal_data_aligned():
+    df = NormalData.sample()
+    normal_data = NormalData(df)
+
+    # no copy for the aligned data
+    assert normal_data.panel is normal_data.data_df
+    for entity_id, entity_df in normal_data.entity_map_df.items():
+        pd.testing.assert_frame_equal(entity_df, df.loc[entity_id], check_freq=False)
+
+
+def test_entity_df_view():
+    normal_data = NormalData(NormalData.sample())
+
+    entity_id = normal_data.entity_ids[1]
+    df = normal_data.get_entity_df(entity_id)
+    assert df.index.equals(normal_data.index)
+    assert np.shares_memory(df['math'].values, normal_data.panel['math'].values)
+    # the panel keeps its index
+    assert isinstance(normal_data.panel.index, pd.MultiIndex)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy.schema import CreateTable
+
+from zvdata.api import get_data
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session, _db_storage_map, _get_db_key
+from zvdata.parquet_store import read_parquet, append_parquet, migrate_to_parquet, get_parquet_root, \
+    get_partition_path
+from zvt.api.adjust import adjust_engine
+from zvt.domain import Stock1dKdata, StockAdjustFactor
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    # the factors loaded from the other dbs
+    adjust_engine.clear()
+    set_data_path(str(tmpdir))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+    # the factors loaded from the tmp db
+    adjust_engine.clear()
+
+
+def get_kdata_df(entity_ids, timestamps, close=1.0):
+    df = pd.DataFrame([{'id': '{}_{}'.format(entity_id, timestamp), 'entity_id': entity_id, 'provider': 'joinquant',
+                        'code': entity_id.split('_')[-1], 'level': '1d', 'timestamp': pd.Timestamp(timestamp)} for
+                       entity_id in entity_ids for timestamp in timestamps])
+    df['close'] = close
+    return df
+
+
+def test_read_parquet(data_path):
+    df = get_kdata_df(['stock_sz_000338', 'stock_sh_600000'], ['2018-12-28', '2019-01-02', '2019-01-03'])
+    df['close'] = range(len(df))
+    df.loc[df['timestamp'] == '2019-01-03', 'hfq_close'] = 10.0
+    assert append_parquet(df, provider='joinquant', data_schema=Stock1dKdata) == 6
+
+    root = get_parquet_root('joinquant', Stock1dKdata)
+    assert os.path.exists(get_partition_path(root, 'stock_sz_000338', 2018))
+    assert os.path.exists(get_partition_path(root, 'stock_sh_600000', 2019))
+
+    # the columns and the filters are pushed down
+    result = read_parquet(Stock1dKdata, provider='joinquant', entity_ids=['stock_sz_000338'], columns=['close'],
+                          start_timestamp='2019-01-01')
+    assert list(result.columns) == ['close', 'timestamp']
+    assert result['close'].tolist() == [1, 2]
+
+    result = read_parquet(Stock1dKdata, provider='joinquant', filters=[Stock1dKdata.close >= 2,
+                                                                       Stock1dKdata.code.in_(['600000'])])
+    assert result['id'].tolist() == ['stock_sh_600000_2018-12-28', 'stock_sh_600000_2019-01-02',
+                                     'stock_sh_600000_2019-01-03']
+
+    result = read_parquet(Stock1dKdata, provider='joinquant', entity_ids=['stock_sh_600000'],
+                          filters=[Stock1dKdata.hfq_close.is_(None)])
+    assert result['timestamp'].tolist() == [pd.Timestamp('2018-12-28'), pd.Timestamp('2019-01-02')]
+
+    result = read_parquet(Stock1dKdata, provider='joinquant', order=Stock1dKdata.close.desc(), limit=2)
+    assert result['close'].tolist() == [5, 4]
+
+    # not exist
+    assert read_parquet(Stock1dKdata, provider='netease').empty
+
+
+def test_append_parquet(data_path):
+    entity_id = 'stock_sz_000338'
+    assert append_parquet(get_kdata_df([entity_id], ['2019-01-02', '2019-01-03']), provider='joinquant',
+                          data_schema=Stock1dKdata) == 2
+
+    # the saved is kept
+    df = get_kdata_df([entity_id], ['2019-01-01', '2019-01-03'], close=2.0)
+    assert append_parquet(df, provider='joinquant', data_schema=Stock1dKdata) == 1
+    result = read_parquet(Stock1dKdata, provider='joinquant', entity_ids=[entity_id])
+    assert result['close'].tolist() == [2.0, 1.0, 1.0]
+
+    # the partition is rewritten sorted by timestamp
+    assert append_parquet(df, provider='joinquant', data_schema=Stock1dKdata, force_update=True) == 2
+    result = read_parquet(Stock1dKdata, provider='joinquant', entity_ids=[entity_id])
+    assert result['timestamp'].tolist() == list(pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-03']))
+    assert result['close'].tolist() == [2.0, 1.0, 2.0]
+
+    root = get_parquet_root('joinquant', Stock1dKdata)
+    assert os.listdir(os.path.dirname(get_partition_path(root, entity_id, 2019))) == ['data.parquet']
+
+
+def test_migrate_to_parquet(data_path, monkeypatch):
+    for data_schema in [Stock1dKdata, StockAdjustFactor]:
+        get_db_engine('joinquant', data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+
+    df = get_kdata_df(['stock_sz_000338', 'stock_sh_600000'], ['2018-12-28', '2019-01-02'], close=3.0)
+    session = get_db_session('joinquant', data_schema=Stock1dKdata)
+    session.add_all([Stock1dKdata(**record) for record in df.to_dict(orient='records')])
+    session.commit()
+    session.close()
+
+    assert migrate_to_parquet(provider='joinquant', data_schema=Stock1dKdata) == 4
+    # force update
+    assert migrate_to_parquet(provider='joinquant', data_schema=Stock1dKdata, entity_ids=['stock_sz_000338']) == 2
+
+    # get_data reads the parquet dataset after switching the storage
+    monkeypatch.setitem(_db_storage_map, _get_db_key('joinquant', 'stock_1d_kdata'), 'parquet')
+    result = get_data(data_schema=Stock1dKdata, provider='joinquant', entity_ids=['stock_sz_000338'])
+    assert result['id'].tolist() == ['stock_sz_000338_2018-12-28', 'stock_sz_000338_2019-01-02']
+    assert result['close'].tolist() == [3.0, 3.0]
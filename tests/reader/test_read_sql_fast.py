@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import pandas as pd
+import pytest
+
+from zvdata.api import read_sql_fast
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvt.domain.business import BusinessBase, Position
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    BusinessBase.metadata.create_all(get_db_engine('zvt', db_name='business'))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def test_read_sql_fast(data_path):
+    session = get_db_session('zvt', 'business')
+    session.bulk_insert_mappings(Position, [
+        {'id': 'test_{}'.format(i), 'trader_name': 'test', 'entity_id': 'stock_sz_000001',
+         'timestamp': pd.Timestamp('2019-01-01') + pd.Timedelta(days=i), 'long_amount': float(i),
+         'profit': None if i % 2 else 1.0, 'trading_t': 1, 'sim_account_id': 'test_2019-01-0{}'.format(i + 1)} for
+        i in range(5)])
+    session.commit()
+
+    query = session.query(Position)
+    df = read_sql_fast(query, chunk_size=2)
+    expected = pd.read_sql(query.statement, session.bind)
+    pd.testing.assert_frame_equal(df, expected)
+
+    # the string ids saved in the integer foreign key are kept
+    assert df['sim_account_id'].tolist() == ['test_2019-01-0{}'.format(i + 1) for i in range(5)]
+    assert df['trading_t'].dtype == 'int64'
+    assert df['profit'].isna().tolist() == [False, True, False, True, False]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import pandas as pd
+import pytest
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.reader import DataReader
+from zvdata.result_cache import ResultCache
+from zvt.domain import Stock1dKdata, Index1dKdata
+
+entity_ids = ['index_sh_000001', 'index_sz_399001']
+
+
+def test_result_key():
+    def get_key(**kwargs):
+        return ResultCache.get_key(DataReader(data_schema=Stock1dKdata, provider='joinquant', auto_load=False,
+                                              start_timestamp='2019-01-01', **kwargs))
+
+    assert get_key(codes=['000001'], columns=['close', 'open']) == get_key(codes='000001', columns=['open', 'close'])
+    assert get_key(codes=['000001']) != get_key(codes=['000002'])
+    assert get_key(codes=['000001'], filters=[Stock1dKdata.close > 1]) != get_key(codes=['000001'],
+                                                                                filters=[Stock1dKdata.close > 2])
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    get_db_engine('exchange', data_schema=Index1dKdata).execute(CreateTable(Index1dKdata.__table__))
+
+    session = get_db_session('exchange', data_schema=Index1dKdata)
+    session.add_all([Index1dKdata(id='{}_{}'.format(entity_id, timestamp.date()), entity_id=entity_id,
+                                  provider='exchange', code=entity_id[-6:], level='1d', timestamp=timestamp,
+                                  close=float(timestamp.day)) for entity_id in entity_ids
+                     for timestamp in pd.date_range('2019-01-01', '2019-01-05')])
+    session.commit()
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def get_reader(result_cache):
+    return result_cache.get(DataReader, data_schema=Index1dKdata, provider='exchange', entity_ids=entity_ids,
+                            columns=['entity_id', 'timestamp', 'close'], start_timestamp='2019-01-01')
+
+
+def test_result_view(data_path):
+    result_cache = ResultCache()
+    data_df = get_reader(result_cache).data_df.copy()
+
+    # the drawer and normal data of the data app
+    reader = get_reader(result_cache)
+    reader.data_drawer().draw_data_table(id='data_table_content')
+    reader.normal_data.get_intents()
+    reader.data_drawer().draw(chart='line', render=None)
+    reader.data_df['added'] = 1
+
+    the_reader = get_reader(result_cache)
+    assert result_cache.get_metrics()['hits'] == 2
+    assert the_reader is not reader
+    assert the_reader.normal_data is not reader.normal_data
+    pd.testing.assert_frame_equal(the_reader.data_df, data_df)
+
+
+def test_result_updated_in_place(data_path):
+    result_cache = ResultCache()
+    assert get_reader(result_cache).data_df['close'].tolist()[-1] == 5.0
+    get_reader(result_cache)
+    assert result_cache.get_metrics()['hits'] == 1
+
+    # the latest timestamp is not changed
+    session = get_db_session('exchange', data_schema=Index1dKdata)
+    session.query(Index1dKdata).filter(Index1dKdata.id == '{}_2019-01-05'.format(entity_ids[-1])).update(
+        {Index1dKdata.close: 50.0})
+    session.commit()
+
+    assert get_reader(result_cache).data_df['close'].tolist()[-1] == 50.0
+    assert result_cache.get_metrics()['invalidations'] == 1
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.recorder import TimeSeriesDataRecorder
+from zvdata.structs import IntervalLevel
+from zvt.api.common import generate_kdata_id, generate_kdata_ids
+from zvt.domain import Stock, Index1dKdata
+
+entity_id = 'stock_sz_000001'
+
+
+class SampleRecorder(TimeSeriesDataRecorder):
+    entity_provider = 'exchange'
+    entity_schema = Stock
+
+    provider = 'exchange'
+    data_schema = Index1dKdata
+
+    def __init__(self, data, bulk_persist=True, **kwargs) -> None:
+        # the DataFrame or the json list returned by record
+        self.data = data
+        self.bulk_persist = bulk_persist
+        super().__init__(entity_type='stock', exchanges=['sz'], entity_ids=[entity_id], sleeping_time=0,
+                         one_shot=True, **kwargs)
+
+    def get_data_map(self):
+        return {}
+
+    def record(self, entity, start, end, size, timestamps):
+        if isinstance(self.data, pd.DataFrame):
+            return self.data.copy()
+        return [dict(item) for item in self.data]
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+
+    for provider, data_schema in [('exchange', Stock), ('exchange', Index1dKdata)]:
+        get_db_engine(provider, data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+
+    session = get_db_session(provider='exchange', data_schema=Stock)
+    session.add(Stock(id=entity_id, entity_id=entity_id, entity_type='stock', exchange='sz', code='000001',
+                      timestamp=pd.Timestamp('2018-01-01')))
+    session.commit()
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+@pytest.fixture
+def executed(data_path):
+    # (statement,the parameter sets) of the insert/update of the kdata
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO index_1d_kdata') or statement.startswith('UPDATE index_1d_kdata'):
+            statements.append((statement.split(' ')[0], len(parameters) if executemany else 1))
+
+    engine = get_db_engine('exchange', data_schema=Index1dKdata)
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', on_execute)
+
+
+def make_data(closes, record_type):
+    # the last two rows have the same timestamp,so the same id
+    df = pd.DataFrame({'timestamp': pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-03', '2019-01-03',
+                                                    '2019-01-04'][:len(closes)]),
+                       'close': closes})
+    if record_type == 'list':
+        return df.to_dict(orient='records')
+    return df
+
+
+def get_saved():
+    session = get_db_session(provider='exchange', data_schema=Index1dKdata)
+    try:
+        return {item.id: item.close for item in session.query(Index1dKdata).all()}
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('record_type', ['df', 'list'])
+def test_record(executed, record_type):
+    recorder = SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], record_type))
+    recorder.run()
+
+    # the duplicated id is added with a suffix
+    assert get_saved() == {'stock_sz_000001_2019-01-01': 1.0, 'stock_sz_000001_2019-01-02': 2.0,
+                           'stock_sz_000001_2019-01-03': 3.0, 'stock_sz_000001_2019-01-03_1': 4.0}
+    # one executemany
+    assert executed == [('INSERT', 4)]
+    assert recorder.latest_timestamps[entity_id] == pd.Timestamp('2019-01-03')
+
+    # the saved ones are ignored without force_update
+    executed.clear()
+    recorder = SampleRecorder(make_data([10.0, 20.0, 30.0, 40.0, 5.0], record_type))
+    recorder.run()
+
+    assert get_saved() == {'stock_sz_000001_2019-01-01': 1.0, 'stock_sz_000001_2019-01-02': 2.0,
+                           'stock_sz_000001_2019-01-03': 3.0, 'stock_sz_000001_2019-01-03_1': 4.0,
+                           'stock_sz_000001_2019-01-04': 5.0}
+    assert executed == [('INSERT', 1)]
+    assert recorder.latest_timestamps[entity_id] == pd.Timestamp('2019-01-04')
+
+
+@pytest.mark.parametrize('record_type', ['df', 'list'])
+def test_record_force_update(executed, record_type):
+    SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], record_type)).run()
+
+    # nothing changed
+    executed.clear()
+    SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], record_type), force_update=True).run()
+    assert executed == []
+
+    # only the changed are updated
+    SampleRecorder(make_data([1.0, 20.0, 3.0, 40.0, 5.0], record_type), force_update=True).run()
+    assert sorted(executed) == [('INSERT', 1), ('UPDATE', 2)]
+    assert get_saved() == {'stock_sz_000001_2019-01-01': 1.0, 'stock_sz_000001_2019-01-02': 20.0,
+                           'stock_sz_000001_2019-01-03': 3.0, 'stock_sz_000001_2019-01-03_1': 40.0,
+                           'stock_sz_000001_2019-01-04': 5.0}
+
+
+@pytest.mark.parametrize('record_type', ['df', 'list'])
+def test_fix_duplicate_way_ignore(data_path, record_type):
+    SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], record_type), fix_duplicate_way='ignore').run()
+
+    # the first one is kept
+    assert get_saved() == {'stock_sz_000001_2019-01-01': 1.0, 'stock_sz_000001_2019-01-02': 2.0,
+                           'stock_sz_000001_2019-01-03': 3.0}
+
+
+def test_bulk_persist_as_domains(data_path):
+    SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], 'list'), bulk_persist=False).run()
+    domain_saved = get_saved()
+
+    get_db_engine('exchange', data_schema=Index1dKdata).execute(Index1dKdata.__table__.delete())
+
+    SampleRecorder(make_data([1.0, 2.0, 3.0, 4.0], 'df')).run()
+    assert get_saved() == domain_saved
+
+
+class SampleIdRecorder(SampleRecorder):
+    def generate_domain_id(self, entity, original_data):
+        return '{}_{}'.format(entity.id, int(original_data['close']))
+
+
+def test_generate_domain_ids(data_path):
+    df = make_data([1.0, 2.0, 3.0, 4.0], 'df')
+
+    recorder = SampleRecorder(df)
+    entity = recorder.entities[0]
+    expected = [recorder.generate_domain_id(entity, row) for _, row in df.iterrows()]
+    assert recorder.generate_domain_ids(entity, df).tolist() == expected
+
+    # the overwritten generate_domain_id is used
+    recorder = SampleIdRecorder(df)
+    expected = ['stock_sz_000001_{}'.format(i) for i in range(1, 5)]
+    assert recorder.generate_domain_ids(entity, df).tolist() == expected
+    recorder.run()
+    assert sorted(get_saved().keys()) == expected
+
+
+@pytest.mark.parametrize('level', [IntervalLevel.LEVEL_1DAY, IntervalLevel.LEVEL_1HOUR, IntervalLevel.LEVEL_5MIN])
+def test_generate_kdata_ids(level):
+    timestamps = pd.Series(pd.to_datetime(['2019-01-02', '2019-01-02 09:35', '2019-01-02 10:30:00.123']))
+    assert generate_kdata_ids(entity_id, timestamps, level=level).tolist() == [
+        generate_kdata_id(entity_id, timestamp, level=level) for timestamp in timestamps]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from zvdata.utils import http_utils
+from zvdata.utils.http_utils import HttpTransport, request_all
+from zvdata.utils.rate_limit_utils import TokenBucket
+from zvt.recorders.eastmoney.common import call_eastmoney_api, call_eastmoney_api_all
+
+# the recorded responses,path -> [(status,json)],the last one is replayed when the others are used up
+recorded = {
+    '/api/timestamps': [(200, {'Result': {'ReportDate': ['2019-06-30', '2019-03-31']}})],
+    '/api/busy': [(503, {'Result': None}), (200, {'Result': {'TotalCount': 9}})],
+    '/api/echo': [(200, None)]
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def replay(self, body=None):
+        responses = self.server.responses[self.path.split('?')[0]]
+        status, result = responses.pop(0) if len(responses) > 1 else responses[0]
+        if result is None:
+            result = {'Result': {'path': self.path, 'body': body}}
+        # the bad response
+        if body and body.get('bad'):
+            result = 'busy'
+
+        content = json.dumps(result).encode('utf-8')
+        self.server.accept_encodings.append(self.headers.get('Accept-Encoding'))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.replay()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.replay(json.loads(body) if body else None)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.responses = {path: list(responses) for path, responses in recorded.items()}
+    server.accept_encodings = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def test_http_transport():
+    server, host = start_stub_server()
+    transport = HttpTransport(backoff_factor=0)
+    try:
+        result = call_eastmoney_api(url=host + '/api/timestamps', param={'color': 'w'},
+                                    path_fields=['ReportDate'], transport=transport)
+        assert result == ['2019-06-30', '2019-03-31']
+        assert 'gzip' in server.accept_encodings[0]
+
+        # retried on 503
+        assert call_eastmoney_api(url=host + '/api/busy', path_fields=['TotalCount'], transport=transport) == 9
+        assert len(server.accept_encodings) == 3
+
+        # the same pooled session for the host
+        assert len(transport.sessions) == 1
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_request_all():
+    server, host = start_stub_server()
+    transport = HttpTransport(backoff_factor=0)
+    try:
+        params = [{'code': str(i)} for i in range(20)]
+        results = call_eastmoney_api_all(url=host + '/api/echo', params=params, transport=transport)
+        assert [result['body'] for result in results] == params
+
+        responses = request_all([{'method': 'get', 'url': host + '/api/echo', 'params': param} for param in params],
+                                concurrency=5, transport=transport)
+        assert [resp.status_code for resp in responses] == [200] * 20
+        assert [resp.json()['Result']['path'] for resp in responses] == ['/api/echo?code={}'.format(i) for i in
+                                                                           range(20)]
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+@pytest.mark.parametrize('use_aiohttp', [True, False])
+def test_request_all_failed(use_aiohttp, monkeypatch):
+    if not use_aiohttp:
+        monkeypatch.setattr(http_utils, 'aiohttp', None)
+
+    server, host = start_stub_server()
+    transport = HttpTransport(backoff_factor=0, retries=0)
+    try:
+        bucket = TokenBucket(rate=50, capacity=1)
+        bucket.acquire()
+        start = time.monotonic()
+
+        calls = [{'method': 'get', 'url': host + '/api/echo', 'params': {'code': str(i)}} for i in range(10)]
+        # refused
+        calls[6]['url'] = 'http://127.0.0.1:1/api/echo'
+        responses = request_all(calls, transport=transport, rate_limiter=bucket, return_exceptions=True)
+        assert isinstance(responses[6], Exception)
+        assert [resp.status_code for i, resp in enumerate(responses) if i != 6] == [200] * 9
+        # throttled by the bucket
+        assert time.monotonic() - start >= 0.15
+
+        params = [{'code': str(i)} for i in range(10)]
+        params[3]['bad'] = True
+        results = call_eastmoney_api_all(url=host + '/api/echo', params=params, path_fields=['body'],
+                                         transport=transport, return_exceptions=True)
+        # one bad response doesn't drop the others
+        assert isinstance(results[3], Exception)
+        assert results[:3] + results[4:] == params[:3] + params[4:]
+
+        with pytest.raises(Exception):
+            call_eastmoney_api_all(url=host + '/api/echo', params=params, path_fields=['body'], transport=transport)
+    finally:
+        transport.close()
+        server.shutdown()
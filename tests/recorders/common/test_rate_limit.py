@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zvdata.utils.rate_limit_utils import TokenBucket, get_or_register_rate_limit, get_rate_limiter, \
+    get_provider_rate_limiter, provider_rate_limits
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    # the burst
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    waiting_seconds = bucket.try_acquire()
+    assert 0 < waiting_seconds <= 0.05
+
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # 4 tokens refilled at 20 per second
+    assert time.monotonic() - start >= 0.15
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(rate=50, capacity=1)
+    bucket.acquire()
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        list(executor.map(lambda _: bucket.acquire(), range(10)))
+    # the threads share the rate
+    assert time.monotonic() - start >= 0.18
+
+
+def test_get_or_register_rate_limit():
+    key = 'test_get_or_register_rate_limit'
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        buckets = list(executor.map(lambda _: get_or_register_rate_limit(key, rate=10), range(32)))
+
+    # the racing threads get the same bucket
+    assert all(bucket is buckets[0] for bucket in buckets)
+    assert get_rate_limiter(key) is buckets[0]
+    # the registered is kept
+    assert get_or_register_rate_limit(key, rate=100) is buckets[0]
+    assert buckets[0].rate == 10
+
+
+def test_get_provider_rate_limiter(monkeypatch):
+    monkeypatch.setitem(provider_rate_limits, 'test_provider', 10)
+    assert get_provider_rate_limiter('test_provider') is get_rate_limiter('test_provider')
+    assert get_provider_rate_limiter('test_provider').rate == 10
+    # no limit
+    assert get_provider_rate_limiter('test_no_limit_provider') is None
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.schema import CreateTable
+
+from zvdata.api import get_data
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.recorder import TimeSeriesDataRecorder
+from zvdata.utils.rate_limit_utils import provider_rate_limits
+from zvt.domain import Stock, Index1dKdata
+
+
+class SampleKdataRecorder(TimeSeriesDataRecorder):
+    entity_provider = 'exchange'
+    entity_schema = Stock
+
+    provider = 'exchange'
+    data_schema = Index1dKdata
+
+    def __init__(self, failures=None, **kwargs) -> None:
+        # entity_id -> the errors raised by record in turn
+        self.failures = failures or {}
+        # (entity_id,time) of the record calls
+        self.calls = []
+        super().__init__(entity_type='stock', exchanges=['sz'], sleeping_time=0, one_shot=True, **kwargs)
+
+    def get_data_map(self):
+        return {}
+
+    def get_rate_limit_key(self, entity):
+        # not shared with the other tests
+        return 'test_{}'.format(id(self))
+
+    def record(self, entity, start, end, size, timestamps):
+        self.calls.append((entity.id, time.monotonic()))
+        if self.failures.get(entity.id):
+            raise self.failures[entity.id].pop(0)
+        return pd.DataFrame({'timestamp': pd.date_range('2019-01-01', periods=3), 'close': [1.0, 2.0, 3.0]})
+
+
+entity_ids = ['stock_sz_00000{}'.format(i) for i in range(1, 6)]
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+
+    for provider, data_schema in [('exchange', Stock), ('exchange', Index1dKdata)]:
+        get_db_engine(provider, data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+
+    session = get_db_session(provider='exchange', data_schema=Stock)
+    session.add_all([Stock(id=entity_id, entity_id=entity_id, entity_type='stock', exchange='sz',
+                           code=entity_id.split('_')[-1], timestamp=pd.Timestamp('2018-01-01')) for entity_id in
+                     entity_ids])
+    session.commit()
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def get_recorded_entity_ids():
+    df = get_data(data_schema=Index1dKdata, provider='exchange', columns=['entity_id'])
+    return sorted(df['entity_id'].unique()) if df is not None and not df.empty else []
+
+
+def test_record_with_retry(data_path):
+    recorder = SampleKdataRecorder(entity_ids=entity_ids[:1],
+                                   failures={entity_ids[0]: [IOError('timeout'), IOError('timeout')]})
+    recorder.retry_times = 2
+    recorder.retry_backoff = 0.01
+    recorder.run()
+
+    assert len(recorder.calls) == 3
+    assert get_recorded_entity_ids() == entity_ids[:1]
+
+    # out of the retry times
+    recorder = SampleKdataRecorder(entity_ids=entity_ids[1:2],
+                                   failures={entity_ids[1]: [IOError('timeout'), IOError('timeout')]})
+    recorder.retry_times = 1
+    recorder.retry_backoff = 0.01
+    with pytest.raises(IOError):
+        recorder.run()
+    assert len(recorder.calls) == 2
+    assert get_recorded_entity_ids() == entity_ids[:1]
+
+
+def test_failure_policy(data_path):
+    recorder = SampleKdataRecorder(entity_ids=entity_ids, failures={entity_ids[1]: [ValueError('bad data')]})
+    with pytest.raises(ValueError):
+        recorder.run()
+    # stop at the failed one
+    assert [entity_id for entity_id, _ in recorder.calls] == entity_ids[:2]
+    assert get_recorded_entity_ids() == entity_ids[:1]
+
+    recorder = SampleKdataRecorder(entity_ids=entity_ids, failures={entity_ids[2]: [ValueError('bad data')]})
+    recorder.failure_policy = 'skip'
+    recorder.run()
+    assert [item.id for item in recorder.failed_entities] == entity_ids[2:3]
+    assert get_recorded_entity_ids() == entity_ids[:2] + entity_ids[3:]
+
+
+def test_run_concurrently(data_path):
+    recorder = SampleKdataRecorder(entity_ids=entity_ids, failures={entity_ids[2]: [ValueError('bad data')]})
+    recorder.concurrency = 3
+    recorder.rate_limit = 100
+    recorder.failure_policy = 'skip'
+    recorder.run()
+
+    assert len(recorder.calls) == 5
+    assert [item.id for item in recorder.failed_entities] == entity_ids[2:3]
+    assert get_recorded_entity_ids() == entity_ids[:2] + entity_ids[3:]
+
+    # raise the error after all the submitted finished
+    recorder = SampleKdataRecorder(entity_ids=entity_ids, failures={entity_ids[2]: [ValueError('bad data')]})
+    recorder.concurrency = 3
+    with pytest.raises(ValueError):
+        recorder.run()
+
+
+def test_run_concurrently_throttled(data_path):
+    recorder = SampleKdataRecorder(entity_ids=entity_ids)
+    recorder.concurrency = 5
+    recorder.rate_limit = 20
+    recorder.get_rate_limiter(recorder.entities[0]).tokens = 0
+    recorder.run()
+    timestamps = sorted(call_time for _, call_time in recorder.calls)
+    # at most 20 requests per second
+    assert timestamps[-1] - timestamps[0] >= 0.15
+
+    # no rate_limit,throttled by sleeping_time as the sequential run
+    recorder = SampleKdataRecorder(entity_ids=entity_ids)
+    recorder.concurrency = 5
+    recorder.sleeping_time = 0.05
+    assert recorder.get_rate_limit() == 20
+    recorder.get_rate_limiter(recorder.entities[0]).tokens = 0
+    recorder.run()
+    timestamps = sorted(call_time for _, call_time in recorder.calls)
+    assert timestamps[-1] - timestamps[0] >= 0.15
+
+
+def test_provider_rate_limit(data_path, monkeypatch):
+    monkeypatch.setitem(provider_rate_limits, 'exchange', 50)
+
+    # the sequential run is throttled by sleeping_time
+    recorder = SampleKdataRecorder(entity_ids=entity_ids)
+    assert recorder.get_rate_limit() is None
+
+    recorder.concurrency = 5
+    assert recorder.get_rate_limit() == 50
+    recorder.rate_limit = 20
+    assert recorder.get_rate_limit() == 20
+
+    # the rate_limit of the recorder is applied to the sequential run too
+    recorder.concurrency = 1
+    assert recorder.get_rate_limit() == 20
+
+
+def test_load_latest_timestamps(data_path):
+    session = get_db_session(provider='exchange', data_schema=Index1dKdata)
+    session.add_all([Index1dKdata(id='{}_{}'.format(entity_id, timestamp), entity_id=entity_id,
+                                  timestamp=pd.Timestamp(timestamp)) for entity_id, timestamp in
+                     [(entity_ids[0], '2019-01-01'), (entity_ids[0], '2019-01-05'), (entity_ids[1], '2019-02-01'),
+                      (entity_ids[4], '2019-03-01')]])
+    session.commit()
+
+    recorder = SampleKdataRecorder(entity_ids=entity_ids)
+    recorder.load_step = 2
+    entities = {entity.id: entity for entity in recorder.entities}
+
+    queries = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'max(index_1d_kdata.timestamp)' in statement:
+            queries.append(parameters)
+
+    engine = recorder.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[0]]) == pd.Timestamp('2019-01-05')
+        # 5 entities in chunks of 2
+        assert len(queries) == 3
+        assert recorder.latest_timestamps == {entity_ids[0]: pd.Timestamp('2019-01-05'),
+                                              entity_ids[1]: pd.Timestamp('2019-02-01'),
+                                              entity_ids[4]: pd.Timestamp('2019-03-01')}
+
+        # served from the cache
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[1]]) == pd.Timestamp('2019-02-01')
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[2]]) is None
+        assert len(queries) == 3
+
+        # the cache is updated by the persisted timestamps
+        recorder.update_latest_timestamp(entities[entity_ids[2]], [pd.Timestamp('2019-01-02'), None, pd.NaT])
+        recorder.update_latest_timestamp(entities[entity_ids[1]], [pd.Timestamp('2019-01-02')])
+        recorder.update_latest_timestamp(entities[entity_ids[3]], [])
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[2]]) == pd.Timestamp('2019-01-02')
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[1]]) == pd.Timestamp('2019-02-01')
+        assert recorder.get_latest_saved_timestamp(entities[entity_ids[3]]) is None
+
+        recorder.run()
+        assert len(queries) == 3
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    # recorded 2019-01-01 to 2019-01-03
+    assert recorder.latest_timestamps == {entity_ids[0]: pd.Timestamp('2019-01-05'),
+                                          entity_ids[1]: pd.Timestamp('2019-02-01'),
+                                          entity_ids[2]: pd.Timestamp('2019-01-03'),
+                                          entity_ids[3]: pd.Timestamp('2019-01-03'),
+                                          entity_ids[4]: pd.Timestamp('2019-03-01')}
+
+    # the same as the one loaded again
+    the_recorder = SampleKdataRecorder(entity_ids=entity_ids)
+    assert the_recorder.load_latest_timestamps() == recorder.latest_timestamps
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import pandas as pd
+from sqlalchemy import event
+
+from zvdata.domain import get_db_session
+from zvt.domain import Stock, StockAttribute, BalanceSheet, FinanceFactor
+from zvt.recorders.eastmoney.common import StockAttributeCache
+from zvt.recorders.eastmoney.finance import base_china_stock_finance_recorder
+from zvt.recorders.eastmoney.finance.china_stock_balance_sheet_recorder import ChinaStockBalanceSheetRecorder
+
+stocks = [Stock(id='stock_sz_90000{}'.format(i), entity_type='stock', exchange='sz', code='90000{}'.format(i),
+                industries='银行') for i in range(1, 4)]
+
+
+def get_report(schema, stock, report_date, timestamp=None):
+    return schema(id='{}_{}'.format(stock.id, report_date), entity_id=stock.id, provider='eastmoney',
+                  code=stock.code, report_date=pd.Timestamp(report_date),
+                  timestamp=pd.Timestamp(timestamp or report_date))
+
+
+def test_fill_timestamps(monkeypatch):
+    # statDate -> the queries
+    requested = {}
+
+    def get_fundamentals(q, statDate):
+        requested.setdefault(statDate, []).append(q)
+        pub_dates = {'2019q1': {'900002.XSHE': '2019-04-25', '900003.XSHE': '2019-04-28'},
+                     '2018': {'900002.XSHE': '2019-03-20'}}.get(statDate, {})
+        return pd.DataFrame({'code': list(pub_dates.keys()), 'pubDate': list(pub_dates.values())})
+
+    monkeypatch.setattr(base_china_stock_finance_recorder, 'get_fundamentals', get_fundamentals)
+    monkeypatch.setattr(base_china_stock_finance_recorder, 'stock_attribute_cache', StockAttributeCache())
+
+    # not login jq
+    recorder = ChinaStockBalanceSheetRecorder.__new__(ChinaStockBalanceSheetRecorder)
+    recorder.session = get_db_session(provider='eastmoney', data_schema=BalanceSheet)
+    recorder.entities = stocks
+
+    executed = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE balance_sheet'):
+            executed.append((executemany, len(parameters)))
+
+    engine = recorder.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        recorder.session.add_all([
+            # filled from FinanceFactor
+            get_report(BalanceSheet, stocks[0], '2019-03-31'),
+            # filled already
+            get_report(BalanceSheet, stocks[0], '2018-12-31', timestamp='2019-03-01'),
+            # filled from jq
+            get_report(BalanceSheet, stocks[1], '2019-03-31'),
+            get_report(BalanceSheet, stocks[1], '2018-12-31'),
+            get_report(BalanceSheet, stocks[2], '2019-03-31'),
+            # not published by jq
+            get_report(BalanceSheet, stocks[2], '2018-12-31'),
+            get_report(FinanceFactor, stocks[0], '2019-03-31', timestamp='2019-04-20'),
+            # not published yet
+            get_report(FinanceFactor, stocks[1], '2019-03-31')
+        ])
+        recorder.session.commit()
+
+        recorder.fill_timestamps([stock.id for stock in stocks])
+
+        # the codes of the same statDate in one get_fundamentals
+        assert sorted(requested.keys()) == ['2018', '2019q1']
+        assert [len(queries) for queries in requested.values()] == [1, 1]
+
+        # one executemany update
+        assert executed == [(True, 4)]
+
+        recorder.session.expire_all()
+        timestamps = {item.id: item.timestamp for item in
+                      recorder.session.query(BalanceSheet).filter(
+                          BalanceSheet.entity_id.in_([stock.id for stock in stocks])).all()}
+        assert timestamps == {
+            'stock_sz_900001_2019-03-31': pd.Timestamp('2019-04-20'),
+            'stock_sz_900001_2018-12-31': pd.Timestamp('2019-03-01'),
+            'stock_sz_900002_2019-03-31': pd.Timestamp('2019-04-25'),
+            'stock_sz_900002_2018-12-31': pd.Timestamp('2019-03-20'),
+            'stock_sz_900003_2019-03-31': pd.Timestamp('2019-04-28'),
+            'stock_sz_900003_2018-12-31': pd.Timestamp('2018-12-31')
+        }
+
+        # nothing to fill
+        requested.clear()
+        executed.clear()
+        recorder.fill_timestamps([stocks[0].id])
+        assert not requested
+        assert not executed
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+        stock_ids = [stock.id for stock in stocks]
+        for schema in [BalanceSheet, FinanceFactor]:
+            recorder.session.query(schema).filter(schema.entity_id.in_(stock_ids)).delete(synchronize_session=False)
+        recorder.session.commit()
+
+        session = get_db_session(provider='eastmoney', data_schema=StockAttribute)
+        session.query(StockAttribute).filter(StockAttribute.id.in_(stock_ids)).delete(synchronize_session=False)
+        session.commit()
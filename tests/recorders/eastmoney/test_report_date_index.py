@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from zvdata.domain import get_db_session
+from zvdata.utils.rate_limit_utils import get_rate_limiter
+from zvt.domain import Stock, FinanceReportDate
+from zvt.recorders.eastmoney.finance.base_china_stock_finance_recorder import ReportDateIndex
+
+
+class ReportDateHandler(BaseHTTPRequestHandler):
+    # the recorded GetCompanyReportDateList response
+    def do_POST(self):
+        param = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.params.append(param)
+
+        report_dates = [{'ReportDate': '2019-06-30'}, {'ReportDate': '2019-03-31'}]
+        if param.get('ReportType'):
+            report_dates = report_dates[:1]
+        content = json.dumps({'Result': {'CompanyReportDateList': report_dates}}).encode('utf-8')
+        # the bad response
+        if param['fc'] == self.server.bad_fc and param['DataType'] == 3:
+            content = b'<html>busy</html>'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_report_date_index():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReportDateHandler)
+    server.params = []
+    server.bad_fc = '00000302'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stocks = [Stock(id='stock_sz_00000{}'.format(i), entity_type='stock', exchange='sz', code='00000{}'.format(i),
+                    industries='银行') for i in range(1, 4)]
+    types = [(1, 0), (2, 1), (3, 0), (4, 1)]
+
+    index = ReportDateIndex()
+    index.url = 'http://127.0.0.1:{}/api'.format(server.server_address[1])
+    try:
+        # one pass for all the recorders
+        index.refresh(stocks, types)
+        assert len(server.params) == 12
+        assert sorted(set(param['fc'] for param in server.params)) == ['00000102', '00000202', '00000302']
+
+        assert index.get(stocks[0], 1, 0) == [pd.Timestamp('2019-06-30'), pd.Timestamp('2019-03-31')]
+        assert index.get(stocks[0], 2, 1) == [pd.Timestamp('2019-06-30')]
+
+        # the bad response doesn't drop the others
+        assert index.get(stocks[2], 3, 0) is None
+        assert index.get(stocks[2], 4, 1) == [pd.Timestamp('2019-06-30')]
+
+        # not expired,only the failed one is requested again
+        server.bad_fc = None
+        index.refresh(stocks, types)
+        assert len(server.params) == 13
+        assert index.get(stocks[2], 3, 0) == [pd.Timestamp('2019-06-30'), pd.Timestamp('2019-03-31')]
+
+        # throttled by the token bucket of eastmoney
+        assert index.get_rate_limiter() is get_rate_limiter('eastmoney')
+
+        # persisted in the finance db
+        the_index = ReportDateIndex()
+        the_index.url = index.url
+        assert the_index.get(stocks[2], 4, 1) == [pd.Timestamp('2019-06-30')]
+
+        the_index.ttl = pd.Timedelta(seconds=0)
+        assert the_index.get(stocks[2], 4, 1) is None
+        the_index.refresh(stocks[:1], types)
+        assert len(server.params) == 17
+    finally:
+        server.shutdown()
+        session = get_db_session(provider='eastmoney', data_schema=FinanceReportDate)
+        session.query(FinanceReportDate).filter(
+            FinanceReportDate.entity_id.in_([stock.id for stock in stocks])).delete(synchronize_session=False)
+        session.commit()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+from zvdata.domain import get_db_session
+from zvt.domain import Stock, StockAttribute
+from zvt.recorders.eastmoney.common import StockAttributeCache
+
+
+def test_stock_attribute_cache():
+    stock = Stock(id='stock_sz_000001', entity_type='stock', exchange='sz', code='000001', name='平安银行',
+                  industries='银行,金融')
+
+    cache = StockAttributeCache()
+    try:
+        the_attribute = cache.get(stock)
+        assert the_attribute.company_type == '3'
+        assert the_attribute.fc == '00000102'
+        assert the_attribute.jq_code == '000001.XSHE'
+        assert cache.get(stock) is the_attribute
+
+        # persisted in the meta db
+        assert StockAttributeCache().get(stock).company_type == '3'
+
+        # recomputed after the industries changed
+        stock.industries = '保险,金融'
+        assert cache.get(stock).company_type == '2'
+        assert StockAttributeCache().get(stock).company_type == '2'
+    finally:
+        session = get_db_session(provider='eastmoney', data_schema=StockAttribute)
+        session.query(StockAttribute).filter(StockAttribute.id == stock.id).delete()
+        session.commit()
@@ -5,6 +5,13 @@ from ...context import init_context
 
 init_context()
 
+import pandas as pd
+
+from zvdata.domain import context, set_data_path, _db_storage_map, _get_db_key
+from zvdata.parquet_store import append_parquet, read_parquet
+from zvt.api.adjust import update_kdata, adjusted_cols
+from zvt.api.technical import get_kdata
+from zvt.domain import Stock, Stock1dKdata
 from zvt.settings import SAMPLE_STOCK_CODES
 from zvt.recorders.joinquant.quotes.jq_china_stock__kdata_recorder import JQChinaStockKdataRecorder
 
@@ -37,3 +44,43 @@ def test_5m_kdata_recorder():
         recorder.run()
     except:
         assert False
+
+
+def test_update_kdata_parquet(tmpdir, monkeypatch):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    monkeypatch.setitem(_db_storage_map, _get_db_key('joinquant', 'stock_1d_kdata'), 'parquet')
+    try:
+        entity = Stock(id='stock_sz_000338', entity_type='stock', exchange='sz', code='000338')
+        timestamps = pd.to_datetime(['2019-01-02', '2019-01-03'])
+        ids = ['stock_sz_000338_2019-01-02', 'stock_sz_000338_2019-01-03']
+        append_parquet(pd.DataFrame({'id': ids, 'entity_id': entity.id, 'code': entity.code, 'level': '1d',
+                                     'timestamp': timestamps, 'close': [10.0, 11.0]}), provider='joinquant',
+                       data_schema=Stock1dKdata)
+
+        update_kdata(pd.DataFrame({'id': ids[:1], 'factor': [1.2], 'hfq_close': [12.0], 'qfq_close': [10.0],
+                                   'turnover_rate': [0.5]}), provider='joinquant', data_schema=Stock1dKdata,
+                     session=None, entity_id=entity.id, cols=adjusted_cols + ['turnover_rate'])
+
+        # the computed columns are written to the parquet partitions
+        df = read_parquet(Stock1dKdata, provider='joinquant', entity_ids=[entity.id])
+        assert df['close'].tolist() == [10.0, 11.0]
+        assert df['hfq_close'].tolist()[0] == 12.0
+        assert df['turnover_rate'].tolist()[0] == 0.5
+        assert df['hfq_close'].isna().tolist() == [False, True]
+
+        # only the kdata not adjusted is queried next time
+        df = get_kdata(entity_id=entity.id, provider='joinquant', columns=['id', 'timestamp'],
+                       filters=[Stock1dKdata.hfq_close.is_(None)])
+        assert df['id'].tolist() == ids[1:]
+    finally:
+        set_data_path(origin_data_path)
+
+
+def test_jq_rate_limit():
+    recorder = JQChinaStockKdataRecorder.__new__(JQChinaStockKdataRecorder)
+    recorder.concurrency = 4
+    rate_limiter = recorder.get_rate_limiter(None)
+    assert rate_limiter.rate == 2
+    # shared by the joinquant recorders
+    assert recorder.get_rate_limit_key(None) == 'joinquant'
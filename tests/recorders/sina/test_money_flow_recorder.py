@@ -1 +1,21 @@
 # -*- coding: utf-8 -*-
+from ...context import init_context
+
+init_context()
+
+from zvt.recorders.sina.china_index_day_kdata_recorder import ChinaIndexDayKdataRecorder
+from zvt.recorders.sina.money_flow.sina_stock_money_flow_recorder import SinaStockMoneyFlowRecorder
+
+
+def get_concurrent_recorder(recorder_class):
+    recorder = recorder_class.__new__(recorder_class)
+    recorder.concurrency = 4
+    return recorder
+
+
+def test_sina_rate_limit():
+    # the sina recorders running concurrently share the bucket of the provider
+    rate_limiters = [get_concurrent_recorder(recorder_class).get_rate_limiter(None) for recorder_class in
+                     [ChinaIndexDayKdataRecorder, SinaStockMoneyFlowRecorder]]
+    assert rate_limiters[0] is rate_limiters[1]
+    assert rate_limiters[0].rate == 1
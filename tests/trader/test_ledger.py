@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import pandas as pd
+import pytest
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvt.api.business import get_account, get_position, get_orders
+from zvt.domain.business import BusinessBase
+from zvt.trader.account import SimAccountService, ORDER_TYPE_LONG
+from zvt.trader.ledger import Ledger, AccountRecord, PositionRecord, OrderRecord
+from zvt.trader.price_provider import PriceProvider
+
+entity_id = 'stock_sz_000001'
+timestamps = pd.date_range('2019-01-02', periods=3)
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    BusinessBase.metadata.create_all(get_db_engine('zvt', db_name='business'))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def get_account_record(trader_name, timestamp, cash):
+    the_id = '{}_{}'.format(trader_name, timestamp.date())
+    account = AccountRecord(id=the_id, trader_name=trader_name, cash=cash, value=0, all_value=cash,
+                            timestamp=timestamp)
+    position = PositionRecord(id='{}_{}_{}'.format(trader_name, entity_id, timestamp.date()), trader_name=trader_name,
+                              entity_id=entity_id, sim_account_id=the_id, timestamp=timestamp, long_amount=100,
+                              available_long=100, short_amount=0, available_short=0, trading_t=1)
+    return account, [position]
+
+
+def test_ledger(data_path):
+    ledger = Ledger(session=get_db_session('zvt', 'business'))
+    for i, timestamp in enumerate(timestamps[:2]):
+        ledger.add_account(*get_account_record('test_ledger', timestamp, cash=1000 + i))
+    ledger.add_order(OrderRecord(id='test_ledger_order', trader_name='test_ledger', entity_id=entity_id,
+                                 timestamp=timestamps[0], order_price=10, order_amount=100,
+                                 order_type=ORDER_TYPE_LONG, status='success'))
+    assert len(ledger) == 5
+
+    # the latest account before or at the timestamp
+    account, positions = ledger.get_account(timestamps[2])
+    assert account.cash == 1001
+    assert [position.sim_account_id for position in positions] == [account.id]
+    assert ledger.get_account(timestamps[0])[0].cash == 1000
+    assert ledger.get_account(timestamps[0] - pd.Timedelta(days=1)) == (None, [])
+
+    # nothing saved before flushing
+    assert get_account(trader_name='test_ledger', return_type='domain') == []
+
+    ledger.flush()
+    assert len(ledger) == 0
+    assert ledger.get_account(timestamps[2]) == (None, [])
+
+    assert get_account(trader_name='test_ledger')['cash'].tolist() == [1000, 1001]
+    assert len(get_position(trader_name='test_ledger')) == 2
+    assert get_orders(trader_name='test_ledger')['order_price'].tolist() == [10]
+
+    # flush nothing
+    ledger.flush()
+    assert len(get_account(trader_name='test_ledger')) == 2
+
+
+def test_ledger_get_account():
+    ledger = Ledger(session=None)
+    days = pd.date_range('2019-01-01', periods=100, freq='2D')
+    for i, timestamp in enumerate(days):
+        ledger.add_account(*get_account_record('test_ledger', timestamp, cash=i))
+
+    # the same as walking back through the accounts
+    for timestamp in pd.date_range(days[0] - pd.Timedelta(days=1), days[-1] + pd.Timedelta(days=1)):
+        expected = [account for account in ledger.accounts if account.timestamp <= timestamp]
+        account, positions = ledger.get_account(timestamp)
+        if expected:
+            assert account is expected[-1]
+            assert positions == [position for position in ledger.positions if position.sim_account_id == account.id]
+        else:
+            assert (account, positions) == (None, [])
+
+
+def test_sim_account_service_ledger(data_path):
+    price_provider = PriceProvider(provider='joinquant', start_timestamp=timestamps[0],
+                                   end_timestamp=timestamps[-1])
+    price_provider.add_kdata(pd.DataFrame({'entity_id': entity_id, 'timestamp': timestamps,
+                                           'qfq_close': [10.0, 11.0, 12.0]}), loaded_timestamp=timestamps[-1])
+
+    service = SimAccountService(trader_name='test_ledger', timestamp=timestamps[0], provider='joinquant',
+                                base_capital=10000, buy_cost=0, sell_cost=0, slippage=0,
+                                price_provider=price_provider, flush_days=2)
+    assert service.ledger is not None
+
+    for i, timestamp in enumerate(timestamps):
+        service.on_trading_open(timestamp)
+        if i == 0:
+            service.buy(entity_id, current_price=10.0, current_timestamp=timestamp, order_amount=100)
+        service.on_trading_close(timestamp)
+
+        # the accounts are kept in the ledger until flush_days
+        saved = get_account(trader_name='test_ledger', return_type='domain')
+        assert len(saved) == (2 if i >= 1 else 0)
+
+    # the account not flushed is served from the ledger
+    assert len(service.ledger) == 2
+    account = service.get_account_at_time(timestamps[2])
+    assert account.cash == 9000
+    assert account.all_value == 9000 + 100 * 12.0
+    assert [(position.entity_id, position.long_amount) for position in account.positions] == [(entity_id, 100)]
+
+    # the flushed one is served from db
+    account = service.get_account_at_time(timestamps[1])
+    assert account.all_value == 9000 + 100 * 11.0
+    assert account.positions[0].long_amount == 100
+
+    service.flush()
+    assert get_account(trader_name='test_ledger')['all_value'].tolist() == [10000, 10100, 10200]
+    assert len(get_position(trader_name='test_ledger')) == 3
+    assert get_orders(trader_name='test_ledger')['order_amount'].tolist() == [100]
+    assert service.get_account_at_time(timestamps[2]).all_value == 10200
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvt.domain import Coin1dKdata
+from zvt.trader.price_provider import PriceProvider
+
+entity_a = 'coin_binance_A/USDT'
+entity_b = 'coin_binance_B/USDT'
+# no kdata
+entity_c = 'coin_binance_C/USDT'
+
+
+def add_kdata(entity_id, timestamps, closes):
+    session = get_db_session('ccxt', data_schema=Coin1dKdata)
+    session.add_all([Coin1dKdata(id='{}_{}'.format(entity_id, timestamp.date()), entity_id=entity_id,
+                                 provider='ccxt', code=entity_id.split('_')[-1], level='1d', timestamp=timestamp,
+                                 close=close) for timestamp, close in zip(pd.to_datetime(timestamps), closes)])
+    session.commit()
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    get_db_engine('ccxt', data_schema=Coin1dKdata).execute(CreateTable(Coin1dKdata.__table__))
+
+    # no kdata in 2019-01-05 for a,and one before the start timestamp
+    timestamps = [timestamp for timestamp in pd.date_range('2019-01-01', '2019-01-10') if timestamp.day != 5]
+    add_kdata(entity_a, ['2018-12-30'] + timestamps, [0.5] + [float(timestamp.day) for timestamp in timestamps])
+    timestamps = pd.date_range('2019-01-01', '2019-01-10')
+    add_kdata(entity_b, timestamps, [timestamp.day * 10.0 for timestamp in timestamps])
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+@pytest.fixture
+def queries(data_path):
+    # the queries of the kdata
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SELECT') and 'FROM coin_1d_kdata' in statement:
+            statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', on_execute)
+    yield statements
+    event.remove(Engine, 'before_cursor_execute', on_execute)
+
+
+def test_get_price(queries):
+    price_provider = PriceProvider(provider='ccxt', start_timestamp='2019-01-01', end_timestamp='2019-01-10')
+
+    # loaded lazily to the end
+    assert price_provider.get_price(entity_a, '2019-01-02') == 2.0
+    assert len(queries) == 1
+    assert price_provider.get_price(entity_a, '2019-01-10') == 10.0
+    assert price_provider.get_price(entity_a, '2019-01-05') is None
+    assert price_provider.get_latest_price(entity_a, '2019-01-05') == 4.0
+    assert price_provider.get_latest_price(entity_a, '2019-01-10') == 10.0
+    assert len(queries) == 1
+    assert price_provider.loaded_timestamps[entity_a] == pd.Timestamp('2019-01-10')
+
+    # the kdata before the start timestamp is queried from the db
+    assert price_provider.get_latest_price(entity_a, '2018-12-31') == 0.5
+    assert len(queries) == 2
+
+
+def test_load(queries):
+    price_provider = PriceProvider(provider='ccxt', start_timestamp='2019-01-01', end_timestamp='2019-01-10')
+    price_provider.load_step = 2
+
+    price_provider.load([entity_a, entity_b, entity_c], '2019-01-01')
+    # in chunks of load_step
+    assert len(queries) == 2
+    assert price_provider.get_price(entity_b, '2019-01-03') == 30.0
+    assert price_provider.get_price(entity_a, '2019-01-03') == 3.0
+
+    # the entity without data is not loaded again
+    assert price_provider.get_price(entity_c, '2019-01-03') is None
+    assert price_provider.loaded_timestamps[entity_c] == pd.Timestamp('2019-01-10')
+    price_provider.load([entity_a, entity_b, entity_c], '2019-01-10')
+    assert len(queries) == 2
+
+    # nothing before the timestamp in the db
+    assert price_provider.get_latest_price(entity_c, '2019-01-03') is None
+    assert len(queries) == 3
+
+
+def test_add_kdata(queries):
+    price_provider = PriceProvider(provider='ccxt', start_timestamp='2019-01-01', end_timestamp='2019-01-10')
+
+    df = pd.DataFrame({'entity_id': [entity_a] * 4,
+                       'timestamp': pd.to_datetime(['2019-01-03', '2019-01-01', '2019-01-02', '2019-01-02']),
+                       'close': [3.0, 1.0, 2.0, 20.0]})
+    price_provider.add_kdata(df.set_index(['entity_id', 'timestamp'], drop=False), loaded_timestamp='2019-01-10')
+
+    # sorted and the latest added one is kept for the same timestamp
+    assert price_provider.entity_prices[entity_a].prices.tolist() == [1.0, 20.0, 3.0]
+    assert price_provider.get_price(entity_a, '2019-01-02') == 20.0
+    assert price_provider.get_latest_price(entity_a, '2019-01-08') == 3.0
+    # not loaded from the db
+    assert queries == []
+
+    price_provider.add_kdata(pd.DataFrame({'entity_id': [entity_a], 'timestamp': pd.to_datetime(['2019-01-01']),
+                                           'close': [10.0]}))
+    assert price_provider.get_price(entity_a, '2019-01-01') == 10.0
+    assert price_provider.get_price(entity_a, '2019-01-03') == 3.0
+    # the loaded timestamp is not moved back
+    assert price_provider.loaded_timestamps[entity_a] == pd.Timestamp('2019-01-10')
+
+
+def test_real_time(queries):
+    price_provider = PriceProvider(provider='ccxt', start_timestamp='2019-01-01', real_time=True)
+
+    assert price_provider.get_price(entity_a, '2019-01-03') == 3.0
+    assert price_provider.loaded_timestamps[entity_a] == pd.Timestamp('2019-01-03')
+    assert len(queries) == 1
+
+    # the coming data is loaded again
+    add_kdata(entity_a, ['2019-01-11'], [11.0])
+    assert price_provider.get_price(entity_a, '2019-01-11') == 11.0
+    assert price_provider.get_price(entity_a, '2019-01-04') == 4.0
+    assert price_provider.loaded_timestamps[entity_a] == pd.Timestamp('2019-01-11')
+    assert len(queries) == 2
+
+    # the entity without data is queried every time
+    assert price_provider.get_price(entity_c, '2019-01-11') is None
+    assert price_provider.get_price(entity_c, '2019-01-11') is None
+    assert entity_c not in price_provider.loaded_timestamps
+    assert len(queries) == 4
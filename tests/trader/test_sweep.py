@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.schema import CreateTable
+
+from zvdata.data_cache import MemmapDataCache
+from zvdata.domain import context, set_data_path, get_db_engine, get_db_session
+from zvdata.reader import DataReader
+from zvt.api.adjust import adjust_engine
+from zvt.domain import Stock1dKdata, StockAdjustFactor, Coin1dKdata
+from zvt.domain.business import BusinessBase
+from zvt.trader.impls import StockMaTrader
+from zvt.trader.price_provider import PriceProvider
+from zvt.trader.sweep import iterate_params, get_summary, run_trader, SweepRunner
+
+
+def test_iterate_params():
+    params_list = iterate_params({'short_window': [5, 10], 'long_window': [20, 30]})
+    assert params_list == [{'short_window': 5, 'long_window': 20}, {'short_window': 5, 'long_window': 30},
+                           {'short_window': 10, 'long_window': 20}, {'short_window': 10, 'long_window': 30}]
+
+
+def test_summary():
+    account_df = pd.DataFrame({'all_value': [100, 120, 90, 110]}, index=pd.date_range('2019-01-01', periods=4))
+    summary = get_summary(account_df, base_capital=100)
+    assert summary['days'] == 4
+    assert round(summary['return'], 6) == 0.1
+    assert summary['max_drawdown'] == 0.25
+
+
+def test_memmap_data_cache(tmpdir):
+    df = pd.DataFrame({'entity_id': ['stock_sz_000338', 'stock_sh_600000'] * 3,
+                       'code': ['000338', '600000'] * 3,
+                       'timestamp': pd.to_datetime(['2019-01-01'] * 2 + ['2019-01-02'] * 2 + ['2019-01-03'] * 2),
+                       'close': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+
+    cache = MemmapDataCache(str(tmpdir))
+    cache.save(df, data_schema=Stock1dKdata, provider='joinquant', level='1d', codes=['000338', '600000'],
+               start_timestamp='2019-01-01', end_timestamp='2019-01-03')
+
+    result = cache.get_data(data_schema=Stock1dKdata, provider='joinquant', level='1d',
+                            entity_ids=['stock_sz_000338'], start_timestamp='2019-01-02',
+                            end_timestamp='2019-01-03')
+    assert result['close'].tolist() == [3.0, 5.0]
+    assert result['entity_id'].tolist() == ['stock_sz_000338'] * 2
+
+    # not covered by the cache
+    assert cache.get_data(data_schema=Stock1dKdata, provider='joinquant', level='1d', codes=['000001'],
+                          start_timestamp='2019-01-01', end_timestamp='2019-01-03') is None
+    assert cache.get_data(data_schema=Stock1dKdata, provider='joinquant', level='1d', codes=['000338'],
+                          start_timestamp='2018-01-01', end_timestamp='2019-01-03') is None
+
+
+def test_price_provider_cache(tmpdir):
+    df = pd.DataFrame({'entity_id': ['coin_binance_TEST/USDT'] * 3, 'code': ['TEST/USDT'] * 3,
+                       'timestamp': pd.date_range('2019-01-01', periods=3), 'close': [1.0, 2.0, 3.0]})
+    cache = MemmapDataCache(str(tmpdir))
+    cache.save(df, data_schema=Coin1dKdata, provider='ccxt', level='1d', entity_ids=['coin_binance_TEST/USDT'],
+               start_timestamp='2019-01-01', end_timestamp='2019-01-03')
+
+    DataReader.data_cache = cache
+    try:
+        # not in the db
+        price_provider = PriceProvider(provider='ccxt', start_timestamp='2019-01-01', end_timestamp='2019-01-03')
+        assert price_provider.get_price('coin_binance_TEST/USDT', '2019-01-02') == 2.0
+        assert price_provider.get_latest_price('coin_binance_TEST/USDT', '2019-01-05') == 3.0
+    finally:
+        DataReader.data_cache = None
+
+
+entity_ids = ['stock_sz_000001', 'stock_sz_000002', 'stock_sz_000003']
+timestamps = pd.bdate_range('2019-01-02', periods=60)
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    # the factors loaded from the other dbs
+    adjust_engine.clear()
+    set_data_path(str(tmpdir))
+    for data_schema in [Stock1dKdata, StockAdjustFactor]:
+        get_db_engine('joinquant', data_schema=data_schema).execute(CreateTable(data_schema.__table__))
+    BusinessBase.metadata.create_all(get_db_engine('zvt', db_name='business'))
+
+    session = get_db_session('joinquant', data_schema=Stock1dKdata)
+    for i, entity_id in enumerate(entity_ids):
+        close = 10 * (i + 1) + 2 * np.sin(np.arange(len(timestamps)) / (3 + i))
+        # the saved qfq is stale,the right one is computed from the hfq and the factors
+        session.add_all([Stock1dKdata(id='{}_{}'.format(entity_id, timestamp.date()), entity_id=entity_id,
+                                      provider='joinquant', code=entity_id[-6:], level='1d', timestamp=timestamp,
+                                      close=price, hfq_close=price * 2, qfq_close=1.0)
+                         for timestamp, price in zip(timestamps, close)])
+    session.commit()
+
+    session = get_db_session('joinquant', data_schema=StockAdjustFactor)
+    session.add_all([StockAdjustFactor(id='{}_{}'.format(entity_id, timestamps[0].date()), entity_id=entity_id,
+                                       timestamp=timestamps[0], factor=2.0, version=1) for entity_id in entity_ids])
+    session.commit()
+
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+    adjust_engine.clear()
+
+
+class DataRemovedSweepRunner(SweepRunner):
+    def prepare_cache(self, cache_path):
+        super().prepare_cache(cache_path)
+
+        # the workers could only read the kdata and the factors from the cache
+        for data_schema in [Stock1dKdata, StockAdjustFactor]:
+            data_schema.__table__.drop(get_db_engine('joinquant', data_schema=data_schema))
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_sweep_runner(data_path, vectorized):
+    param_grid = {'short_window': [3, 5], 'long_window': [10]}
+    trader_kwargs = {'entity_ids': entity_ids, 'start_timestamp': timestamps[0], 'end_timestamp': timestamps[-1],
+                     'limit': 2}
+
+    # run in the process with the data in the db
+    expected = {}
+    for index, params in enumerate(iterate_params(param_grid)):
+        account_df = run_trader(StockMaTrader, dict(trader_kwargs, trader_name='expected_{}'.format(index)), params,
+                                vectorized=vectorized)
+        expected['test_sweep_{}'.format(index)] = account_df['all_value']
+
+    cache_path = os.path.join(data_path, 'cache')
+    runner = DataRemovedSweepRunner(StockMaTrader, param_grid=param_grid, trader_kwargs=trader_kwargs,
+                                    sweep_name='test_sweep', processes=2, cache_path=cache_path,
+                                    vectorized=vectorized)
+    result_df = runner.run()
+
+    assert sorted(os.listdir(cache_path)) == ['joinquant_stock_1d_kdata_1d', 'joinquant_stock_adjust_factor_None']
+
+    assert result_df.index.tolist() == ['test_sweep_0', 'test_sweep_1']
+    assert result_df['short_window'].tolist() == [3, 5]
+    assert (result_df['days'] > 0).all()
+
+    # traded with the qfq prices computed from the cached factors
+    equity_df = pd.DataFrame(expected)
+    assert (equity_df.iloc[-1] != 1000000).all()
+    pd.testing.assert_frame_equal(runner.equity_df, equity_df, check_names=False, check_freq=False)
+    assert result_df['all_value'].tolist() == equity_df.iloc[-1].tolist()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from zvdata.domain import context, set_data_path, get_db_engine
+from zvdata.utils.pd_utils import index_df
+from zvt.api.business import get_account, get_position, get_orders
+from zvt.domain.business import BusinessBase, SimAccount, Position, Order
+from zvt.selectors.selector import TargetSelector
+from zvt.trader.account import ORDER_TYPE_LONG, ORDER_TYPE_CLOSE_LONG
+from zvt.trader.trader import Trader, LimitSelectorsComparator
+from zvt.trader.vectorized import VectorizedBacktest
+
+
+def test_vectorized_backtest():
+    timestamps = pd.date_range('2019-01-01', periods=4)
+    entity_ids = ['stock_sz_000001', 'stock_sz_000002']
+
+    price_df = pd.DataFrame([[10, 20], [10, 20], [11, np.nan], [12, 22]], index=timestamps, columns=entity_ids,
+                            dtype=float)
+    long_signal_df = pd.DataFrame([[True, True], [False, False], [False, False], [False, False]], index=timestamps,
+                                  columns=entity_ids)
+    short_signal_df = pd.DataFrame([[False, False], [True, True], [False, False], [False, False]],
+                                   index=timestamps, columns=entity_ids)
+
+    backtest = VectorizedBacktest(trader_name='test', long_signal_df=long_signal_df,
+                                  short_signal_df=short_signal_df, price_df=price_df, base_capital=10000,
+                                  buy_cost=0, sell_cost=0, slippage=0, trading_t=[1, 1])
+    account_df = backtest.run()
+
+    # long at the second timestamp with the cash divided equally
+    assert account_df['cash'][1] == 0
+    assert account_df['all_value'][1] == 10000
+
+    # close the holdings at the third timestamp,the one without price is ignored
+    assert account_df['cash'][2] == 5500
+    assert account_df['value'][2] == 5000
+    assert account_df['all_value'][3] == 5500 + 250 * 22
+
+    assert [order[4] for order in backtest.orders] == [ORDER_TYPE_LONG, ORDER_TYPE_LONG, ORDER_TYPE_CLOSE_LONG]
+
+
+# the qfq_close of the trading dates with the missing prices
+prices = {
+    'stock_sz_000001': [10.0, 10.5, 11.0, 10.8, 11.2, 11.6, 12.0, 12.4],
+    'stock_sz_000002': [20.0, 21.0, 22.0, np.nan, np.nan, 23.0, 24.0, 25.0],
+    'stock_sz_000003': [5.0, 5.1, 5.2, 5.3, 5.4, 5.5, 5.6, 5.7],
+    'stock_sz_000004': [8.0, 8.1, 8.2, 8.3, 8.4, np.nan, 8.6, 8.7]
+}
+trading_dates = pd.bdate_range('2019-01-02', periods=8)
+
+# the index of the trading dates -> the targets sorted by score
+long_targets = {
+    # limit 2,the third is dropped
+    0: ['stock_sz_000001', 'stock_sz_000002', 'stock_sz_000003'],
+    1: ['stock_sz_000003'],
+    # stock_sz_000004 has no price at the next timestamp
+    4: ['stock_sz_000004', 'stock_sz_000001']
+}
+short_targets = {
+    # stock_sz_000003 is bought at the next timestamp,not available for T+1
+    1: ['stock_sz_000001', 'stock_sz_000003'],
+    2: ['stock_sz_000001', 'stock_sz_000003'],
+    # stock_sz_000002 has no price at the next timestamp,closed later
+    3: ['stock_sz_000002'],
+    4: ['stock_sz_000002']
+}
+
+
+class SampleSelector(TargetSelector):
+    def run(self):
+        for target_type, targets in [('open_long', long_targets), ('open_short', short_targets)]:
+            df = pd.DataFrame([{'timestamp': trading_dates[i], 'entity_id': entity_id, 'score': score} for
+                               i, entity_ids in targets.items() for score, entity_id in enumerate(entity_ids)])
+            setattr(self, '{}_df'.format(target_type), index_df(df))
+
+
+class SampleTrader(Trader):
+    entity_type = 'stock'
+
+    def init_selectors(self, entity_ids, entity_type, exchanges, codes, start_timestamp, end_timestamp):
+        kdata = pd.DataFrame([{'entity_id': entity_id, 'timestamp': timestamp, 'qfq_close': price} for
+                              entity_id, entity_prices in prices.items() for timestamp, price in
+                              zip(trading_dates, entity_prices) if not np.isnan(price)])
+        self.account_service.price_provider.add_kdata(kdata, loaded_timestamp=trading_dates[-1])
+
+        self.selectors.append(SampleSelector(entity_ids=entity_ids, start_timestamp=start_timestamp,
+                                             end_timestamp=end_timestamp))
+
+    def init_selectors_comparator(self):
+        return LimitSelectorsComparator(self.selectors, limit=2)
+
+
+@pytest.fixture
+def data_path(tmpdir):
+    origin_data_path = context['data_path']
+    set_data_path(str(tmpdir))
+    BusinessBase.metadata.create_all(get_db_engine('zvt', db_name='business'))
+    yield str(tmpdir)
+    set_data_path(origin_data_path)
+
+
+def get_result(trader_name):
+    account_df = get_account(trader_name=trader_name, order=SimAccount.timestamp.asc())
+    position_df = get_position(trader_name=trader_name, order=Position.id.asc())
+    order_df = get_orders(trader_name=trader_name, order=Order.id.asc())
+
+    columns = ['timestamp', 'cash', 'value', 'all_value']
+    position_columns = ['timestamp', 'entity_id', 'long_amount', 'available_long', 'average_long_price', 'value']
+    order_columns = ['timestamp', 'entity_id', 'order_price', 'order_amount', 'order_type']
+    return (account_df[columns].reset_index(drop=True), position_df[position_columns].reset_index(drop=True),
+            order_df[order_columns].reset_index(drop=True))
+
+
+def test_run_vectorized_parity(data_path):
+    entity_ids = list(prices.keys())
+    for trader_name, vectorized in [('test_run', False), ('test_run_vectorized', True)]:
+        trader = SampleTrader(entity_ids=entity_ids, start_timestamp=trading_dates[0],
+                              end_timestamp=trading_dates[-1], trader_name=trader_name)
+        if vectorized:
+            trader.run_vectorized()
+        else:
+            trader.run()
+
+    account_df, position_df, order_df = get_result('test_run')
+    the_account_df, the_position_df, the_order_df = get_result('test_run_vectorized')
+
+    assert len(account_df) == len(trading_dates)
+    pd.testing.assert_frame_equal(account_df, the_account_df)
+    pd.testing.assert_frame_equal(position_df, the_position_df)
+    pd.testing.assert_frame_equal(order_df, the_order_df)
+
+    # the orders cover the limit,T+1 and the missing prices
+    orders = order_df.sort_values(['timestamp', 'entity_id'])
+    assert orders[['entity_id', 'order_type']].values.tolist() == [
+        # the third target is dropped by the limit
+        ['stock_sz_000001', ORDER_TYPE_LONG], ['stock_sz_000002', ORDER_TYPE_LONG],
+        # stock_sz_000003 bought at the same timestamp is not closed for T+1
+        ['stock_sz_000001', ORDER_TYPE_CLOSE_LONG], ['stock_sz_000003', ORDER_TYPE_LONG],
+        ['stock_sz_000003', ORDER_TYPE_CLOSE_LONG],
+        # stock_sz_000002 without price is closed a day later,stock_sz_000004 without price is not longed
+        ['stock_sz_000001', ORDER_TYPE_LONG], ['stock_sz_000002', ORDER_TYPE_CLOSE_LONG]]
+    # the amount is rounded down with the costs
+    assert orders['order_amount'].tolist()[:2] == [500000 // (10.5 * 1.002), 500000 // (21.0 * 1.002)]
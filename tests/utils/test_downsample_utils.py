@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from ..context import init_context
+
+init_context()
+
+import numpy as np
+import pandas as pd
+
+from zvdata.utils.downsample_utils import lttb, min_max, downsample, downsample_ohlc
+
+
+def test_lttb():
+    x = pd.date_range('2019-01-01', periods=100).values
+    y = np.zeros(100)
+    y[30] = 10
+    y[70] = -10
+
+    positions = lttb(x, y, threshold=10)
+    assert len(positions) == 10
+    assert positions[0] == 0 and positions[-1] == 99
+    assert np.all(np.diff(positions) > 0)
+    # the peaks are kept
+    assert 30 in positions and 70 in positions
+
+    # not enough points
+    assert lttb(x, y, threshold=100).tolist() == list(range(100))
+    assert lttb(x, y, threshold=2).tolist() == list(range(100))
+
+
+def test_min_max():
+    x = np.arange(100)
+    y = np.sin(np.arange(100) / 5.0)
+
+    positions = min_max(x, y, threshold=20)
+    assert len(positions) <= 20
+    assert positions[0] == 0 and positions[-1] == 99
+    # the min and max are kept
+    assert np.argmin(y) in positions and np.argmax(y) in positions
+
+    assert min_max(x, y, threshold=3).tolist() == list(range(100))
+
+
+def test_downsample():
+    x = np.arange(100)
+    y = np.arange(100, dtype=float)
+    y[10] = np.nan
+
+    for method in ['lttb', 'minmax']:
+        the_x, the_y = downsample(x, y, threshold=10, method=method)
+        assert len(the_x) <= 10
+        assert 10 not in the_x
+        assert np.array_equal(y[the_x], the_y)
+
+    # the small data is unchanged,the nan kept
+    the_x, the_y = downsample(x[:10], y[:10], threshold=10)
+    assert np.array_equal(the_x, x[:10])
+    assert np.array_equal(the_y, y[:10], equal_nan=True)
+    the_x, the_y = downsample(x, y, threshold=None)
+    assert np.array_equal(the_x, x)
+
+    # the object y of numbers is downsampled and kept as it is
+    the_x, the_y = downsample(x, np.array([None] + list(range(1, 100)), dtype=object), threshold=10)
+    assert len(the_x) == 10
+    assert the_y.dtype == object and the_y.tolist() == the_x.tolist()
+
+    # the non-numeric y is not downsampled
+    labels = np.array(['up', 'down'] * 50, dtype=object)
+    the_x, the_y = downsample(x, labels, threshold=10)
+    assert np.array_equal(the_x, x)
+    assert np.array_equal(the_y, labels)
+
+
+def test_downsample_ohlc():
+    df = pd.DataFrame({'open': np.arange(10, dtype=float), 'close': np.arange(10, dtype=float) + 0.5,
+                       'high': np.arange(10, dtype=float) + 1, 'low': np.arange(10, dtype=float) - 1},
+                      index=pd.date_range('2019-01-01', periods=10))
+
+    result = downsample_ohlc(df, threshold=5)
+    assert result.index.tolist() == df.index[::2].tolist()
+    assert result['open'].tolist() == [0, 2, 4, 6, 8]
+    assert result['close'].tolist() == [1.5, 3.5, 5.5, 7.5, 9.5]
+    assert result['high'].tolist() == [2, 4, 6, 8, 10]
+    assert result['low'].tolist() == [-1, 1, 3, 5, 7]
+
+    result = downsample_ohlc(df, threshold=3)
+    assert len(result) == 3
+    assert result['open'].iloc[0] == df['open'].iloc[0]
+    assert result['close'].iloc[-1] == df['close'].iloc[-1]
+    assert result['high'].max() == df['high'].max()
+    assert result['low'].min() == df['low'].min()
+
+    # the small data is unchanged
+    assert downsample_ohlc(df, threshold=10) is df
+    assert downsample_ohlc(df, threshold=None) is df
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
+import os
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import func, exists, and_
+from sqlalchemy import func, exists, and_, types
 from sqlalchemy.orm import Query, Session
-from zvdata.domain import get_db_name, get_db_session, get_db_engine, entity_type_map_schema, global_providers
+from zvdata.domain import get_db_name, get_db_session, get_db_engine, entity_type_map_schema, global_providers, \
+    get_db_storage, get_adjuster, get_db_path
+from zvdata.parquet_store import read_parquet, get_parquet_root
 from zvdata.structs import IntervalLevel
-from zvdata.utils.pd_utils import df_is_not_null, index_df
+from zvdata.utils.pd_utils import df_is_not_null, index_df, df_to_records
 from zvdata.utils.time_utils import to_pd_timestamp
 
 
@@ -43,6 +47,113 @@ def common_filter(query: Query,
     return query
 
 
+# the columns could be converted to category in read_sql_fast
+category_columns = ['entity_id', 'code', 'level', 'provider']
+
+
+def _to_column_array(values: list, column_type, result_processor):
+    """
+    convert the raw values of one column to typed array,the result should be same as read_sql
+
+    """
+    if isinstance(column_type, types.DateTime):
+        return pd.to_datetime(pd.Series(values, dtype=object)).values
+
+    try:
+        if isinstance(column_type, (types.Float, types.Numeric)):
+            return np.array(values, dtype=np.float64)
+
+        has_none = None in values
+
+        if isinstance(column_type, types.Integer) and not isinstance(column_type, types.Boolean):
+            if has_none:
+                return np.array(values, dtype=np.float64)
+            return np.array(values, dtype=np.int64)
+    except (ValueError, TypeError):
+        # sqlite keeps the values not matching the column type,e.g,the string id in the integer foreign key
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    if isinstance(column_type, types.String) and not isinstance(column_type, types.Enum):
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    # handle other types(boolean,date,enum...) by the processor of sqlalchemy
+    if result_processor:
+        values = [result_processor(value) for value in values]
+
+    if isinstance(column_type, types.Boolean) and not has_none:
+        return np.array(values, dtype=bool)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def read_sql_fast(query: Query, chunk_size: int = 100000, category: bool = False) -> pd.DataFrame:
+    """
+    the fast version of pd.read_sql(query.statement, query.session.bind),the rows are fetched from the raw cursor
+    in chunks and converted to typed arrays by the column types of the schema
+
+    :param query:
+    :type query: Query
+    :param chunk_size: the rows size for every fetching
+    :type chunk_size: int
+    :param category: whether convert the category_columns to category dtype
+    :type category: bool
+    :return:
+    :rtype: pd.DataFrame
+    """
+    statement = query.statement
+    result = query.session.execute(statement)
+
+    try:
+        names = list(result.keys())
+        columns = list(statement.columns)
+
+        # could not match the types,just use read_sql
+        if len(columns) != len(names):
+            result.close()
+            return pd.read_sql(statement, query.session.bind)
+
+        dialect = query.session.bind.dialect
+        processors = [column.type.result_processor(dialect, None) for column in columns]
+
+        cursor = result.cursor
+        chunks = [[] for _ in names]
+        # read_sql keeps the column with all None as object
+        not_null = [False for _ in names]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for i, values in enumerate(zip(*rows)):
+                values = list(values)
+                not_null[i] = not_null[i] or values.count(None) < len(values)
+                chunks[i].append(
+                    _to_column_array(values, column_type=columns[i].type, result_processor=processors[i]))
+    finally:
+        result.close()
+
+    size = sum(len(chunk) for chunk in chunks[0]) if names else 0
+    if not size:
+        return pd.DataFrame.from_records([], columns=names)
+
+    data = {}
+    for i, name in enumerate(names):
+        if not not_null[i]:
+            array = np.full(size, None, dtype=object)
+        else:
+            array = np.concatenate(chunks[i]) if len(chunks[i]) > 1 else chunks[i][0]
+        if category and name in category_columns:
+            array = pd.Categorical(array)
+        data[name] = array
+
+    return pd.DataFrame(data, columns=names)
+
+
 def get_data(data_schema,
              entity_ids: List[str] = None,
              entity_id: str = None,
@@ -59,14 +170,49 @@ def get_data(data_schema,
              limit: int = None,
              index: str = 'timestamp',
              index_is_time: bool = True,
-             time_field: str = 'timestamp'):
+             time_field: str = 'timestamp',
+             fast: bool = True,
+             category: bool = False,
+             adjust: bool = True):
+    """
+    get the data of the data_schema
+
+    :param fast: whether reading the df by read_sql_fast
+    :type fast: bool
+    :param category: whether convert the entity_id,code,level,provider columns to category,only for fast
+    :type category: bool
+    :param adjust: whether applying the DataAdjuster registered for the data_schema to the df
+    :type adjust: bool
+    """
     assert data_schema is not None
     assert provider is not None
     assert provider in global_providers
 
+    adjuster = get_adjuster(provider=provider, data_schema=data_schema)
+    if adjust and adjuster and return_type == 'df':
+        names = [col if type(col) == str else col.name for col in columns] if columns else None
+        extra_columns = [col for col in adjuster.get_required_columns(names) if col not in names] if names else []
+
+        df = get_data(data_schema=data_schema, entity_ids=entity_ids, entity_id=entity_id, codes=codes, level=level,
+                      provider=provider, columns=names + extra_columns if names else None, return_type=return_type,
+                      start_timestamp=start_timestamp, end_timestamp=end_timestamp, filters=filters,
+                      session=session, order=order, limit=limit, index=index, index_is_time=index_is_time,
+                      time_field=time_field, fast=fast, category=category, adjust=False)
+        df = adjuster.adjust(df)
+        if extra_columns and df_is_not_null(df):
+            df = df.drop(columns=[col for col in extra_columns if col in df.columns])
+        return df
+
+    if get_db_storage(provider=provider, data_schema=data_schema) == 'parquet':
+        return get_parquet_data(data_schema=data_schema, entity_ids=entity_ids, entity_id=entity_id, codes=codes,
+                                level=level, provider=provider, columns=columns, return_type=return_type,
+                                start_timestamp=start_timestamp, end_timestamp=end_timestamp, filters=filters,
+                                order=order, limit=limit, index=index, index_is_time=index_is_time,
+                                time_field=time_field)
+
     local_session = False
     if not session:
-        session = get_db_session(provider=provider, data_schema=data_schema)
+        session = get_db_session(provider=provider, data_schema=data_schema, readonly=True)
         local_session = True
 
     try:
@@ -109,7 +255,10 @@ def get_data(data_schema,
                               time_field=time_field)
 
         if return_type == 'df':
-            df = pd.read_sql(query.statement, query.session.bind)
+            if fast:
+                df = read_sql_fast(query, category=category)
+            else:
+                df = pd.read_sql(query.statement, query.session.bind)
             if df_is_not_null(df):
                 return index_df(df, drop=False, index=index, index_is_time=index_is_time)
             return df
@@ -124,6 +273,94 @@ def get_data(data_schema,
             session.close()
 
 
+def get_parquet_data(data_schema,
+                     entity_ids: List[str] = None,
+                     entity_id: str = None,
+                     codes: List[str] = None,
+                     level: Union[IntervalLevel, str] = None,
+                     provider: str = None,
+                     columns: List = None,
+                     return_type: str = 'df',
+                     start_timestamp: Union[pd.Timestamp, str] = None,
+                     end_timestamp: Union[pd.Timestamp, str] = None,
+                     filters: List = None,
+                     order=None,
+                     limit: int = None,
+                     index: str = 'timestamp',
+                     index_is_time: bool = True,
+                     time_field: str = 'timestamp'):
+    """
+    the get_data for the schema registered with parquet storage,the filters should be simple comparisons which could
+    be pushed down to the parquet reader
+    """
+    if entity_id:
+        entity_ids = [entity_id]
+    if type(level) == IntervalLevel:
+        level = level.value
+    if columns:
+        columns = [col if type(col) == str else col.name for col in columns]
+
+    df = read_parquet(data_schema=data_schema, provider=provider, entity_ids=entity_ids, codes=codes, level=level,
+                      columns=columns, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                      filters=filters, order=order, limit=limit, time_field=time_field)
+
+    if return_type == 'df':
+        if df_is_not_null(df):
+            return index_df(df, drop=False, index=index, index_is_time=index_is_time)
+        return df
+    elif return_type == 'domain':
+        return [data_schema(**record) for record in df_to_records(df)]
+    elif return_type == 'dict':
+        return df_to_records(df)
+
+
+def get_latest_timestamp(data_schema, provider: str, time_field: str = 'timestamp'):
+    """
+    the latest time of the table,None if no data
+
+    """
+    time_col = eval('data_schema.{}'.format(time_field))
+
+    if get_db_storage(provider=provider, data_schema=data_schema) == 'parquet':
+        df = get_parquet_data(data_schema=data_schema, provider=provider, columns=[time_field],
+                              order=time_col.desc(), limit=1, time_field=time_field)
+        if df_is_not_null(df):
+            return df[time_field].iloc[0]
+        return None
+
+    session = get_db_session(provider=provider, data_schema=data_schema, readonly=True)
+    try:
+        return session.query(func.max(time_col)).scalar()
+    finally:
+        session.close()
+
+
+def get_data_version(data_schema, provider: str):
+    """
+    the (latest modified time,size) of the files storing the table,it changes with every commit including the updating
+    of the saved rows in place.the sqlite file is shared by the tables of the db,so it changes with the other tables too
+
+    """
+    if get_db_storage(provider=provider, data_schema=data_schema) == 'parquet':
+        paths = [os.path.join(root, name) for root, _, names in os.walk(get_parquet_root(provider, data_schema)) for
+                 name in names]
+    else:
+        db_path = get_db_path(provider, data_schema=data_schema)
+        # the commits go to the wal file until the checkpoint
+        paths = [db_path, db_path + '-wal']
+
+    mtime = 0
+    size = 0
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        mtime = max(mtime, stat.st_mtime_ns)
+        size += stat.st_size
+    return mtime, size
+
+
 def data_exist(session, schema, id):
     return session.query(exists().where(and_(schema.id == id))).scalar()
 
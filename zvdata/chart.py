@@ -3,11 +3,13 @@ import os
 
 import dash_table
 import plotly
+import pandas as pd
 import plotly.graph_objs as go
 
 from zvdata.api import decode_entity_id
 from zvdata.domain import context
 from zvdata.normal_data import NormalData, TableType
+from zvdata.utils.downsample_utils import downsample, downsample_ohlc
 from zvdata.utils.pd_utils import df_is_not_null
 from zvdata.utils.time_utils import now_time_str, TIME_FORMAT_ISO8601
 from zvdata.utils.utils import to_positive_number
@@ -19,13 +21,76 @@ def get_ui_path(name):
     return os.path.join(context['ui_path'], f'{name}.html')
 
 
+def get_x_range(relayout_data):
+    """
+    the x range zoomed in the dcc.Graph
+
+    :param relayout_data: the relayoutData of the dcc.Graph
+    :return: (start,end),None for the whole range,False if the x range is not changed
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return False
+
+
+def register_zoom_callback(app, graph_id, draw_func, state=[]):
+    """
+    re-draw the graph with the detail of the zoomed x range,the data would be downsampled again for the range
+
+    :param app: the dash app
+    :param graph_id: the id of the dcc.Graph
+    :param draw_func: draw_func(x_range, *states) -> (plotly_data, plotly_layout),e.g,re-fetch the data and
+    drawer.draw(chart, render=None, x_range=x_range)
+    :param state: the dash states passed to draw_func
+    """
+    from dash.dependencies import Input, Output
+    from dash.exceptions import PreventUpdate
+
+    def update_graph_detail(relayout_data, *states):
+        x_range = get_x_range(relayout_data)
+        if x_range is False:
+            raise PreventUpdate()
+
+        plotly_data, plotly_layout = draw_func(x_range, *states)
+        return {'data': plotly_data, 'layout': plotly_layout}
+
+    app.callback(Output(graph_id, 'figure'), [Input(graph_id, 'relayoutData')], state)(update_graph_detail)
+
+
 class Drawer(object):
+    # the points of a trace would be downsampled to it,None means no downsampling
+    max_points = 5000
+    # 'lttb' or 'minmax'
+    downsample_method = 'lttb'
+    # the traces with more points are drawn by Scattergl
+    webgl_threshold = 1000
+
     def __init__(self, data: NormalData = None) -> None:
         self.normal_data: NormalData = data
 
     def refresh_data(self, data: NormalData = None):
         self.normal_data = data
 
+    def get_df_in_range(self, df, x_range=None):
+        if x_range and self.normal_data.is_timeseries:
+            start, end = x_range
+            return df.loc[pd.Timestamp(start) if start else None:pd.Timestamp(end) if end else None]
+        return df
+
+    def get_line(self, df, col):
+        return downsample(df.index.values, df[col].values, threshold=self.max_points, method=self.downsample_method)
+
+    def get_scatter_cls(self, size):
+        if self.webgl_threshold is not None and size > self.webgl_threshold:
+            return go.Scattergl
+        return go.Scatter
+
     def get_plotly_annotations(self):
         annotation_df = self.normal_data.annotation_df
         annotations = []
@@ -138,7 +203,10 @@ class Drawer(object):
 
     def draw(self, chart: str, plotly_layout=None, annotation_df=None, render='html', file_name=None, width=None,
              height=None,
-             title=None, keep_ui_state=True, **kwargs):
+             title=None, keep_ui_state=True, x_range=None, **kwargs):
+        # only the line charts could be drawn in the x range
+        if x_range and chart in ('line', 'area', 'scatter', 'kline'):
+            kwargs['x_range'] = x_range
 
         func_name = f'self.draw_{chart}'
         draw_func = eval(func_name)
@@ -162,14 +230,16 @@ class Drawer(object):
 
     def draw_scatter(self, mode='markers', plotly_layout=None, annotation_df=None, render='html', file_name=None,
                      width=None, height=None,
-                     title=None, keep_ui_state=True, **kwargs):
+                     title=None, keep_ui_state=True, x_range=None, **kwargs):
         data = []
         for entity_id, df in self.normal_data.entity_map_df.items():
             _, _, code = decode_entity_id(entity_id)
+            df = self.get_df_in_range(df, x_range)
             for col in df.columns:
                 trace_name = '{}_{}'.format(code, col)
-                ydata = df.loc[:, col].values.tolist()
-                data.append(go.Scatter(x=df.index, y=ydata, mode=mode, name=trace_name, **kwargs))
+                xdata, ydata = self.get_line(df, col)
+                scatter_cls = self.get_scatter_cls(len(xdata))
+                data.append(scatter_cls(x=xdata, y=ydata.tolist(), mode=mode, name=trace_name, **kwargs))
 
         return self.show(plotly_data=data, plotly_layout=plotly_layout, annotation_df=annotation_df, render=render,
                          file_name=file_name, width=width,
@@ -285,33 +355,33 @@ class Drawer(object):
                          height=height, title=title, keep_ui_state=keep_ui_state)
 
     def draw_kline(self, plotly_layout=None, annotation_df=None, render='html', file_name=None, width=None, height=None,
-                   title=None, keep_ui_state=True, indicators=[], **kwargs):
+                   title=None, keep_ui_state=True, indicators=[], x_range=None, **kwargs):
         data = []
         for entity_id, df in self.normal_data.entity_map_df.items():
             entity_type, _, code = decode_entity_id(entity_id)
+            df = self.get_df_in_range(df, x_range)
 
             trace_name = '{}_kdata'.format(code)
 
             if entity_type == 'stock':
-                open = df.loc[:, 'qfq_open']
-                close = df.loc[:, 'qfq_close']
-                high = df.loc[:, 'qfq_high']
-                low = df.loc[:, 'qfq_low']
+                cols = ['qfq_open', 'qfq_close', 'qfq_high', 'qfq_low']
             else:
-                open = df.loc[:, 'open']
-                close = df.loc[:, 'close']
-                high = df.loc[:, 'high']
-                low = df.loc[:, 'low']
+                cols = ['open', 'close', 'high', 'low']
+
+            kdata = downsample_ohlc(df.loc[:, cols], threshold=self.max_points, open_col=cols[0], close_col=cols[1],
+                                    high_col=cols[2], low_col=cols[3])
+            open, close, high, low = [kdata.loc[:, col] for col in cols]
 
             data.append(
-                go.Candlestick(x=df.index, open=open, close=close, low=low, high=high, name=trace_name, **kwargs))
+                go.Candlestick(x=kdata.index, open=open, close=close, low=low, high=high, name=trace_name, **kwargs))
 
             # append indicators
             for indicator in indicators:
                 if indicator in df.columns:
                     trace_name = '{}_{}'.format(code, indicator)
-                    ydata = df.loc[:, indicator].values.tolist()
-                    data.append(go.Scatter(x=df.index, y=ydata, mode='lines', name=trace_name))
+                    xdata, ydata = self.get_line(df, indicator)
+                    scatter_cls = self.get_scatter_cls(len(xdata))
+                    data.append(scatter_cls(x=xdata, y=ydata.tolist(), mode='lines', name=trace_name))
 
         return self.show(plotly_data=data, plotly_layout=plotly_layout, annotation_df=annotation_df, render=render,
                          file_name=file_name, width=width,
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from zvdata.api import get_data
+from zvdata.domain import get_adjuster
+from zvdata.structs import IntervalLevel
+from zvdata.utils.pd_utils import df_is_not_null, index_df
+from zvdata.utils.time_utils import to_pd_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class MemmapDataCache(object):
+    """
+    the data cache stored as one .npy file per column,the files are opened by numpy memmap so the processes using the
+    same cache share the pages of the os instead of loading the data from the db again.
+
+    the data is stored as {cache_path}/{provider}_{table}_{level}/{column}.npy with a meta.json,
+    the string columns are stored as the category codes and the categories
+
+    """
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        # key -> (meta,{column:array}) opened in the process
+        self.opened = {}
+
+    @staticmethod
+    def get_key(data_schema, provider: str, level: Union[IntervalLevel, str] = None) -> str:
+        if type(level) == IntervalLevel:
+            level = level.value
+        return '{}_{}_{}'.format(provider, data_schema.__tablename__, level)
+
+    def get_dir(self, key):
+        return os.path.join(self.cache_path, key)
+
+    def load(self, data_schema, provider: str, level: Union[IntervalLevel, str] = None, entity_ids: List[str] = None,
+             codes: List[str] = None, start_timestamp=None, end_timestamp=None, time_field: str = 'timestamp'):
+        """
+        load the data from the db and save it to the cache
+
+        """
+        df = get_data(data_schema=data_schema, entity_ids=entity_ids, codes=codes, level=level, provider=provider,
+                      start_timestamp=start_timestamp, end_timestamp=end_timestamp, time_field=time_field)
+        self.save(df, data_schema=data_schema, provider=provider, level=level, entity_ids=entity_ids, codes=codes,
+                  start_timestamp=start_timestamp, end_timestamp=end_timestamp)
+        return df
+
+    def save(self, df: pd.DataFrame, data_schema, provider: str, level: Union[IntervalLevel, str] = None,
+             entity_ids: List[str] = None, codes: List[str] = None, start_timestamp=None, end_timestamp=None):
+        """
+        save the df got by get_data with the query params,the params are used to check whether the cache covers
+        the query
+
+        """
+        key = self.get_key(data_schema, provider, level)
+        path = self.get_dir(key)
+        os.makedirs(path, exist_ok=True)
+
+        if df is None:
+            df = pd.DataFrame()
+        df = df.reset_index(drop=True)
+
+        columns = []
+        for col in df.columns:
+            values = df[col].values
+            if np.issubdtype(values.dtype, np.datetime64):
+                np.save(os.path.join(path, '{}.npy'.format(col)), values.astype('datetime64[ns]').astype(np.int64))
+                columns.append([col, 'datetime'])
+            elif values.dtype != object and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                np.save(os.path.join(path, '{}.npy'.format(col)), values)
+                columns.append([col, 'array'])
+            else:
+                # the object columns are restored as strings
+                categorical = pd.Categorical(df[col])
+                np.save(os.path.join(path, '{}.npy'.format(col)), categorical.codes.astype(np.int32))
+                np.save(os.path.join(path, '{}.categories.npy'.format(col)),
+                        np.asarray(categorical.categories.astype(str), dtype=str))
+                columns.append([col, 'category'])
+
+        meta = {
+            'columns': columns,
+            'size': len(df),
+            'entity_ids': entity_ids,
+            'codes': codes,
+            'start_timestamp': str(to_pd_timestamp(start_timestamp)) if start_timestamp else None,
+            'end_timestamp': str(to_pd_timestamp(end_timestamp)) if end_timestamp else None
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        self.opened.pop(key, None)
+        logger.info('cache {},size:{}'.format(key, len(df)))
+
+    def open(self, key):
+        if key in self.opened:
+            return self.opened[key]
+
+        path = self.get_dir(key)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        arrays = {}
+        for col, kind in meta['columns']:
+            array = np.load(os.path.join(path, '{}.npy'.format(col)), mmap_mode='r')
+            if kind == 'category':
+                categories = np.load(os.path.join(path, '{}.categories.npy'.format(col)))
+                array = (array, np.array(categories.tolist(), dtype=object))
+            arrays[col] = (kind, array)
+
+        self.opened[key] = (meta, arrays)
+        return self.opened[key]
+
+    @staticmethod
+    def covers(meta, entity_ids: List[str] = None, codes: List[str] = None, start_timestamp=None,
+               end_timestamp=None):
+        if meta['entity_ids'] is not None or meta['codes'] is not None:
+            if entity_ids:
+                if meta['entity_ids'] is not None:
+                    if not set(entity_ids) <= set(meta['entity_ids']):
+                        return False
+                # the entity_id is {entity_type}_{exchange}_{code}
+                elif not set(entity_id.split('_', 2)[-1] for entity_id in entity_ids) <= set(meta['codes']):
+                    return False
+            elif codes:
+                if meta['codes'] is None or not set(codes) <= set(meta['codes']):
+                    return False
+            else:
+                return False
+
+        if meta['start_timestamp']:
+            if not start_timestamp or to_pd_timestamp(start_timestamp) < pd.Timestamp(meta['start_timestamp']):
+                return False
+        if meta['end_timestamp']:
+            if not end_timestamp or to_pd_timestamp(end_timestamp) > pd.Timestamp(meta['end_timestamp']):
+                return False
+        return True
+
+    def get_data(self, data_schema, provider: str, level: Union[IntervalLevel, str] = None,
+                 entity_ids: List[str] = None, codes: List[str] = None, columns: List = None, start_timestamp=None,
+                 end_timestamp=None, time_field: str = 'timestamp', index: str = 'timestamp'):
+        """
+        the same as zvdata.api.get_data without filters,order and limit
+
+        :return: the df,None if the cache doesn't cover the query
+        """
+        opened = self.open(self.get_key(data_schema, provider, level))
+        if not opened:
+            return None
+
+        meta, arrays = opened
+        if not self.covers(meta, entity_ids=entity_ids, codes=codes, start_timestamp=start_timestamp,
+                           end_timestamp=end_timestamp):
+            return None
+
+        adjuster = get_adjuster(provider=provider, data_schema=data_schema)
+        extra_columns = []
+        if columns:
+            names = [col if type(col) == str else col.key for col in columns]
+            if time_field not in names:
+                names.append(time_field)
+            if adjuster:
+                extra_columns = [col for col in adjuster.get_required_columns(names) if
+                                 col not in names and col in arrays]
+                names = names + extra_columns
+        else:
+            names = [col for col, _ in meta['columns']]
+
+        if not meta['size']:
+            return pd.DataFrame(columns=[col for col in names if col not in extra_columns])
+
+        mask = np.ones(meta['size'], dtype=bool)
+        if entity_ids:
+            mask &= self.isin(arrays['entity_id'], entity_ids)
+        if codes:
+            mask &= self.isin(arrays['code'], codes)
+        if start_timestamp or end_timestamp:
+            _, timestamps = arrays[time_field]
+            if start_timestamp:
+                mask &= timestamps >= to_pd_timestamp(start_timestamp).value
+            if end_timestamp:
+                mask &= timestamps <= to_pd_timestamp(end_timestamp).value
+
+        rows = np.flatnonzero(mask)
+        data = {}
+        for name in names:
+            kind, array = arrays[name]
+            if kind == 'datetime':
+                data[name] = array[rows].astype('datetime64[ns]')
+            elif kind == 'category':
+                codes_array, categories = array
+                values = np.empty(len(rows), dtype=object)
+                selected = codes_array[rows]
+                values[selected >= 0] = categories[selected[selected >= 0]]
+                values[selected < 0] = None
+                data[name] = values
+            else:
+                data[name] = array[rows]
+
+        df = pd.DataFrame(data, columns=names)
+        if df_is_not_null(df):
+            df = index_df(df, drop=False, index=index)
+            # the cached data is adjusted again since the adjustment may change after caching
+            if adjuster:
+                df = adjuster.adjust(df)
+                if extra_columns:
+                    df = df.drop(columns=extra_columns)
+        return df
+
+    @staticmethod
+    def isin(array, values):
+        kind, array = array
+        if kind == 'category':
+            codes_array, categories = array
+            return np.isin(codes_array, np.flatnonzero(np.isin(categories, values)))
+        return np.isin(array, values)
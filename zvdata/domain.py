@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
+from contextlib import contextmanager
 from typing import List
 
-from sqlalchemy import create_engine, schema, Column, String, DateTime
+from sqlalchemy import create_engine, schema, Column, String, DateTime, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 
 from zvdata.structs import EntityMixin
 
@@ -16,6 +18,28 @@ logger = logging.getLogger(__name__)
 _db_engine_map = {}
 # provider_dbname -> session
 _db_session_map = {}
+# provider_dbname -> storage,'sqlite' or 'parquet'
+_db_storage_map = {}
+
+# the pragmas applied to every sqlite connection,WAL makes the readers and the writer not blocking each other
+sqlite_pragmas = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # 256M
+    'mmap_size': 268435456,
+    # negative means KiB,64M
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    # ms for waiting the lock of the writer
+    'busy_timeout': 30000
+}
+
+# the pool settings of the engine,the connections are shared by the threads
+db_pool_conf = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30
+}
 
 global_providers = []
 global_entity_types = []
@@ -38,6 +62,11 @@ entity_type_map_schema = {
 
 }
 
+# (provider,schema) -> DataAdjuster
+schema_map_adjuster = {
+
+}
+
 context = {}
 
 BusinessBase = declarative_base()
@@ -56,7 +85,8 @@ def init_factor_schema():
     register_schema(providers=['zvdata'], db_name='core', schema_base=BusinessBase)
 
 
-def init_context(data_path: str, ui_path: str, domain_module: str, register_api: bool = False) -> None:
+def init_context(data_path: str, ui_path: str, domain_module: str, register_api: bool = False,
+                 pragmas: dict = None, pool_conf: dict = None) -> None:
     """
     now we just support sqlite engine for storing the data,you need to set the path for the db
 
@@ -68,7 +98,16 @@ def init_context(data_path: str, ui_path: str, domain_module: str, register_api:
     :type domain_module:
     :param register_api: whether register the api
     :type register_api:
+    :param pragmas: the sqlite pragmas to overwrite the default sqlite_pragmas,None value means not setting it
+    :type pragmas: dict
+    :param pool_conf: the pool settings to overwrite the default db_pool_conf
+    :type pool_conf: dict
     """
+    if pragmas:
+        sqlite_pragmas.update(pragmas)
+    if pool_conf:
+        db_pool_conf.update(pool_conf)
+
     context['data_path'] = data_path
     context['ui_path'] = ui_path
     context['domain_module'] = domain_module
@@ -80,6 +119,30 @@ def init_context(data_path: str, ui_path: str, domain_module: str, register_api:
     init_factor_schema()
 
 
+def set_data_path(data_path: str) -> None:
+    """
+    change the data path after the schemas registered,the engines are created again for the dbs in the new path,
+    e.g,the worker process started with the default data path
+
+    :param data_path: the db file path
+    :type data_path:
+    """
+    context['data_path'] = data_path
+    if not os.path.exists(data_path):
+        os.makedirs(data_path)
+
+    _db_engine_map.clear()
+    _db_session_map.clear()
+
+    # the state cached from the dbs in the old path
+    for adjuster in set(schema_map_adjuster.values()):
+        adjuster.clear()
+
+    for provider, db_names in provider_map_dbnames.items():
+        for db_name in db_names:
+            get_db_session_factory(provider, db_name=db_name).configure(bind=get_db_engine(provider, db_name=db_name))
+
+
 def table_name_to_domain_name(table_name: str) -> DeclarativeMeta:
     """
     the rules for table_name -> domain_class
@@ -133,12 +196,49 @@ def get_db_name(data_schema: DeclarativeMeta) -> str:
             return db_name
 
 
+def _get_db_key(provider: str, db_name: str, readonly: bool = False) -> str:
+    if readonly:
+        return '{}_{}_reader'.format(provider, db_name)
+    return '{}_{}'.format(provider, db_name)
+
+
+def _set_sqlite_pragmas(engine: Engine, readonly: bool = False):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in sqlite_pragmas.items():
+            # journal mode is persistent in the db file,just set it by the writer
+            if value is None or (readonly and pragma == 'journal_mode'):
+                continue
+            cursor.execute('PRAGMA {}={}'.format(pragma, value))
+        # make sure the reader never takes the write lock
+        if readonly:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+
+def get_db_path(provider: str, db_name: str = None, data_schema: object = None) -> str:
+    """
+    get the sqlite file path of the (provider,db_name) or (provider,data_schema)
+
+    """
+    if data_schema:
+        db_name = get_db_name(data_schema=data_schema)
+
+    return os.path.join(context['data_path'], '{}_{}.db'.format(provider, db_name))
+
+
 def get_db_engine(provider: str,
                   db_name: str = None,
-                  data_schema: object = None) -> Engine:
+                  data_schema: object = None,
+                  readonly: bool = False) -> Engine:
     """
     get db engine of the (provider,db_name) or (provider,data_schema)
 
+    the engine is pooled and shared by the threads,with sqlite_pragmas applied to every connection.
+    the reader engine is separated from the writer engine of the same db,so the reading(factors,ui) would not wait
+    the recorders writing in WAL mode
+
 
     :param provider:
     :type provider:
@@ -146,25 +246,36 @@ def get_db_engine(provider: str,
     :type db_name:
     :param data_schema:
     :type data_schema:
+    :param readonly: whether get the reader engine
+    :type readonly: bool
     :return:
     :rtype:
     """
     if data_schema:
         db_name = get_db_name(data_schema=data_schema)
 
-    db_path = os.path.join(context['data_path'], '{}_{}.db'.format(provider, db_name))
+    db_path = get_db_path(provider, db_name=db_name)
 
-    engine_key = '{}_{}'.format(provider, db_name)
+    engine_key = _get_db_key(provider, db_name, readonly)
     db_engine = _db_engine_map.get(engine_key)
     if not db_engine:
-        db_engine = create_engine('sqlite:///' + db_path, echo=False)
+        # make sure the db file and its journal mode are created by the writer
+        if readonly:
+            get_db_engine(provider, db_name=db_name).connect().close()
+
+        db_engine = create_engine('sqlite:///' + db_path, echo=False, poolclass=QueuePool,
+                                  connect_args={'check_same_thread': False,
+                                                'timeout': sqlite_pragmas.get('busy_timeout', 30000) / 1000},
+                                  **db_pool_conf)
+        _set_sqlite_pragmas(db_engine, readonly=readonly)
         _db_engine_map[engine_key] = db_engine
     return db_engine
 
 
 def get_db_session(provider: str,
                    db_name: str = None,
-                   data_schema: object = None) -> Session:
+                   data_schema: object = None,
+                   readonly: bool = False) -> Session:
     """
     get db session of the (provider,db_name) or (provider,data_schema)
 
@@ -174,15 +285,18 @@ def get_db_session(provider: str,
     :type db_name:
     :param data_schema:
     :type data_schema:
+    :param readonly: whether get the session of the reader engine
+    :type readonly: bool
     :return:
     :rtype:
     """
-    return get_db_session_factory(provider, db_name, data_schema)()
+    return get_db_session_factory(provider, db_name, data_schema, readonly)()
 
 
 def get_db_session_factory(provider: str,
                            db_name: str = None,
-                           data_schema: object = None):
+                           data_schema: object = None,
+                           readonly: bool = False):
     """
     get db session factory of the (provider,db_name) or (provider,data_schema)
 
@@ -192,20 +306,80 @@ def get_db_session_factory(provider: str,
     :type db_name:
     :param data_schema:
     :type data_schema:
+    :param readonly: whether get the session factory of the reader engine
+    :type readonly: bool
     :return:
     :rtype:
     """
     if data_schema:
         db_name = get_db_name(data_schema=data_schema)
 
-    session_key = '{}_{}'.format(provider, db_name)
+    session_key = _get_db_key(provider, db_name, readonly)
     session = _db_session_map.get(session_key)
     if not session:
         session = sessionmaker()
+        # the reader is bound lazily,the writer is bound in register_schema
+        if readonly and provider in provider_map_dbnames and db_name in provider_map_dbnames[provider]:
+            session.configure(bind=get_db_engine(provider, db_name=db_name, readonly=True))
         _db_session_map[session_key] = session
     return session
 
 
+@contextmanager
+def session_scope(provider: str,
+                  db_name: str = None,
+                  data_schema: object = None,
+                  readonly: bool = False) -> Session:
+    """
+    context manager for the session lifecycle,commit if no error and rollback if error,the session is always closed
+
+    with session_scope(provider='joinquant', data_schema=Stock1dKdata) as session:
+        session.add(...)
+
+    :param provider:
+    :type provider:
+    :param db_name:
+    :type db_name:
+    :param data_schema:
+    :type data_schema:
+    :param readonly: whether using the reader engine,the session would not be committed
+    :type readonly: bool
+    :return:
+    :rtype:
+    """
+    session = get_db_session(provider=provider, db_name=db_name, data_schema=data_schema, readonly=readonly)
+    try:
+        yield session
+        if not readonly:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_db_storage(provider: str,
+                   db_name: str = None,
+                   data_schema: object = None) -> str:
+    """
+    get the storage of the (provider,db_name) or (provider,data_schema)
+
+    :param provider:
+    :type provider:
+    :param db_name:
+    :type db_name:
+    :param data_schema:
+    :type data_schema:
+    :return: 'sqlite' or 'parquet'
+    :rtype: str
+    """
+    if data_schema:
+        db_name = get_db_name(data_schema=data_schema)
+
+    return _db_storage_map.get(_get_db_key(provider, db_name), 'sqlite')
+
+
 def get_schemas(provider: str) -> List[DeclarativeMeta]:
     """
     get domain schemas supported by the provider
@@ -364,9 +538,54 @@ def register_entity(entity_type: str = None):
     return register
 
 
+class DataAdjuster(object):
+    """
+    the adjustment applied to the data read from the storage,e.g,the qfq prices of the stock kdata depend on the
+    latest adjustment factors so they are computed when reading instead of the stored ones
+
+    """
+
+    def get_required_columns(self, columns: List[str]) -> List[str]:
+        """
+        the columns needed by adjust besides the columns queried
+
+        :param columns: the column names queried
+        """
+        return []
+
+    def adjust(self, df):
+        return df
+
+    def get_version(self) -> int:
+        """
+        the version changes once the adjusted result changes,the cached results are reloaded with it
+        """
+        return 0
+
+    def clear(self):
+        """
+        clear the state cached from the dbs,called when the data path changed
+        """
+        pass
+
+
+def register_adjuster(providers: List[str], data_schema: DeclarativeMeta, adjuster: DataAdjuster) -> None:
+    """
+    apply the adjuster to the data of the schema from the providers
+
+    """
+    for provider in providers:
+        schema_map_adjuster[(provider, data_schema)] = adjuster
+
+
+def get_adjuster(provider: str, data_schema: DeclarativeMeta) -> DataAdjuster:
+    return schema_map_adjuster.get((provider, data_schema))
+
+
 def register_schema(providers: List[str],
                     db_name: str,
-                    schema_base: DeclarativeMeta):
+                    schema_base: DeclarativeMeta,
+                    storage: str = 'sqlite'):
     """
     function for register schema,please declare them before register
 
@@ -376,9 +595,13 @@ def register_schema(providers: List[str],
     :type db_name:
     :param schema_base:
     :type schema_base:
+    :param storage: 'sqlite' or 'parquet',parquet is for the big time series data(e.g,kdata) which would be stored as
+    the parquet dataset partitioned by entity_id/year
+    :type storage: str
     :return:
     :rtype:
     """
+    assert storage in ('sqlite', 'parquet')
     schemas = []
     for item in schema_base._decl_class_registry.items():
         cls = item[1]
@@ -399,6 +622,7 @@ def register_schema(providers: List[str],
             provider_map_dbnames[provider] = []
         provider_map_dbnames[provider].append(db_name)
         dbname_map_base[db_name] = schema_base
+        _db_storage_map[_get_db_key(provider, db_name)] = storage
 
         # create the db & table
         engine = get_db_engine(provider, db_name=db_name)
@@ -2,6 +2,7 @@
 import enum
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
 
 from zvdata.chart import Drawer
@@ -10,7 +11,7 @@ from zvdata.normal_data import NormalData
 from zvdata.reader import DataReader, DataListener
 from zvdata.sedes import Jsonable, UiComposable
 from zvdata.structs import IntervalLevel
-from zvdata.utils.pd_utils import index_df_with_category_xfield
+from zvdata.utils.pd_utils import index_df_with_category_xfield, df_is_not_null
 
 
 class FactorType(enum.Enum):
@@ -93,6 +94,11 @@ class Factor(DataReader, DataListener, Jsonable, UiComposable, metaclass=Meta):
 
         self.result_df: pd.DataFrame = None
 
+        # the timestamps affected by the added data,the breadth would be computed for them
+        self.added_timestamps = set()
+        # the added data could not be computed incrementally,compute the whole data in on_data_changed
+        self.need_compute = False
+
         self.register_data_listener(self)
 
     def depth_computing(self):
@@ -148,26 +154,90 @@ class Factor(DataReader, DataListener, Jsonable, UiComposable, metaclass=Meta):
     def on_data_loaded(self, data: pd.DataFrame):
         self.compute()
 
+    def depth_computing_incrementally(self, category, added_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        implement it to compute the depth_df rows of the added data,keep the state needed(window tail,ema...) in the
+        factor instead of computing the whole data_df
+
+        Parameters
+        ----------
+        category : the data category
+        added_data : the data added
+
+        Returns
+        -------
+        the added depth_df rows with (category,timestamp) index,None means not supported
+        """
+        return None
+
+    def breadth_computing_incrementally(self, timestamps: List[pd.Timestamp]) -> pd.DataFrame:
+        """
+        implement it to compute the result_df rows of the timestamps affected by the added data
+
+        Parameters
+        ----------
+        timestamps : the affected timestamps
+
+        Returns
+        -------
+        the result_df rows of the timestamps,None means not supported
+        """
+        return None
+
     def on_data_changed(self, data: pd.DataFrame):
         """
-        overwrite it for computing fast
+        compute the breadth of the timestamps affected by the added data,or compute the whole data if could not compute
+        incrementally
 
         Parameters
         ----------
         data :
         """
-        self.compute()
+        if self.need_compute or self.depth_df is None:
+            self.need_compute = False
+            self.added_timestamps = set()
+            self.compute()
+            return
+
+        # the added data has no new depth
+        if not self.added_timestamps:
+            return
+
+        timestamps = sorted(self.added_timestamps)
+        self.added_timestamps = set()
+
+        added_result = self.breadth_computing_incrementally(timestamps)
+
+        if added_result is None:
+            self.breadth_computing()
+        elif self.result_df is None:
+            self.result_df = added_result
+        else:
+            self.result_df = pd.concat([self.result_df[~self.result_df.index.isin(added_result.index)], added_result])
+            self.result_df = self.result_df.sort_index(level=[0, 1])
+            self.fill_gap()
 
     def on_category_data_added(self, category, added_data: pd.DataFrame):
         """
-        overwrite it for computing fast
+        compute the depth of the added data incrementally,the breadth would be computed in on_data_changed
 
         Parameters
         ----------
         category :
         added_data :
         """
-        self.compute()
+        if self.need_compute or self.depth_df is None:
+            self.need_compute = True
+            return
+
+        added_depth = self.depth_computing_incrementally(category, added_data)
+
+        if added_depth is None:
+            self.need_compute = True
+        elif df_is_not_null(added_depth):
+            self.depth_df = pd.concat([self.depth_df[~self.depth_df.index.isin(added_depth.index)], added_depth])
+            self.depth_df = self.depth_df.sort_index(level=[0, 1])
+            self.added_timestamps.update(added_depth.index.get_level_values(1))
 
     # TODO:
     def persist(self):
@@ -225,90 +295,220 @@ class ScoreFactor(Factor):
 
     def depth_computing(self):
         if self.depth_computing_method != None:
-            self.depth_df = self.data_df.reset_index(level=self.time_field)
+            self.depth_df = self.rolling_computing(self.data_df)
 
-            if self.depth_computing_method == 'ma':
-                window = self.depth_computing_param['window']
+            self.depth_df = self.depth_df.loc[(slice(None), slice(self.start_timestamp, self.end_timestamp)), :]
 
-                on = self.depth_computing_param['on']
+            self.logger.info('factor:{},depth_df:\n{}'.format(self.factor_name, self.depth_df))
+        else:
+            self.depth_df = self.data_df
+
+    def rolling_computing(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        the rolling ma/count of the data by depth_computing_method
+
+        :param df: the data indexed by (category,timestamp)
+        :return: the depth indexed by (category,timestamp)
+        """
+        df = df.reset_index(level=self.time_field)
+        window = self.depth_computing_param['window']
 
-                if on == self.time_field:
-                    if isinstance(window, pd.DateOffset):
-                        window = '{}D'.format(self.window.days)
+        if self.depth_computing_method == 'ma':
+            on = self.depth_computing_param['on']
 
-                    self.depth_df = self.depth_df.groupby(level=0).rolling(window=window,
-                                                                           on=self.time_field).mean()
-                else:
-                    assert type(window) == int
-                    self.depth_df = self.depth_df.groupby(level=0).rolling(window=window).mean()
-            elif self.depth_computing_method == 'count':
-                window = self.depth_computing_param['window']
+            if on == self.time_field:
                 if isinstance(window, pd.DateOffset):
-                    window = '{}D'.format(self.window.days)
+                    window = '{}D'.format(window.days)
 
-                self.depth_df = self.depth_df.groupby(level=0).rolling(window=window, on=self.time_field).count()
+                df = df.groupby(level=0).rolling(window=window, on=self.time_field).mean()
+            else:
+                assert type(window) == int
+                # keep the time field
+                df = df.groupby(level=0).rolling(window=window, on=self.time_field).mean()
+        elif self.depth_computing_method == 'count':
+            if isinstance(window, pd.DateOffset):
+                window = '{}D'.format(window.days)
 
-            self.depth_df = self.depth_df.reset_index(level=0, drop=True)
-            self.depth_df = self.depth_df.set_index(self.time_field, append=True)
+            df = df.groupby(level=0).rolling(window=window, on=self.time_field).count()
 
-            self.depth_df = self.depth_df.loc[(slice(None), slice(self.start_timestamp, self.end_timestamp)), :]
+        df = df.reset_index(level=0, drop=True)
+        return df.set_index(self.time_field, append=True)
 
-            self.logger.info('factor:{},depth_df:\n{}'.format(self.factor_name, self.depth_df))
-        else:
-            self.depth_df = self.data_df
+    def get_rolling_history(self, category, start_timestamp) -> pd.DataFrame:
+        """
+        the data of the category in the rolling window before start_timestamp
+
+        """
+        window = self.depth_computing_param['window']
+        history = self.data_df.loc[[category]]
+        history = history[history.index.get_level_values(1) < start_timestamp]
+
+        # the rows window
+        if isinstance(window, int):
+            return history.iloc[max(len(history) - window + 1, 0):]
+
+        if isinstance(window, pd.DateOffset):
+            window = pd.Timedelta(days=window.days)
+        return history[history.index.get_level_values(1) > start_timestamp - pd.Timedelta(window)]
+
+    def depth_computing_incrementally(self, category, added_data: pd.DataFrame) -> pd.DataFrame:
+        if self.depth_computing_method is None:
+            return added_data
+
+        if self.depth_computing_method not in ('ma', 'count'):
+            return None
+
+        # the rolling of the added data only depends on the history in the window
+        start_timestamp = added_data.index.get_level_values(1).min()
+        df = pd.concat([self.get_rolling_history(category, start_timestamp), added_data])
+        depth_df = self.rolling_computing(df)
+
+        timestamps = depth_df.index.get_level_values(1)
+        selected = timestamps >= start_timestamp
+        if self.start_timestamp:
+            selected &= timestamps >= self.start_timestamp
+        if self.end_timestamp:
+            selected &= timestamps <= self.end_timestamp
+        return depth_df[selected]
 
     def breadth_computing(self):
         if self.breadth_computing_method == 'quantile':
-            self.score_levels = self.breadth_computing_param['score_levels']
-            self.score_levels.sort(reverse=True)
-
-            self.quantile = self.depth_df.groupby(level=1).quantile(self.score_levels)
-            self.quantile.index.names = [self.time_field, 'score']
-
-            self.logger.info('factor:{},quantile:\n{}'.format(self.factor_name, self.quantile))
-
-            self.result_df = self.depth_df.copy()
-            self.result_df.reset_index(inplace=True, level='entity_id')
-            self.result_df['quantile'] = None
-            for timestamp in self.quantile.index.levels[0]:
-                length = len(self.result_df.loc[self.result_df.index == timestamp, 'quantile'])
-                self.result_df.loc[self.result_df.index == timestamp, 'quantile'] = [self.quantile.loc[
-                                                                                         timestamp].to_dict()] * length
-
-            self.logger.info('factor:{},df with quantile:\n{}'.format(self.factor_name, self.result_df))
-
-            # self.result_df = self.result_df.set_index(['entity_id'], append=True)
-            # self.result_df = self.result_df.sort_index(level=[0, 1])
-            #
-            # self.logger.info(self.result_df)
-            #
-            def calculate_score(df, factor_name, quantile):
-                original_value = df[factor_name]
-                score_map = quantile.get(factor_name)
-                min_score = self.score_levels[-1]
-
-                if original_value < score_map.get(min_score):
-                    return 0
-
-                for score in self.score_levels[:-1]:
-                    if original_value >= score_map.get(score):
-                        return score
-
-            for factor in self.factors:
-                self.result_df[factor] = self.result_df.apply(lambda x: calculate_score(x, factor, x['quantile']),
-                                                              axis=1)
-
-            self.result_df = self.result_df.reset_index()
-            self.result_df = index_df_with_category_xfield(self.result_df, category_field=self.category_field,
-                                                           xfield=self.time_field)
-            self.result_df = self.result_df.loc[:, self.factors]
-
-            self.result_df = self.result_df.loc[~self.result_df.index.duplicated(keep='first')]
+            self.quantile, self.result_df = self.score_quantile(self.depth_df)
 
             self.logger.info('factor:{},df:\n{}'.format(self.factor_name, self.result_df))
 
             self.fill_gap()
 
+    def breadth_computing_incrementally(self, timestamps: List[pd.Timestamp]) -> pd.DataFrame:
+        if self.breadth_computing_method == 'quantile':
+            # the quantile of one timestamp only depends on the depth of the timestamp
+            depth_df = self.depth_df.loc[self.depth_df.index.get_level_values(1).isin(timestamps)]
+            quantile, result_df = self.score_quantile(depth_df)
+
+            self.quantile = pd.concat([self.quantile[~self.quantile.index.isin(quantile.index)], quantile])
+            self.quantile = self.quantile.sort_index(level=[0, 1], ascending=[True, False])
+
+            return result_df
+
+    def score_quantile(self, depth_df: pd.DataFrame):
+        """
+        score the factors of depth_df by the quantiles of their timestamps
+
+        :param depth_df: the depth_df or the rows of some timestamps of it
+        :return: quantile,result_df
+        """
+        self.score_levels = self.breadth_computing_param['score_levels']
+        self.score_levels.sort(reverse=True)
+
+        # timestamp -> the quantiles of the factors,shape:(len(timestamps),len(score_levels))
+        quantile_timestamps, factor_quantiles = self.calculate_quantile(depth_df)
+
+        quantile = pd.DataFrame({factor: factor_quantiles[factor].ravel() for factor in self.factors},
+                                index=pd.MultiIndex.from_product([quantile_timestamps, self.score_levels],
+                                                                 names=[self.time_field, 'score']))
+
+        self.logger.info('factor:{},quantile:\n{}'.format(self.factor_name, quantile))
+
+        result_df = depth_df.copy()
+        result_df.reset_index(inplace=True, level='entity_id')
+
+        # the row -> the quantile of its timestamp
+        positions = quantile_timestamps.get_indexer(result_df.index)
+
+        for factor in self.factors:
+            result_df[factor] = self.calculate_score(result_df[factor].values, factor_quantiles[factor][positions])
+
+        self.logger.info('factor:{},df with score:\n{}'.format(self.factor_name, result_df))
+
+        result_df = result_df.reset_index()
+        result_df = index_df_with_category_xfield(result_df, category_field=self.category_field,
+                                                  xfield=self.time_field)
+        result_df = result_df.loc[:, self.factors]
+
+        result_df = result_df.loc[~result_df.index.duplicated(keep='first')]
+
+        return quantile, result_df
+
+    def calculate_quantile(self, depth_df: pd.DataFrame = None):
+        """
+        the quantiles of score_levels for the factors in every timestamp,same as
+        depth_df.groupby(level=1).quantile(score_levels) with linear interpolation,but sorting the values of one
+        timestamp in a row of the (timestamp,entity) matrix instead of sorting all the rows
+
+        :param depth_df: default is self.depth_df
+        :return: timestamps,{factor:quantiles with shape (len(timestamps),len(score_levels))}
+        """
+        if depth_df is None:
+            depth_df = self.depth_df
+
+        # could not pivot,just use groupby
+        if not depth_df.index.is_unique:
+            quantile = depth_df.groupby(level=1).quantile(self.score_levels)
+            timestamps = quantile.index.get_level_values(0).unique()
+            return timestamps, {factor: quantile[factor].values.reshape(len(timestamps), len(self.score_levels)) for
+                                factor in self.factors}
+
+        # pivot to (timestamp,entity) matrix
+        timestamp_codes, timestamps = pd.factorize(depth_df.index.get_level_values(1), sort=True)
+        entity_codes = depth_df.index.codes[0]
+        # groupby drops the NaT group
+        selected = timestamp_codes >= 0
+        timestamp_codes = timestamp_codes[selected]
+        entity_codes = entity_codes[selected]
+
+        factor_quantiles = {}
+        for factor in self.factors:
+            values = np.full((len(timestamps), len(depth_df.index.levels[0])), np.nan)
+            values[timestamp_codes, entity_codes] = depth_df[factor].values[selected]
+            # nan is sorted to the end
+            values.sort(axis=1)
+            size = (~np.isnan(values)).sum(axis=1)
+            rows = np.arange(len(values))
+
+            quantiles = np.full((len(values), len(self.score_levels)), np.nan)
+            for i, score in enumerate(self.score_levels):
+                position = score * (size - 1).astype(np.float64)
+                lower = np.maximum(position, 0).astype(np.int64)
+                upper = np.minimum(lower + 1, np.maximum(size - 1, 0))
+                frac = position % 1
+
+                lower_value = values[rows, lower]
+                upper_value = values[rows, upper]
+                quantiles[:, i] = np.where(frac == 0, lower_value, lower_value + (upper_value - lower_value) * frac)
+
+            quantiles[size == 0] = np.nan
+            factor_quantiles[factor] = quantiles
+
+        return timestamps, factor_quantiles
+
+    def calculate_score(self, values: np.ndarray, thresholds: np.ndarray):
+        """
+        score the values by the quantile thresholds of their timestamps,with the score levels sorted desc:
+        value < the min level quantile -> 0,otherwise the first level whose quantile <= value,
+        the value between the min two levels(or NaN) has no score
+
+        :param values: the factor values
+        :param thresholds: the quantiles of every value,shape:(len(values),len(score_levels))
+        :return: the scores
+        """
+        scores = np.full(len(values), np.nan)
+
+        with np.errstate(invalid='ignore'):
+            scored = values < thresholds[:, -1]
+            scores[scored] = 0
+
+            for i, score in enumerate(self.score_levels[:-1]):
+                matched = ~scored & (values >= thresholds[:, i])
+                scores[matched] = score
+                scored |= matched
+
+        # keep the dtype as scoring row by row
+        if len(scores) and not scored.any():
+            return np.full(len(scores), None, dtype=object)
+        if scored.all() and (scores == 0).all():
+            return scores.astype(np.int64)
+        return scores
+
 
 class StateFactor(Factor):
     factor_type = FactorType.state
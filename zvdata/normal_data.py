@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 import enum
+from collections.abc import Mapping
 from typing import List
 
 import numpy as np
 import pandas as pd
 
-from zvdata.utils.pd_utils import df_is_not_null, fill_with_same_index, index_df_with_category_xfield
+from zvdata.utils.pd_utils import df_is_not_null, index_df_with_category_xfield
 
 
 class TableType(enum.Enum):
@@ -53,6 +54,25 @@ intent_map_charts = {
 }
 
 
+class EntityMapDf(Mapping):
+    """
+    entity_id -> the df of the entity aligned to the union index,the df is sliced from the panel when accessed
+
+    """
+
+    def __init__(self, normal_data) -> None:
+        self.normal_data = normal_data
+
+    def __getitem__(self, entity_id):
+        return self.normal_data.get_entity_df(entity_id)
+
+    def __iter__(self):
+        return iter(self.normal_data.entity_ids)
+
+    def __len__(self):
+        return self.normal_data.entity_size
+
+
 class NormalData(object):
     table_type_sample = None
 
@@ -65,8 +85,14 @@ class NormalData(object):
         self.is_timeseries = is_timeseries
 
         self.entity_ids = []
-        self.df_list = []
-        self.entity_map_df = {}
+        # entity_id -> the position in the panel
+        self.entity_positions = {}
+        self.entity_map_df = EntityMapDf(self)
+
+        # the union index of the entities
+        self.index = None
+        # the data_df aligned to entity_ids x index,built when the entity df is accessed
+        self._panel = None
 
         self.entity_size = 0
         self.row_count = 0
@@ -106,31 +132,62 @@ class NormalData(object):
                 self.data_df = index_df_with_category_xfield(self.data_df, category_field=self.category_field,
                                                              xfield=self.index_field, is_timeseries=self.is_timeseries)
 
-            if isinstance(self.data_df.index, pd.MultiIndex):
-                self.entity_ids = list(self.data_df.index.get_level_values(0).values)
+            # the entities and the union index come from the index metadata
+            index = self.data_df.index
+            if isinstance(index, pd.MultiIndex):
+                index = index.remove_unused_levels()
+                self.entity_ids = index.levels[0].tolist()
+                self.index = index.levels[1]
+                self.row_count = len(self.index)
             else:
-                self.entity_ids = list(self.data_df.index.values)
+                self.entity_ids = index.unique().tolist()
+                self.row_count = int(len(self.data_df) / len(self.entity_ids))
 
-            # remove the duplicates
-            self.entity_ids = list(set(self.entity_ids))
+            self.entity_positions = {entity_id: i for i, entity_id in enumerate(self.entity_ids)}
+            self.entity_size = len(self.entity_ids)
+            self.column_size = len(self.data_df.columns)
 
-            for entity_id, df_item in self.data_df.groupby(self.category_field):
-                df = df_item.copy()
-                df.reset_index(inplace=True, level=self.category_field)
-                self.df_list.append(df)
+    @property
+    def panel(self) -> pd.DataFrame:
+        """
+        the data_df aligned to entity_ids x index by one reindex,it's the data_df itself if aligned already
+
+        """
+        if self._panel is None and df_is_not_null(self.data_df):
+            if isinstance(self.data_df.index, pd.MultiIndex):
+                df = self.data_df
+                # the duplicated rows could not be aligned
+                if not df.index.is_unique:
+                    df = df[~df.index.duplicated(keep='last')]
+
+                full_index = pd.MultiIndex.from_product([self.entity_ids, self.index], names=df.index.names)
+                if df.index.equals(full_index):
+                    self._panel = df
+                else:
+                    self._panel = df.reindex(full_index)
+            else:
+                self._panel = self.data_df
+        return self._panel
 
-            if len(self.df_list) > 1:
-                self.df_list = fill_with_same_index(df_list=self.df_list)
+    def get_entity_df(self, entity_id) -> pd.DataFrame:
+        """
+        the df of the entity aligned to the union index,it's a view of the panel and should not be modified
 
-            for df in self.df_list:
-                entity_id = df[df[self.category_field].notna()][self.category_field][0]
-                columns = list(df.columns)
-                columns.remove(self.category_field)
-                self.entity_map_df[entity_id] = df.loc[:, columns]
+        """
+        if entity_id not in self.entity_positions:
+            raise KeyError(entity_id)
+
+        if isinstance(self.data_df.index, pd.MultiIndex):
+            start = self.entity_positions[entity_id] * self.row_count
+            df = self.panel.iloc[start:start + self.row_count]
+            # set_axis(copy=False) needs pandas 1.5,the index of the sliced view is assigned without copying the data
+            df.index = self.index
+        else:
+            df = self.data_df.loc[[entity_id]].reset_index(drop=True)
 
-            self.entity_size = len(self.entity_ids)
-            self.row_count = int(len(self.data_df) / self.entity_size)
-            self.column_size = len(self.data_df.columns)
+        if self.category_field in df.columns:
+            df = df.drop(columns=[self.category_field])
+        return df
 
     def get_table_type(self):
         if self.entity_size == 1:
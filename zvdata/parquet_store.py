@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+from typing import List, Union
+from urllib.parse import quote
+
+import pandas as pd
+from sqlalchemy import types
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BooleanClauseList, Grouping, BindParameter, ClauseList, \
+    UnaryExpression, Null
+
+from zvdata.domain import context, get_db_name, get_db_session
+from zvdata.utils.time_utils import to_pd_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    ds = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# the data is stored as {data_path}/parquet/{provider}_{db_name}/entity_id={entity_id}/year={year}/data.parquet
+partition_columns = ['entity_id', 'year']
+
+_sql_op_map_func = {
+    operators.eq: lambda field, value: field == value,
+    operators.ne: lambda field, value: field != value,
+    operators.gt: lambda field, value: field > value,
+    operators.ge: lambda field, value: field >= value,
+    operators.lt: lambda field, value: field < value,
+    operators.le: lambda field, value: field <= value,
+    operators.in_op: lambda field, value: field.isin(value),
+    operators.notin_op: lambda field, value: ~field.isin(value),
+    operators.is_: lambda field, value: field.is_null() if value is None else field == value,
+    operators.isnot: lambda field, value: ~field.is_null() if value is None else field != value
+}
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is needed for the parquet storage,please install it:pip install zvt[parquet]')
+
+
+def get_parquet_root(provider: str, data_schema) -> str:
+    return os.path.join(context['data_path'], 'parquet', '{}_{}'.format(provider, get_db_name(data_schema)))
+
+
+def get_arrow_type(column_type):
+    if isinstance(column_type, types.DateTime):
+        return pa.timestamp('ns')
+    if isinstance(column_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, types.Integer):
+        return pa.int64()
+    if isinstance(column_type, (types.Float, types.Numeric)):
+        return pa.float64()
+    return pa.string()
+
+
+def get_file_schema(data_schema):
+    """
+    the arrow schema of the parquet file,the partition columns are not in the file
+
+    """
+    return pa.schema([(column.name, get_arrow_type(column.type)) for column in data_schema.__table__.columns if
+                      column.name not in partition_columns])
+
+
+def get_partitioning():
+    return ds.partitioning(pa.schema([('entity_id', pa.string()), ('year', pa.int32())]), flavor='hive')
+
+
+def get_partition_path(root: str, entity_id: str, year: int) -> str:
+    # entity_id could contain '/',e.g,coin_binance_EOS/USDT
+    return os.path.join(root, 'entity_id={}'.format(quote(entity_id, safe='')), 'year={}'.format(year),
+                        'data.parquet')
+
+
+def to_dataset_expression(the_filter):
+    """
+    translate the sqlalchemy filter to pyarrow dataset expression,so the filters of get_data could be pushed down,
+    support column op value(==,!=,>,>=,<,<=,in,not in,is,is not) combined with and/or
+
+    :param the_filter: sqlalchemy filter or pyarrow dataset expression
+    :return:
+    :rtype: ds.Expression
+    """
+    if isinstance(the_filter, ds.Expression):
+        return the_filter
+
+    if isinstance(the_filter, BooleanClauseList):
+        expressions = [to_dataset_expression(clause) for clause in the_filter.clauses]
+        result = expressions[0]
+        for expression in expressions[1:]:
+            if the_filter.operator is operators.and_:
+                result = result & expression
+            elif the_filter.operator is operators.or_:
+                result = result | expression
+            else:
+                raise NotImplementedError('not support filter:{}'.format(the_filter))
+        return result
+
+    if isinstance(the_filter, Grouping):
+        return to_dataset_expression(the_filter.element)
+
+    if isinstance(the_filter, BinaryExpression) and the_filter.operator in _sql_op_map_func:
+        field = ds.field(the_filter.left.name)
+        right = the_filter.right
+        if isinstance(right, Grouping):
+            right = right.element
+
+        if isinstance(right, BindParameter):
+            value = right.value
+        elif isinstance(right, ClauseList):
+            value = [clause.value for clause in right.clauses]
+        elif isinstance(right, Null):
+            value = None
+        else:
+            raise NotImplementedError('not support filter:{}'.format(the_filter))
+
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+
+        return _sql_op_map_func[the_filter.operator](field, value)
+
+    raise NotImplementedError('not support filter:{}'.format(the_filter))
+
+
+def read_parquet(data_schema,
+                 provider: str,
+                 entity_ids: List[str] = None,
+                 codes: List[str] = None,
+                 level: str = None,
+                 columns: List[str] = None,
+                 start_timestamp: Union[pd.Timestamp, str] = None,
+                 end_timestamp: Union[pd.Timestamp, str] = None,
+                 filters: List = None,
+                 order=None,
+                 limit: int = None,
+                 time_field: str = 'timestamp') -> pd.DataFrame:
+    """
+    read the data from the parquet dataset,the partitions are pruned by entity_id/year and the columns,filters are
+    pushed down to the parquet reader
+
+    :param order: sqlalchemy order,e.g,Stock1dKdata.timestamp.desc(),default is time_field asc
+    :return: the df with the same columns as the sqlite table
+    :rtype: pd.DataFrame
+    """
+    _check_pyarrow()
+
+    table_columns = data_schema.__table__.columns.keys()
+    if not columns:
+        columns = table_columns
+    elif time_field not in columns:
+        columns = list(columns) + [time_field]
+
+    root = get_parquet_root(provider, data_schema)
+    if not os.path.exists(root):
+        return pd.DataFrame(columns=columns)
+
+    start_timestamp = to_pd_timestamp(start_timestamp)
+    end_timestamp = to_pd_timestamp(end_timestamp)
+
+    expressions = []
+    if entity_ids:
+        expressions.append(ds.field('entity_id').isin(entity_ids))
+    if codes:
+        expressions.append(ds.field('code').isin(codes))
+    if level and 'level' in table_columns:
+        expressions.append(ds.field('level') == level)
+    if start_timestamp:
+        if time_field == 'timestamp':
+            expressions.append(ds.field('year') >= start_timestamp.year)
+        expressions.append(ds.field(time_field) >= start_timestamp.to_pydatetime())
+    if end_timestamp:
+        if time_field == 'timestamp':
+            expressions.append(ds.field('year') <= end_timestamp.year)
+        expressions.append(ds.field(time_field) <= end_timestamp.to_pydatetime())
+    if filters:
+        expressions += [to_dataset_expression(the_filter) for the_filter in filters]
+
+    the_filter = None
+    for expression in expressions:
+        the_filter = expression if the_filter is None else the_filter & expression
+
+    dataset = ds.dataset(root, schema=get_file_schema(data_schema).append(pa.field('entity_id', pa.string())).append(
+        pa.field('year', pa.int32())), format='parquet', partitioning=get_partitioning())
+
+    df = dataset.to_table(columns=list(columns), filter=the_filter).to_pandas()
+
+    # handle the order like sql
+    sort_field = time_field
+    ascending = True
+    if order is not None:
+        if isinstance(order, UnaryExpression):
+            ascending = order.modifier is not operators.desc_op
+            sort_field = order.element.name
+        else:
+            sort_field = order.name
+    df = df.sort_values(by=sort_field, ascending=ascending, kind='mergesort').reset_index(drop=True)
+
+    if limit:
+        df = df.iloc[:limit]
+
+    return df
+
+
+def append_parquet(df: pd.DataFrame, provider: str, data_schema, force_update: bool = False) -> int:
+    """
+    upsert the df into the partitions of the parquet dataset,the saved data is kept if not force_update
+
+    :param df: the df with the columns of data_schema,origin_id column is the id before fixing duplicate if exists
+    :param provider:
+    :param data_schema:
+    :param force_update: whether update the saved data with the same id
+    :return: the rows size written
+    :rtype: int
+    """
+    _check_pyarrow()
+
+    if df is None or df.empty:
+        return 0
+
+    root = get_parquet_root(provider, data_schema)
+    file_schema = get_file_schema(data_schema)
+
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+    written = 0
+    for (entity_id, year), group in df.groupby([df['entity_id'], df['timestamp'].dt.year]):
+        path = get_partition_path(root, entity_id, year)
+
+        if os.path.exists(path):
+            saved = pq.read_table(path).to_pandas()
+            if force_update:
+                saved = saved[~saved['id'].isin(group['id'])]
+            else:
+                keep = ~group['id'].isin(saved['id'])
+                if 'origin_id' in group.columns:
+                    keep = keep & ~group['origin_id'].isin(saved['id'])
+                group = group[keep]
+                if group.empty:
+                    continue
+        else:
+            saved = None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        written += len(group)
+
+        group = group.reindex(columns=file_schema.names)
+        if saved is not None:
+            group = pd.concat([saved, group], ignore_index=True, sort=False)
+
+        group = group.sort_values(by='timestamp', kind='mergesort')
+
+        table = pa.Table.from_pandas(group, schema=file_schema, preserve_index=False)
+
+        # write to tmp file and then replace,the readers would not see the half written file
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    return written
+
+
+def migrate_to_parquet(provider: str, data_schema, entity_ids: List[str] = None) -> int:
+    """
+    migrate the data of the schema from sqlite to parquet,entity by entity
+
+    :param provider:
+    :param data_schema:
+    :param entity_ids: the entities to migrate,None means all
+    :return: the rows size migrated
+    :rtype: int
+    """
+    from zvdata.api import read_sql_fast
+
+    session = get_db_session(provider=provider, data_schema=data_schema, readonly=True)
+
+    try:
+        if not entity_ids:
+            entity_ids = [item[0] for item in session.query(data_schema.entity_id).distinct()]
+
+        total = 0
+        for entity_id in entity_ids:
+            query = session.query(data_schema).filter(data_schema.entity_id == entity_id).order_by(
+                data_schema.timestamp.asc())
+            df = read_sql_fast(query)
+            size = append_parquet(df, provider=provider, data_schema=data_schema, force_update=True)
+            logger.info('migrate {} for entity_id:{},size:{}'.format(data_schema, entity_id, size))
+            total += size
+
+        return total
+    finally:
+        session.close()
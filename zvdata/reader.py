@@ -4,6 +4,7 @@ import logging
 import time
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
 
 from zvdata.api import get_data
@@ -47,6 +48,14 @@ class DataListener(object):
 class DataReader(object):
     logger = logging.getLogger(__name__)
 
+    # the backoff sleeping time of waiting the data in move_on
+    move_on_sleeping_time = 0.5
+    move_on_max_sleeping_time = 5
+    # sqlite limits the variable number of one statement,the categories are queried in chunks of it in move_on
+    load_step = 500
+    # the cache shared by the processes,e.g,MemmapDataCache,None means querying the db
+    data_cache = None
+
     def __init__(self,
                  data_schema: object,
                  entity_ids: List[str] = None,
@@ -128,7 +137,18 @@ class DataReader(object):
             self.load_data()
 
     def load_data(self):
-        if self.entity_ids:
+        self.data_df = None
+        if self.data_cache is not None and not self.filters and self.order is None and not self.limit:
+            self.data_df = self.data_cache.get_data(data_schema=self.data_schema, provider=self.provider,
+                                                    level=self.level, entity_ids=self.entity_ids,
+                                                    codes=None if self.entity_ids else self.codes,
+                                                    columns=self.columns, start_timestamp=self.start_timestamp,
+                                                    end_timestamp=self.end_timestamp, time_field=self.time_field,
+                                                    index=self.time_field)
+
+        if self.data_df is not None:
+            self.logger.info('load {} from the cache,size:{}'.format(self.data_schema.__name__, len(self.data_df)))
+        elif self.entity_ids:
             self.data_df = get_data(data_schema=self.data_schema, entity_ids=self.entity_ids,
                                     provider=self.provider, columns=self.columns,
                                     start_timestamp=self.start_timestamp,
@@ -167,7 +187,7 @@ class DataReader(object):
         return list(self.data_df.groupby(level=0).groups.keys())
 
     def move_on(self, to_timestamp: Union[str, pd.Timestamp] = None,
-                timeout: int = 20) -> bool:
+                timeout: int = 20, batch: bool = True) -> bool:
         """
         get the data happened before to_timestamp,if not set,get all the data which means to now
 
@@ -175,6 +195,7 @@ class DataReader(object):
         ----------
         to_timestamp :
         timeout : the time waiting the data ready in seconds
+        batch : whether query the data of all the categories in one query
 
         Returns
         -------
@@ -184,6 +205,9 @@ class DataReader(object):
             self.load_data()
             return False
 
+        if batch:
+            return self.move_on_batch(to_timestamp=to_timestamp, timeout=timeout)
+
         df = self.data_df.reset_index(level='timestamp')
         recorded_timestamps = df.groupby(level=0)['timestamp'].max()
 
@@ -234,6 +258,117 @@ class DataReader(object):
 
         return changed
 
+    def move_on_batch(self, to_timestamp: Union[str, pd.Timestamp] = None, timeout: int = 20) -> bool:
+        """
+        the batched move_on,query the added data of the waiting categories with the same recorded timestamp in one
+        query(timestamp > the recorded timestamp) and wait with backoff until all of them got data or timeout
+
+        Parameters
+        ----------
+        to_timestamp :
+        timeout : the time waiting the data ready in seconds
+
+        Returns
+        -------
+        whether got data
+        """
+        recorded_timestamps = pd.Series(self.data_df.index.get_level_values(1)).groupby(
+            self.data_df.index.get_level_values(0)).max()
+
+        self.logger.info('level:{},current_timestamps:\n{}'.format(self.level, recorded_timestamps))
+
+        time_column = getattr(self.data_schema, self.time_field)
+
+        changed = False
+        waiting_categories = list(recorded_timestamps.index)
+        sleeping_time = self.move_on_sleeping_time
+        start_time = time.time()
+        while True:
+            added = self.query_added_data(waiting_categories, recorded_timestamps, time_column, to_timestamp)
+
+            if df_is_not_null(added):
+                self.merge_added_data(added)
+
+                added_categories = list(added.index.unique(level=0))
+                for category in added_categories:
+                    category_added = added.loc[[category]]
+                    self.logger.info('category:{},added:\n{}'.format(category, category_added))
+
+                    for listener in self.data_listeners:
+                        listener.on_category_data_added(category=category, added_data=category_added)
+
+                changed = True
+                # if got data,the category would not wait again
+                waiting_categories = [category for category in waiting_categories if category not in added_categories]
+                # got data,poll the others quickly
+                sleeping_time = self.move_on_sleeping_time
+
+            if not waiting_categories:
+                break
+
+            cost_time = time.time() - start_time
+            if cost_time > timeout:
+                self.logger.warning(
+                    'categories:{} level:{} getting data timeout,to_timestamp:{},now:{}'.format(waiting_categories,
+                                                                                               self.level,
+                                                                                               to_timestamp,
+                                                                                               now_pd_timestamp()))
+                break
+
+            time.sleep(min(sleeping_time, timeout - cost_time))
+            sleeping_time = min(sleeping_time * 2, self.move_on_max_sleeping_time)
+
+        if changed:
+            for listener in self.data_listeners:
+                listener.on_data_changed(self.data_df)
+
+        return changed
+
+    def query_added_data(self, categories: List[str], recorded_timestamps: pd.Series, time_column,
+                         to_timestamp: Union[str, pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        query the data after the recorded timestamps of the categories,the categories with the same recorded timestamp
+        are queried together with it as the lower bound,so a late category doesn't make the others read their history
+
+        :return: the added data indexed by (category,timestamp) and sorted
+        """
+        # recorded timestamp -> categories
+        groups = {}
+        for category in categories:
+            groups.setdefault(recorded_timestamps[category], []).append(category)
+
+        dfs = []
+        for start_timestamp, the_categories in groups.items():
+            for i in range(0, len(the_categories), self.load_step):
+                filters = [self.category_column.in_(the_categories[i:i + self.load_step]),
+                           time_column > start_timestamp]
+                if self.filters:
+                    filters = self.filters + filters
+
+                df = get_data(data_schema=self.data_schema, provider=self.provider, columns=self.columns,
+                              end_timestamp=to_timestamp, filters=filters, level=self.level)
+                if df_is_not_null(df):
+                    dfs.append(df)
+
+        if not dfs:
+            return None
+
+        added = pd.concat(dfs) if len(dfs) > 1 else dfs[0]
+        return index_df_with_category_xfield(added, category_field=self.category_field, xfield=self.time_field)
+
+    def merge_added_data(self, added: pd.DataFrame):
+        """
+        merge the sorted added data which is after the data of its category,the concatenated rows are sorted by
+        category stably,the timestamps of the category are kept in order without sorting the whole data again
+
+        :param added: the added data indexed by (category,timestamp) and sorted
+        """
+        df = pd.concat([self.data_df, added])
+
+        codes, _ = pd.factorize(df.index.get_level_values(0), sort=True)
+        # the two sorted runs are merged in linear time by the stable sort(timsort)
+        self.data_df = df.iloc[np.argsort(codes, kind='stable')]
+
     def register_data_listener(self, listener):
         if listener not in self.data_listeners:
             self.data_listeners.append(listener)
@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 import logging
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import groupby
 from typing import List
 
 import pandas as pd
+from sqlalchemy import bindparam, func
 from sqlalchemy.orm import Session
 
 from zvdata.api import get_entities, get_data
-from zvdata.domain import get_db_session
+from zvdata.domain import get_db_session, get_db_storage
+from zvdata.parquet_store import read_parquet, append_parquet
 from zvdata.structs import IntervalLevel
-from zvdata.utils.time_utils import is_same_date, now_pd_timestamp, to_pd_timestamp, TIME_FORMAT_DAY, to_time_str
-from zvdata.utils.utils import fill_domain_from_dict
+from zvdata.utils.pd_utils import df_is_not_null, df_to_records
+from zvdata.utils.rate_limit_utils import get_or_register_rate_limit, provider_rate_limits
+from zvdata.utils.time_utils import is_same_date, now_pd_timestamp, to_pd_timestamp, TIME_FORMAT_DAY, to_time_str, \
+    to_time_strs
+from zvdata.utils.utils import fill_domain_from_dict, fill_dict_from_dict, none_values
 
 
 class Recorder(object):
@@ -119,6 +127,23 @@ class RecorderForEntities(Recorder):
 
 
 class TimeSeriesDataRecorder(RecorderForEntities):
+    # set it to True to persist the records with one query for the existing ids and executemany for the writes,
+    # instead of querying and committing the domain objects one by one,the DataFrame from record is always persisted
+    # in bulk
+    bulk_persist: bool = False
+    # sqlite limits the variable number of one statement,the entities are queried in chunks of it
+    load_step: int = 500
+
+    # settings for fetching the entities concurrently,concurrency > 1 means using a thread pool in run
+    concurrency: int = 1
+    # max requests per second of the recorder,None means using the limit of the provider in provider_rate_limits
+    rate_limit: float = None
+    # retry times and the base seconds of exponential backoff when record failed
+    retry_times: int = 0
+    retry_backoff: float = 1
+    # the policy when recording an entity failed,'raise':stop the run and raise the error,'skip':just log it and go on
+    failure_policy: str = 'raise'
+
     def __init__(self,
                  entity_type='stock',
                  exchanges=['sh', 'sz'],
@@ -140,8 +165,14 @@ class TimeSeriesDataRecorder(RecorderForEntities):
         self.start_timestamp = to_pd_timestamp(start_timestamp)
         self.end_timestamp = to_pd_timestamp(end_timestamp)
 
+        # entity_id -> latest saved timestamp,loaded for all the entities in one query and updated when persisting
+        self.latest_timestamps: dict = None
+
         super().__init__(entity_type, exchanges, entity_ids, codes, batch_size, force_update, sleeping_time)
 
+        # 'sqlite' or 'parquet'
+        self.storage = get_db_storage(provider=self.provider, data_schema=self.data_schema)
+
     def get_latest_saved_record(self, entity):
         order = eval('self.data_schema.{}.desc()'.format(self.get_evaluated_time_field()))
 
@@ -153,12 +184,81 @@ class TimeSeriesDataRecorder(RecorderForEntities):
                         return_type='domain',
                         session=self.session)
 
+    def get_latest_timestamps_filters(self):
+        """
+        the filters for loading the latest timestamps,e.g,level for kdata
+
+        """
+        return []
+
+    def load_latest_timestamps(self):
+        """
+        load max(evaluated time field) group by entity_id for all the entities
+
+        :return: entity_id -> latest saved timestamp
+        :rtype: dict
+        """
+        time_field = getattr(self.data_schema, self.get_evaluated_time_field())
+        entity_ids = [entity.id for entity in self.entities]
+
+        latest_timestamps = {}
+
+        if self.storage == 'parquet':
+            df = read_parquet(self.data_schema, provider=self.provider, entity_ids=entity_ids,
+                              columns=['entity_id', time_field.name], filters=self.get_latest_timestamps_filters(),
+                              time_field=time_field.name)
+            if df_is_not_null(df):
+                for entity_id, latest_timestamp in df.groupby('entity_id')[time_field.name].max().items():
+                    latest_timestamps[entity_id] = to_pd_timestamp(latest_timestamp)
+            return latest_timestamps
+
+        for i in range(0, len(entity_ids), self.load_step):
+            query = self.session.query(self.data_schema.entity_id, func.max(time_field)).filter(
+                self.data_schema.entity_id.in_(entity_ids[i:i + self.load_step]))
+            for the_filter in self.get_latest_timestamps_filters():
+                query = query.filter(the_filter)
+
+            for entity_id, latest_timestamp in query.group_by(self.data_schema.entity_id):
+                if latest_timestamp:
+                    latest_timestamps[entity_id] = to_pd_timestamp(latest_timestamp)
+
+        return latest_timestamps
+
+    def get_latest_saved_timestamp(self, entity):
+        """
+        get the latest saved timestamp of the entity from the cache,the cache is loaded in one query at the first call
+
+        """
+        if self.latest_timestamps is None:
+            self.latest_timestamps = self.load_latest_timestamps()
+            self.logger.info(
+                'load latest timestamps of {} for {} entities'.format(self.data_schema, len(self.latest_timestamps)))
+
+        return self.latest_timestamps.get(entity.id)
+
+    def update_latest_timestamp(self, entity, timestamps):
+        """
+        update the latest timestamp cache after persisting
+
+        :param entity:
+        :param timestamps: the persisted timestamps
+        """
+        if self.latest_timestamps is None or timestamps is None or len(timestamps) == 0:
+            return
+
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None and not pd.isna(timestamp)]
+        if not timestamps:
+            return
+
+        latest_timestamp = max(to_pd_timestamp(timestamp) for timestamp in timestamps)
+        saved_timestamp = self.latest_timestamps.get(entity.id)
+        if saved_timestamp is None or latest_timestamp > saved_timestamp:
+            self.latest_timestamps[entity.id] = latest_timestamp
+
     def evaluate_start_end_size_timestamps(self, entity):
-        latest_saved_record = self.get_latest_saved_record(entity=entity)
+        latest_timestamp = self.get_latest_saved_timestamp(entity=entity)
 
-        if latest_saved_record:
-            latest_timestamp = eval('latest_saved_record[0].{}'.format(self.get_evaluated_time_field()))
-        else:
+        if not latest_timestamp:
             latest_timestamp = entity.timestamp
 
         if not latest_timestamp:
@@ -183,7 +283,8 @@ class TimeSeriesDataRecorder(RecorderForEntities):
 
     def record(self, entity, start, end, size, timestamps):
         """
-        implement the recording logic in this method, should return json or domain list
+        implement the recording logic in this method, should return json list, domain list or pd.DataFrame,
+        the DataFrame would be handled by column in generate_df and persist_df
 
         :param entity:
         :type entity:
@@ -224,6 +325,87 @@ class TimeSeriesDataRecorder(RecorderForEntities):
         timestamp = to_time_str(original_data[self.get_original_time_field()], fmt=time_fmt)
         return "{}_{}".format(entity.id, timestamp)
 
+    def generate_domain_ids(self, entity, df, time_fmt=TIME_FORMAT_DAY):
+        """
+        the vectorized version of generate_domain_id,overwrite it if generate_domain_id is overwritten
+
+        :param entity:
+        :type entity:
+        :param df: the DataFrame returned by record
+        :type df: pd.DataFrame
+        :param time_fmt:
+        :type time_fmt:
+        :return:
+        :rtype: pd.Series
+        """
+        # generate_domain_id is overwritten,just call it for every row
+        if type(self).generate_domain_id is not TimeSeriesDataRecorder.generate_domain_id:
+            return df.apply(lambda x: self.generate_domain_id(entity, x), axis=1)
+
+        return entity.id + '_' + to_time_strs(df[self.get_original_time_field()], fmt=time_fmt).values
+
+    def generate_df(self, entity, df):
+        """
+        generate the DataFrame of data_schema using entity and the DataFrame from record,it's the vectorized version
+        of generate_domain
+
+        :param entity:
+        :param df:
+        :return: the DataFrame with schema columns and 'origin_id'(the id before fixing duplicate)
+        :rtype: pd.DataFrame
+        """
+        df = df.reset_index(drop=True)
+
+        result = pd.DataFrame(index=df.index)
+        result['id'] = self.generate_domain_ids(entity, df)
+        result['code'] = entity.code
+        result['entity_id'] = entity.id
+        result['timestamp'] = pd.to_datetime(df[self.get_original_time_field()])
+
+        the_map = self.get_data_map()
+        if not the_map:
+            the_map = {col: col for col in df.columns}
+
+        for k, v in the_map.items():
+            if isinstance(v, tuple):
+                field_in_df, the_func = v
+            else:
+                field_in_df, the_func = v, None
+
+            if field_in_df not in df.columns:
+                continue
+
+            s = df[field_in_df]
+            if s.dtype == object:
+                s = s.where(~s.isin(none_values), None)
+                if the_func:
+                    s = s.apply(lambda x: None if x is None else the_func(x))
+            elif the_func:
+                s = s.apply(the_func)
+
+            # keep the value generated above if the original value is null
+            if k in result.columns:
+                result[k] = s.where(s.notnull(), result[k])
+            else:
+                result[k] = s
+
+        columns = self.data_schema.__table__.columns.keys()
+        result = result.loc[:, [col for col in result.columns if col in columns]]
+
+        result['origin_id'] = result['id']
+        # handle the case  generate_domain_id generate duplicate id
+        duplicated = result['id'].duplicated()
+        if duplicated.any():
+            if self.fix_duplicate_way == 'add':
+                # regenerate the id
+                result.loc[duplicated, 'id'] = result.loc[duplicated, 'id'] + '_' + \
+                                               duplicated.cumsum()[duplicated].astype(str)
+            else:
+                # ignore
+                result = result[~duplicated]
+
+        return result
+
     def generate_domain(self, entity, original_data):
         """
         generate the data_schema instance using entity and original_data,the original_data is from record result
@@ -289,96 +471,424 @@ class TimeSeriesDataRecorder(RecorderForEntities):
             self.session.add_all(domain_list)
             self.session.commit()
 
+            self.update_latest_timestamp(entity, [getattr(item, self.get_evaluated_time_field()) for item in
+                                                  domain_list])
+
+    def generate_record(self, entity, original_data):
+        """
+        generate the plain dict record of data_schema using entity and original_data,it's the bulk_persist version of
+        generate_domain
+
+        :param entity:
+        :param original_data:
+        """
+        columns = self.data_schema.__table__.columns.keys()
+
+        if isinstance(original_data, self.data_schema):
+            return {k: v for k, v in original_data.__dict__.items() if k in columns and v is not None}
+
+        the_id = self.generate_domain_id(entity, original_data)
+
+        timestamp = None
+        try:
+            timestamp = to_pd_timestamp(original_data[self.get_original_time_field()])
+        except Exception as e:
+            self.logger.exception(e)
+
+        record = {'id': the_id,
+                  'code': entity.code,
+                  'entity_id': entity.id,
+                  'timestamp': timestamp}
+
+        fill_dict_from_dict(record, original_data, self.get_data_map())
+
+        return {k: v for k, v in record.items() if k in columns}
+
+    def get_saved_records(self, entity, start_timestamp, columns):
+        """
+        get the saved records of the entity which could be conflicted with the recording data in one query
+
+        :param entity:
+        :param start_timestamp: the min timestamp of the recording data,None means all
+        :param columns: the columns to load
+        :return: id -> saved record
+        :rtype: dict
+        """
+        table = self.data_schema.__table__
+        query = self.session.query(*[table.c[col] for col in columns]).filter(table.c.entity_id == entity.id)
+
+        # the saved timestamp could be moved forward(e.g,report date -> publish date),so just use the start of window
+        if start_timestamp is not None:
+            query = query.filter(table.c.timestamp >= start_timestamp)
+
+        return {row[0]: dict(zip(columns, row)) for row in query}
+
+    def persist_records(self, entity, records):
+        """
+        persist the records in bulk,the existing ids are loaded in one query and the new or changed records are
+        written with executemany
+
+        :param entity:
+        :param records: list of (origin_id,record),origin_id is the id before fixing duplicate
+        """
+        if not records:
+            return
+
+        table = self.data_schema.__table__
+
+        columns = ['id']
+        if self.force_update:
+            for _, record in records:
+                columns += [col for col in record if col not in columns]
+
+        start_timestamp = None
+        timestamps = [record.get('timestamp') for _, record in records]
+        if all(timestamp is not None for timestamp in timestamps):
+            start_timestamp = min(timestamps)
+
+        saved = self.get_saved_records(entity, start_timestamp, columns)
+
+        inserts = []
+        updates = []
+        for origin_id, record in records:
+            if origin_id in saved and not self.force_update:
+                continue
+
+            saved_record = saved.get(record['id'])
+            if saved_record is None:
+                inserts.append(record)
+            elif self.force_update:
+                changed = {k: v for k, v in record.items() if k != 'id' and saved_record.get(k) != v}
+                if changed:
+                    changed['_id'] = record['id']
+                    updates.append(changed)
+
+        ignored = len(records) - len(inserts) - len(updates)
+        if ignored:
+            self.logger.info('ignore {} data of {} for entity_id:{} saved before'.format(ignored, self.data_schema,
+                                                                                        entity.id))
+
+        if not inserts and not updates:
+            return
+
+        timestamps = [record['timestamp'] for record in inserts + updates if record.get('timestamp') is not None]
+        if timestamps:
+            self.logger.info(
+                "persist {} for entity_id:{},time interval:[{},{}],insert:{},update:{}".format(
+                    self.data_schema, entity.id, min(timestamps), max(timestamps), len(inserts), len(updates)))
+
+        # executemany needs the same keys in every parameter set
+        for keys, group in groupby(sorted(inserts, key=lambda x: sorted(x.keys())), key=lambda x: sorted(x.keys())):
+            self.session.execute(table.insert(), list(group))
+
+        for keys, group in groupby(sorted(updates, key=lambda x: sorted(x.keys())), key=lambda x: sorted(x.keys())):
+            stmt = table.update().where(table.c.id == bindparam('_id')).values(
+                {key: bindparam(key) for key in keys if key != '_id'})
+            self.session.execute(stmt, list(group))
+
+        self.session.commit()
+
+        time_field = self.get_evaluated_time_field()
+        self.update_latest_timestamp(entity, [record.get(time_field) for record in inserts + updates])
+
+    def persist_df(self, entity, df):
+        """
+        the vectorized version of persist_records
+
+        :param entity:
+        :param df: the DataFrame from generate_df
+        """
+        if not df_is_not_null(df):
+            return
+
+        table = self.data_schema.__table__
+        data_columns = [col for col in df.columns if col != 'origin_id']
+
+        columns = ['id']
+        if self.force_update:
+            columns = data_columns
+
+        start_timestamp = None
+        if df['timestamp'].notnull().all():
+            start_timestamp = df['timestamp'].min()
+
+        saved = self.get_saved_records(entity, start_timestamp, columns)
+        saved_df = pd.DataFrame(list(saved.values()), columns=columns)
+
+        new_rows = ~df['id'].isin(saved_df['id'])
+        if not self.force_update:
+            new_rows = new_rows & ~df['origin_id'].isin(saved_df['id'])
+        inserts = df.loc[new_rows, data_columns]
+
+        updates = None
+        if self.force_update:
+            # just update the changed rows
+            current = df.loc[df['id'].isin(saved_df['id']), data_columns].set_index('id', drop=False)
+            if not current.empty:
+                before = saved_df.set_index('id', drop=False).loc[current.index, data_columns]
+                before['timestamp'] = pd.to_datetime(before['timestamp'])
+                changed = ((current != before) & ~(current.isnull() & before.isnull())).any(axis=1)
+                updates = current[changed]
+
+        update_size = 0 if updates is None else len(updates)
+        ignored = len(df) - len(inserts) - update_size
+        if ignored:
+            self.logger.info('ignore {} data of {} for entity_id:{} saved before'.format(ignored, self.data_schema,
+                                                                                        entity.id))
+
+        if inserts.empty and not update_size:
+            return
+
+        self.logger.info(
+            "persist {} for entity_id:{},time interval:[{},{}],insert:{},update:{}".format(
+                self.data_schema, entity.id, df['timestamp'].min(), df['timestamp'].max(), len(inserts), update_size))
+
+        if not inserts.empty:
+            self.session.execute(table.insert(), df_to_records(inserts))
+
+        if update_size:
+            updates = updates.rename(columns={'id': '_id'})
+            stmt = table.update().where(table.c.id == bindparam('_id')).values(
+                {key: bindparam(key) for key in updates.columns if key != '_id'})
+            self.session.execute(stmt, df_to_records(updates))
+
+        self.session.commit()
+
+        time_field = self.get_evaluated_time_field()
+        if time_field in inserts.columns:
+            self.update_latest_timestamp(entity, inserts[time_field])
+        if update_size and time_field in updates.columns:
+            self.update_latest_timestamp(entity, updates[time_field])
+
+    def persist_parquet(self, entity, df):
+        """
+        append the df to the parquet dataset,for the schema registered with parquet storage
+
+        :param entity:
+        :param df: the DataFrame from generate_df
+        """
+        if not df_is_not_null(df):
+            return
+
+        size = append_parquet(df, provider=self.provider, data_schema=self.data_schema,
+                              force_update=self.force_update)
+
+        self.logger.info(
+            "persist {} for entity_id:{},time interval:[{},{}],size:{}".format(
+                self.data_schema, entity.id, df['timestamp'].min(), df['timestamp'].max(), size))
+
+        time_field = self.get_evaluated_time_field()
+        if size and time_field in df.columns:
+            self.update_latest_timestamp(entity, df[time_field])
+
     def on_finish(self):
         self.session.close()
 
     def on_finish_entity(self, entity):
         pass
 
+    def get_rate_limit(self):
+        """
+        the requests per second,rate_limit of the recorder is always applied.the concurrent run without it is
+        throttled by the limit of the provider in provider_rate_limits,or by sleeping_time as the sequential run which
+        sleeps sleeping_time between the requests
+
+        """
+        if self.rate_limit:
+            return self.rate_limit
+        if self.concurrency > 1:
+            if provider_rate_limits.get(self.provider):
+                return provider_rate_limits[self.provider]
+            if self.sleeping_time:
+                return 1 / self.sleeping_time
+        return None
+
+    def get_rate_limiter(self, entity):
+        """
+        get the token bucket for requesting the data of the entity,the bucket is shared by all the recorders with the
+        same rate limit key
+
+        :param entity:
+        :return:
+        :rtype: TokenBucket
+        """
+        rate_limit = self.get_rate_limit()
+        if not rate_limit:
+            return None
+        return get_or_register_rate_limit(self.get_rate_limit_key(entity), rate=rate_limit)
+
+    def get_rate_limit_key(self, entity):
+        """
+        overwrite it if the rate limit is not for the whole provider,e.g,coin exchanges
+
+        """
+        return self.provider
+
+    def record_with_retry(self, entity, start, end, size, timestamps):
+        """
+        call record with rate limit and retry,it's safe to be called in worker thread if record not using the session
+
+        """
+        rate_limiter = self.get_rate_limiter(entity)
+        retry = 0
+        while True:
+            if rate_limiter:
+                rate_limiter.acquire()
+            try:
+                return self.record(entity, start=start, end=end, size=size, timestamps=timestamps)
+            except Exception as e:
+                if retry >= self.retry_times:
+                    raise e
+                # exponential backoff with jitter
+                backoff = self.retry_backoff * (2 ** retry) * (1 + random.random())
+                self.logger.warning(
+                    'recording data for entity_id:{},{},error:{},retry after {} seconds'.format(entity.id,
+                                                                                              self.data_schema,
+                                                                                              e, backoff))
+                time.sleep(backoff)
+                retry += 1
+
+    def evaluate_entity(self, entity_item):
+        latest_timestamp, end_timestamp, size, timestamps = self.evaluate_start_end_size_timestamps(entity_item)
+
+        if timestamps:
+            self.logger.info('entity_id:{},evaluate_start_end_size_timestamps result:{},{},{},{}-{}'.format(
+                entity_item.id,
+                latest_timestamp,
+                end_timestamp,
+                size,
+                timestamps[0],
+                timestamps[-1]))
+        else:
+            self.logger.info('entity_id:{},evaluate_start_end_size_timestamps result:{},{},{},{}'.format(
+                entity_item.id,
+                latest_timestamp,
+                end_timestamp,
+                size,
+                timestamps))
+
+        return latest_timestamp, end_timestamp, size, timestamps
+
+    def persist_original_list(self, entity_item, original_list):
+        """
+        generate and persist the domains from the record result,the only place writing the recorded data to db
+
+        :param entity_item:
+        :param original_list: json list, domain list or pd.DataFrame
+        """
+        if isinstance(original_list, pd.DataFrame):
+            if df_is_not_null(original_list):
+                if self.storage == 'parquet':
+                    self.persist_parquet(entity_item, self.generate_df(entity_item, original_list))
+                else:
+                    self.persist_df(entity_item, self.generate_df(entity_item, original_list))
+        elif original_list and (self.bulk_persist or self.storage == 'parquet'):
+            records = []
+            ids = set()
+            duplicate_count = 0
+            for original_item in original_list:
+                record = self.generate_record(entity_item, original_item)
+                origin_id = record['id']
+                # handle the case  generate_domain_id generate duplicate id
+                if origin_id in ids:
+                    # regenerate the id
+                    if self.fix_duplicate_way == 'add':
+                        duplicate_count += 1
+                        record['id'] = "{}_{}".format(origin_id, duplicate_count)
+                    # ignore
+                    else:
+                        continue
+                ids.add(record['id'])
+                records.append((origin_id, record))
+
+            if self.storage == 'parquet':
+                self.persist_parquet(entity_item, pd.DataFrame(
+                    [dict(record, origin_id=origin_id) for origin_id, record in records]))
+            else:
+                self.persist_records(entity_item, records)
+        elif original_list:
+            domain_list = []
+            duplicate_count = 0
+            for original_item in original_list:
+                domain_item = self.generate_domain(entity_item, original_item)
+                # handle the case  generate_domain_id generate duplicate id
+                if domain_item:
+                    duplicate = [item for item in domain_list if item.id == domain_item.id]
+                    if duplicate:
+                        # regenerate the id
+                        if self.fix_duplicate_way == 'add':
+                            duplicate_count += 1
+                            domain_item.id = "{}_{}".format(domain_item.id, duplicate_count)
+                        # ignore
+                        else:
+                            continue
+
+                    domain_list.append(domain_item)
+
+            if domain_list:
+                self.persist(entity_item, domain_list)
+            else:
+                self.logger.info('just get {} duplicated data in this cycle'.format(len(original_list)))
+
+    def is_finished(self, original_list):
+        # no  more data or force set to one shot means finished
+        return original_list is None or len(original_list) == 0 or self.one_shot
+
+    def finish_entity(self, entity_item, latest_timestamp, refresh_latest_timestamp=True):
+        if refresh_latest_timestamp:
+            latest_saved_timestamp = self.get_latest_saved_timestamp(entity=entity_item)
+            if latest_saved_timestamp:
+                latest_timestamp = latest_saved_timestamp
+
+        self.logger.info(
+            "finish recording {} for entity_id:{},latest_timestamp:{}".format(
+                self.data_schema,
+                entity_item.id,
+                latest_timestamp))
+        self.on_finish_entity(entity_item)
+
+    def on_entity_failed(self, entity_item, e):
+        self.logger.exception(
+            "recording data for entity_id:{},{},error:{}".format(entity_item.id, self.data_schema, e))
+        self.failed_entities.append(entity_item)
+
     def run(self):
+        self.failed_entities = []
+
+        if self.concurrency > 1:
+            return self.run_concurrently()
+
         finished_items = []
         unfinished_items = self.entities
         raising_exeption = None
         while True:
             for entity_item in unfinished_items:
                 try:
-                    latest_timestamp, end_timestamp, size, timestamps = self.evaluate_start_end_size_timestamps(
-                        entity_item)
-
-                    if timestamps:
-                        self.logger.info('entity_id:{},evaluate_start_end_size_timestamps result:{},{},{},{}-{}'.format(
-                            entity_item.id,
-                            latest_timestamp,
-                            end_timestamp,
-                            size,
-                            timestamps[0],
-                            timestamps[-1]))
-                    else:
-                        self.logger.info('entity_id:{},evaluate_start_end_size_timestamps result:{},{},{},{}'.format(
-                            entity_item.id,
-                            latest_timestamp,
-                            end_timestamp,
-                            size,
-                            timestamps))
+                    latest_timestamp, end_timestamp, size, timestamps = self.evaluate_entity(entity_item)
 
                     # no more to record
                     if size == 0:
                         finished_items.append(entity_item)
-                        self.logger.info(
-                            "finish recording {} for entity_id:{},latest_timestamp:{}".format(
-                                self.data_schema,
-                                entity_item.id,
-                                latest_timestamp))
-                        self.on_finish_entity(entity_item)
+                        self.finish_entity(entity_item, latest_timestamp, refresh_latest_timestamp=False)
                         continue
 
-                    original_list = self.record(entity_item, start=latest_timestamp, end=end_timestamp, size=size,
-                                                timestamps=timestamps)
-
-                    if original_list:
-                        domain_list = []
-                        duplicate_count = 0
-                        for original_item in original_list:
-                            domain_item = self.generate_domain(entity_item, original_item)
-                            # handle the case  generate_domain_id generate duplicate id
-                            if domain_item:
-                                duplicate = [item for item in domain_list if item.id == domain_item.id]
-                                if duplicate:
-                                    # regenerate the id
-                                    if self.fix_duplicate_way == 'add':
-                                        duplicate_count += 1
-                                        domain_item.id = "{}_{}".format(domain_item.id, duplicate_count)
-                                    # ignore
-                                    else:
-                                        continue
-
-                                domain_list.append(domain_item)
-
-                        if domain_list:
-                            self.persist(entity_item, domain_list)
-                        else:
-                            self.logger.info('just get {} duplicated data in this cycle'.format(len(original_list)))
+                    original_list = self.record_with_retry(entity_item, start=latest_timestamp, end=end_timestamp,
+                                                           size=size, timestamps=timestamps)
 
-                    # no  more data or force set to one shot means finished
-                    if not original_list or self.one_shot:
-                        finished_items.append(entity_item)
+                    self.persist_original_list(entity_item, original_list)
 
-                        latest_saved_record = self.get_latest_saved_record(entity=entity_item)
-                        if latest_saved_record:
-                            latest_timestamp = eval('latest_saved_record[0].{}'.format(self.get_evaluated_time_field()))
-
-                        self.logger.info(
-                            "finish recording {} for entity_id:{},latest_timestamp:{}".format(
-                                self.data_schema,
-                                entity_item.id,
-                                latest_timestamp))
-                        self.on_finish_entity(entity_item)
+                    if self.is_finished(original_list):
+                        finished_items.append(entity_item)
+                        self.finish_entity(entity_item, latest_timestamp)
                         continue
 
                     time.sleep(self.sleeping_time)
                 except Exception as e:
-                    self.logger.exception(
-                        "recording data for entity_id:{},{},error:{}".format(entity_item.id, self.data_schema, e))
+                    self.on_entity_failed(entity_item, e)
+                    if self.failure_policy == 'skip':
+                        finished_items.append(entity_item)
+                        continue
+
                     raising_exeption = e
                     finished_items = unfinished_items
                     break
@@ -393,6 +903,66 @@ class TimeSeriesDataRecorder(RecorderForEntities):
         if raising_exeption:
             raise raising_exeption
 
+    def run_concurrently(self):
+        """
+        fetch the entities in a thread pool,the rate limiter of the provider controls the request speed instead of
+        sleeping_time.all the db operations are still in the calling thread,so the commits are serialized
+
+        """
+        unfinished_items = list(self.entities)
+        raising_exeption = None
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while unfinished_items and not raising_exeption:
+                future_map_entity = {}
+                next_items = []
+
+                for entity_item in unfinished_items:
+                    try:
+                        latest_timestamp, end_timestamp, size, timestamps = self.evaluate_entity(entity_item)
+
+                        # no more to record
+                        if size == 0:
+                            self.finish_entity(entity_item, latest_timestamp, refresh_latest_timestamp=False)
+                            continue
+
+                        future = executor.submit(self.record_with_retry, entity_item, latest_timestamp,
+                                                 end_timestamp, size, timestamps)
+                        future_map_entity[future] = (entity_item, latest_timestamp)
+                    except Exception as e:
+                        self.on_entity_failed(entity_item, e)
+                        if self.failure_policy != 'skip':
+                            raising_exeption = e
+                            break
+
+                for future in as_completed(future_map_entity):
+                    entity_item, latest_timestamp = future_map_entity[future]
+                    try:
+                        original_list = future.result()
+                        # single writer
+                        self.persist_original_list(entity_item, original_list)
+
+                        if self.is_finished(original_list):
+                            self.finish_entity(entity_item, latest_timestamp)
+                        else:
+                            next_items.append(entity_item)
+                    except Exception as e:
+                        self.on_entity_failed(entity_item, e)
+                        if self.failure_policy != 'skip' and not raising_exeption:
+                            raising_exeption = e
+
+                unfinished_items = next_items
+
+        self.on_finish()
+
+        if self.failed_entities:
+            self.logger.warning('recording {} failed for entity_ids:{}'.format(self.data_schema,
+                                                                              [item.id for item in
+                                                                               self.failed_entities]))
+
+        if raising_exeption:
+            raise raising_exeption
+
 
 class FixedCycleDataRecorder(TimeSeriesDataRecorder):
     def __init__(self,
@@ -437,13 +1007,17 @@ class FixedCycleDataRecorder(TimeSeriesDataRecorder):
                         session=self.session,
                         level=self.level.value)
 
+    def get_latest_timestamps_filters(self):
+        # some schema has no level,just ignore it
+        if hasattr(self.data_schema, 'level'):
+            return [self.data_schema.level == self.level.value]
+        return []
+
     def evaluate_start_end_size_timestamps(self, entity):
-        # get latest record
-        latest_saved_record = self.get_latest_saved_record(entity=entity)
+        # get latest timestamp
+        latest_timestamp = self.get_latest_saved_timestamp(entity=entity)
 
-        if latest_saved_record:
-            latest_timestamp = latest_saved_record[0].timestamp
-        else:
+        if not latest_timestamp:
             latest_timestamp = entity.timestamp
 
         if not latest_timestamp:
@@ -520,6 +1094,8 @@ class FixedCycleDataRecorder(TimeSeriesDataRecorder):
             self.session.add_all(saving_datas)
             self.session.commit()
 
+            self.update_latest_timestamp(entity, [item.timestamp for item in saving_datas])
+
 
 class TimestampsDataRecorder(TimeSeriesDataRecorder):
 
@@ -554,11 +1130,11 @@ class TimestampsDataRecorder(TimeSeriesDataRecorder):
         self.logger.info(
             'entity_id:{},timestamps start:{},end:{}'.format(entity.id, timestamps[0], timestamps[-1]))
 
-        latest_record = self.get_latest_saved_record(entity=entity)
+        latest_timestamp = self.get_latest_saved_timestamp(entity=entity)
 
-        if latest_record:
-            self.logger.info('latest record timestamp:{}'.format(latest_record[0].timestamp))
-            timestamps = [t for t in timestamps if t > latest_record[0].timestamp]
+        if latest_timestamp:
+            self.logger.info('latest record timestamp:{}'.format(latest_timestamp))
+            timestamps = [t for t in timestamps if t > latest_timestamp]
 
             if timestamps:
                 return timestamps[0], timestamps[-1], len(timestamps), timestamps
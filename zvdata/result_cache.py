@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import copy
+import inspect
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+
+from zvdata.api import get_data_version
+from zvdata.domain import get_adjuster
+from zvdata.sedes import Jsonable, CustomJsonEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class ResultKeyEncoder(CustomJsonEncoder):
+    def default(self, obj):
+        if isinstance(obj, InstrumentedAttribute):
+            return obj.name
+        try:
+            return super().default(obj)
+        except TypeError:
+            return str(obj)
+
+
+class ResultCache(object):
+    """
+    the size-bounded lru cache of the loaded DataReader/Factor,keyed on the canonical json of the constructor args,
+    the result is reloaded once the data version(files modified time and size) of its table or the version of its
+    DataAdjuster changed
+
+    """
+
+    def __init__(self, max_size: int = 32) -> None:
+        self.max_size = max_size
+        # key -> ((data version,adjuster version),the loaded DataReader/Factor)
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def get_key(reader) -> str:
+        if isinstance(reader, Jsonable):
+            result = reader.__json__()
+        else:
+            result = Jsonable.__json__(reader)
+        result.pop('auto_load', None)
+
+        # the columns are kept as a set by the reader
+        columns = result.get('columns')
+        if columns:
+            result['columns'] = sorted(col if type(col) == str else col.name for col in columns)
+
+        return '{}:{}'.format(type(reader).__name__, json.dumps(result, sort_keys=True, cls=ResultKeyEncoder))
+
+    @staticmethod
+    def get_view(reader):
+        """
+        the shallow copy of the cached reader for one caller,the attributes set(e.g,normal_data by data_drawer) and the
+        columns added to its dfs are not seen by the others,while the values of the dfs are shared without copying
+
+        """
+        view = copy.copy(reader)
+        for name in ('data_df', 'depth_df', 'result_df'):
+            df = getattr(view, name, None)
+            if df is not None:
+                setattr(view, name, df.copy(deep=False))
+        return view
+
+    def get(self, reader_cls, *args, **kwargs):
+        """
+        get the loaded reader_cls(*args, **kwargs) from the cache,construct and load it if missing or out of date
+
+        :param reader_cls: DataReader or the Factor class
+        :return: the view of the loaded DataReader/Factor,the values of its dfs are shared by the callers and should
+        not be modified in place
+        """
+        arguments = inspect.signature(reader_cls).bind(*args, **kwargs).arguments
+        arguments['auto_load'] = False
+        reader = reader_cls(**arguments)
+
+        key = self.get_key(reader)
+        data_version = get_data_version(data_schema=reader.data_schema, provider=reader.provider)
+        adjuster = get_adjuster(provider=reader.provider, data_schema=reader.data_schema)
+        token = (data_version, adjuster.get_version() if adjuster else 0)
+
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None:
+                if cached[0] == token:
+                    self.hits += 1
+                    self.results.move_to_end(key)
+                    return self.get_view(cached[1])
+                # the table is written or the adjustment changed
+                self.invalidations += 1
+                del self.results[key]
+            self.misses += 1
+
+        reader.load_data()
+
+        with self.lock:
+            self.results[key] = (token, reader)
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+        logger.info('cache {},data version:{}'.format(key, data_version))
+        return self.get_view(reader)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {'size': len(self.results),
+                    'max_size': self.max_size,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'invalidations': self.invalidations,
+                    'hit_rate': self.hits / total if total else 0}
+
+    def get_metrics_str(self) -> str:
+        metrics = self.get_metrics()
+        return 'result cache size:{}/{},hits:{},misses:{},invalidations:{},hit rate:{:.0%}'.format(
+            metrics['size'], metrics['max_size'], metrics['hits'], metrics['misses'], metrics['invalidations'],
+            metrics['hit_rate'])
+
+
+# shared by the apps
+result_cache = ResultCache()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def to_numeric_x(x):
+    """
+    the x used in the computing,the timestamps are converted to int64 nanoseconds
+
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if x.dtype == object:
+        return pd.to_datetime(x).values.astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling,keep the first and last points and the point making the largest
+    triangle with the selected point of the previous bucket and the average point of the next bucket
+
+    :param x: the sorted x
+    :param y: the y without nan
+    :param threshold: the points to keep
+    :return: the positions of the kept points
+    :rtype:np.ndarray
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = to_numeric_x(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    every = (size - 2) / (threshold - 2)
+    positions = np.empty(threshold, dtype=np.int64)
+    positions[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # the average point of the next bucket
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, size)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        range_start = int(math.floor(i * every)) + 1
+        range_end = int(math.floor((i + 1) * every)) + 1
+        areas = np.abs((x[a] - avg_x) * (y[range_start:range_end] - y[a]) -
+                       (x[a] - x[range_start:range_end]) * (avg_y - y[a]))
+        a = range_start + int(np.argmax(areas))
+        positions[i + 1] = a
+
+    positions[-1] = size - 1
+    return positions
+
+
+def min_max(x, y, threshold):
+    """
+    keep the min and max points of every bucket,the first and last points are kept too
+
+    :param x: the sorted x
+    :param y: the y without nan
+    :param threshold: the points to keep
+    :return: the positions of the kept points
+    :rtype:np.ndarray
+    """
+    size = len(x)
+    if threshold >= size or threshold < 4:
+        return np.arange(size)
+
+    y = np.asarray(y, dtype=np.float64)
+
+    bucket_size = 2
+    edges = np.linspace(1, size - 1, (threshold - bucket_size) // bucket_size + 1).astype(np.int64)
+    positions = [0]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            bucket = y[start:end]
+            positions.extend(sorted((start + int(np.argmin(bucket)), start + int(np.argmax(bucket)))))
+    positions.append(size - 1)
+    return np.unique(positions)
+
+
+downsample_funcs = {
+    'lttb': lttb,
+    'minmax': min_max
+}
+
+
+def downsample(x, y, threshold, method='lttb'):
+    """
+    downsample the line to the threshold points,the nan points are dropped,the line of non-numeric y is kept as it is
+
+    :return: x,y downsampled
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if threshold is None or len(x) <= threshold:
+        return x, y
+
+    values = y
+    if not pd.api.types.is_numeric_dtype(y):
+        try:
+            values = pd.to_numeric(y)
+        except (ValueError, TypeError):
+            # e.g,the string labels could not be compared by value
+            return x, y
+
+    valid = ~pd.isna(values)
+    x = x[valid]
+    y = y[valid]
+
+    positions = downsample_funcs[method](x, values[valid], threshold)
+    return x[positions], y[positions]
+
+
+def downsample_ohlc(df: pd.DataFrame, threshold, open_col='open', close_col='close', high_col='high', low_col='low'):
+    """
+    merge the bars into the threshold bars,the first open,the max high,the min low and the last close of the merged
+    bars
+
+    :param df: the kdata indexed by the timestamp
+    :return: the df merged
+    """
+    size = len(df)
+    if threshold is None or size <= threshold:
+        return df
+
+    # the bar of the merged bars is at the first timestamp
+    groups = np.arange(size) * threshold // size
+    grouped = df.groupby(groups)
+    result = pd.DataFrame({open_col: grouped[open_col].first(),
+                           close_col: grouped[close_col].last(),
+                           high_col: grouped[high_col].max(),
+                           low_col: grouped[low_col].min()})
+    result.index = df.index[np.flatnonzero(np.diff(groups, prepend=-1))]
+    return result
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from typing import List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_host(url: str) -> str:
+    parts = urlsplit(url)
+    return '{}://{}'.format(parts.scheme, parts.netloc)
+
+
+def get_backoff_seconds(attempt: int, backoff_factor: float, max_backoff: float) -> float:
+    """
+    the full jitter backoff,random in [0,min(max_backoff,backoff_factor*2^attempt)]
+
+    """
+    return random.uniform(0, min(max_backoff, backoff_factor * (2 ** attempt)))
+
+
+class HttpTransport(object):
+    """
+    the shared http transport,one pooled requests.Session with keep-alive per host,every request has the timeout and
+    is retried with the jittered backoff on the connection errors and the retry status
+
+    """
+    # (connect timeout,read timeout) in seconds
+    timeout = (5, 30)
+    retries = 3
+    backoff_factor = 0.5
+    max_backoff = 10
+    retry_status = (429, 500, 502, 503, 504)
+    # the connections kept for every host
+    pool_maxsize = 10
+
+    def __init__(self, timeout=None, retries: int = None, backoff_factor: float = None,
+                 pool_maxsize: int = None) -> None:
+        if timeout is not None:
+            self.timeout = timeout
+        if retries is not None:
+            self.retries = retries
+        if backoff_factor is not None:
+            self.backoff_factor = backoff_factor
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+
+        # host -> requests.Session
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, url: str) -> requests.Session:
+        host = get_host(url)
+        session = self.sessions.get(host)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers['Accept-Encoding'] = 'gzip, deflate'
+                    self.sessions[host] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        the same as requests.request with the pooled session,timeout and retries
+
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.get_session(url)
+
+        for attempt in range(self.retries + 1):
+            try:
+                resp = session.request(method, url, **kwargs)
+                if resp.status_code not in self.retry_status or attempt == self.retries:
+                    return resp
+                logger.warning('{} {} got status:{},retry:{}'.format(method, url, resp.status_code, attempt + 1))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning('{} {} failed:{},retry:{}'.format(method, url, e, attempt + 1))
+
+            time.sleep(get_backoff_seconds(attempt, self.backoff_factor, self.max_backoff))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('get', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('post', url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+
+class HttpResult(object):
+    """
+    the content read from the aiohttp response,with the same status_code,text,json() as requests.Response
+
+    """
+
+    def __init__(self, url: str, status_code: int, content: bytes, encoding: str = None) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncHttpTransport(object):
+    """
+    the asyncio http transport by aiohttp,one pooled ClientSession per host,the same timeout and retries as
+    HttpTransport
+
+    usage:
+        async with AsyncHttpTransport() as transport:
+            results = await asyncio.gather(*[transport.request('post', url, json=param) for param in params])
+    """
+    timeout = HttpTransport.timeout
+    retries = HttpTransport.retries
+    backoff_factor = HttpTransport.backoff_factor
+    max_backoff = HttpTransport.max_backoff
+    retry_status = HttpTransport.retry_status
+    pool_maxsize = HttpTransport.pool_maxsize
+
+    def __init__(self, timeout=None, retries: int = None, backoff_factor: float = None,
+                 pool_maxsize: int = None) -> None:
+        assert aiohttp is not None, 'aiohttp is needed for the async http transport'
+
+        if timeout is not None:
+            self.timeout = timeout
+        if retries is not None:
+            self.retries = retries
+        if backoff_factor is not None:
+            self.backoff_factor = backoff_factor
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+
+        # host -> aiohttp.ClientSession
+        self.sessions = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def get_session(self, url: str):
+        host = get_host(url)
+        session = self.sessions.get(host)
+        if session is None:
+            connect_timeout, read_timeout = self.timeout if type(self.timeout) == tuple else (None, self.timeout)
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_maxsize),
+                timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout),
+                headers={'Accept-Encoding': 'gzip, deflate'})
+            self.sessions[host] = session
+        return session
+
+    async def request(self, method: str, url: str, **kwargs) -> HttpResult:
+        session = self.get_session(url)
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.request(method, url, **kwargs) as resp:
+                    result = HttpResult(url=url, status_code=resp.status, content=await resp.read(),
+                                        encoding=resp.get_encoding() if resp.charset else None)
+                if result.status_code not in self.retry_status or attempt == self.retries:
+                    return result
+                logger.warning('{} {} got status:{},retry:{}'.format(method, url, result.status_code, attempt + 1))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning('{} {} failed:{},retry:{}'.format(method, url, e, attempt + 1))
+
+            await asyncio.sleep(get_backoff_seconds(attempt, self.backoff_factor, self.max_backoff))
+
+    async def close(self):
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions = {}
+
+
+def request_all(calls: List[dict], concurrency: int = 10, transport: HttpTransport = None, rate_limiter=None,
+                return_exceptions: bool = False) -> list:
+    """
+    do the requests concurrently by the async transport,sequentially by the transport if aiohttp is not installed
+
+    :param calls: the kwargs of the requests,e.g,{'method':'post','url':url,'json':param}
+    :param concurrency: the max requests at the same time
+    :param transport: the transport whose timeout and retries are used,it does the requests if aiohttp is not installed
+    :param rate_limiter: the TokenBucket of the provider acquired before every request
+    :param return_exceptions: whether return the exception in the place of the failed request instead of raising it
+    :return: the responses in the order of calls
+    """
+    transport = transport or http_transport
+    if aiohttp is None:
+        results = []
+        for call in calls:
+            if rate_limiter:
+                rate_limiter.acquire()
+            try:
+                results.append(transport.request(**call))
+            except Exception as e:
+                if not return_exceptions:
+                    raise e
+                results.append(e)
+        return results
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        async with AsyncHttpTransport(timeout=transport.timeout, retries=transport.retries,
+                                      backoff_factor=transport.backoff_factor,
+                                      pool_maxsize=concurrency) as async_transport:
+            async def request(call):
+                async with semaphore:
+                    if rate_limiter:
+                        # not blocking the loop
+                        waiting_seconds = rate_limiter.try_acquire()
+                        while waiting_seconds:
+                            await asyncio.sleep(waiting_seconds)
+                            waiting_seconds = rate_limiter.try_acquire()
+                    return await async_transport.request(**call)
+
+            return await asyncio.gather(*[request(call) for call in calls], return_exceptions=return_exceptions)
+
+    return asyncio.run(run())
+
+
+# shared by the recorders
+http_transport = HttpTransport()
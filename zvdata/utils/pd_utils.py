@@ -40,6 +40,16 @@ def df_subset(df, columns=None):
     return df
 
 
+def df_to_records(df: pd.DataFrame):
+    """
+    DataFrame to list of dict with python native values and None for null,which could be used in executemany
+
+    """
+    df = df.astype(object)
+    df = df.where(df.notnull(), None)
+    return df.to_dict(orient='records')
+
+
 def fill_with_same_index(df_list: List[pd.DataFrame]):
     idx = None
     for df in df_list:
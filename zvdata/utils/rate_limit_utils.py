@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+# key -> TokenBucket
+_rate_limiters = {}
+
+# provider -> max requests per second,shared by all the recorders of the provider when running concurrently
+provider_rate_limits = {
+    'eastmoney': 5,
+    'joinquant': 2,
+    'sina': 1
+}
+
+_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """
+    thread safe token bucket,the tokens are refilled at rate per second and at most capacity tokens could be saved
+
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        assert rate > 0
+
+        self.rate = rate
+        if capacity:
+            self.capacity = capacity
+        else:
+            self.capacity = max(1.0, rate)
+
+        self.tokens = self.capacity
+        self.updated_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_time) * self.rate)
+        self.updated_time = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        try to get the tokens
+
+        :return: 0 if got the tokens,otherwise the seconds to wait
+        :rtype: float
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """
+        block until got the tokens
+
+        """
+        while True:
+            waiting_seconds = self.try_acquire(tokens)
+            if waiting_seconds == 0:
+                return
+            time.sleep(waiting_seconds)
+
+
+def register_rate_limit(key: str, rate: float, capacity: float = None) -> TokenBucket:
+    """
+    register the rate limit for the key(provider,exchange...),the registered one would be replaced
+
+    :param key:
+    :type key: str
+    :param rate: requests per second
+    :type rate: float
+    :param capacity: max burst requests
+    :type capacity: float
+    :return:
+    :rtype: TokenBucket
+    """
+    with _lock:
+        _rate_limiters[key] = TokenBucket(rate=rate, capacity=capacity)
+        return _rate_limiters[key]
+
+
+def get_rate_limiter(key: str) -> TokenBucket:
+    return _rate_limiters.get(key)
+
+
+def get_or_register_rate_limit(key: str, rate: float, capacity: float = None) -> TokenBucket:
+    """
+    get the rate limit registered for the key,register it if not exist.the threads racing on the same key get the same
+    bucket
+
+    :param key:
+    :type key: str
+    :param rate: requests per second
+    :type rate: float
+    :param capacity: max burst requests
+    :type capacity: float
+    :return:
+    :rtype: TokenBucket
+    """
+    with _lock:
+        rate_limiter = _rate_limiters.get(key)
+        if rate_limiter is None:
+            rate_limiter = TokenBucket(rate=rate, capacity=capacity)
+            _rate_limiters[key] = rate_limiter
+        return rate_limiter
+
+
+def get_provider_rate_limiter(provider: str) -> TokenBucket:
+    """
+    get the token bucket of the provider with the rate in provider_rate_limits
+
+    :param provider:
+    :type provider: str
+    :return: None if no limit for the provider
+    :rtype: TokenBucket
+    """
+    rate = provider_rate_limits.get(provider)
+    if not rate:
+        return None
+    return get_or_register_rate_limit(provider, rate=rate)
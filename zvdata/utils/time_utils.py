@@ -50,6 +50,39 @@ def to_time_str(the_time, fmt=TIME_FORMAT_DAY):
         return the_time
 
 
+# arrow format -> strftime format
+_strftime_formats = {
+    TIME_FORMAT_DAY: '%Y-%m-%d',
+    TIME_FORMAT_DAY1: '%Y%m%d',
+    TIME_FORMAT_MINUTE: '%Y%m%d%H%M',
+    TIME_FORMAT_MINUTE1: '%H:%M'
+}
+
+
+def to_time_strs(the_times: pd.Series, fmt=TIME_FORMAT_DAY) -> pd.Series:
+    """
+    the vectorized version of to_time_str
+
+    :param the_times:
+    :type the_times: pd.Series
+    :param fmt:
+    :type fmt: str
+    :return:
+    :rtype: pd.Series
+    """
+    the_times = pd.to_datetime(pd.Series(the_times))
+
+    if fmt == TIME_FORMAT_ISO8601:
+        return the_times.dt.strftime('%Y-%m-%dT%H:%M:%S.') + \
+               (the_times.dt.microsecond // 1000).astype(str).str.zfill(3)
+
+    strftime_format = _strftime_formats.get(fmt)
+    if strftime_format:
+        return the_times.dt.strftime(strftime_format)
+
+    return the_times.apply(lambda x: to_time_str(x, fmt=fmt))
+
+
 def now_time_str(fmt=TIME_FORMAT_DAY):
     return to_time_str(the_time=now_pd_timestamp(), fmt=fmt)
 
@@ -100,6 +100,34 @@ def fill_domain_from_dict(the_domain, the_dict: dict, the_map: dict, default_fun
                 exec('the_domain.{}=result_value'.format(k))
 
 
+def fill_dict_from_dict(the_record: dict, the_dict: dict, the_map: dict, default_func=lambda x: x):
+    """
+    the plain dict version of fill_domain_from_dict,using for bulk persisting without domain objects
+
+    """
+    if not the_map:
+        the_map = {}
+        for k in the_dict:
+            the_map[k] = (k, default_func)
+
+    for k, v in the_map.items():
+        if isinstance(v, tuple):
+            field_in_dict = v[0]
+            the_func = v[1]
+        else:
+            field_in_dict = v
+            the_func = default_func
+
+        the_value = the_dict.get(field_in_dict)
+        if the_value is not None:
+            if the_value in none_values:
+                the_record[k] = None
+            else:
+                the_record[k] = the_func(the_value)
+
+    return the_record
+
+
 def init_process_log(file_name, log_dir):
     root_logger = logging.getLogger()
 
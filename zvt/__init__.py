@@ -56,6 +56,10 @@ from zvt.domain import init_schema
 
 init_schema()
 
+from zvt.api.adjust import init_adjuster
+
+init_adjuster()
+
 from zvt.factors import init_factors
 
 init_factors()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, bindparam
+
+from zvdata.api import get_data
+from zvdata.domain import get_db_session, DataAdjuster, register_adjuster, get_db_storage, context, \
+    get_schemas
+from zvdata.parquet_store import append_parquet
+from zvdata.reader import DataReader
+from zvt.domain.quote import StockAdjustFactor, Stock1mKdata, Stock5mKdata, Stock15mKdata, Stock30mKdata, \
+    Stock1hKdata, Stock1dKdata, Stock1wkKdata
+from zvt.utils.time_utils import to_time_str
+
+logger = logging.getLogger(__name__)
+
+# the columns of the kdata computed by AdjustEngine.adjust_kdata
+adjusted_cols = ['factor', 'hfq_open', 'hfq_close', 'hfq_high', 'hfq_low', 'qfq_open', 'qfq_close', 'qfq_high',
+                 'qfq_low']
+
+
+class AdjustEngine(DataAdjuster):
+    """
+    the hfq/qfq computing from the adjustment factors,the factors are kept as the compact series of the change points
+    per entity with a version bumped on every change,hfq = price * factor and qfq = hfq / latest factor
+
+    the kdata keeps the stable hfq prices,the qfq prices are computed by fill_qfq when reading the stock kdata,so a
+    factor change only invalidates the cached factors of the entity instead of rewriting its history
+
+    """
+    price_cols = ['open', 'close', 'high', 'low']
+    # check the versions changed by the other processes at most once in the interval(seconds)
+    refresh_interval = 60
+    # sqlite limits the variable number of one statement
+    load_step = 500
+
+    def __init__(self, provider: str = 'joinquant') -> None:
+        # the factors are stored in the stock_adjust_factor db of the provider
+        self.provider = provider
+        # the data path the cached factors loaded from
+        self.data_path = context.get('data_path')
+        # entity_id -> pd.Series of the factors indexed by the change timestamps
+        self.factors = {}
+        # entity_id -> version
+        self.versions = {}
+        self.refresh_time = time.time()
+        self.lock = threading.Lock()
+
+    def get_session(self):
+        return get_db_session(provider=self.provider, data_schema=StockAdjustFactor)
+
+    def load(self, entity_ids: List[str], use_cache: bool = True):
+        """
+        load the factor series of the entities from the data cache of DataReader if it covers them,otherwise from the
+        db
+
+        :param entity_ids:
+        :param use_cache: False for reloading the changed factors
+        """
+        columns = ['entity_id', 'timestamp', 'factor', 'version']
+
+        df = None
+        if use_cache and DataReader.data_cache is not None:
+            df = DataReader.data_cache.get_data(data_schema=StockAdjustFactor, provider=self.provider,
+                                                entity_ids=entity_ids, columns=columns)
+            if df is not None:
+                df = df.reset_index(drop=True)[columns]
+
+        if df is None:
+            session = self.get_session()
+            try:
+                rows = []
+                for i in range(0, len(entity_ids), self.load_step):
+                    rows += session.query(StockAdjustFactor.entity_id, StockAdjustFactor.timestamp,
+                                          StockAdjustFactor.factor, StockAdjustFactor.version).filter(
+                        StockAdjustFactor.entity_id.in_(entity_ids[i:i + self.load_step])).all()
+            finally:
+                session.close()
+
+            df = pd.DataFrame(rows, columns=columns)
+
+        grouped = dict(list(df.groupby('entity_id'))) if not df.empty else {}
+        with self.lock:
+            for entity_id in entity_ids:
+                entity_df = grouped.get(entity_id)
+                if entity_df is None:
+                    self.factors[entity_id] = pd.Series([], dtype=float, index=pd.DatetimeIndex([]))
+                    self.versions[entity_id] = 0
+                else:
+                    entity_df = entity_df.sort_values('timestamp')
+                    self.factors[entity_id] = pd.Series(entity_df['factor'].values,
+                                                        index=pd.DatetimeIndex(entity_df['timestamp']))
+                    self.versions[entity_id] = int(entity_df['version'].max())
+
+    def refresh(self) -> int:
+        """
+        reload the cached entities whose version changed
+
+        :return: the sum of the versions of all the entities
+        """
+        session = self.get_session()
+        try:
+            rows = session.query(StockAdjustFactor.entity_id, func.max(StockAdjustFactor.version)).group_by(
+                StockAdjustFactor.entity_id).all()
+        finally:
+            session.close()
+
+        with self.lock:
+            changed = [entity_id for entity_id, version in rows if
+                       entity_id in self.versions and self.versions[entity_id] != version]
+            self.refresh_time = time.time()
+
+        if changed:
+            logger.info('adjust factors changed:{}'.format(changed))
+            # the cache keeps the factors before the change
+            self.load(changed, use_cache=False)
+
+        return int(sum(version for _, version in rows))
+
+    def prepare(self, entity_ids):
+        # the cached factors are from the dbs of the other data path
+        if self.data_path != context.get('data_path'):
+            self.clear()
+
+        if time.time() - self.refresh_time > self.refresh_interval:
+            self.refresh()
+
+        missing = [entity_id for entity_id in entity_ids if entity_id not in self.factors]
+        if missing:
+            self.load(missing)
+
+    def get_factors(self, entity_id) -> pd.Series:
+        self.prepare([entity_id])
+        return self.factors[entity_id]
+
+    def get_version(self, entity_id=None) -> int:
+        """
+        the version of the factors of the entity,the version of all the factors checked against the db if entity_id is
+        None,which changes once any qfq price changes
+
+        """
+        if entity_id is None:
+            return self.refresh()
+
+        self.prepare([entity_id])
+        return self.versions[entity_id]
+
+    def get_latest_factor(self, entity_id):
+        factors = self.get_factors(entity_id)
+        if factors.empty:
+            return None
+        return factors.iloc[-1]
+
+    def save_factors(self, entity_id, factors: pd.Series) -> bool:
+        """
+        save the change points of the factors,the version is bumped if any new change point
+
+        :param entity_id:
+        :param factors: the factors indexed by timestamp,e.g,the factor of the jq get_price(fq='post')
+        :return: whether the factors changed
+        """
+        factors = factors.dropna()
+        factors.index = pd.to_datetime(factors.index)
+        factors = factors.sort_index()
+        if factors.empty:
+            return False
+
+        saved = self.get_factors(entity_id)
+        # the factors after the last saved change point
+        if not saved.empty:
+            factors = factors[factors.index > saved.index[-1]]
+            previous = saved.iloc[-1]
+        else:
+            previous = np.nan
+
+        values = factors.values
+        changed = values != np.concatenate([[previous], values[:-1]])
+        new_points = factors[changed]
+        if new_points.empty:
+            return False
+
+        version = self.versions[entity_id] + 1
+        session = self.get_session()
+        try:
+            session.add_all([StockAdjustFactor(id='{}_{}'.format(entity_id, to_time_str(timestamp)),
+                                               entity_id=entity_id, timestamp=timestamp, factor=float(factor),
+                                               version=version) for timestamp, factor in new_points.items()])
+            session.commit()
+        finally:
+            session.close()
+
+        with self.lock:
+            self.factors[entity_id] = pd.concat([saved, new_points])
+            self.versions[entity_id] = version
+
+        logger.info('{} adjust factors changed:{},version:{}'.format(entity_id, new_points.to_dict(), version))
+        return True
+
+    def get_factor(self, entity_id, timestamps) -> np.ndarray:
+        """
+        the factors at the timestamps,nan before the first change point
+
+        """
+        factors = self.get_factors(entity_id)
+        result = np.full(len(timestamps), np.nan)
+        if not factors.empty:
+            positions = factors.index.searchsorted(pd.to_datetime(timestamps), side='right') - 1
+            valid = positions >= 0
+            result[valid] = factors.values[positions[valid]]
+        return result
+
+    def adjust_kdata(self, df: pd.DataFrame, entity_id) -> pd.DataFrame:
+        """
+        compute the factor,hfq and qfq prices of the kdata from the raw prices
+
+        :param df: the kdata of the entity with timestamp and the raw price columns
+        :return: df with factor,hfq_{col},qfq_{col}
+        """
+        df = df.copy()
+        df['factor'] = self.get_factor(entity_id, df['timestamp'])
+        latest_factor = self.get_latest_factor(entity_id)
+        for col in self.price_cols:
+            if col in df.columns:
+                df['hfq_{}'.format(col)] = df[col] * df['factor']
+                df['qfq_{}'.format(col)] = df['hfq_{}'.format(col)] / latest_factor if latest_factor else np.nan
+        return df
+
+    def fill_qfq(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        compute the qfq prices of the kdata from the hfq prices with the latest factors,the qfq saved is kept for the
+        rows without hfq
+
+        :param df: the kdata with entity_id column or indexed by (entity_id,timestamp)
+        :return: the df with the qfq prices
+        """
+        if df is None or df.empty:
+            return df
+
+        cols = [col for col in self.price_cols if
+                'hfq_{}'.format(col) in df.columns and 'qfq_{}'.format(col) in df.columns]
+        if not cols:
+            return df
+
+        if 'entity_id' in df.columns:
+            entity_ids = df['entity_id']
+        else:
+            entity_ids = pd.Series(df.index.get_level_values(0), index=df.index)
+
+        unique_ids = list(entity_ids.unique())
+        self.prepare(unique_ids)
+        latest_factors = entity_ids.map({entity_id: self.factors[entity_id].iloc[-1] for entity_id in unique_ids if
+                                         not self.factors[entity_id].empty})
+
+        df = df.copy()
+        for col in cols:
+            qfq = df['hfq_{}'.format(col)] / latest_factors
+            df['qfq_{}'.format(col)] = qfq.where(qfq.notna(), df['qfq_{}'.format(col)])
+        return df
+
+    def get_required_columns(self, columns: List[str]) -> List[str]:
+        required = ['hfq_{}'.format(col) for col in self.price_cols if 'qfq_{}'.format(col) in columns]
+        if required:
+            required.append('entity_id')
+        return required
+
+    def adjust(self, df):
+        return self.fill_qfq(df)
+
+    def clear(self):
+        with self.lock:
+            self.data_path = context.get('data_path')
+            self.factors = {}
+            self.versions = {}
+
+
+# provider -> AdjustEngine,the providers whose kdata keeps the hfq computed from the factors of the engine
+adjust_engines = {provider: AdjustEngine(provider=provider) for provider in ['joinquant', 'netease']}
+
+# shared by the recorders and the readers
+adjust_engine = adjust_engines['joinquant']
+
+
+def get_adjust_engine(provider: str) -> AdjustEngine:
+    return adjust_engines.get(provider)
+
+
+def update_kdata(df: pd.DataFrame, provider: str, data_schema, session, entity_id: str, cols: List[str]):
+    """
+    update the computed columns of the kdata by id in one executemany,the partitions are rewritten for parquet
+
+    :param df: the kdata with id and the cols
+    :param cols: the columns to update,e.g,factor,hfq and qfq prices
+    """
+    cols = [col for col in cols if col in df.columns]
+
+    if get_db_storage(provider=provider, data_schema=data_schema) == 'parquet':
+        saved = get_data(data_schema=data_schema, provider=provider, entity_id=entity_id,
+                         filters=[data_schema.id.in_(df['id'].tolist())], adjust=False)
+        saved = saved.reset_index(drop=True).drop(columns=cols).merge(df[['id'] + cols], on='id', how='left')
+        append_parquet(saved, provider=provider, data_schema=data_schema, force_update=True)
+        return
+
+    table = data_schema.__table__
+    statement = table.update().where(table.c.id == bindparam('the_id')).values(
+        **{col: bindparam('the_{}'.format(col)) for col in cols})
+
+    params = df[['id'] + cols].astype(object).where(df[['id'] + cols].notna(), None)
+    params.columns = ['the_{}'.format(col) for col in params.columns]
+    session.execute(statement, params.to_dict(orient='records'))
+    session.commit()
+
+
+def init_adjuster():
+    # the qfq prices read are computed from the latest factors of the provider
+    for provider, engine in adjust_engines.items():
+        schemas = get_schemas(provider)
+        for data_schema in [Stock1mKdata, Stock5mKdata, Stock15mKdata, Stock30mKdata, Stock1hKdata, Stock1dKdata,
+                            Stock1wkKdata]:
+            if data_schema in schemas:
+                register_adjuster([provider], data_schema, engine)
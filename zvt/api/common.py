@@ -9,6 +9,7 @@ from sqlalchemy import exists, and_
 from zvdata.api import decode_entity_id
 from zvdata.domain import get_db_session
 from zvdata.structs import IntervalLevel
+from zvdata.utils.time_utils import to_time_strs
 from zvt.domain import ReportPeriod, CompanyType
 from zvt.domain.quote import *
 from zvt.domain.stock_meta import Index, Stock, StockIndex
@@ -172,11 +173,30 @@ def generate_kdata_id(entity_id, timestamp, level):
         return "{}_{}".format(entity_id, to_time_str(timestamp, fmt=TIME_FORMAT_ISO8601))
 
 
+def generate_kdata_ids(entity_id, timestamps, level):
+    """
+    the vectorized version of generate_kdata_id
+
+    :param entity_id:
+    :type entity_id: str
+    :param timestamps:
+    :type timestamps: pd.Series
+    :param level:
+    :type level: IntervalLevel
+    :return:
+    :rtype: pd.Series
+    """
+    if level == IntervalLevel.LEVEL_1DAY:
+        return entity_id + '_' + to_time_strs(timestamps, fmt=TIME_FORMAT_DAY)
+    else:
+        return entity_id + '_' + to_time_strs(timestamps, fmt=TIME_FORMAT_ISO8601)
+
+
 def stock_id_in_index(stock_id, index_id, session=None, data_schema=StockIndex, provider='eastmoney'):
     the_id = '{}_{}'.format(index_id, stock_id)
     local_session = False
     if not session:
-        session = get_db_session(provider=provider, data_schema=data_schema)
+        session = get_db_session(provider=provider, data_schema=data_schema, readonly=True)
         local_session = True
 
     try:
@@ -1,7 +1,56 @@
 # -*- coding: utf-8 -*-
+import copy
+import math
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
 from zvt.api.technical import get_kdata
 
 
+def _group(s):
+    # the panel indexed by (entity_id,timestamp) is computed entity by entity in one pass
+    if isinstance(s.index, pd.MultiIndex):
+        return s.groupby(level=0, sort=False)
+    return s
+
+
+def _to_series(s, result):
+    if isinstance(s.index, pd.MultiIndex):
+        # the result is ordered by the entities,so the rows are put back if the entities are not contiguous
+        codes, _ = pd.factorize(s.index.get_level_values(0))
+        values = np.empty(len(s), dtype=result.dtype)
+        values[np.argsort(codes, kind='mergesort')] = result.values
+        return pd.Series(values, index=s.index)
+    return result
+
+
+def _rolling(s, method, window, min_periods=None, **kwargs):
+    rolling = _group(s).rolling(window=window, min_periods=window if min_periods is None else min_periods)
+    return _to_series(s, getattr(rolling, method)(**kwargs))
+
+
+# SeriesGroupBy.ewm is added in pandas 1.2
+_groupby_ewm = hasattr(pd.core.groupby.SeriesGroupBy, 'ewm')
+
+
+def _ewm(s, window=None, alpha=None, min_periods=0):
+    if alpha is None:
+        params = {'span': window, 'adjust': False, 'min_periods': min_periods}
+    else:
+        params = {'alpha': alpha, 'adjust': False, 'min_periods': min_periods}
+
+    if isinstance(s.index, pd.MultiIndex) and not _groupby_ewm:
+        return _group(s).transform(lambda x: x.ewm(**params).mean())
+    return _to_series(s, _group(s).ewm(**params).mean())
+
+
+def _shift(s):
+    return _group(s).shift()
+
+
 def ma(s, window=5):
     """
 
@@ -12,11 +61,11 @@ def ma(s, window=5):
     :return:
     :rtype:
     """
-    return s.rolling(window=window, min_periods=window).mean()
+    return _rolling(s, 'mean', window=window)
 
 
 def ema(s, window=12):
-    return s.ewm(span=window, adjust=False, min_periods=window).mean()
+    return _ewm(s, window=window, min_periods=window)
 
 
 def macd(s, slow=26, fast=12, n=9):
@@ -25,12 +74,451 @@ def macd(s, slow=26, fast=12, n=9):
     ema_slow = ema(s, window=slow)
 
     diff = ema_fast - ema_slow
-    dea = diff.ewm(span=n, adjust=False).mean()
+    dea = _ewm(diff, window=n)
     m = (diff - dea) * 2
 
     return diff, dea, m
 
 
+def rsi(s, window=14):
+    """
+    the rsi with the wilder smoothing,the same as SMA(MAX(CLOSE-LC,0),N,1)/SMA(ABS(CLOSE-LC),N,1)*100
+
+    """
+    delta = s - _shift(s)
+    up = _ewm(delta.clip(lower=0), alpha=1. / window, min_periods=window)
+    down = _ewm(delta.abs(), alpha=1. / window, min_periods=window)
+    return up / down * 100
+
+
+def boll(s, window=20, k=2, ddof=1):
+    """
+
+    :return: upper,mid,lower
+    :rtype:tuple
+    """
+    mid = _rolling(s, 'mean', window=window)
+    std = _rolling(s, 'std', window=window, ddof=ddof)
+    return mid + k * std, mid, mid - k * std
+
+
+def true_range(high, low, close):
+    pre_close = _shift(close)
+    return pd.concat([high - low, (high - pre_close).abs(), (low - pre_close).abs()], axis=1).max(axis=1)
+
+
+def atr(high, low, close, window=14):
+    return _ewm(true_range(high, low, close), alpha=1. / window, min_periods=window)
+
+
+def kdj(high, low, close, n=9, m1=3, m2=3):
+    """
+    the kdj with the sma smoothing starting from the first rsv instead of 50
+
+    :return: k,d,j
+    :rtype:tuple
+    """
+    llv = rolling_min(low, window=n)
+    hhv = rolling_max(high, window=n)
+    rsv = (close - llv) / (hhv - llv) * 100
+    # the rsv is undefined if the high equals the low
+    rsv = rsv.mask(hhv == llv)
+
+    k = _ewm(rsv, alpha=1. / m1)
+    d = _ewm(k, alpha=1. / m2)
+    return k, d, 3 * k - 2 * d
+
+
+def rolling_max(s, window=20):
+    return _rolling(s, 'max', window=window)
+
+
+def rolling_min(s, window=20):
+    return _rolling(s, 'min', window=window)
+
+
+# (rtol,atol) between the streaming and the batch results with pandas<1.3,the atol is for the std of the same values
+# which is sqrt of the float error of the var
+streaming_tolerance = (1e-9, 1e-6)
+
+
+class IndicatorState(object):
+    """
+    the streaming form of the indicator,update it with the new value(s) in O(1) to get the same result as the batch
+    function on the whole history,the state could be snapshotted and restored,e.g,to keep it across the processes
+
+    the rolling states follow the rolling mean/var of pandas>=1.3(kahan summation and the special cases of the same
+    and the negative values),the results are exactly equal with it and within streaming_tolerance with the older
+    pandas,e.g,0.24.2 pinned in requirements.txt
+
+    """
+
+    def update(self, *values):
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        return copy.deepcopy(self.__dict__)
+
+    @classmethod
+    def restore(cls, snapshot: dict):
+        state = cls.__new__(cls)
+        state.__dict__.update(copy.deepcopy(snapshot))
+        return state
+
+
+class MaState(IndicatorState):
+    """
+    the state of ma(s, window),the same kahan summation as pandas>=1.3 rolling mean
+
+    """
+
+    def __init__(self, window=5, min_periods=None) -> None:
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.sum = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.nobs = 0
+        self.neg_ct = 0
+        self.prev_value = None
+        self.num_consecutive_same_value = 0
+
+    def add(self, value):
+        if value == value:
+            self.nobs += 1
+            y = value - self.compensation_add
+            t = self.sum + y
+            self.compensation_add = t - self.sum - y
+            self.sum = t
+            if math.copysign(1., value) < 0:
+                self.neg_ct += 1
+
+            if value == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = value
+
+    def remove(self, value):
+        if value == value:
+            self.nobs -= 1
+            y = - value - self.compensation_remove
+            t = self.sum + y
+            self.compensation_remove = t - self.sum - y
+            self.sum = t
+            if math.copysign(1., value) < 0:
+                self.neg_ct -= 1
+
+    def update(self, value):
+        value = float(value)
+        # the window of size 1 is computed from scratch every time
+        if self.prev_value is None or self.window == 1:
+            self.sum = self.compensation_add = self.compensation_remove = 0.
+            self.nobs = self.neg_ct = 0
+            self.prev_value = value
+            self.num_consecutive_same_value = 0
+            self.values.clear()
+        elif len(self.values) == self.window:
+            self.remove(self.values.popleft())
+
+        self.values.append(value)
+        self.add(value)
+
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum / self.nobs
+            if self.num_consecutive_same_value >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.
+            return result
+        return np.nan
+
+
+class StdState(IndicatorState):
+    """
+    the state of s.rolling(window).std(ddof),the same welford's method as pandas>=1.3 rolling var
+
+    """
+
+    def __init__(self, window=20, min_periods=None, ddof=1) -> None:
+        self.window = window
+        self.min_periods = max(window if min_periods is None else min_periods, 1)
+        self.ddof = ddof
+        self.values = deque()
+        self.nobs = 0
+        self.mean = 0.
+        self.ssqdm = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.prev_value = None
+        self.num_consecutive_same_value = 0
+
+    def add(self, value):
+        if value != value:
+            return
+
+        self.nobs += 1
+        if value == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = value
+
+        prev_mean = self.mean - self.compensation_add
+        y = value - self.compensation_add
+        t = y - self.mean
+        self.compensation_add = t + self.mean - y
+        self.mean = self.mean + t / self.nobs
+        self.ssqdm = self.ssqdm + (value - prev_mean) * (value - self.mean)
+
+    def remove(self, value):
+        if value == value:
+            self.nobs -= 1
+            if self.nobs:
+                prev_mean = self.mean - self.compensation_remove
+                y = value - self.compensation_remove
+                t = y - self.mean
+                self.compensation_remove = t + self.mean - y
+                self.mean = self.mean - t / self.nobs
+                self.ssqdm = self.ssqdm - (value - prev_mean) * (value - self.mean)
+            else:
+                self.mean = 0.
+                self.ssqdm = 0.
+
+    def update(self, value):
+        value = float(value)
+        if self.prev_value is None or self.window == 1:
+            self.nobs = 0
+            self.mean = self.ssqdm = self.compensation_add = self.compensation_remove = 0.
+            self.prev_value = value
+            self.num_consecutive_same_value = 0
+            self.values.clear()
+        elif len(self.values) == self.window:
+            self.remove(self.values.popleft())
+
+        self.values.append(value)
+        self.add(value)
+
+        if self.nobs >= self.min_periods and self.nobs > self.ddof:
+            if self.nobs == 1 or self.num_consecutive_same_value >= self.nobs:
+                return 0.
+            var = self.ssqdm / (self.nobs - self.ddof)
+            return math.sqrt(var) if var >= 0 else 0.
+        return np.nan
+
+
+class EmaState(IndicatorState):
+    """
+    the state of s.ewm(span=window, adjust=False, min_periods=min_periods).mean(),update it with the new value to get
+    the same ema without the whole history,min_periods is window by default as ema(s, window)
+
+    """
+
+    def __init__(self, window=12, min_periods=None, alpha=None) -> None:
+        # the same center of mass as pandas
+        if alpha is None:
+            com = (window - 1) / 2
+        else:
+            com = (1 - alpha) / alpha
+        if min_periods is None:
+            min_periods = window if alpha is None else 0
+        self.alpha = 1. / (1. + com)
+        self.old_wt_factor = 1. - self.alpha
+        self.min_periods = max(min_periods, 1)
+        self.weighted = None
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, value):
+        value = float(value)
+        is_observation = value == value
+        self.nobs += int(is_observation)
+
+        if self.weighted is None:
+            self.weighted = value
+        elif self.weighted == self.weighted:
+            # the weight decays on the missing values too
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * value) / (self.old_wt + self.alpha)
+                self.old_wt = 1.
+        elif is_observation:
+            self.weighted = value
+
+        if self.nobs >= self.min_periods:
+            return self.weighted
+        return np.nan
+
+
+class MacdState(IndicatorState):
+    """
+    the state of macd(s, slow, fast, n)
+
+    """
+
+    def __init__(self, slow=26, fast=12, n=9) -> None:
+        self.ema_fast = EmaState(window=fast, min_periods=fast)
+        self.ema_slow = EmaState(window=slow, min_periods=slow)
+        self.dea = EmaState(window=n, min_periods=0)
+
+    def update(self, value):
+        diff = self.ema_fast.update(value) - self.ema_slow.update(value)
+        dea = self.dea.update(diff)
+        return diff, dea, (diff - dea) * 2
+
+
+class RsiState(IndicatorState):
+    """
+    the state of rsi(s, window)
+
+    """
+
+    def __init__(self, window=14) -> None:
+        self.up = EmaState(alpha=1. / window, min_periods=window)
+        self.down = EmaState(alpha=1. / window, min_periods=window)
+        self.pre_value = np.nan
+
+    def update(self, value):
+        delta = value - self.pre_value
+        self.pre_value = value
+
+        up = self.up.update(max(delta, 0.) if delta == delta else delta)
+        down = self.down.update(abs(delta))
+        # 0/0 is nan as pandas
+        if down == 0:
+            return np.nan if up == 0 else np.inf
+        return up / down * 100
+
+
+class BollState(IndicatorState):
+    """
+    the state of boll(s, window, k, ddof)
+
+    """
+
+    def __init__(self, window=20, k=2, ddof=1) -> None:
+        self.k = k
+        self.mid = MaState(window=window)
+        self.std = StdState(window=window, ddof=ddof)
+
+    def update(self, value):
+        mid = self.mid.update(value)
+        std = self.std.update(value)
+        return mid + self.k * std, mid, mid - self.k * std
+
+
+class TrueRangeState(IndicatorState):
+    """
+    the state of true_range(high, low, close)
+
+    """
+
+    def __init__(self) -> None:
+        self.pre_close = np.nan
+
+    def update(self, high, low, close):
+        ranges = [r for r in (high - low, abs(high - self.pre_close), abs(low - self.pre_close)) if r == r]
+        self.pre_close = close
+        return max(ranges) if ranges else np.nan
+
+
+class AtrState(IndicatorState):
+    """
+    the state of atr(high, low, close, window)
+
+    """
+
+    def __init__(self, window=14) -> None:
+        self.true_range = TrueRangeState()
+        self.atr = EmaState(alpha=1. / window, min_periods=window)
+
+    def update(self, high, low, close):
+        return self.atr.update(self.true_range.update(high, low, close))
+
+
+class RollingMaxState(IndicatorState):
+    """
+    the state of rolling_max(s, window),the same monotonic queue as pandas rolling max
+
+    """
+    is_max = True
+
+    def __init__(self, window=20, min_periods=None) -> None:
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        # (index,value) of the candidates,the max/min is always the front
+        self.candidates = deque()
+        # the observed flags of the window
+        self.observed = deque()
+        self.nobs = 0
+        self.index = 0
+
+    def update(self, value):
+        value = float(value)
+        if value == value:
+            self.nobs += 1
+            compared = value
+        else:
+            compared = -sys.float_info.max if self.is_max else sys.float_info.max
+
+        while self.candidates:
+            last = self.candidates[-1][1]
+            if last != last or (compared >= last if self.is_max else compared <= last):
+                self.candidates.pop()
+            else:
+                break
+        self.candidates.append((self.index, value))
+        self.observed.append(value == value)
+
+        # discard the values out of the window
+        while self.candidates[0][0] <= self.index - self.window:
+            self.candidates.popleft()
+        if len(self.observed) > self.window:
+            self.nobs -= int(self.observed.popleft())
+        self.index += 1
+
+        if self.nobs >= self.min_periods:
+            return self.candidates[0][1]
+        return np.nan
+
+
+class RollingMinState(RollingMaxState):
+    """
+    the state of rolling_min(s, window)
+
+    """
+    is_max = False
+
+
+class KdjState(IndicatorState):
+    """
+    the state of kdj(high, low, close, n, m1, m2)
+
+    """
+
+    def __init__(self, n=9, m1=3, m2=3) -> None:
+        self.llv = RollingMinState(window=n)
+        self.hhv = RollingMaxState(window=n)
+        self.k = EmaState(alpha=1. / m1)
+        self.d = EmaState(alpha=1. / m2)
+
+    def update(self, high, low, close):
+        llv = self.llv.update(low)
+        hhv = self.hhv.update(high)
+        if hhv == llv:
+            rsv = np.nan
+        else:
+            rsv = (close - llv) / (hhv - llv) * 100
+
+        k = self.k.update(rsv)
+        d = self.d.update(k)
+        return k, d, 3 * k - 2 * d
+
+
 if __name__ == '__main__':
     kdata = get_kdata(entity_id='stock_sz_000338', start_timestamp='2019-01-01', end_timestamp='2019-05-25',
                       provider='netease')
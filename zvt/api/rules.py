@@ -1,27 +1,206 @@
 # -*- coding: utf-8 -*-
 import logging
+import os
 
+import numpy as np
 import pandas as pd
 from zvdata.structs import IntervalLevel
 from zvdata.utils.time_utils import to_pd_timestamp
 
 from zvt.api.common import decode_entity_id
-from zvt.utils.time_utils import date_and_time, is_same_time, to_time_str, TIME_FORMAT_MINUTE1, now_pd_timestamp, \
-    is_same_date
+from zvt.settings import HOLIDAY_PATH
+from zvt.utils.time_utils import date_and_time, to_time_str, TIME_FORMAT_MINUTE1, now_pd_timestamp, is_same_date
 
 logger = logging.getLogger(__name__)
 
 
-# TODO:more precise
-def is_trading_date(entity_type, exchange, timestamp: pd.Timestamp):
-    if type(timestamp) == str:
-        timestamp = to_pd_timestamp(timestamp)
+# (entity_type,exchange) -> the days since epoch of the holidays,loaded from HOLIDAY_PATH
+_holidays = {}
+
+# (entity_type,exchange,level) -> TradingCalendar
+_trading_calendars = {}
+
+NS_PER_DAY = 24 * 60 * 60 * 1000000000
+
+
+def to_minute_of_day(the_time: str) -> int:
+    hour, minute = the_time.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def load_holidays(entity_type, exchange, holiday_path=HOLIDAY_PATH):
+    """
+    load the holidays from {holiday_path}/{entity_type}_{exchange}.txt or {holiday_path}/{entity_type}.txt,
+    one date(e.g,2019-10-01) per line and the line starts with # is ignored
+
+    :return: the days since epoch of the holidays
+    :rtype: set
+    """
+    for file_name in ('{}_{}.txt'.format(entity_type, exchange), '{}.txt'.format(entity_type)):
+        file_path = os.path.join(holiday_path, file_name)
+        if os.path.exists(file_path):
+            with open(file_path) as f:
+                dates = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+            logger.info('load {} holidays from {}'.format(len(dates), file_path))
+            return set((pd.to_datetime(dates).normalize().asi8 // NS_PER_DAY).tolist())
+    return set()
+
+
+def get_holidays(entity_type, exchange):
+    key = (entity_type, exchange)
+    if key not in _holidays:
+        _holidays[key] = load_holidays(entity_type, exchange)
+    return _holidays[key]
+
+
+def set_holidays(entity_type, exchange, dates):
+    """
+    set the holidays instead of loading from the file
+
+    :param dates: the holidays
+    :type dates: List[Union[str, pd.Timestamp]]
+    """
+    _holidays[(entity_type, exchange)] = set((pd.to_datetime(dates).normalize().asi8 // NS_PER_DAY).tolist())
+
+
+class TradingCalendar(object):
+    """
+    the trading calendar of (entity_type,exchange,level),the open/close/finished times are precomputed to the
+    minute of day bitset and the timestamps of one day to the offsets,so the lookups are O(1) and the iteration is
+    vectorized
+
+    """
+
+    def __init__(self, entity_type, exchange, level: IntervalLevel) -> None:
+        self.entity_type = entity_type
+        self.exchange = exchange
+        self.level = IntervalLevel(level)
+
+        self.intervals = get_trading_intervals(entity_type=entity_type, exchange=exchange)
+
+        self.open_minute = None
+        self.close_minute = None
+        if self.intervals:
+            self.open_minute = to_minute_of_day(self.intervals[0][0])
+            self.close_minute = to_minute_of_day(self.intervals[-1][-1])
+
+        # (contain_all_timestamp,kdata_use_begin_time) -> the minute offsets of the timestamps in one day
+        self.day_offsets = {}
+
+        self.finished_minutes = self.get_finished_minutes()
+
+    def get_finished_minutes(self) -> int:
+        """
+        the bitset of the minutes of day which the kdata of the level could be recorded
+
+        """
+        bitset = 0
+        if self.entity_type == 'stock' and self.exchange in ('sh', 'sz'):
+            if self.level == IntervalLevel.LEVEL_1DAY:
+                minutes = [0, self.close_minute]
+            elif self.level < IntervalLevel.LEVEL_1DAY:
+                minutes = self.get_day_offsets(contain_all_timestamp=False, kdata_use_begin_time=False)
+            else:
+                minutes = []
+        elif self.entity_type == 'coin':
+            minutes = [minute for minute in range(24 * 60) if (minute % 60) % self.level.to_minute() == 0]
+        else:
+            minutes = []
+
+        for minute in minutes:
+            bitset |= 1 << (int(minute) % (24 * 60))
+        return bitset
+
+    def get_day_offsets(self, contain_all_timestamp=True, kdata_use_begin_time=False) -> np.ndarray:
+        """
+        the minute offsets of the timestamps in one day for the level under 1 day,could be 24 * 60 for the end of
+        the day
+
+        """
+        key = (contain_all_timestamp, kdata_use_begin_time)
+        if key not in self.day_offsets:
+            step = self.level.to_minute()
+            offsets = []
+            for start, end in self.intervals:
+                start_minute = to_minute_of_day(start)
+                end_minute = to_minute_of_day(end)
+                if end == '00:00':
+                    end_minute += 24 * 60
+
+                interval_offsets = list(range(start_minute, end_minute + 1, step))
+                if contain_all_timestamp:
+                    offsets += interval_offsets
+                elif kdata_use_begin_time:
+                    offsets += interval_offsets[:-1]
+                else:
+                    offsets += interval_offsets[1:]
+            self.day_offsets[key] = np.unique(np.array(offsets, dtype=np.int64))
+        return self.day_offsets[key]
+
+    def iterate_timestamps(self, start_timestamp, end_timestamp, contain_all_timestamp=True,
+                           kdata_use_begin_time=False) -> pd.DatetimeIndex:
+        date_range = pd.date_range(start=start_timestamp, end=end_timestamp, freq='1D')
+
+        if self.level >= IntervalLevel.LEVEL_1DAY:
+            return date_range
+
+        offsets = self.get_day_offsets(contain_all_timestamp=contain_all_timestamp,
+                                       kdata_use_begin_time=kdata_use_begin_time)
+
+        # date x offsets,the end of one day could be the begin of next day
+        timestamps = date_range.normalize().asi8[:, None] + offsets[None, :] * 60 * 1000000000
+        return pd.DatetimeIndex(np.unique(timestamps.ravel()))
+
+    def is_trading_date(self, timestamp: pd.Timestamp) -> bool:
+        if self.entity_type == 'stock' and timestamp.weekday() >= 5:
+            return False
+
+        holidays = get_holidays(self.entity_type, self.exchange)
+        return not holidays or (timestamp.value // NS_PER_DAY) not in holidays
 
-    # just ignore 00:00
-    # the_date = date_and_time(timestamp, '09:00')
+    def is_open_time(self, timestamp: pd.Timestamp) -> bool:
+        return self._is_minute(timestamp, self.open_minute)
 
+    def is_close_time(self, timestamp: pd.Timestamp) -> bool:
+        return self._is_minute(timestamp, self.close_minute)
+
+    def is_finished_timestamp(self, timestamp: pd.Timestamp) -> bool:
+        if timestamp.microsecond != 0:
+            return False
+
+        return bool((self.finished_minutes >> (timestamp.hour * 60 + timestamp.minute)) & 1)
+
+    @staticmethod
+    def _is_minute(timestamp: pd.Timestamp, minute) -> bool:
+        # same as comparing in ms
+        if minute is None or timestamp.second != 0 or timestamp.microsecond >= 1000:
+            return False
+        return timestamp.hour * 60 + timestamp.minute == minute % (24 * 60)
+
+
+def get_trading_calendar(entity_type, exchange, level=IntervalLevel.LEVEL_1DAY) -> TradingCalendar:
+    level = IntervalLevel(level)
+    key = (entity_type, exchange, level)
+
+    calendar = _trading_calendars.get(key)
+    if not calendar:
+        calendar = TradingCalendar(entity_type=entity_type, exchange=exchange, level=level)
+        _trading_calendars[key] = calendar
+    return calendar
+
+
+def _to_timestamp(timestamp) -> pd.Timestamp:
+    if type(timestamp) == pd.Timestamp:
+        return timestamp
+    return to_pd_timestamp(timestamp)
+
+
+def is_trading_date(entity_type, exchange, timestamp: pd.Timestamp):
+    timestamp = _to_timestamp(timestamp)
+
+    # the calendar of stock,e.g,weekend and the holidays
     if entity_type == 'stock':
-        return (timestamp.weekday() != 5) and (timestamp.weekday() != 6)
+        return get_trading_calendar(entity_type, exchange).is_trading_date(timestamp)
 
     return True
 
@@ -75,84 +254,25 @@ def iterate_timestamps(entity_type, exchange, start_timestamp: pd.Timestamp, end
     :return:
     :rtype: List[pandas._libs.tslibs.timestamps.Timestamp]
     """
-    date_range = pd.date_range(start=start_timestamp, end=end_timestamp,
-                               freq='1D').tolist()
-
-    if level == IntervalLevel.LEVEL_1DAY:
-        return date_range
-
-    if level < IntervalLevel.LEVEL_1DAY:
-        start_end_list = get_trading_intervals(entity_type=entity_type, exchange=exchange)
-
-        time_ranges = []
-
-        for date in date_range:
-            for start_end in start_end_list:
-                start = start_end[0]
-                end = start_end[1]
-
-                start_date = date_and_time(the_date=date, the_time=start)
-                end_date = date_and_time(the_date=date, the_time=end)
-
-                if end == '00:00':
-                    end_date = end_date + pd.Timedelta(days=1)
-
-                time_range = pd.date_range(start=start_date,
-                                           end=end_date,
-                                           freq=level.to_pd_freq()).tolist()
-                if contain_all_timestamp:
-                    time_ranges += time_range
-                else:
-                    if kdata_use_begin_time:
-                        time_ranges += time_range[:-1]
-                    else:
-                        time_ranges += time_range[1:]
-        time_ranges = list(set(time_ranges))
-        time_ranges.sort()
-        return time_ranges
-
-    return date_range
+    return get_trading_calendar(entity_type, exchange, level).iterate_timestamps(
+        start_timestamp=start_timestamp, end_timestamp=end_timestamp, contain_all_timestamp=contain_all_timestamp,
+        kdata_use_begin_time=kdata_use_begin_time).tolist()
 
 
 def is_open_time(entity_type, exchange, timestamp):
-    return is_same_time(timestamp, date_and_time(the_date=timestamp,
-                                                 the_time=get_trading_intervals(entity_type=entity_type,
-                                                                                exchange=exchange)[0][0]))
+    return get_trading_calendar(entity_type, exchange).is_open_time(_to_timestamp(timestamp))
 
 
 def is_close_time(entity_type, exchange, timestamp):
-    return is_same_time(timestamp, date_and_time(the_date=timestamp,
-                                                 the_time=get_trading_intervals(entity_type=entity_type,
-                                                                                exchange=exchange)[-1][-1]))
-
-
-china_stock_level_map_finished_timestamps = {
-    IntervalLevel.LEVEL_1DAY.value: ['00:00', '15:00']
-}
-
-for level in IntervalLevel:
-    if level < IntervalLevel.LEVEL_1DAY:
-        china_stock_level_map_finished_timestamps[level.value] = generate_finished_timestamps(
-            entity_type='stock', exchange='sh', level=level)
+    return get_trading_calendar(entity_type, exchange).is_close_time(_to_timestamp(timestamp))
 
 
 def coin_finished_timestamp(timestamp: pd.Timestamp, level: IntervalLevel):
-    timestamp = to_pd_timestamp(timestamp)
-
-    if timestamp.microsecond != 0:
-        return False
-
-    return timestamp.minute % level.to_minute() == 0
+    return get_trading_calendar('coin', None, level).is_finished_timestamp(_to_timestamp(timestamp))
 
 
 def china_stock_finished_timestamp(timestamp: pd.Timestamp, level: IntervalLevel):
-    timestamp = to_pd_timestamp(timestamp)
-
-    if timestamp.microsecond != 0:
-        return False
-
-    return to_time_str(timestamp, fmt=TIME_FORMAT_MINUTE1) in china_stock_level_map_finished_timestamps.get(
-        level.value)
+    return get_trading_calendar('stock', 'sh', level).is_finished_timestamp(_to_timestamp(timestamp))
 
 
 def is_in_finished_timestamps(entity_type, exchange, timestamp, level: IntervalLevel):
@@ -9,7 +9,7 @@ from zvt.domain.stock_meta import Index
 
 
 def get_securities_in_blocks(block_names=['HS300_'], block_category='concept', provider='eastmoney'):
-    session = get_db_session(provider=provider, data_schema=Index)
+    session = get_db_session(provider=provider, data_schema=Index, readonly=True)
 
     filters = [Index.category == block_category]
     name_filters = None
@@ -5,13 +5,15 @@ import dash_html_components as html
 from dash import dash
 from dash.dependencies import Input, Output, State
 
+from zvdata.chart import register_zoom_callback
 from zvdata.domain import global_providers, get_schemas, get_schema_by_name, get_schema_columns
 from zvdata.normal_data import NormalData
 from zvdata.reader import DataReader
+from zvdata.result_cache import result_cache
 from zvdata.utils.time_utils import now_pd_timestamp, TIME_FORMAT_DAY
 from zvt.api.common import has_report_period, get_important_column
 from zvt.app import app
-from zvt.settings import SAMPLE_STOCK_CODES
+from zvt.settings import SAMPLE_STOCK_CODES, UI_ZOOM_DETAIL
 
 layout = html.Div(
     [
@@ -113,9 +115,9 @@ def update_data_table(n_clicks, provider, schema_name, columns, codes: str, star
         else:
             time_field = 'timestamp'
 
-        data_reader = DataReader(data_schema=get_schema_by_name(schema_name), provider=provider, codes=codes,
-                                 columns=columns, start_timestamp=start_date, end_timestamp=end_date,
-                                 time_field=time_field)
+        data_reader = result_cache.get(DataReader, data_schema=get_schema_by_name(schema_name), provider=provider,
+                                       codes=codes, columns=columns, start_timestamp=start_date,
+                                       end_timestamp=end_date, time_field=time_field)
         if data_reader.is_empty():
             return 'no data,please reselect!', '', [{'label': 'compare_self', 'value': 'compare_self'}], 'compare_self'
 
@@ -193,6 +195,33 @@ def split_filter_part(filter_part, operators=operators_sql):
     return [None] * 3
 
 
+def get_data_reader(filter, provider, schema_name, columns, codes, start_date, end_date):
+    if has_report_period(schema_name=schema_name):
+        time_field = 'report_date'
+    else:
+        time_field = 'timestamp'
+
+    schema = get_schema_by_name(schema_name)
+    # <class 'list'>: ['{report_period} = year']
+    filters = None
+
+    if filter:
+        filters = []
+        print(filter)
+        filtering_expressions = filter.split(' && ')
+
+        for filter_part in filtering_expressions:
+            col_name, operator, filter_value = split_filter_part(filter_part)
+            s = f'schema.{col_name} {operator} "{filter_value}"'
+            filter = eval(s)
+            filters.append(filter)
+
+    # the data is reused when switching the intent or chart
+    return result_cache.get(DataReader, data_schema=schema, provider=provider, codes=codes,
+                            columns=columns, start_timestamp=start_date, end_timestamp=end_date,
+                            time_field=time_field, filters=filters)
+
+
 @app.callback(
     [Output('data_table_content', "data"),
      Output('chart-container', "children")],
@@ -209,30 +238,7 @@ def split_filter_part(filter_part, operators=operators_sql):
 def update_table_and_graph(page_current, page_size, filter, chart, provider, schema_name, columns, codes, start_date,
                            end_date):
     if provider and columns and schema_name and chart:
-
-        if has_report_period(schema_name=schema_name):
-            time_field = 'report_date'
-        else:
-            time_field = 'timestamp'
-
-        schema = get_schema_by_name(schema_name)
-        # <class 'list'>: ['{report_period} = year']
-        filters = None
-
-        if filter:
-            filters = []
-            print(filter)
-            filtering_expressions = filter.split(' && ')
-
-            for filter_part in filtering_expressions:
-                col_name, operator, filter_value = split_filter_part(filter_part)
-                s = f'schema.{col_name} {operator} "{filter_value}"'
-                filter = eval(s)
-                filters.append(filter)
-
-        data_reader = DataReader(data_schema=schema, provider=provider, codes=codes,
-                                 columns=columns, start_timestamp=start_date, end_timestamp=end_date,
-                                 time_field=time_field, filters=filters)
+        data_reader = get_data_reader(filter, provider, schema_name, columns, codes, start_date, end_date)
 
         dff = data_reader.data_df.reset_index()
 
@@ -247,3 +253,24 @@ def update_table_and_graph(page_current, page_size, filter, chart, provider, sch
         )
 
     raise dash.exceptions.PreventUpdate()
+
+
+def draw_graph_detail(x_range, filter, chart, provider, schema_name, columns, codes, start_date, end_date):
+    # only the data in the zoomed range is fetched
+    if x_range:
+        start_date, end_date = x_range
+
+    data_reader = get_data_reader(filter, provider, schema_name, columns, codes, start_date, end_date)
+    return data_reader.data_drawer().draw(chart=chart, render=None, x_range=x_range)
+
+
+if UI_ZOOM_DETAIL:
+    register_zoom_callback(app, 'chart-content', draw_graph_detail,
+                           state=[State('data_table_content', "filter_query"),
+                                  State('chart-selector', "value"),
+                                  State('provider_selector', 'value'),
+                                  State('schema_selector', 'value'),
+                                  State('schema_column_selector', 'value'),
+                                  State('input_code_filter', 'value'),
+                                  State('date-picker-range', 'start_date'),
+                                  State('date-picker-range', 'end_date')])
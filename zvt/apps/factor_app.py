@@ -5,6 +5,7 @@ from dash import dash
 from dash.dependencies import Input, Output
 
 from zvdata.factor import factor_cls_registry, Factor
+from zvdata.result_cache import result_cache
 from zvdata.sedes import UiComposable
 from zvt.app import app
 
@@ -88,8 +89,8 @@ def generate_factor_details_callback(factor_name):
         if n_clicks:
             factor_cls: Factor = factor_cls_registry.get(factor_name)
             factor_args = factor_cls.from_html_inputs(*args)
-            factor: Factor = factor_cls(*factor_args)
-            factor.load_data()
+            # the factor computed with the same args is reused
+            factor: Factor = result_cache.get(factor_cls, *factor_args)
 
             factor_data, factor_layout = factor.draw_depth(render=None)
 
@@ -943,4 +943,20 @@ class FinanceFactor(FinanceBase, Mixin):
     broker_self_operated_fixed_income_securities_net_capital_ratio = Column(Float)
 
 
+# 财报的报告期列表,由各财报recorder共享
+class FinanceReportDate(FinanceBase):
+    __tablename__ = 'finance_report_date'
+
+    id = Column(String(length=128), primary_key=True)
+    entity_id = Column(String(length=128))
+    # 刷新时间
+    timestamp = Column(DateTime)
+
+    # eastmoney的DataType和ReportType
+    data_type = Column(Integer)
+    report_type = Column(Integer)
+    # 逗号分隔的报告期
+    report_dates = Column(String)
+
+
 register_schema(providers=['eastmoney'], db_name='finance', schema_base=FinanceBase)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import Column, String, Float
+from sqlalchemy import Column, String, Float, DateTime, Integer
 from sqlalchemy.ext.declarative import declarative_base
 
 from zvdata.domain import register_schema
 from zvdata.structs import Mixin
+from zvt.settings import KDATA_STORAGE
 
 
 class StockKdataCommon(Mixin):
@@ -72,7 +73,7 @@ class Stock1mKdata(Stock1mKdataBase, StockKdataCommon):
     __tablename__ = 'stock_1m_kdata'
 
 
-register_schema(providers=['joinquant'], db_name='stock_1m_kdata', schema_base=Stock1mKdataBase)
+register_schema(providers=['joinquant'], db_name='stock_1m_kdata', schema_base=Stock1mKdataBase, storage=KDATA_STORAGE)
 
 Stock5MKdataBase = declarative_base()
 
@@ -81,7 +82,7 @@ class Stock5mKdata(Stock5MKdataBase, StockKdataCommon):
     __tablename__ = 'stock_5m_kdata'
 
 
-register_schema(providers=['joinquant'], db_name='stock_5m_kdata', schema_base=Stock5MKdataBase)
+register_schema(providers=['joinquant'], db_name='stock_5m_kdata', schema_base=Stock5MKdataBase, storage=KDATA_STORAGE)
 
 Stock15MKdataBase = declarative_base()
 
@@ -104,7 +105,7 @@ class Stock1hKdata(Stock1HKdataBase, StockKdataCommon):
     __tablename__ = 'stock_1h_kdata'
 
 
-register_schema(providers=['joinquant'], db_name='stock_1h_kdata', schema_base=Stock1HKdataBase)
+register_schema(providers=['joinquant'], db_name='stock_1h_kdata', schema_base=Stock1HKdataBase, storage=KDATA_STORAGE)
 
 Stock1DKdataBase = declarative_base()
 
@@ -113,7 +114,8 @@ class Stock1dKdata(Stock1DKdataBase, StockKdataCommon):
     __tablename__ = 'stock_1d_kdata'
 
 
-register_schema(providers=['joinquant', 'netease'], db_name='stock_1d_kdata', schema_base=Stock1DKdataBase)
+register_schema(providers=['joinquant', 'netease'], db_name='stock_1d_kdata', schema_base=Stock1DKdataBase,
+                storage=KDATA_STORAGE)
 
 Stock1WKKdataBase = declarative_base()
 
@@ -122,7 +124,28 @@ class Stock1wkKdata(Stock1WKKdataBase, StockKdataCommon):
     __tablename__ = 'stock_1wk_kdata'
 
 
-register_schema(providers=['joinquant', 'netease'], db_name='stock_1wk_kdata', schema_base=Stock1WKKdataBase)
+register_schema(providers=['joinquant', 'netease'], db_name='stock_1wk_kdata', schema_base=Stock1WKKdataBase,
+                storage=KDATA_STORAGE)
+
+StockAdjustFactorBase = declarative_base()
+
+
+# 复权因子,只保存因子变化的点
+class StockAdjustFactor(StockAdjustFactorBase):
+    __tablename__ = 'stock_adjust_factor'
+
+    id = Column(String(length=128), primary_key=True)
+    entity_id = Column(String(length=128))
+    # 因子生效的时间
+    timestamp = Column(DateTime)
+
+    # 后复权因子,hfq = price * factor
+    factor = Column(Float)
+    # 写入时的版本,因子变化时加1
+    version = Column(Integer)
+
+
+register_schema(providers=['joinquant', 'netease'], db_name='stock_adjust_factor', schema_base=StockAdjustFactorBase)
 
 Index1DKdataBase = declarative_base()
 
@@ -137,7 +160,7 @@ class Index1dKdata(Index1DKdataBase, KdataCommon):
     change_pct = Column(Float)
 
 
-register_schema(providers=['exchange'], db_name='index_1d_kdata', schema_base=Index1DKdataBase)
+register_schema(providers=['exchange'], db_name='index_1d_kdata', schema_base=Index1DKdataBase, storage=KDATA_STORAGE)
 
 CoinTickKdataBase = declarative_base()
 
@@ -146,7 +169,7 @@ class CoinTickKdata(CoinTickKdataBase, TickCommon):
     __tablename__ = 'coin_tick_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_tick_kdata', schema_base=CoinTickKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_tick_kdata', schema_base=CoinTickKdataBase, storage=KDATA_STORAGE)
 
 Coin1mKdataBase = declarative_base()
 
@@ -155,7 +178,7 @@ class Coin1mKdata(Coin1mKdataBase, KdataCommon):
     __tablename__ = 'coin_1m_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_1m_kdata', schema_base=Coin1mKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_1m_kdata', schema_base=Coin1mKdataBase, storage=KDATA_STORAGE)
 
 Coin5MKdataBase = declarative_base()
 
@@ -164,7 +187,7 @@ class Coin5mKdata(Coin5MKdataBase, KdataCommon):
     __tablename__ = 'coin_5m_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_5m_kdata', schema_base=Coin5MKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_5m_kdata', schema_base=Coin5MKdataBase, storage=KDATA_STORAGE)
 
 Coin15MKdataBase = declarative_base()
 
@@ -173,7 +196,7 @@ class Coin15mKdata(Coin15MKdataBase, KdataCommon):
     __tablename__ = 'coin_15m_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_15m_kdata', schema_base=Coin15MKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_15m_kdata', schema_base=Coin15MKdataBase, storage=KDATA_STORAGE)
 
 Coin1HKdataBase = declarative_base()
 
@@ -182,7 +205,7 @@ class Coin1hKdata(Coin1HKdataBase, KdataCommon):
     __tablename__ = 'coin_1h_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_1h_kdata', schema_base=Coin1HKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_1h_kdata', schema_base=Coin1HKdataBase, storage=KDATA_STORAGE)
 
 Coin1DKdataBase = declarative_base()
 
@@ -191,7 +214,7 @@ class Coin1dKdata(Coin1DKdataBase, KdataCommon):
     __tablename__ = 'coin_1d_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_1d_kdata', schema_base=Coin1DKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_1d_kdata', schema_base=Coin1DKdataBase, storage=KDATA_STORAGE)
 
 Coin1WKKdataBase = declarative_base()
 
@@ -200,4 +223,4 @@ class Coin1wkKdata(Coin1WKKdataBase, KdataCommon):
     __tablename__ = 'coin_1wk_kdata'
 
 
-register_schema(providers=['ccxt'], db_name='coin_1wk_kdata', schema_base=Coin1WKKdataBase)
+register_schema(providers=['ccxt'], db_name='coin_1wk_kdata', schema_base=Coin1WKKdataBase, storage=KDATA_STORAGE)
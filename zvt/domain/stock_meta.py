@@ -74,4 +74,22 @@ class Stock(StockMetaBase, EntityMixin):
     net_winning_rate = Column(Float)
 
 
+# 个股的派生属性,industries变化时重新计算
+class StockAttribute(StockMetaBase):
+    __tablename__ = 'stock_attribute'
+
+    id = Column(String(length=128), primary_key=True)
+    entity_id = Column(String(length=128))
+    timestamp = Column(DateTime)
+
+    # 计算时的industries
+    industries = Column(String)
+    # eastmoney的公司类型
+    company_type = Column(String(length=8))
+    # eastmoney的代码
+    fc = Column(String(length=16))
+    # joinquant的代码
+    jq_code = Column(String(length=16))
+
+
 register_schema(providers=['eastmoney', 'exchange', 'sina'], db_name='stock_meta', schema_base=StockMetaBase)
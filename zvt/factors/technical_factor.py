@@ -1,14 +1,30 @@
+import inspect
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
 
 from zvdata.factor import FilterFactor
 from zvdata.structs import IntervalLevel
 from zvdata.utils.pd_utils import df_is_not_null
 from zvt.api.common import get_kdata_schema
-from zvt.api.computing import ma, macd
+from zvt.api.computing import ma, ema, macd, rsi, boll, atr, kdj, rolling_max, rolling_min, MaState, EmaState, \
+    MacdState, RsiState, BollState, AtrState, KdjState, RollingMaxState, RollingMinState
 from zvt.utils.pd_utils import index_df_with_category_time
 
+# indicator -> (the batch function,the streaming state)
+indicator_functions = {
+    'ma': (ma, MaState),
+    'ema': (ema, EmaState),
+    'macd': (macd, MacdState),
+    'rsi': (rsi, RsiState),
+    'boll': (boll, BollState),
+    'atr': (atr, AtrState),
+    'kdj': (kdj, KdjState),
+    'max': (rolling_max, RollingMaxState),
+    'min': (rolling_min, RollingMinState)
+}
+
 
 class TechnicalFactor(FilterFactor):
     def __init__(self,
@@ -41,6 +57,8 @@ class TechnicalFactor(FilterFactor):
         self.data_schema = get_kdata_schema(entity_type, level=level)
         self.valid_window = valid_window
         self.indicator_cols = set()
+        # category -> {indicator index -> the streaming state},for computing the depth incrementally
+        self.depth_state = {}
 
         super().__init__(self.data_schema, entity_ids, entity_type, exchanges, codes, the_timestamp, start_timestamp,
                          end_timestamp, columns, filters, order, limit, provider, level, category_field, time_field,
@@ -48,72 +66,138 @@ class TechnicalFactor(FilterFactor):
                          fill_method=None, effective_number=None)
 
     def depth_computing(self):
+        # the state would be initialized from the data when computing incrementally
+        self.depth_state = {}
+
         if df_is_not_null(self.data_df):
-            self.depth_df = self.data_df.reset_index(level='timestamp')
+            # all the indicators of all the entities are computed on the panel sorted once
+            depth_df = self.data_df
+            if not depth_df.index.is_monotonic_increasing:
+                depth_df = depth_df.sort_index(level=[0, 1])
 
+            columns = {}
             for idx, indicator in enumerate(self.indicators):
-                if indicator == 'ma':
-                    window = self.indicators_param[idx].get('window')
-
-                    col = 'ma{}'.format(window)
-                    self.indicator_cols.add(col)
-
-                    for entity_id, df in self.depth_df.groupby('entity_id'):
-                        if self.entity_type == 'stock':
-                            self.depth_df.loc[entity_id, col] = ma(df['qfq_close'], window=window)
-                        else:
-                            self.depth_df.loc[entity_id, col] = ma(df['close'], window=window)
-                if indicator == 'macd':
-                    slow = self.indicators_param[idx].get('slow')
-                    fast = self.indicators_param[idx].get('fast')
-                    n = self.indicators_param[idx].get('n')
-
-                    self.indicator_cols.add('diff')
-                    self.indicator_cols.add('dea')
-                    self.indicator_cols.add('macd')
-
-                    for entity_id, df in self.depth_df.groupby('entity_id'):
-                        if self.entity_type == 'stock' and self.fq == 'qfq':
-                            diff, dea, m = macd(df['qfq_close'], slow=slow, fast=fast, n=n)
-                        else:
-                            diff, dea, m = macd(df['close'], slow=slow, fast=fast, n=n)
-
-                        self.depth_df.loc[entity_id, 'diff'] = diff
-                        self.depth_df.loc[entity_id, 'dea'] = dea
-                        self.depth_df.loc[entity_id, 'macd'] = m
-
-            self.depth_df = self.depth_df.set_index('timestamp', append=True)
-
-    def on_category_data_added(self, category, added_data: pd.DataFrame):
-        size = len(added_data)
-        df = self.data_df.loc[category].iloc[-self.valid_window - size:]
-
-        for idx, indicator in enumerate(self.indicators):
-            if indicator == 'ma':
-                window = self.indicators_param[idx].get('window')
-
-                if self.entity_type == 'stock':
-                    df['ma{}'.format(window)] = ma(df['qfq_close'], window=window)
+                inputs = [depth_df[col] for col in self.get_price_cols(indicator)]
+                if self.is_streaming(idx):
+                    values = self.streaming_computing(idx, inputs)
                 else:
-                    df['ma{}'.format(window)] = ma(df['close'], window=window)
-
-            if indicator == 'macd':
-                slow = self.indicators_param[idx].get('slow')
-                fast = self.indicators_param[idx].get('fast')
-                n = self.indicators_param[idx].get('n')
+                    values = indicator_functions[indicator][0](*inputs, **self.get_indicator_param(idx))
+
+                if type(values) != tuple:
+                    values = (values,)
+                for col, value in zip(self.get_indicator_cols(idx), values):
+                    columns[col] = np.asarray(value)
+
+            self.indicator_cols.update(columns.keys())
+
+            depth_df = depth_df.drop(columns=[col for col in columns if col in depth_df.columns])
+            self.depth_df = pd.concat([depth_df, pd.DataFrame(columns, index=depth_df.index)], axis=1)
+
+    def streaming_computing(self, idx, inputs):
+        """
+        compute the indicator row by row with the streaming state,the states of the entities are kept for computing
+        incrementally
+
+        :param idx: the index of the indicator
+        :param inputs: the price series of the panel
+        :return: the values in the order of the panel
+        """
+        state_class = indicator_functions[self.indicators[idx]][1]
+        param = self.get_indicator_param(idx)
+
+        results = []
+        current = None
+        state = None
+        for entity_id, *row in zip(inputs[0].index.get_level_values(0), *[s.values for s in inputs]):
+            if entity_id != current:
+                current = entity_id
+                state = state_class(**param)
+                self.depth_state.setdefault(entity_id, {})[idx] = state
+            results.append(state.update(*row))
+
+        if results and type(results[0]) == tuple:
+            return tuple(np.array(values, dtype=float) for values in zip(*results))
+        return np.array(results, dtype=float)
+
+    def is_streaming(self, idx):
+        return self.indicators_param[idx].get('streaming', False)
+
+    def get_indicator_param(self, idx):
+        """
+        the param of the indicator,the defaults of the batch function are used for the missing ones
+
+        """
+        func = indicator_functions[self.indicators[idx]][0]
+        param = {name: p.default for name, p in inspect.signature(func).parameters.items() if
+                 p.default is not inspect.Parameter.empty}
+        param.update(self.indicators_param[idx])
+        param.pop('streaming', None)
+        return param
+
+    def get_indicator_cols(self, idx):
+        indicator = self.indicators[idx]
+        if indicator == 'macd':
+            return ['diff', 'dea', 'macd']
+        if indicator == 'boll':
+            return ['boll_upper', 'boll_mid', 'boll_lower']
+        if indicator == 'kdj':
+            return ['k', 'd', 'j']
+        # ma5,rsi14...
+        return ['{}{}'.format(indicator, self.get_indicator_param(idx).get('window'))]
+
+    def get_close_col(self, indicator):
+        if indicator == 'ma':
+            return 'qfq_close' if self.entity_type == 'stock' else 'close'
+        return 'qfq_close' if self.entity_type == 'stock' and self.fq == 'qfq' else 'close'
+
+    def get_price_cols(self, indicator):
+        close_col = self.get_close_col(indicator)
+        if indicator in ('atr', 'kdj'):
+            return [close_col.replace('close', 'high'), close_col.replace('close', 'low'), close_col]
+        return [close_col]
+
+    def init_depth_state(self, history: pd.DataFrame, indices=None):
+        """
+        the streaming states of the indicators after the history
+
+        :param history: the data of the category before the added data
+        :param indices: the indices of the indicators to init,all if None
+        :return:
+        """
+        if indices is None:
+            indices = range(len(self.indicators))
+
+        state = {}
+        for idx in indices:
+            indicator = self.indicators[idx]
+            state[idx] = indicator_functions[indicator][1](**self.get_indicator_param(idx))
+            for row in zip(*[history[col].values for col in self.get_price_cols(indicator)]):
+                state[idx].update(*row)
+        return state
+
+    def depth_computing_incrementally(self, category, added_data: pd.DataFrame) -> pd.DataFrame:
+        df = added_data.reset_index(level=0, drop=True).copy()
+
+        state = self.depth_state.setdefault(category, {})
+        # the states not kept by the streaming computing
+        indices = [idx for idx in range(len(self.indicators)) if idx not in state]
+        if indices:
+            history = self.data_df.loc[category]
+            state.update(self.init_depth_state(history[history.index < df.index[0]], indices))
 
-                if self.entity_type == 'stock':
-                    df['diff'], df['dea'], df['m'] = macd(df['qfq_close'], slow=slow, fast=fast, n=n)
-                else:
-                    df['diff'], df['dea'], df['m'] = macd(df['close'], slow=slow, fast=fast, n=n)
+        for idx, indicator in enumerate(self.indicators):
+            inputs = [df[col].values for col in self.get_price_cols(indicator)]
+            values = [state[idx].update(*row) for row in zip(*inputs)]
+            cols = self.get_indicator_cols(idx)
+            if len(cols) == 1:
+                df[cols[0]] = values
+            else:
+                for col, value in zip(cols, zip(*values)):
+                    df[col] = value
 
-        df = df.iloc[-size:, ]
         df = df.reset_index()
         df[self.category_field] = category
-        df = index_df_with_category_time(df)
-
-        self.depth_df = self.depth_df.append(df)
-        self.depth_df = self.depth_df.sort_index(level=[0, 1])
+        return index_df_with_category_time(df)
 
     def draw_depth(self, chart='kline', plotly_layout=None, annotation_df=None, render='html', file_name=None,
                    width=None, height=None, title=None, keep_ui_state=True, **kwargs):
@@ -160,15 +244,15 @@ class CrossMaFactor(TechnicalFactor):
                          time_field='timestamp', auto_load=auto_load, fq='qfq', indicators=['ma', 'ma'],
                          indicators_param=[{'window': short_window}, {'window': long_window}], valid_window=long_window)
 
-    def compute(self):
-        super().compute()
-        s = self.depth_df['ma{}'.format(self.short_window)] > self.depth_df['ma{}'.format(self.long_window)]
-        self.result_df = s.to_frame(name='score')
+    def to_result_df(self, depth_df: pd.DataFrame) -> pd.DataFrame:
+        s = depth_df['ma{}'.format(self.short_window)] > depth_df['ma{}'.format(self.long_window)]
+        return s.to_frame(name='score')
 
-    def on_category_data_added(self, category, added_data: pd.DataFrame):
-        super().on_category_data_added(category, added_data)
-        # TODO:improve it to just computing the added data
-        self.compute()
+    def breadth_computing(self):
+        self.result_df = self.to_result_df(self.depth_df)
+
+    def breadth_computing_incrementally(self, timestamps: List[pd.Timestamp]) -> pd.DataFrame:
+        return self.to_result_df(self.depth_df.loc[self.depth_df.index.get_level_values(1).isin(timestamps)])
 
 
 class BullFactor(TechnicalFactor):
@@ -197,10 +281,15 @@ class BullFactor(TechnicalFactor):
                          time_field='timestamp', auto_load=auto_load, fq='qfq', indicators=indicators,
                          indicators_param=indicators_param, valid_window=valid_window)
 
-    def compute(self):
-        super().compute()
-        s = (self.depth_df['diff'] > 0) & (self.depth_df['dea'] > 0)
-        self.result_df = s.to_frame(name='score')
+    def to_result_df(self, depth_df: pd.DataFrame) -> pd.DataFrame:
+        s = (depth_df['diff'] > 0) & (depth_df['dea'] > 0)
+        return s.to_frame(name='score')
+
+    def breadth_computing(self):
+        self.result_df = self.to_result_df(self.depth_df)
+
+    def breadth_computing_incrementally(self, timestamps: List[pd.Timestamp]) -> pd.DataFrame:
+        return self.to_result_df(self.depth_df.loc[self.depth_df.index.get_level_values(1).isin(timestamps)])
 
 
 if __name__ == '__main__':
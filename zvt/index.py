@@ -9,6 +9,7 @@ import dash_core_components as dcc
 
 from dash.dependencies import Input, Output
 
+from zvdata.result_cache import result_cache
 from zvt.apps import factor_app, data_app, trader_app
 
 from zvt.app import app
@@ -40,7 +41,10 @@ def serve_layout():
                     selected_className='custom-tab--selected'
                 )
             ]),
-        html.Div(id='tabs-content-classes')
+        html.Div(id='tabs-content-classes'),
+        # the hits/misses of the loaded data and factors
+        html.Div(id='result_cache_metrics', style={'color': 'gray'}),
+        dcc.Interval(id='result_cache_interval', interval=5 * 1000)
     ])
     return layout
 
@@ -59,5 +63,11 @@ def render_content(tab):
         return trader_app.serve_layout()
 
 
+@app.callback(Output('result_cache_metrics', 'children'),
+              [Input('result_cache_interval', 'n_intervals')])
+def update_result_cache_metrics(n_intervals):
+    return result_cache.get_metrics_str()
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
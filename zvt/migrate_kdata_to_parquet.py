@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import argparse
+
+from zvdata.domain import get_schema_by_name, get_schemas
+from zvdata.parquet_store import migrate_to_parquet
+from zvt.utils.utils import init_process_log
+
+# migrate the kdata from sqlite to parquet,set ZVT_KDATA_STORAGE=parquet to read/write the migrated data after that
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--provider', help='provider', default='joinquant')
+    parser.add_argument('--schemas', help='kdata schema names,default is all kdata schemas of the provider', nargs='+')
+    parser.add_argument('--entity_ids', help='entity ids,default is all', nargs='+')
+
+    args = parser.parse_args()
+
+    init_process_log('migrate_kdata_to_parquet.log')
+
+    if args.schemas:
+        schemas = [get_schema_by_name(name) for name in args.schemas]
+    else:
+        schemas = [schema for schema in get_schemas(provider=args.provider) if schema.__name__.endswith('Kdata')]
+
+    for schema in schemas:
+        size = migrate_to_parquet(provider=args.provider, data_schema=schema, entity_ids=args.entity_ids)
+        print('migrate {} of {},size:{}'.format(schema.__name__, args.provider, size))
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 import argparse
 
+import pandas as pd
+import tzlocal
+
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.rate_limit_utils import get_or_register_rate_limit
 from zvdata.utils.time_utils import to_pd_timestamp
 from zvt.accounts.ccxt_account import CCXTAccount
-from zvt.api.common import generate_kdata_id, to_ccxt_trading_level, get_kdata_schema
+from zvt.api.common import generate_kdata_id, to_ccxt_trading_level, get_kdata_schema, generate_kdata_ids
 from zvt.domain import Coin
 from zvt.settings import COIN_EXCHANGES, COIN_PAIRS
 from zvt.utils.time_utils import to_time_str
@@ -37,6 +41,17 @@ class CoinKdataRecorder(FixedCycleDataRecorder):
     def generate_domain_id(self, entity, original_data):
         return generate_kdata_id(entity_id=entity.id, timestamp=original_data['timestamp'], level=self.level)
 
+    def generate_domain_ids(self, entity, df):
+        return generate_kdata_ids(entity_id=entity.id, timestamps=df['timestamp'], level=self.level)
+
+    def get_rate_limit_key(self, entity):
+        # the rate limit is per exchange
+        return 'ccxt_{}'.format(entity.exchange)
+
+    def get_rate_limiter(self, entity):
+        return get_or_register_rate_limit(self.get_rate_limit_key(entity),
+                                          rate=1 / CCXTAccount.get_safe_sleeping_time(entity.exchange), capacity=1)
+
     def record(self, entity, start, end, size, timestamps):
         if self.start_timestamp:
             start = max(self.start_timestamp, to_pd_timestamp(start))
@@ -50,8 +65,6 @@ class CoinKdataRecorder(FixedCycleDataRecorder):
 
             limit = min(size, limit)
 
-            kdata_list = []
-
             if CCXTAccount.exchange_conf[entity.exchange]['support_since']:
                 kdatas = ccxt_exchange.fetch_ohlcv(entity.code,
                                                    timeframe=self.ccxt_trading_level,
@@ -62,25 +75,19 @@ class CoinKdataRecorder(FixedCycleDataRecorder):
                                                    limit=limit)
 
             # always ignore the latest one,because it's not finished
-            for kdata in kdatas[0:-1]:
-                current_timestamp = kdata[0]
-                if self.level == IntervalLevel.LEVEL_1DAY:
-                    current_timestamp = to_time_str(current_timestamp)
-
-                kdata_json = {
-                    'timestamp': to_pd_timestamp(current_timestamp),
-                    'open': kdata[1],
-                    'high': kdata[2],
-                    'low': kdata[3],
-                    'close': kdata[4],
-                    'volume': kdata[5],
-                    'name': entity.name,
-                    'provider': 'ccxt',
-                    'level': self.level.value
-                }
-                kdata_list.append(kdata_json)
-
-            return kdata_list
+            df = pd.DataFrame(kdatas[0:-1], columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+            # ms -> local time
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True).dt.tz_convert(
+                tzlocal.get_localzone()).dt.tz_localize(None)
+            if self.level == IntervalLevel.LEVEL_1DAY:
+                df['timestamp'] = df['timestamp'].dt.normalize()
+
+            df['name'] = entity.name
+            df['provider'] = 'ccxt'
+            df['level'] = self.level.value
+
+            return df
         else:
             self.logger.warning("exchange:{} not support fetchOHLCV".format(entity.exchange))
 
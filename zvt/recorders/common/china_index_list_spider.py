@@ -7,6 +7,7 @@ import pandas as pd
 import requests
 from zvdata.api import df_to_db, init_entities
 from zvdata.recorder import Recorder
+from zvdata.utils.http_utils import http_transport
 
 from zvt.api.common import china_stock_code_to_id
 from zvt.domain import StockIndex
@@ -42,7 +43,7 @@ class ChinaIndexListSpider(Recorder):
         page_size = 50
         while True:
             query_url = url.format(page, page_size)
-            response = requests.get(query_url)
+            response = http_transport.get(query_url)
             response_dict = demjson.decode(response.text)
             response_index_list = response_dict.get('list', [])
 
@@ -81,7 +82,7 @@ class ChinaIndexListSpider(Recorder):
             url = query_url.format(index_code)
 
             try:
-                response = requests.get(url)
+                response = http_transport.get(url)
                 response.raise_for_status()
             except requests.HTTPError as error:
                 self.logger.error(f'{index["name"]} - {index_code} 成分股抓取错误 ({error})')
@@ -108,7 +109,7 @@ class ChinaIndexListSpider(Recorder):
         抓取深证指数列表
         """
         url = 'http://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=1812_zs&TABKEY=tab1'
-        response = requests.get(url)
+        response = http_transport.get(url)
         df = pd.read_excel(io.BytesIO(response.content), dtype='str')
 
         df.columns = ['code', 'name', 'timestamp', 'base_point', 'list_date']
@@ -131,7 +132,7 @@ class ChinaIndexListSpider(Recorder):
             index_code = index['code']
 
             url = query_url.format(index_code)
-            response = requests.get(url)
+            response = http_transport.get(url)
 
             response_df = pd.read_excel(io.BytesIO(response.content), dtype='str')
 
@@ -153,7 +154,7 @@ class ChinaIndexListSpider(Recorder):
         抓取国证指数列表
         """
         url = 'http://www.cnindex.com.cn/zstx/jcxl/'
-        response = requests.get(url)
+        response = http_transport.get(url)
         response.encoding = 'utf-8'
         dfs = pd.read_html(response.text)
 
@@ -195,7 +196,7 @@ class ChinaIndexListSpider(Recorder):
             url = query_url.format(index_code)
 
             try:
-                response = requests.get(url)
+                response = http_transport.get(url)
                 response.raise_for_status()
             except requests.HTTPError as error:
                 self.logger.error(f'{index["name"]} - {index_code} 成分股抓取错误 ({error})')
@@ -3,9 +3,9 @@
 import io
 
 import pandas as pd
-import requests
 from zvdata.api import init_entities
 from zvdata.recorder import Recorder
+from zvdata.utils.http_utils import http_transport
 
 from zvt.domain import Stock
 from zvt.recorders.consts import DEFAULT_SH_HEADER, DEFAULT_SZ_HEADER
@@ -22,12 +22,12 @@ class ChinaStockListSpider(Recorder):
     def run(self):
         url = 'http://query.sse.com.cn/security/stock/downloadStockListFile.do?csrcCode=&stockCode=&areaName=&stockType=1'
 
-        resp = requests.get(url, headers=DEFAULT_SH_HEADER)
+        resp = http_transport.get(url, headers=DEFAULT_SH_HEADER)
         self.download_stock_list(response=resp, exchange='sh')
 
         url = 'http://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=1110&TABKEY=tab1&random=0.20932135244582617'
 
-        resp = requests.get(url, headers=DEFAULT_SZ_HEADER)
+        resp = http_transport.get(url, headers=DEFAULT_SZ_HEADER)
         self.download_stock_list(response=resp, exchange='sz')
 
     def download_stock_list(self, response, exchange):
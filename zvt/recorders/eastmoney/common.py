@@ -1,21 +1,33 @@
 # -*- coding: utf-8 -*-
 import logging
-
-import requests
+import threading
 
 from zvdata.api import get_count, get_data
+from zvdata.domain import get_db_session
 from zvdata.recorder import TimestampsDataRecorder, TimeSeriesDataRecorder
-from zvt.api.common import get_company_type
-from zvt.domain import CompanyType, Stock
-from zvt.utils.time_utils import to_pd_timestamp
+from zvdata.utils.http_utils import http_transport, request_all, HttpTransport
+from zvt.api.common import get_company_type, to_jq_entity_id
+from zvt.domain import CompanyType, Stock, StockAttribute
+from zvt.utils.time_utils import to_pd_timestamp, now_pd_timestamp
 
 logger = logging.getLogger(__name__)
 
 
 class ApiWrapper(object):
+    # all the provider calls go through the shared transport
+    transport: HttpTransport = http_transport
+
     def request(self, url=None, method='post', param=None, path_fields=None):
         raise NotImplementedError
 
+    def request_all(self, url=None, method='post', params=None, path_fields=None):
+        """
+        the requests of the params,sent concurrently by the async transport if aiohttp is installed
+
+        :return: the results in the order of params
+        """
+        raise NotImplementedError
+
 
 def get_fc(security_item):
     if security_item.exchange == 'sh':
@@ -26,7 +38,7 @@ def get_fc(security_item):
     return fc
 
 
-def company_type_flag(security_item):
+def query_company_type_flag(security_item):
     try:
         company_type = get_company_type(security_item)
 
@@ -46,7 +58,7 @@ def company_type_flag(security_item):
         "fc": get_fc(security_item)
     }
 
-    resp = requests.post('https://emh5.eastmoney.com/api/CaiWuFenXi/GetCompanyType', json=param)
+    resp = http_transport.post('https://emh5.eastmoney.com/api/CaiWuFenXi/GetCompanyType', json=param)
 
     ct = resp.json().get('Result').get('CompanyType')
 
@@ -55,10 +67,67 @@ def company_type_flag(security_item):
     return ct
 
 
-def call_eastmoney_api(url=None, method='post', param=None, path_fields=None):
-    if method == 'post':
-        resp = requests.post(url, json=param)
+class StockAttributeCache(object):
+    """
+    the memoized company type,fc and jq code of the stocks,persisted in the stock meta db and shared by the eastmoney
+    recorders,the attributes are recomputed once Stock.industries changed
+
+    """
+
+    def __init__(self, provider: str = 'eastmoney') -> None:
+        self.provider = provider
+        # entity_id -> StockAttribute,loaded from the db on the first get
+        self.attributes = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        session = get_db_session(provider=self.provider, data_schema=StockAttribute)
+        try:
+            self.attributes = {item.id: item for item in session.query(StockAttribute).all()}
+            # detached from the session and used as plain objects
+            session.expunge_all()
+        finally:
+            session.close()
+
+    def get(self, security_item) -> StockAttribute:
+        with self.lock:
+            if self.attributes is None:
+                self.load()
+
+            the_attribute = self.attributes.get(security_item.id)
+            if the_attribute is not None and the_attribute.industries == security_item.industries:
+                return the_attribute
+
+        the_attribute = StockAttribute(id=security_item.id, entity_id=security_item.id,
+                                       timestamp=now_pd_timestamp(), industries=security_item.industries,
+                                       company_type=query_company_type_flag(security_item),
+                                       fc=get_fc(security_item), jq_code=to_jq_entity_id(security_item))
+
+        session = get_db_session(provider=self.provider, data_schema=StockAttribute)
+        try:
+            session.merge(the_attribute)
+            session.commit()
+        finally:
+            session.close()
+
+        with self.lock:
+            self.attributes[security_item.id] = the_attribute
+        return the_attribute
+
+    def clear(self):
+        with self.lock:
+            self.attributes = None
 
+
+# shared by the eastmoney recorders
+stock_attribute_cache = StockAttributeCache()
+
+
+def company_type_flag(security_item):
+    return stock_attribute_cache.get(security_item).company_type
+
+
+def get_eastmoney_result(resp, url=None, param=None, path_fields=None):
     resp.encoding = 'utf8'
 
     try:
@@ -79,6 +148,45 @@ def call_eastmoney_api(url=None, method='post', param=None, path_fields=None):
     return origin_result
 
 
+def call_eastmoney_api(url=None, method='post', param=None, path_fields=None, transport=http_transport):
+    if method == 'post':
+        resp = transport.post(url, json=param)
+    else:
+        resp = transport.get(url, params=param)
+
+    return get_eastmoney_result(resp, url=url, param=param, path_fields=path_fields)
+
+
+def call_eastmoney_api_all(url=None, method='post', params=None, path_fields=None, transport=http_transport,
+                           rate_limiter=None, return_exceptions=False):
+    """
+    the requests of the params sent concurrently
+
+    :param rate_limiter: the TokenBucket of eastmoney acquired before every request
+    :param return_exceptions: whether return the exception in the place of the failed request or response,so one bad
+    response would not drop the others
+    :return: the results in the order of params
+    """
+    if method == 'post':
+        calls = [{'method': 'post', 'url': url, 'json': param} for param in params]
+    else:
+        calls = [{'method': 'get', 'url': url, 'params': param} for param in params]
+
+    results = []
+    for resp, param in zip(request_all(calls, transport=transport, rate_limiter=rate_limiter,
+                                       return_exceptions=return_exceptions), params):
+        if isinstance(resp, Exception):
+            results.append(resp)
+            continue
+        try:
+            results.append(get_eastmoney_result(resp, url=url, param=param, path_fields=path_fields))
+        except Exception as e:
+            if not return_exceptions:
+                raise e
+            results.append(e)
+    return results
+
+
 def get_from_path_fields(the_json, path_fields):
     the_data = the_json.get(path_fields[0])
     if the_data:
@@ -91,7 +199,12 @@ def get_from_path_fields(the_json, path_fields):
 
 class EastmoneyApiWrapper(ApiWrapper):
     def request(self, url=None, method='post', param=None, path_fields=None):
-        return call_eastmoney_api(url=url, method=method, param=param, path_fields=path_fields)
+        return call_eastmoney_api(url=url, method=method, param=param, path_fields=path_fields,
+                                  transport=self.transport)
+
+    def request_all(self, url=None, method='post', params=None, path_fields=None):
+        return call_eastmoney_api_all(url=url, method=method, params=params, path_fields=path_fields,
+                                      transport=self.transport)
 
 
 class BaseEastmoneyRecorder(object):
@@ -142,9 +255,9 @@ class EastmoneyTimestampsDataRecorder(BaseEastmoneyRecorder, TimestampsDataRecor
             "fc": get_fc(entity)
         }
 
-        timestamp_json_list = call_eastmoney_api(url=self.timestamps_fetching_url,
-                                                 path_fields=self.timestamp_list_path_fields,
-                                                 param=param)
+        timestamp_json_list = self.api_wrapper.request(url=self.timestamps_fetching_url,
+                                                       path_fields=self.timestamp_list_path_fields,
+                                                       param=param)
 
         if self.timestamp_path_fields:
             timestamps = [get_from_path_fields(data, self.timestamp_path_fields) for data in timestamp_json_list]
@@ -167,7 +280,7 @@ class EastmoneyPageabeDataRecorder(BaseEastmoneyRecorder, TimeSeriesDataRecorder
             "pageNum": 1,
             "pageSize": 1
         }
-        return call_eastmoney_api(self.page_url, param=param, path_fields=['TotalCount'])
+        return self.api_wrapper.request(url=self.page_url, param=param, path_fields=['TotalCount'])
 
     def evaluate_start_end_size_timestamps(self, entity):
         remote_count = self.get_remote_count(entity)
@@ -207,7 +320,7 @@ class EastmoneyMoreDataRecorder(BaseEastmoneyRecorder, TimeSeriesDataRecorder):
             "pageNum": 1,
             "pageSize": 1
         }
-        results = call_eastmoney_api(self.url, param=param, path_fields=self.path_fields)
+        results = self.api_wrapper.request(url=self.url, param=param, path_fields=self.path_fields)
         return self.generate_domain(security_item, results[0])
 
     def evaluate_start_end_size_timestamps(self, entity):
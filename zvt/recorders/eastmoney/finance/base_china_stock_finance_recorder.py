@@ -1,25 +1,156 @@
 # -*- coding: utf-8 -*-
+import logging
+import threading
+from typing import List
+
+import pandas as pd
 from jqdatasdk import auth, query, indicator, get_fundamentals, logout
+from sqlalchemy import and_, bindparam
 
-from zvdata.api import get_data
+from zvdata.domain import get_db_session
 from zvdata.utils.pd_utils import df_is_not_null
-from zvt.api.api import get_finance_factors
-from zvt.api.common import to_jq_entity_id, to_jq_report_period
-from zvt.domain import FinanceFactor
-from zvt.recorders.eastmoney.common import company_type_flag, get_fc, EastmoneyTimestampsDataRecorder, \
-    call_eastmoney_api, get_from_path_fields
+from zvdata.utils.rate_limit_utils import get_provider_rate_limiter
+from zvt.api.common import to_jq_report_period
+from zvt.domain import FinanceFactor, FinanceReportDate
+from zvt.recorders.eastmoney.common import EastmoneyTimestampsDataRecorder, BaseEastmoneyRecorder, \
+    get_from_path_fields, get_fc, call_eastmoney_api_all, stock_attribute_cache
 from zvt.settings import JQ_ACCOUNT, JQ_PASSWD
-from zvt.utils.pd_utils import index_df
-from zvt.utils.time_utils import to_time_str, to_pd_timestamp
+from zvt.utils.time_utils import to_time_str, to_pd_timestamp, now_pd_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class ReportDateIndex(object):
+    """
+    the report dates of the stocks keyed by (entity,data_type,report_type),persisted in the finance db and shared by
+    the finance recorders,the entries older than ttl are refreshed concurrently in one pass
+
+    """
+    url = 'https://emh5.eastmoney.com/api/CaiWuFenXi/GetCompanyReportDateList'
+    path_fields = ['CompanyReportDateList']
+    ttl = pd.Timedelta(hours=12)
+    # the requests saved together
+    batch_size = 200
+
+    def __init__(self, provider: str = 'eastmoney') -> None:
+        self.provider = provider
+        # id -> FinanceReportDate,loaded from the db on the first use
+        self.report_dates = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_id(entity_id, data_type, report_type):
+        return '{}_{}_{}'.format(entity_id, data_type, report_type)
+
+    def load(self):
+        session = get_db_session(provider=self.provider, data_schema=FinanceReportDate)
+        try:
+            self.report_dates = {item.id: item for item in session.query(FinanceReportDate).all()}
+            session.expunge_all()
+        finally:
+            session.close()
+
+    def is_expired(self, item):
+        return item is None or item.timestamp is None or now_pd_timestamp() - item.timestamp > self.ttl
+
+    def get(self, entity, data_type, report_type) -> List[pd.Timestamp]:
+        """
+        the report dates of the entity,None if missing or expired
+
+        """
+        with self.lock:
+            if self.report_dates is None:
+                self.load()
+            item = self.report_dates.get(self.get_id(entity.id, data_type, report_type))
+
+        if self.is_expired(item):
+            return None
+        return [to_pd_timestamp(t) for t in item.report_dates.split(',') if t]
+
+    def get_rate_limiter(self):
+        # shared with the eastmoney recorders
+        return get_provider_rate_limiter(self.provider)
+
+    def refresh(self, entities, types, force=False):
+        """
+        fetch the report dates of the missing or expired (entity,data_type,report_type) concurrently
+
+        :param entities: the stocks
+        :param types: the list of (data_type,report_type)
+        :param force: refresh all even if not expired
+        """
+        with self.lock:
+            if self.report_dates is None:
+                self.load()
+            keys = [(entity, data_type, report_type) for entity in entities for data_type, report_type in types if
+                    force or self.is_expired(self.report_dates.get(self.get_id(entity.id, data_type, report_type)))]
+
+        if keys:
+            logger.info('refresh report dates:{}'.format(len(keys)))
+
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            params = []
+            for entity, data_type, report_type in batch:
+                param = {
+                    "color": "w",
+                    "fc": get_fc(entity),
+                    "DataType": data_type
+                }
+                if report_type:
+                    param['ReportType'] = report_type
+                params.append(param)
+
+            results = call_eastmoney_api_all(url=self.url, params=params, path_fields=self.path_fields,
+                                             rate_limiter=self.get_rate_limiter(), return_exceptions=True)
+
+            items = []
+            for (entity, data_type, report_type), result in zip(batch, results):
+                # not cached,retried by the next refresh
+                if isinstance(result, Exception):
+                    logger.warning('refresh report dates of {} error:{}'.format(entity.id, result))
+                    continue
+                if result is None:
+                    continue
+                try:
+                    report_dates = [to_time_str(get_from_path_fields(data, ['ReportDate'])) for data in result]
+                except Exception as e:
+                    logger.warning('parse report dates of {} error:{},result:{}'.format(entity.id, e, result))
+                    continue
+                items.append(FinanceReportDate(id=self.get_id(entity.id, data_type, report_type),
+                                               entity_id=entity.id, timestamp=now_pd_timestamp(),
+                                               data_type=data_type, report_type=report_type,
+                                               report_dates=','.join(report_dates)))
+
+            session = get_db_session(provider=self.provider, data_schema=FinanceReportDate)
+            try:
+                for item in items:
+                    session.merge(item)
+                session.commit()
+            finally:
+                session.close()
+
+            with self.lock:
+                for item in items:
+                    self.report_dates[item.id] = item
+
+    def clear(self):
+        with self.lock:
+            self.report_dates = None
+
+
+# shared by the finance recorders
+report_date_index = ReportDateIndex()
 
 
 class BaseChinaStockFinanceRecorder(EastmoneyTimestampsDataRecorder):
     finance_report_type = None
     data_type = 1
 
-    timestamps_fetching_url = 'https://emh5.eastmoney.com/api/CaiWuFenXi/GetCompanyReportDateList'
-    timestamp_list_path_fields = ['CompanyReportDateList']
-    timestamp_path_fields = ['ReportDate']
+    # the entities in one sql query when filling the publish dates
+    fill_batch_size = 500
+    # the codes in one jq get_fundamentals
+    jq_batch_size = 1000
 
     def __init__(self, entity_type='stock', exchanges=['sh', 'sz'], entity_ids=None, codes=None, batch_size=10,
                  force_update=False, sleeping_time=5, default_size=2000, one_shot=False,
@@ -29,31 +160,34 @@ class BaseChinaStockFinanceRecorder(EastmoneyTimestampsDataRecorder):
 
         auth(JQ_ACCOUNT, JQ_PASSWD)
 
-    def init_timestamps(self, entity):
-        param = {
-            "color": "w",
-            "fc": get_fc(entity),
-            "DataType": self.data_type
-        }
+        self.finished_entity_ids = []
 
-        if self.finance_report_type == 'LiRunBiaoList' or self.finance_report_type == 'XianJinLiuLiangBiaoList':
-            param['ReportType'] = 1
+    @classmethod
+    def get_report_type(cls):
+        if cls.finance_report_type == 'LiRunBiaoList' or cls.finance_report_type == 'XianJinLiuLiangBiaoList':
+            return 1
+        return 0
 
-        timestamp_json_list = call_eastmoney_api(url=self.timestamps_fetching_url,
-                                                 path_fields=self.timestamp_list_path_fields,
-                                                 param=param)
+    def run(self):
+        # the report dates of all the entities are fetched in one concurrent pass
+        report_date_index.refresh(self.entities, [(self.data_type, self.get_report_type())])
+        super().run()
 
-        if self.timestamp_path_fields:
-            timestamps = [get_from_path_fields(data, self.timestamp_path_fields) for data in timestamp_json_list]
+    def init_timestamps(self, entity):
+        timestamps = report_date_index.get(entity, self.data_type, self.get_report_type())
+        if timestamps is None:
+            report_date_index.refresh([entity], [(self.data_type, self.get_report_type())], force=True)
+            timestamps = report_date_index.get(entity, self.data_type, self.get_report_type())
 
-        return [to_pd_timestamp(t) for t in timestamps]
+        return timestamps or []
 
     def generate_request_param(self, security_item, start, end, size, timestamps):
+        the_attribute = stock_attribute_cache.get(security_item)
         if len(timestamps) <= 10:
             param = {
                 "color": "w",
-                "fc": get_fc(security_item),
-                "corpType": company_type_flag(security_item),
+                "fc": the_attribute.fc,
+                "corpType": the_attribute.company_type,
                 # 0 means get all types
                 "reportDateType": 0,
                 "endDate": '',
@@ -62,21 +196,21 @@ class BaseChinaStockFinanceRecorder(EastmoneyTimestampsDataRecorder):
         else:
             param = {
                 "color": "w",
-                "fc": get_fc(security_item),
-                "corpType": company_type_flag(security_item),
+                "fc": the_attribute.fc,
+                "corpType": the_attribute.company_type,
                 # 0 means get all types
                 "reportDateType": 0,
                 "endDate": to_time_str(timestamps[10]),
                 "latestCount": 10
             }
 
-        if self.finance_report_type == 'LiRunBiaoList' or self.finance_report_type == 'XianJinLiuLiangBiaoList':
+        if self.get_report_type():
             param['reportType'] = 1
 
         return param
 
     def generate_path_fields(self, security_item):
-        comp_type = company_type_flag(security_item)
+        comp_type = stock_attribute_cache.get(security_item).company_type
 
         if comp_type == "3":
             return ['{}_YinHang'.format(self.finance_report_type)]
@@ -98,65 +232,100 @@ class BaseChinaStockFinanceRecorder(EastmoneyTimestampsDataRecorder):
     def get_original_time_field(self):
         return 'ReportDate'
 
-    def fill_timestamp_with_jq(self, security_item, the_data):
-        # get report published date from jq
-        q = query(
-            indicator.pubDate
-        ).filter(
-            indicator.code == to_jq_entity_id(security_item),
-        )
-
-        df = get_fundamentals(q, statDate=to_jq_report_period(the_data.report_date))
-        if not df.empty:
-            the_data.timestamp = to_pd_timestamp(df['pubDate'][0])
-            self.logger.info(
-                'jq fill {} {} timestamp:{} for report_date:{}'.format(self.data_schema, security_item.id,
-                                                                       the_data.timestamp,
-                                                                       the_data.report_date))
-            self.session.commit()
-
     def on_finish_entity(self, entity):
-        # fill the timestamp for report published date
-        the_data_list = get_data(data_schema=self.data_schema,
-                                 provider=self.provider,
-                                 entity_id=entity.id,
-                                 order=self.data_schema.timestamp.asc(),
-                                 return_type='domain',
-                                 session=self.session,
-                                 filters=[self.data_schema.timestamp == self.data_schema.report_date,
-                                          self.data_schema.timestamp >= to_pd_timestamp('2005-01-01')])
-        if the_data_list:
-            if self.data_schema == FinanceFactor:
-                for the_data in the_data_list:
-                    self.fill_timestamp_with_jq(entity, the_data)
-            else:
-                df = get_finance_factors(entity_id=entity.id,
-                                         columns=[FinanceFactor.timestamp, FinanceFactor.report_date, FinanceFactor.id],
-                                         filters=[FinanceFactor.timestamp != FinanceFactor.report_date,
-                                                  FinanceFactor.timestamp >= to_pd_timestamp('2005-01-01'),
-                                                  FinanceFactor.report_date >= the_data_list[0].report_date,
-                                                  FinanceFactor.report_date <= the_data_list[-1].report_date, ])
+        # the publish dates are filled in bulk by on_finish
+        self.finished_entity_ids.append(entity.id)
+
+    def get_unfilled_reports(self, entity_ids):
+        """
+        the reports whose timestamp is not filled with the publish date yet
+
+        :return: [(id,entity_id,report_date)]
+        """
+        return self.session.query(self.data_schema.id, self.data_schema.entity_id,
+                                  self.data_schema.report_date).filter(
+            self.data_schema.entity_id.in_(entity_ids),
+            self.data_schema.timestamp == self.data_schema.report_date,
+            self.data_schema.timestamp >= to_pd_timestamp('2005-01-01')).all()
+
+    def get_timestamps_from_finance_factor(self, entity_ids):
+        """
+        the publish dates of the unfilled reports from FinanceFactor joined on (entity_id,report_date)
 
+        :return: {id:timestamp}
+        """
+        rows = self.session.query(self.data_schema.id, FinanceFactor.timestamp).join(
+            FinanceFactor, and_(FinanceFactor.entity_id == self.data_schema.entity_id,
+                                FinanceFactor.report_date == self.data_schema.report_date)).filter(
+            self.data_schema.entity_id.in_(entity_ids),
+            self.data_schema.timestamp == self.data_schema.report_date,
+            self.data_schema.timestamp >= to_pd_timestamp('2005-01-01'),
+            FinanceFactor.timestamp != FinanceFactor.report_date,
+            FinanceFactor.timestamp >= to_pd_timestamp('2005-01-01')).all()
+        return {the_id: timestamp for the_id, timestamp in rows}
+
+    def get_timestamps_from_jq(self, reports):
+        """
+        the publish dates of the reports from jq,one get_fundamentals for the codes of the same statDate
+
+        :param reports: [(id,entity_id,report_date)]
+        :return: {id:timestamp}
+        """
+        entities = {entity.id: entity for entity in self.entities}
+
+        # statDate -> {jq code:[id]}
+        stat_date_ids = {}
+        for the_id, entity_id, report_date in reports:
+            jq_code = stock_attribute_cache.get(entities[entity_id]).jq_code
+            stat_date_ids.setdefault(to_jq_report_period(report_date), {}).setdefault(jq_code, []).append(the_id)
+
+        timestamps = {}
+        for stat_date, code_ids in stat_date_ids.items():
+            codes = list(code_ids.keys())
+            for i in range(0, len(codes), self.jq_batch_size):
+                q = query(
+                    indicator.code, indicator.pubDate
+                ).filter(
+                    indicator.code.in_(codes[i:i + self.jq_batch_size]),
+                )
+                df = get_fundamentals(q, statDate=stat_date)
                 if df_is_not_null(df):
-                    index_df(df, index='report_date')
-
-                for the_data in the_data_list:
-                    if (df is not None) and (not df.empty) and the_data.report_date in df.index:
-                        the_data.timestamp = df.at[the_data.report_date, 'timestamp']
-                        self.logger.info(
-                            'db fill {} {} timestamp:{} for report_date:{}'.format(self.data_schema, entity.id,
-                                                                                   the_data.timestamp,
-                                                                                   the_data.report_date))
-                        self.session.commit()
-                    else:
-                        # self.logger.info(
-                        #     'waiting jq fill {} {} timestamp:{} for report_date:{}'.format(self.data_schema,
-                        #                                                                    security_item.id,
-                        #                                                                    the_data.timestamp,
-                        #                                                                    the_data.report_date))
-
-                        self.fill_timestamp_with_jq(entity, the_data)
+                    for code, pub_date in zip(df['code'], df['pubDate']):
+                        for the_id in code_ids.get(code, []):
+                            timestamps[the_id] = to_pd_timestamp(pub_date)
+            self.logger.info('jq fill {} timestamp of {} codes for statDate:{}'.format(self.data_schema.__name__,
+                                                                                      len(codes), stat_date))
+        return timestamps
+
+    def fill_timestamps(self, entity_ids):
+        """
+        fill the timestamp of the reports with the publish date,from FinanceFactor first and jq for the remaining,the
+        timestamps are written by one executemany update
+
+        """
+        reports = []
+        for i in range(0, len(entity_ids), self.fill_batch_size):
+            reports += self.get_unfilled_reports(entity_ids[i:i + self.fill_batch_size])
+        if not reports:
+            return
+
+        timestamps = {}
+        if self.data_schema != FinanceFactor:
+            for i in range(0, len(entity_ids), self.fill_batch_size):
+                timestamps.update(self.get_timestamps_from_finance_factor(entity_ids[i:i + self.fill_batch_size]))
+            self.logger.info('db fill {} timestamp:{}/{}'.format(self.data_schema.__name__, len(timestamps),
+                                                                 len(reports)))
+
+        timestamps.update(self.get_timestamps_from_jq([report for report in reports if report[0] not in timestamps]))
+
+        if timestamps:
+            table = self.data_schema.__table__
+            self.session.execute(table.update().where(table.c.id == bindparam('the_id')).values(
+                timestamp=bindparam('the_timestamp')),
+                [{'the_id': the_id, 'the_timestamp': timestamp} for the_id, timestamp in timestamps.items()])
+            self.session.commit()
 
     def on_finish(self):
+        self.fill_timestamps(self.finished_entity_ids)
         super().on_finish()
         logout()
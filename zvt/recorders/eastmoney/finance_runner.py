@@ -5,6 +5,8 @@ import time
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from zvdata.api import get_entities
+from zvt.recorders.eastmoney.finance.base_china_stock_finance_recorder import report_date_index
 from zvt.recorders.eastmoney.finance.china_stock_balance_sheet_recorder import ChinaStockBalanceSheetRecorder
 from zvt.recorders.eastmoney.finance.china_stock_cash_flow_recorder import ChinaStockCashFlowRecorder
 from zvt.recorders.eastmoney.finance.china_stock_finance_factor_recorder import ChinaStockFinanceFactorRecorder
@@ -15,15 +17,25 @@ logger = logging.getLogger(__name__)
 
 sched = BackgroundScheduler()
 
+finance_recorders = [ChinaStockFinanceFactorRecorder, ChinaStockCashFlowRecorder, ChinaStockBalanceSheetRecorder,
+                     ChinaStockIncomeStatementRecorder]
+
+
+def refresh_report_dates():
+    # one discovery pass for all the finance recorders
+    entities = get_entities(entity_type='stock', exchanges=['sh', 'sz'], return_type='domain', provider='eastmoney')
+    report_date_index.refresh(entities,
+                              [(recorder.data_type, recorder.get_report_type()) for recorder in finance_recorders])
+
 
 @sched.scheduled_job('cron', hour=2, minute=00)
 def run():
     while True:
         try:
-            ChinaStockFinanceFactorRecorder().run()
-            ChinaStockCashFlowRecorder().run()
-            ChinaStockBalanceSheetRecorder().run()
-            ChinaStockIncomeStatementRecorder().run()
+            refresh_report_dates()
+
+            for recorder in finance_recorders:
+                recorder().run()
             break
         except Exception as e:
             logger.exception('finance runner error:{}'.format(e))
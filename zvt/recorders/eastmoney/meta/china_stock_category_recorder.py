@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
-import requests
 
 from zvdata.api import df_to_db
 from zvdata.recorder import Recorder
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import china_stock_code_to_id
 from zvt.api.technical import get_entities
 from zvt.domain import StockIndex, StockCategory
@@ -34,7 +34,7 @@ class ChinaStockCategoryRecorder(Recorder):
 
     def run(self):
         for category, url in self.category_map_url.items():
-            resp = requests.get(url)
+            resp = http_transport.get(url)
             results = json_callback_param(resp.text)
             for result in results:
                 items = result.split(',')
@@ -54,7 +54,7 @@ class ChinaStockCategoryRecorder(Recorder):
                                provider=self.provider)
 
         for index_item in indices:
-            resp = requests.get(self.category_stocks_url.format(index_item.code, '1'))
+            resp = http_transport.get(self.category_stocks_url.format(index_item.code, '1'))
             try:
                 results = json_callback_param(resp.text)
                 the_list = []
@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 
-import requests
-
 from zvdata.recorder import Recorder
+from zvdata.utils.http_utils import http_transport
 from zvt.api.technical import get_entities
 from zvt.domain.stock_meta import Stock
 from zvt.utils.time_utils import to_pd_timestamp
@@ -37,7 +36,7 @@ class ChinaStockMetaRecorder(Recorder):
 
             # 基本资料
             param = {"color": "w", "fc": fc, "SecurityCode": "SZ300059"}
-            resp = requests.post('https://emh5.eastmoney.com/api/GongSiGaiKuang/GetJiBenZiLiao', json=param)
+            resp = http_transport.post('https://emh5.eastmoney.com/api/GongSiGaiKuang/GetJiBenZiLiao', json=param)
             resp.encoding = 'utf8'
 
             resp_json = resp.json()['Result']['JiBenZiLiao']
@@ -60,7 +59,7 @@ class ChinaStockMetaRecorder(Recorder):
 
             # 发行相关
             param = {"color": "w", "fc": fc}
-            resp = requests.post('https://emh5.eastmoney.com/api/GongSiGaiKuang/GetFaXingXiangGuan', json=param)
+            resp = http_transport.post('https://emh5.eastmoney.com/api/GongSiGaiKuang/GetFaXingXiangGuan', json=param)
             resp.encoding = 'utf8'
 
             resp_json = resp.json()['Result']['FaXingXiangGuan']
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import requests
-
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import data_exist, generate_kdata_id
 from zvt.domain import IntervalLevel, EntityType
 from zvt.recorders.recorder import TimeSeriesFetchingStyle, FixedCycleDataRecorder
@@ -43,7 +42,7 @@ class ChinaStockKdataRecorder(FixedCycleDataRecorder):
         the_url = self.url.format("{}".format(id_flag), eastmoney_map_zvt_trading_level(self.level),
                                   now_time_str(fmt=TIME_FORMAT_MINUTE), size)
 
-        resp = requests.get(the_url)
+        resp = http_transport.get(the_url)
         results = json_callback_param(resp.text)
 
         kdatas = []
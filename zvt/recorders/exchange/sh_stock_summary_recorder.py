@@ -1,8 +1,8 @@
 import demjson
 import pandas as pd
-import requests
 
 from zvdata.recorder import TimestampsDataRecorder
+from zvdata.utils.http_utils import http_transport
 from zvt.domain import Index
 from zvt.domain.macro import StockSummary
 from zvt.recorders.consts import DEFAULT_SH_SUMMARY_HEADER
@@ -35,7 +35,7 @@ class StockSummaryRecorder(TimestampsDataRecorder):
         for timestamp in timestamps:
             timestamp_str = to_time_str(timestamp)
             url = self.url.format(timestamp_str)
-            response = requests.get(url=url, headers=DEFAULT_SH_SUMMARY_HEADER)
+            response = http_transport.get(url=url, headers=DEFAULT_SH_SUMMARY_HEADER)
 
             results = demjson.decode(response.text[response.text.index("(") + 1:response.text.index(")")])['result']
             result = [result for result in results if result['productType'] == '1']
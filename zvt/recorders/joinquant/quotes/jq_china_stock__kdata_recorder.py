@@ -4,12 +4,15 @@ import io
 from datetime import timedelta
 
 import pandas as pd
-import requests
 from jqdatasdk import auth, get_price, logout
 
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
-from zvt.api.common import generate_kdata_id, to_jq_entity_id, get_kdata_schema, to_jq_trading_level
+from zvdata.utils.http_utils import http_transport
+from zvdata.utils.pd_utils import df_is_not_null
+from zvt.api.adjust import adjust_engine, update_kdata, adjusted_cols
+from zvt.api.common import generate_kdata_id, to_jq_entity_id, get_kdata_schema, to_jq_trading_level, \
+    generate_kdata_ids
 from zvt.api.rules import is_in_trading
 from zvt.api.technical import get_kdata
 from zvt.domain import Stock
@@ -37,17 +40,6 @@ class JQChinaStockKdataRecorder(FixedCycleDataRecorder):
                          contain_unfinished_data, level, kdata_use_begin_time, close_hour, close_minute,
                          one_day_trading_minutes)
 
-        self.current_factors = {}
-        for security_item in self.entities:
-            kdata = get_kdata(entity_id=security_item.id, provider=self.provider,
-                              level=self.level.value, order=self.data_schema.timestamp.desc(),
-                              limit=1,
-                              return_type='domain',
-                              session=self.session)
-            if kdata:
-                self.current_factors[security_item.id] = kdata[0].factor
-                self.logger.info('{} latest factor:{}'.format(security_item.id, kdata[0].factor))
-
         auth(JQ_ACCOUNT, JQ_PASSWD)
 
     def get_data_map(self):
@@ -56,50 +48,31 @@ class JQChinaStockKdataRecorder(FixedCycleDataRecorder):
     def generate_domain_id(self, entity, original_data):
         return generate_kdata_id(entity_id=entity.id, timestamp=original_data['timestamp'], level=self.level)
 
+    def generate_domain_ids(self, entity, df):
+        return generate_kdata_ids(entity_id=entity.id, timestamps=df['timestamp'], level=self.level)
+
     def on_finish_entity(self, entity):
-        kdatas = get_kdata(provider=self.provider, entity_id=entity.id, level=self.level.value,
-                           order=self.data_schema.timestamp.asc(),
-                           return_type='domain',
-                           session=self.session,
-                           filters=[self.data_schema.hfq_close.is_(None),
-                                    self.data_schema.timestamp >= to_pd_timestamp('2005-01-01')])
-        if kdatas:
-            start = kdatas[0].timestamp
-            end = kdatas[-1].timestamp
-
-            # get hfq from joinquant
-            df = get_price(to_jq_entity_id(entity), start_date=to_time_str(start), end_date=now_time_str(),
-                           frequency='daily',
-                           fields=['factor', 'open', 'close', 'low', 'high'],
-                           skip_paused=True, fq='post')
-            if df is not None and not df.empty:
-                # fill hfq data
-                for kdata in kdatas:
-                    time_str = to_time_str(kdata.timestamp)
-                    if time_str in df.index:
-                        kdata.hfq_open = df.loc[time_str, 'open']
-                        kdata.hfq_close = df.loc[time_str, 'close']
-                        kdata.hfq_high = df.loc[time_str, 'high']
-                        kdata.hfq_low = df.loc[time_str, 'low']
-                        kdata.factor = df.loc[time_str, 'factor']
-                self.session.commit()
-
-                latest_factor = df.factor[-1]
-                # factor not change yet, no need to reset the qfq past
-                if latest_factor == self.current_factors.get(entity.id):
-                    sql = 'UPDATE {} SET qfq_close=hfq_close/{},qfq_high=hfq_high/{}, qfq_open= hfq_open/{}, qfq_low= hfq_low/{} where ' \
-                          'entity_id=\'{}\' and level=\'{}\' and (qfq_close isnull or qfq_high isnull or qfq_low isnull or qfq_open isnull)'.format(
-                        self.data_schema.__table__, latest_factor, latest_factor, latest_factor, latest_factor,
-                        entity.id, self.level.value)
-                else:
-                    sql = 'UPDATE {} SET qfq_close=hfq_close/{},qfq_high=hfq_high/{}, qfq_open= hfq_open/{}, qfq_low= hfq_low/{} where ' \
-                          'entity_id=\'{}\' and level=\'{}\''.format(self.data_schema.__table__, latest_factor,
-                                                                     latest_factor, latest_factor, latest_factor,
-                                                                     entity.id,
-                                                                     self.level.value)
-                self.logger.info(sql)
-                self.session.execute(sql)
-                self.session.commit()
+        # only the kdata without hfq,the history is not rewritten when the factor changes
+        df = get_kdata(provider=self.provider, entity_id=entity.id, level=self.level.value,
+                       columns=[self.data_schema.id, self.data_schema.timestamp, self.data_schema.open,
+                                self.data_schema.close, self.data_schema.high, self.data_schema.low],
+                       order=self.data_schema.timestamp.asc(),
+                       session=self.session,
+                       filters=[self.data_schema.hfq_close.is_(None),
+                                self.data_schema.timestamp >= to_pd_timestamp('2005-01-01')])
+        if df_is_not_null(df):
+            df = df.reset_index(drop=True)
+            start = df['timestamp'].iloc[0]
+            end = df['timestamp'].iloc[-1]
+
+            # get the hfq factors from joinquant,only the change points are saved
+            factor_df = get_price(to_jq_entity_id(entity), start_date=to_time_str(start), end_date=now_time_str(),
+                                  frequency='daily', fields=['factor'], skip_paused=True, fq='post')
+            if factor_df is not None and not factor_df.empty:
+                adjust_engine.save_factors(entity.id, factor_df['factor'])
+
+            # the factor,hfq and qfq of the added kdata
+            df = adjust_engine.adjust_kdata(df, entity.id)
 
             # use netease provider to get turnover_rate
             query_url = 'http://quotes.money.163.com/service/chddata.html?code={}{}&start={}&end={}&fields=PCHG;TURNOVER'
@@ -110,19 +83,20 @@ class JQChinaStockKdataRecorder(FixedCycleDataRecorder):
                 exchange_flag = 1
 
             url = query_url.format(exchange_flag, entity.code, to_time_str(start), to_time_str(end))
-            response = requests.get(url=url)
+            response = http_transport.get(url=url)
 
-            df = read_csv(io.BytesIO(response.content), encoding='GB2312', na_values='None')
-            df['日期'] = pd.to_datetime(df['日期'])
-            df.set_index('日期', drop=True, inplace=True)
+            netease_df = read_csv(io.BytesIO(response.content), encoding='GB2312', na_values='None')
+            if netease_df is not None and not netease_df.empty:
+                netease_df['日期'] = pd.to_datetime(netease_df['日期'])
+                netease_df.set_index('日期', drop=True, inplace=True)
+                netease_df = netease_df[~netease_df.index.duplicated()]
 
-            if df is not None and not df.empty:
                 # fill turnover_rate, pct_change
-                for kdata in kdatas:
-                    if kdata.timestamp in df.index:
-                        kdata.turnover_rate = df.loc[kdata.timestamp, '换手率']
-                        kdata.change_pct = df.loc[kdata.timestamp, '涨跌幅']
-                self.session.commit()
+                df['turnover_rate'] = df['timestamp'].map(netease_df['换手率'])
+                df['change_pct'] = df['timestamp'].map(netease_df['涨跌幅'])
+
+            update_kdata(df, provider=self.provider, data_schema=self.data_schema, session=self.session,
+                         entity_id=entity.id, cols=adjusted_cols + ['turnover_rate', 'change_pct'])
 
     def on_finish(self):
         super().on_finish()
@@ -155,7 +129,7 @@ class JQChinaStockKdataRecorder(FixedCycleDataRecorder):
         if is_in_trading(entity_type='stock', exchange='sh', timestamp=df.iloc[-1, :]['timestamp']):
             df = df.iloc[:-1, :]
 
-        return df.to_dict(orient='records')
+        return df
 
 
 if __name__ == '__main__':
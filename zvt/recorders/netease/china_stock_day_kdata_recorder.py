@@ -2,11 +2,13 @@
 import io
 
 import pandas as pd
-import requests
 from jqdatasdk import auth, get_price, logout
 
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
+from zvdata.utils.pd_utils import df_is_not_null
+from zvt.api.adjust import get_adjust_engine, update_kdata, adjusted_cols
 from zvt.api.common import generate_kdata_id, to_jq_entity_id
 from zvt.api.technical import get_kdata
 from zvt.domain import Stock1dKdata, Stock
@@ -21,6 +23,7 @@ class ChinaStockDayKdataRecorder(FixedCycleDataRecorder):
 
     provider = 'netease'
     data_schema = Stock1dKdata
+    bulk_persist = True
     url = 'http://quotes.money.163.com/service/chddata.html?code={}{}&start={}&end={}&fields=TCLOSE;HIGH;LOW;TOPEN;LCLOSE;CHG;PCHG;TURNOVER;VOTURNOVER;VATURNOVER'
 
     def __init__(self, entity_type='stock', exchanges=['sh', 'sz'], entity_ids=None, codes=None, batch_size=10,
@@ -34,16 +37,8 @@ class ChinaStockDayKdataRecorder(FixedCycleDataRecorder):
                          contain_unfinished_data, level, kdata_use_begin_time, close_hour, close_minute,
                          one_day_trading_minutes)
 
-        self.current_factors = {}
-        for security_item in self.entities:
-            kdata = get_kdata(entity_id=security_item.id, provider=self.provider,
-                              level=self.level.value, order=Stock1dKdata.timestamp.desc(),
-                              limit=1,
-                              return_type='domain',
-                              session=self.session)
-            if kdata:
-                self.current_factors[security_item.id] = kdata[0].factor
-                self.logger.info('{} latest factor:{}'.format(security_item.id, kdata[0].factor))
+        # the factors of the netease kdata
+        self.adjust_engine = get_adjust_engine(self.provider)
 
         auth(JQ_ACCOUNT, JQ_PASSWD)
 
@@ -62,48 +57,28 @@ class ChinaStockDayKdataRecorder(FixedCycleDataRecorder):
         }
 
     def on_finish_entity(self, entity):
-        kdatas = get_kdata(entity_id=entity.id, level=self.level.value, order=Stock1dKdata.timestamp.asc(),
-                           return_type='domain',
-                           session=self.session,
-                           filters=[Stock1dKdata.factor.is_(None),
-                                    Stock1dKdata.timestamp >= to_pd_timestamp('2005-01-01')])
-        if kdatas:
-            start = kdatas[0].timestamp
-            end = kdatas[-1].timestamp
-
-            # get hfq from joinquant
-            df = get_price(to_jq_entity_id(entity), start_date=to_time_str(start), end_date=now_time_str(),
-                           frequency='daily',
-                           fields=['factor', 'open', 'close', 'low', 'high'],
-                           skip_paused=True, fq='post')
-            if df is not None and not df.empty:
-                # fill hfq data
-                for kdata in kdatas:
-                    if kdata.timestamp in df.index:
-                        kdata.hfq_open = df.loc[kdata.timestamp, 'open']
-                        kdata.hfq_close = df.loc[kdata.timestamp, 'close']
-                        kdata.hfq_high = df.loc[kdata.timestamp, 'high']
-                        kdata.hfq_low = df.loc[kdata.timestamp, 'low']
-                        kdata.factor = df.loc[kdata.timestamp, 'factor']
-                self.session.commit()
-
-                latest_factor = df.factor[-1]
-                # factor not change yet, no need to reset the qfq past
-                if latest_factor == self.current_factors.get(entity.id):
-                    sql = 'UPDATE stock_1d_kdata SET qfq_close=hfq_close/{},qfq_high=hfq_high/{}, qfq_open= hfq_open/{}, qfq_low= hfq_low/{} where ' \
-                          'entity_id=\'{}\' and level=\'{}\' and (qfq_close isnull or qfq_high isnull or qfq_low isnull or qfq_open isnull)'.format(
-                        latest_factor, latest_factor, latest_factor, latest_factor, entity.id, self.level.value)
-                else:
-                    sql = 'UPDATE stock_1d_kdata SET qfq_close=hfq_close/{},qfq_high=hfq_high/{}, qfq_open= hfq_open/{}, qfq_low= hfq_low/{} where ' \
-                          'entity_id=\'{}\' and level=\'{}\''.format(latest_factor,
-                                                                     latest_factor,
-                                                                     latest_factor,
-                                                                     latest_factor,
-                                                                     entity.id,
-                                                                     self.level.value)
-                self.logger.info(sql)
-                self.session.execute(sql)
-                self.session.commit()
+        # only the kdata without hfq,the history is not rewritten when the factor changes
+        df = get_kdata(provider=self.provider, entity_id=entity.id, level=self.level.value,
+                       columns=[Stock1dKdata.id, Stock1dKdata.timestamp, Stock1dKdata.open, Stock1dKdata.close,
+                                Stock1dKdata.high, Stock1dKdata.low],
+                       order=Stock1dKdata.timestamp.asc(),
+                       session=self.session,
+                       filters=[Stock1dKdata.hfq_close.is_(None),
+                                Stock1dKdata.timestamp >= to_pd_timestamp('2005-01-01')])
+        if df_is_not_null(df):
+            df = df.reset_index(drop=True)
+            start = df['timestamp'].iloc[0]
+
+            # get the hfq factors from joinquant,only the change points are saved
+            factor_df = get_price(to_jq_entity_id(entity), start_date=to_time_str(start), end_date=now_time_str(),
+                                  frequency='daily', fields=['factor'], skip_paused=True, fq='post')
+            if factor_df is not None and not factor_df.empty:
+                self.adjust_engine.save_factors(entity.id, factor_df['factor'])
+
+            # the factor,hfq and qfq of the added kdata
+            df = self.adjust_engine.adjust_kdata(df, entity.id)
+            update_kdata(df, provider=self.provider, data_schema=self.data_schema, session=self.session,
+                         entity_id=entity.id, cols=adjusted_cols)
 
     def on_finish(self):
         super().on_finish()
@@ -120,7 +95,7 @@ class ChinaStockDayKdataRecorder(FixedCycleDataRecorder):
             exchange_flag = 1
 
         url = self.url.format(exchange_flag, entity.code, start, end)
-        response = requests.get(url=url)
+        response = http_transport.get(url=url)
 
         df = utils.read_csv(io.BytesIO(response.content), encoding='GB2312', na_values='None')
 
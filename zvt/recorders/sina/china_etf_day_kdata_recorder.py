@@ -2,10 +2,10 @@
 
 import demjson
 import pandas as pd
-import requests
 
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import generate_kdata_id
 from zvt.api.technical import get_kdata
 from zvt.domain import Index, Index1dKdata
@@ -20,6 +20,7 @@ class ChinaETFDayKdataRecorder(FixedCycleDataRecorder):
 
     provider = 'sina'
     data_schema = Index1dKdata
+    bulk_persist = True
     url = 'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?' \
           'symbol={}{}&scale=240&&datalen={}&ma=no'
 
@@ -69,7 +70,7 @@ class ChinaETFDayKdataRecorder(FixedCycleDataRecorder):
         while True:
             url = query_url.format(security_item.code, page, to_time_str(start), to_time_str(end))
 
-            response = requests.get(url, headers=EASTMONEY_ETF_NET_VALUE_HEADER)
+            response = http_transport.get(url, headers=EASTMONEY_ETF_NET_VALUE_HEADER)
             response_json = demjson.decode(response.text)
             response_df = pd.DataFrame(response_json['Data']['LSJZList'])
 
@@ -106,7 +107,7 @@ class ChinaETFDayKdataRecorder(FixedCycleDataRecorder):
 
         url = url.format(security_item.exchange, security_item.code, size)
 
-        response = requests.get(url)
+        response = http_transport.get(url)
         response_json = demjson.decode(response.text)
 
         if response_json is None or len(response_json) == 0:
@@ -3,10 +3,10 @@
 import time
 
 import pandas as pd
-import requests
 
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import generate_kdata_id
 from zvt.domain import Index, Index1dKdata
 from zvt.utils.time_utils import get_year_quarters, is_same_date
@@ -18,6 +18,7 @@ class ChinaIndexDayKdataRecorder(FixedCycleDataRecorder):
 
     provider = 'sina'
     data_schema = Index1dKdata
+    bulk_persist = True
     url = 'http://vip.stock.finance.sina.com.cn/corp/go.php/vMS_MarketHistory/stockid/{}/type/S.phtml?year={}&jidu={}'
 
     def __init__(self, entity_type='index', exchanges=['cn'], entity_ids=None, codes=None, batch_size=10,
@@ -54,7 +55,7 @@ class ChinaIndexDayKdataRecorder(FixedCycleDataRecorder):
         result_df = pd.DataFrame()
         for year, quarter in quarters:
             query_url = self.url.format(security_item.code, year, quarter)
-            response = requests.get(query_url)
+            response = http_transport.get(query_url)
             response.encoding = 'gbk'
 
             try:
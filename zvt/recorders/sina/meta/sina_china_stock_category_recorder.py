@@ -3,10 +3,10 @@ import json
 
 import demjson
 import pandas as pd
-import requests
 
 from zvdata.api import df_to_db
 from zvdata.recorder import Recorder
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import china_stock_code_to_id
 from zvt.api.technical import get_entities
 from zvt.domain import StockIndex, StockCategory
@@ -37,7 +37,7 @@ class SinaChinaStockCategoryRecorder(Recorder):
     def run(self):
         # get stock category from sina
         for category, url in self.category_map_url.items():
-            resp = requests.get(url)
+            resp = http_transport.get(url)
             resp.encoding = 'GBK'
 
             tmp_str = resp.text
@@ -59,7 +59,7 @@ class SinaChinaStockCategoryRecorder(Recorder):
 
         for index_item in indices:
             for page in range(1, 5):
-                resp = requests.get(self.category_stocks_url.format(page, index_item.code))
+                resp = http_transport.get(self.category_stocks_url.format(page, index_item.code))
                 try:
                     if resp.text == 'null' or resp.text is None:
                         break
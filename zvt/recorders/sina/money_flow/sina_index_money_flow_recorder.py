@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 import time
 
-import requests
-
 from zvdata.domain import get_db_session
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
 from zvt.api.technical import get_entities
 from zvt.domain import IndexMoneyFlow, StockCategory, Index
 from zvt.utils.time_utils import to_pd_timestamp
@@ -23,7 +22,6 @@ class SinaIndexMoneyFlowRecorder(FixedCycleDataRecorder):
 
     provider = 'sina'
     data_schema = IndexMoneyFlow
-
     url = 'http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/MoneyFlow.ssl_bkzj_zjlrqs?page=1&num={}&sort=opendate&asc=0&bankuai={}%2F{}'
 
     def __init__(self, exchanges=['cn'], entity_ids=None, codes=None, batch_size=10,
@@ -61,7 +59,7 @@ class SinaIndexMoneyFlowRecorder(FixedCycleDataRecorder):
     def record(self, entity, start, end, size, timestamps):
         url = self.generate_url(category=entity.category, code=entity.code, number=size)
 
-        resp = requests.get(url)
+        resp = http_transport.get(url)
 
         opendate = "opendate"
         avg_price = "avg_price"
@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
 import time
 
-import requests
-
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
 from zvdata.utils.time_utils import to_pd_timestamp
 from zvt.domain import StockMoneyFlow, Stock
 from zvt.utils.utils import to_float
@@ -16,7 +15,6 @@ class SinaStockMoneyFlowRecorder(FixedCycleDataRecorder):
 
     provider = 'sina'
     data_schema = StockMoneyFlow
-
     url = 'http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/MoneyFlow.ssl_qsfx_lscjfb?page=1&num={}&sort=opendate&asc=0&daima={}'
 
     def __init__(self, entity_type='stock', exchanges=['sh', 'sz'], entity_ids=None, codes=None, batch_size=10,
@@ -42,7 +40,7 @@ class SinaStockMoneyFlowRecorder(FixedCycleDataRecorder):
             'security_item': entity
         }
 
-        resp = requests.get(param['url'])
+        resp = http_transport.get(param['url'])
         # {opendate:"2019-04-29",trade:"10.8700",changeratio:"-0.0431338",turnover:"74.924",netamount:"-2903349.8500",
         # ratioamount:"-0.155177",r0:"0.0000",r1:"2064153.0000",r2:"6485031.0000",r3:"10622169.2100",r0_net:"0.0000",
         # r1_net:"2064153.0000",r2_net:"-1463770.0000",r3_net:"-3503732.8500"}
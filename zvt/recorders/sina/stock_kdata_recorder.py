@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-import requests
 from scrapy import Selector
 
 from zvdata.recorder import FixedCycleDataRecorder
 from zvdata.structs import IntervalLevel
+from zvdata.utils.http_utils import http_transport
 from zvt.api.common import generate_kdata_id
 from zvt.api.technical import get_kdata
 from zvt.domain import Stock1dKdata, Stock
@@ -18,6 +18,7 @@ class StockKdataSinaSpider(FixedCycleDataRecorder):
 
     provider = 'sina'
     data_schema = Stock1dKdata
+    bulk_persist = True
 
     def __init__(self, entity_type='stock', exchanges=['sh', 'sz'], entity_ids=None, codes=None, batch_size=10,
                  force_update=False, sleeping_time=10, default_size=2000, one_shot=True, fix_duplicate_way='add',
@@ -54,7 +55,7 @@ class StockKdataSinaSpider(FixedCycleDataRecorder):
 
             for fuquan in ['bfq', 'hfq']:
                 the_url = self.get_kdata_url(entity.code, year, quarter, fuquan)
-                resp = requests.get(the_url)
+                resp = http_transport.get(the_url)
 
                 trs = Selector(text=resp.text).xpath(
                     '//*[@id="FundHoldSharesTable"]/tr[position()>1 and position()<=last()]').extract()
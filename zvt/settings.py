@@ -7,8 +7,14 @@ DATA_SAMPLE_ZIP_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '
 # please change the path to your real store path
 DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'datasample'))
 
+# the storage of kdata,'sqlite' or 'parquet'(partitioned by entity_id/year,pyarrow is needed)
+KDATA_STORAGE = os.environ.get('ZVT_KDATA_STORAGE', 'sqlite')
+
 UI_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'ui'))
 
+# re-draw the detail of the zoomed range for the charts of the data app
+UI_ZOOM_DETAIL = os.environ.get('ZVT_UI_ZOOM_DETAIL', 'false').lower() == 'true'
+
 LOG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
 
 if not DATA_PATH:
@@ -17,6 +23,9 @@ if not DATA_PATH:
 if not LOG_PATH:
     LOG_PATH = os.environ.get('LOG_PATH')
 
+# the holidays of the trading calendar,{entity_type}_{exchange}.txt or {entity_type}.txt with one date per line
+HOLIDAY_PATH = os.environ.get('ZVT_HOLIDAY_PATH', os.path.join(DATA_PATH, 'holidays'))
+
 JQ_ACCOUNT = ''
 if not JQ_ACCOUNT:
     JQ_ACCOUNT = os.environ.get('JQ_ACCOUNT')
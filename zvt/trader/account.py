@@ -6,13 +6,15 @@ import math
 from zvdata.domain import get_db_session
 from zvdata.structs import IntervalLevel
 from zvt.api.business import get_account
-from zvt.api.common import decode_entity_id, get_kdata_schema
+from zvt.api.common import decode_entity_id
 from zvt.api.rules import get_trading_meta
 from zvt.api.technical import get_kdata
 from zvt.domain import Order
 from zvt.domain.business import SimAccount, Position
 from zvt.trader import TradingSignalType, TradingListener, TradingSignal
 from zvt.trader.errors import NotEnoughMoneyError, InvalidOrderError, NotEnoughPositionError, InvalidOrderParamError
+from zvt.trader.ledger import Ledger, AccountRecord, PositionRecord, OrderRecord
+from zvt.trader.price_provider import PriceProvider, get_price_col
 from zvt.utils.time_utils import to_pd_timestamp, to_time_str, TIME_FORMAT_ISO8601, is_same_date
 from zvt.utils.utils import fill_domain_from_dict
 
@@ -41,6 +43,8 @@ position_schema = PositionSchema()
 class AccountService(TradingListener):
     logger = logging.getLogger(__name__)
     trader_name = None
+    # the kdata prices in memory,None means querying the db
+    price_provider: PriceProvider = None
 
     def get_current_position(self, entity_id):
         pass
@@ -92,34 +96,36 @@ class AccountService(TradingListener):
         trading_level = trading_signal.trading_level.value
         if order_type:
             try:
-                kdata = get_kdata(provider=self.provider, entity_id=entity_id, level=trading_level,
-                                  start_timestamp=current_timestamp, end_timestamp=current_timestamp,
-                                  limit=1)
-                if kdata is not None and not kdata.empty:
-                    # use qfq for stock
-                    entity_type, _, _ = decode_entity_id(kdata['entity_id'][0])
-
-                    if entity_type == 'stock':
-                        the_price = kdata['qfq_close'][0]
-                    else:
-                        the_price = kdata['close'][0]
-
-                    if the_price:
-                        self.order(entity_id=entity_id, current_price=the_price,
-                                   current_timestamp=current_timestamp, order_pct=trading_signal.position_pct,
-                                   order_money=trading_signal.order_money,
-                                   order_type=order_type)
-                    else:
+                # the price provider is for the trading level
+                if self.price_provider and self.price_provider.level.value == trading_level:
+                    the_price = self.price_provider.get_price(entity_id, current_timestamp)
+                    if the_price is None:
+                        self.logger.warning(
+                            'ignore trading signal,could not get kdata,entity_id:{},timestamp:{}'.format(entity_id,
+                                                                                                         current_timestamp))
+                        return
+                else:
+                    kdata = get_kdata(provider=self.provider, entity_id=entity_id, level=trading_level,
+                                      start_timestamp=current_timestamp, end_timestamp=current_timestamp,
+                                      limit=1)
+                    if kdata is None or kdata.empty:
                         self.logger.warning(
-                            'ignore trading signal,wrong kdata,entity_id:{},timestamp:{},kdata:{}'.format(entity_id,
-                                                                                                          current_timestamp,
-                                                                                                          kdata.to_dict(
-                                                                                                              orient='records')))
+                            'ignore trading signal,could not get kdata,entity_id:{},timestamp:{}'.format(entity_id,
+                                                                                                         current_timestamp))
+                        return
 
+                    the_price = kdata[get_price_col(decode_entity_id(entity_id)[0])][0]
+
+                if the_price:
+                    self.order(entity_id=entity_id, current_price=the_price,
+                               current_timestamp=current_timestamp, order_pct=trading_signal.position_pct,
+                               order_money=trading_signal.order_money,
+                               order_type=order_type)
                 else:
                     self.logger.warning(
-                        'ignore trading signal,could not get kdata,entity_id:{},timestamp:{}'.format(entity_id,
-                                                                                                     current_timestamp))
+                        'ignore trading signal,wrong kdata,entity_id:{},timestamp:{},price:{}'.format(entity_id,
+                                                                                                      current_timestamp,
+                                                                                                      the_price))
             except Exception as e:
                 self.logger.exception(e)
 
@@ -133,7 +139,12 @@ class SimAccountService(AccountService):
                  base_capital=1000000,
                  buy_cost=0.001,
                  sell_cost=0.001,
-                 slippage=0.001):
+                 slippage=0.001,
+                 end_timestamp=None,
+                 real_time=False,
+                 price_provider: PriceProvider = None,
+                 flush_days=None,
+                 overwrite=True):
 
         self.base_capital = base_capital
         self.buy_cost = buy_cost
@@ -145,10 +156,29 @@ class SimAccountService(AccountService):
         self.provider = provider
         self.level = level
         self.start_timestamp = timestamp
+        self.real_time = real_time
+
+        # the backtest keeps the account in memory and saves it in bulk every flush_days or at the end,
+        # real time mode saves it every day
+        if real_time:
+            self.ledger = None
+        else:
+            self.ledger = Ledger(session=self.session)
+        self.flush_days = flush_days
+        self.closed_days = 0
+
+        if price_provider:
+            self.price_provider = price_provider
+        else:
+            self.price_provider = PriceProvider(provider=provider, level=level, start_timestamp=timestamp,
+                                                end_timestamp=end_timestamp, real_time=real_time)
 
         account = get_account(session=self.session, trader_name=self.trader_name, return_type='domain', limit=1)
 
         if account:
+            if not overwrite:
+                raise Exception('trader:{} has run before,the old result would not be overwritten'.format(
+                    trader_name))
             self.logger.warning("trader:{} has run before,old result would be deleted".format(trader_name))
             self.session.query(SimAccount).filter(SimAccount.trader_name == self.trader_name).delete()
             self.session.query(Position).filter(Position.trader_name == self.trader_name).delete()
@@ -166,6 +196,9 @@ class SimAccountService(AccountService):
         self.logger.info('on_trading_open:{}'.format(timestamp))
         if is_same_date(timestamp, self.start_timestamp):
             return
+        # the account closed at last trading date is in memory already
+        if self.ledger is not None:
+            return
         # get the account for trading at the date
         accounts = get_account(session=self.session, trader_name=self.trader_name, return_type='domain',
                                end_timestamp=to_time_str(timestamp), limit=1, order=SimAccount.timestamp.desc())
@@ -191,20 +224,12 @@ class SimAccountService(AccountService):
 
         self.latest_account['value'] = 0
         self.latest_account['all_value'] = 0
-        for position in self.latest_account['positions']:
-            # use qfq for stock
-            entity_type, _, _ = decode_entity_id(position['entity_id'])
-            data_schema = get_kdata_schema(entity_type, level=self.level)
 
-            kdata = get_kdata(provider=self.provider, level=self.level, entity_id=position['entity_id'],
-                              order=data_schema.timestamp.desc(),
-                              end_timestamp=timestamp, limit=1)
+        # load the prices of the positions not loaded in one query
+        self.price_provider.load([position['entity_id'] for position in self.latest_account['positions']], timestamp)
 
-            # use qfq for stock
-            if entity_type == 'stock':
-                closing_price = kdata['qfq_close'][0]
-            else:
-                closing_price = kdata['close'][0]
+        for position in self.latest_account['positions']:
+            closing_price = self.price_provider.get_latest_price(position['entity_id'], timestamp)
 
             position['available_long'] = position['long_amount']
             position['available_short'] = position['short_amount']
@@ -231,7 +256,48 @@ class SimAccountService(AccountService):
         self.latest_account['timestamp'] = to_pd_timestamp(timestamp)
 
         self.logger.info('on_trading_close:{},latest_account:{}'.format(timestamp, self.latest_account))
-        self.persist_account(timestamp)
+
+        if self.ledger is not None:
+            self.record_account(timestamp)
+
+            self.closed_days += 1
+            if self.flush_days and self.closed_days % self.flush_days == 0:
+                self.flush()
+        else:
+            self.persist_account(timestamp)
+
+    def record_account(self, timestamp):
+        """
+        keep the account closed at the timestamp in the ledger
+
+        :param timestamp:
+        :type timestamp:
+        """
+        the_id = '{}_{}'.format(self.trader_name, to_time_str(timestamp, TIME_FORMAT_ISO8601))
+        timestamp = to_pd_timestamp(timestamp)
+
+        positions = []
+        for position in self.latest_account['positions']:
+            position_record = PositionRecord(**position)
+            position_record.id = '{}_{}_{}'.format(self.trader_name, position['entity_id'],
+                                                   to_time_str(timestamp, TIME_FORMAT_ISO8601))
+            position_record.timestamp = timestamp
+            position_record.sim_account_id = the_id
+            positions.append(position_record)
+
+        account_record = AccountRecord(id=the_id, trader_name=self.trader_name, cash=self.latest_account['cash'],
+                                       all_value=self.latest_account['all_value'], value=self.latest_account['value'],
+                                       timestamp=to_pd_timestamp(self.latest_account['timestamp']))
+
+        self.ledger.add_account(account_record, positions)
+
+    def flush(self):
+        """
+        save the accounts,positions and orders kept in the ledger to db
+
+        """
+        if self.ledger is not None:
+            self.ledger.flush()
 
     def persist_account(self, timestamp):
         """
@@ -285,8 +351,17 @@ class SimAccountService(AccountService):
         :return:
         :rtype:SimAccount
         """
-        return get_account(session=self.session, trader_name=self.trader_name, return_type='domain',
-                           end_timestamp=timestamp, limit=1)[0]
+        # the accounts not flushed are in the ledger
+        if self.ledger is not None:
+            account, positions = self.ledger.get_account(timestamp)
+            if account:
+                return SimAccount(positions=[Position(**position.to_dict()) for position in positions],
+                                  **account.to_dict())
+
+        accounts = get_account(session=self.session, trader_name=self.trader_name, return_type='domain',
+                               end_timestamp=timestamp, limit=1, order=SimAccount.timestamp.desc())
+        if accounts:
+            return accounts[0]
 
     def update_position(self, current_position, order_amount, current_price, order_type, timestamp):
         """
@@ -352,6 +427,13 @@ class SimAccountService(AccountService):
         # save the order info to db
         order_id = '{}_{}_{}_{}'.format(self.trader_name, order_type, current_position['entity_id'],
                                         to_time_str(timestamp, TIME_FORMAT_ISO8601))
+        if self.ledger is not None:
+            self.ledger.add_order(
+                OrderRecord(id=order_id, timestamp=to_pd_timestamp(timestamp), trader_name=self.trader_name,
+                            entity_id=current_position['entity_id'], order_price=current_price,
+                            order_amount=order_amount, order_type=order_type, status='success'))
+            return
+
         order = Order(id=order_id, timestamp=to_pd_timestamp(timestamp), trader_name=self.trader_name,
                       entity_id=current_position['entity_id'], order_price=current_price, order_amount=order_amount,
                       order_type=order_type,
@@ -4,7 +4,9 @@ from typing import List, Union
 import pandas as pd
 
 from zvdata.structs import IntervalLevel
-from zvt.trader.trader import Trader
+from zvt.factors.technical_factor import CrossMaFactor, BullFactor
+from zvt.selectors.selector import TargetSelector
+from zvt.trader.trader import Trader, LimitSelectorsComparator
 
 
 class CoinTrader(Trader):
@@ -20,9 +22,11 @@ class CoinTrader(Trader):
                  level: Union[str, IntervalLevel] = IntervalLevel.LEVEL_1DAY,
                  trader_name: str = None,
                  real_time: bool = False,
-                 kdata_use_begin_time: bool = True) -> None:
+                 kdata_use_begin_time: bool = True,
+                 flush_days: int = None,
+                 overwrite: bool = True) -> None:
         super().__init__(entity_ids, exchanges, codes, start_timestamp, end_timestamp, provider, level, trader_name,
-                         real_time, kdata_use_begin_time)
+                         real_time, kdata_use_begin_time, flush_days, overwrite)
 
 
 class StockTrader(Trader):
@@ -37,6 +41,101 @@ class StockTrader(Trader):
                  level: Union[str, IntervalLevel] = IntervalLevel.LEVEL_1DAY,
                  trader_name: str = None,
                  real_time: bool = False,
-                 kdata_use_begin_time: bool = False) -> None:
+                 kdata_use_begin_time: bool = False,
+                 flush_days: int = None,
+                 overwrite: bool = True) -> None:
         super().__init__(entity_ids, exchanges, codes, start_timestamp, end_timestamp, provider, level, trader_name,
-                         real_time, kdata_use_begin_time)
+                         real_time, kdata_use_begin_time, flush_days, overwrite)
+
+
+class StockMaTrader(StockTrader):
+    """
+    the stock trader with the cross ma factor,the params could be swept by SweepRunner
+
+    """
+
+    def __init__(self, entity_ids: List[str] = None,
+                 exchanges: List[str] = ['sh', 'sz'],
+                 codes: List[str] = None,
+                 start_timestamp: Union[str, pd.Timestamp] = None,
+                 end_timestamp: Union[str, pd.Timestamp] = None,
+                 provider: str = 'joinquant',
+                 level: Union[str, IntervalLevel] = IntervalLevel.LEVEL_1DAY,
+                 trader_name: str = None,
+                 real_time: bool = False,
+                 kdata_use_begin_time: bool = False,
+                 flush_days: int = None,
+                 overwrite: bool = True,
+                 short_window=5,
+                 long_window=10,
+                 limit=10) -> None:
+        self.short_window = short_window
+        self.long_window = long_window
+        self.limit = limit
+
+        super().__init__(entity_ids, exchanges, codes, start_timestamp, end_timestamp, provider, level, trader_name,
+                         real_time, kdata_use_begin_time, flush_days, overwrite)
+
+    def init_selectors(self, entity_ids, entity_type, exchanges, codes, start_timestamp, end_timestamp):
+        selector = TargetSelector(entity_ids=entity_ids, entity_type=entity_type, exchanges=exchanges,
+                                  codes=codes, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                                  provider=self.provider, level=self.level)
+
+        selector.add_filter_factor(
+            CrossMaFactor(entity_ids=entity_ids, entity_type=entity_type, exchanges=exchanges,
+                          codes=codes, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                          provider=self.provider, level=self.level, short_window=self.short_window,
+                          long_window=self.long_window))
+
+        self.selectors.append(selector)
+
+    def init_selectors_comparator(self):
+        return LimitSelectorsComparator(self.selectors, limit=self.limit)
+
+
+class StockBullTrader(StockTrader):
+    """
+    the stock trader with the bull factor,the macd params could be swept by SweepRunner
+
+    """
+
+    def __init__(self, entity_ids: List[str] = None,
+                 exchanges: List[str] = ['sh', 'sz'],
+                 codes: List[str] = None,
+                 start_timestamp: Union[str, pd.Timestamp] = None,
+                 end_timestamp: Union[str, pd.Timestamp] = None,
+                 provider: str = 'joinquant',
+                 level: Union[str, IntervalLevel] = IntervalLevel.LEVEL_1DAY,
+                 trader_name: str = None,
+                 real_time: bool = False,
+                 kdata_use_begin_time: bool = False,
+                 flush_days: int = None,
+                 overwrite: bool = True,
+                 slow=26,
+                 fast=12,
+                 n=9,
+                 limit=10) -> None:
+        self.slow = slow
+        self.fast = fast
+        self.n = n
+        self.limit = limit
+
+        super().__init__(entity_ids, exchanges, codes, start_timestamp, end_timestamp, provider, level, trader_name,
+                         real_time, kdata_use_begin_time, flush_days, overwrite)
+
+    def init_selectors(self, entity_ids, entity_type, exchanges, codes, start_timestamp, end_timestamp):
+        selector = TargetSelector(entity_ids=entity_ids, entity_type=entity_type, exchanges=exchanges,
+                                  codes=codes, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                                  provider=self.provider, level=self.level)
+
+        selector.add_filter_factor(
+            BullFactor(entity_ids=entity_ids, entity_type=entity_type, exchanges=exchanges,
+                       codes=codes, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                       provider=self.provider, level=self.level,
+                       indicators_param=[{'slow': self.slow, 'fast': self.fast, 'n': self.n}],
+                       valid_window=self.slow))
+
+        self.selectors.append(selector)
+
+    def init_selectors_comparator(self):
+        return LimitSelectorsComparator(self.selectors, limit=self.limit)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+
+from zvt.domain.business import SimAccount, Position, Order
+from zvt.utils.time_utils import to_pd_timestamp
+
+
+class LedgerRecord(object):
+    __slots__ = ()
+
+    def __init__(self, **kwargs) -> None:
+        for field in self.__slots__:
+            setattr(self, field, kwargs.get(field))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class AccountRecord(LedgerRecord):
+    __slots__ = ('id', 'trader_name', 'cash', 'value', 'all_value', 'timestamp')
+
+
+class PositionRecord(LedgerRecord):
+    __slots__ = ('id', 'trader_name', 'entity_id', 'sim_account_id', 'timestamp', 'long_amount', 'available_long',
+                 'average_long_price', 'short_amount', 'available_short', 'average_short_price', 'profit', 'value',
+                 'trading_t')
+
+
+class OrderRecord(LedgerRecord):
+    __slots__ = ('id', 'trader_name', 'entity_id', 'timestamp', 'order_price', 'order_amount', 'order_type', 'status')
+
+
+class Ledger(object):
+    """
+    the accounts,positions and orders of the backtest kept in memory,they are saved to the business db in bulk
+
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, session) -> None:
+        self.session = session
+
+        self.accounts = []
+        self.positions = []
+        self.orders = []
+        # the timestamps of the accounts,they are appended in time order
+        self.timestamps = []
+        # account id -> the positions of the account
+        self.account_positions = {}
+
+    def add_account(self, account: AccountRecord, positions):
+        self.accounts.append(account)
+        self.positions += positions
+        self.timestamps.append(account.timestamp)
+        self.account_positions[account.id] = positions
+
+    def add_order(self, order: OrderRecord):
+        self.orders.append(order)
+
+    def get_account(self, timestamp):
+        """
+        the latest account closed before or at the timestamp and its positions kept in memory
+
+        :param timestamp:
+        :return: (AccountRecord,[PositionRecord]) or (None,[]) if not in the ledger,e.g,flushed to db already
+        """
+        if not self.accounts:
+            return None, []
+
+        timestamp = to_pd_timestamp(timestamp)
+        # the latest one for the current timestamp mostly
+        if self.timestamps[-1] <= timestamp:
+            index = len(self.accounts) - 1
+        else:
+            index = bisect.bisect_right(self.timestamps, timestamp) - 1
+            if index < 0:
+                return None, []
+
+        account = self.accounts[index]
+        return account, self.account_positions[account.id]
+
+    def __len__(self):
+        return len(self.accounts) + len(self.positions) + len(self.orders)
+
+    def flush(self):
+        """
+        save the records in bulk and clear them
+
+        """
+        if not len(self):
+            return
+
+        self.logger.info('flush ledger,accounts:{},positions:{},orders:{}'.format(len(self.accounts),
+                                                                                  len(self.positions),
+                                                                                  len(self.orders)))
+
+        self.session.bulk_insert_mappings(SimAccount, [record.to_dict() for record in self.accounts])
+        self.session.bulk_insert_mappings(Position, [record.to_dict() for record in self.positions])
+        self.session.bulk_insert_mappings(Order, [record.to_dict() for record in self.orders])
+        self.session.commit()
+
+        self.accounts = []
+        self.positions = []
+        self.orders = []
+        self.timestamps = []
+        self.account_positions = {}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from zvdata.api import get_data
+from zvdata.reader import DataReader
+from zvdata.structs import IntervalLevel
+from zvdata.utils.pd_utils import df_is_not_null
+from zvt.api.common import decode_entity_id, get_kdata_schema
+from zvt.api.technical import get_kdata
+from zvt.utils.time_utils import to_pd_timestamp
+
+
+def get_price_col(entity_type):
+    # use qfq for stock
+    if entity_type == 'stock':
+        return 'qfq_close'
+    return 'close'
+
+
+class EntityPrices(object):
+    __slots__ = ('timestamps', 'prices', 'positions')
+
+    def __init__(self, timestamps: np.ndarray, prices: np.ndarray) -> None:
+        # the int64 timestamps sorted asc
+        self.timestamps = timestamps
+        self.prices = prices
+        # timestamp -> the position in the arrays
+        self.positions = dict(zip(timestamps.tolist(), range(len(timestamps))))
+
+
+class PriceProvider(object):
+    """
+    the kdata close prices of the trading entities in memory,the price at the timestamp is got by hash and the last
+    price before the timestamp by binary search,the missing entities are loaded in bulk lazily
+
+    """
+    logger = logging.getLogger(__name__)
+
+    # sqlite limits the variable number of one statement
+    load_step = 500
+
+    def __init__(self, provider: str = 'joinquant', level: IntervalLevel = IntervalLevel.LEVEL_1DAY,
+                 start_timestamp=None, end_timestamp=None, real_time: bool = False) -> None:
+        self.provider = provider
+        self.level = IntervalLevel(level)
+        self.start_timestamp = to_pd_timestamp(start_timestamp)
+        self.end_timestamp = to_pd_timestamp(end_timestamp)
+        # the data after the loaded timestamp is coming in real time mode,it would be loaded again
+        self.real_time = real_time
+
+        # entity_id -> EntityPrices
+        self.entity_prices = {}
+        # entity_id -> the timestamp the prices loaded to,the data after it would be loaded when needed
+        self.loaded_timestamps = {}
+
+    def add_kdata(self, df: pd.DataFrame, loaded_timestamp=None):
+        """
+        add the kdata loaded already,e.g,the data_df of the TechnicalFactor
+
+        :param df: the kdata with entity_id,timestamp and the price columns,could be indexed by (entity_id,timestamp)
+        :param loaded_timestamp: the timestamp the kdata loaded to,default is the max timestamp of the entity
+        """
+        if not df_is_not_null(df):
+            return
+
+        if 'entity_id' not in df.columns or 'timestamp' not in df.columns:
+            df = df.reset_index()
+        elif 'entity_id' in df.index.names:
+            # indexed with the columns kept,the index is ambiguous for groupby
+            df = df.reset_index(drop=True)
+
+        for entity_id, entity_df in df.groupby('entity_id'):
+            entity_type, _, _ = decode_entity_id(entity_id)
+            price_col = get_price_col(entity_type)
+            if price_col not in entity_df.columns:
+                continue
+
+            timestamps = pd.to_datetime(entity_df['timestamp']).values.astype(np.int64)
+            prices = entity_df[price_col].values.astype(np.float64)
+
+            saved = self.entity_prices.get(entity_id)
+            if saved:
+                timestamps = np.concatenate([saved.timestamps, timestamps])
+                prices = np.concatenate([saved.prices, prices])
+
+            # keep the latest added one for the same timestamp
+            timestamps, index = np.unique(timestamps[::-1], return_index=True)
+            prices = prices[::-1][index]
+
+            self.entity_prices[entity_id] = EntityPrices(timestamps, prices)
+
+            if loaded_timestamp is not None:
+                entity_loaded_timestamp = to_pd_timestamp(loaded_timestamp)
+            else:
+                entity_loaded_timestamp = pd.Timestamp(timestamps[-1])
+            if entity_id not in self.loaded_timestamps or self.loaded_timestamps[entity_id] < entity_loaded_timestamp:
+                self.loaded_timestamps[entity_id] = entity_loaded_timestamp
+
+    def load(self, entity_ids: List[str], timestamp):
+        """
+        load the kdata of the entities not loaded to the timestamp,in one query for every entity type,from the data
+        cache of DataReader if it covers the query
+
+        :param entity_ids:
+        :param timestamp: the timestamp needed
+        """
+        timestamp = to_pd_timestamp(timestamp)
+
+        entity_type_ids = {}
+        for entity_id in entity_ids:
+            loaded_timestamp = self.loaded_timestamps.get(entity_id)
+            if loaded_timestamp is None or loaded_timestamp < timestamp:
+                entity_type, _, _ = decode_entity_id(entity_id)
+                entity_type_ids.setdefault(entity_type, {})[entity_id] = loaded_timestamp
+
+        # load to the end in backtest
+        end_timestamp = timestamp
+        if self.end_timestamp and self.end_timestamp > timestamp:
+            end_timestamp = self.end_timestamp
+
+        # the kdata is loaded to the latest one in real time mode
+        if self.real_time:
+            loaded_timestamp = None
+        else:
+            loaded_timestamp = end_timestamp
+
+        for entity_type, entity_loaded_timestamps in entity_type_ids.items():
+            data_schema = get_kdata_schema(entity_type, level=self.level)
+            price_col = get_price_col(entity_type)
+            columns = [data_schema.entity_id, data_schema.timestamp, getattr(data_schema, price_col)]
+
+            # the loaded entities only need the data after the loaded timestamp
+            loaded = [item for item in entity_loaded_timestamps.values() if item is not None]
+            if len(loaded) == len(entity_loaded_timestamps):
+                start_timestamp = min(loaded)
+            else:
+                start_timestamp = self.start_timestamp
+
+            ids = list(entity_loaded_timestamps.keys())
+            for i in range(0, len(ids), self.load_step):
+                step_ids = ids[i:i + self.load_step]
+                df = None
+                # the kdata shared by the sweep workers
+                if DataReader.data_cache is not None:
+                    df = DataReader.data_cache.get_data(data_schema=data_schema, provider=self.provider,
+                                                        level=self.level, entity_ids=step_ids,
+                                                        columns=columns, start_timestamp=start_timestamp,
+                                                        end_timestamp=end_timestamp)
+                if df is None:
+                    df = get_data(data_schema=data_schema, entity_ids=step_ids, provider=self.provider,
+                                  columns=columns, start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+                                  level=self.level)
+                self.logger.info(
+                    'load prices of {} entities,size:{}'.format(len(step_ids), 0 if df is None else len(df)))
+                self.add_kdata(df, loaded_timestamp=loaded_timestamp)
+
+            # the entities without data
+            if loaded_timestamp is not None:
+                for entity_id in ids:
+                    self.loaded_timestamps[entity_id] = loaded_timestamp
+
+    def get_price(self, entity_id, timestamp):
+        """
+        get the price at the timestamp
+
+        :return: the price,None if no kdata at the timestamp
+        """
+        timestamp = to_pd_timestamp(timestamp)
+        self.load([entity_id], timestamp)
+
+        entity_prices = self.entity_prices.get(entity_id)
+        if entity_prices:
+            position = entity_prices.positions.get(timestamp.value)
+            if position is not None:
+                return entity_prices.prices[position]
+        return None
+
+    def get_latest_price(self, entity_id, timestamp):
+        """
+        get the latest price before or at the timestamp
+
+        :return: the price,None if no kdata before the timestamp
+        """
+        timestamp = to_pd_timestamp(timestamp)
+        self.load([entity_id], timestamp)
+
+        entity_prices = self.entity_prices.get(entity_id)
+        if entity_prices:
+            position = np.searchsorted(entity_prices.timestamps, timestamp.value, side='right') - 1
+            if position >= 0:
+                return entity_prices.prices[position]
+
+        # the kdata before the start timestamp
+        entity_type, _, _ = decode_entity_id(entity_id)
+        data_schema = get_kdata_schema(entity_type, level=self.level)
+        kdata = get_kdata(provider=self.provider, level=self.level, entity_id=entity_id,
+                          order=data_schema.timestamp.desc(), end_timestamp=timestamp, limit=1)
+        if df_is_not_null(kdata):
+            return kdata[get_price_col(entity_type)][0]
+        return None
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import itertools
+import logging
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Type
+
+import numpy as np
+import pandas as pd
+
+import zvdata.domain as domain
+from zvdata.data_cache import MemmapDataCache
+from zvdata.domain import get_adjuster
+from zvdata.reader import DataReader
+from zvdata.structs import IntervalLevel
+from zvt.api.adjust import AdjustEngine
+from zvt.api.business import get_account
+from zvt.api.common import get_kdata_schema
+from zvt.domain import StockAdjustFactor
+from zvt.trader.trader import Trader
+from zvt.utils.time_utils import now_pd_timestamp, to_pd_timestamp
+
+
+def iterate_params(param_grid: dict) -> List[dict]:
+    """
+    the params of every run,the product of the param values
+
+    :param param_grid: param name -> the values,e.g,{'short_window': [5, 10], 'long_window': [20, 30]}
+    """
+    names = list(param_grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[param_grid[name] for name in names])]
+
+
+def get_summary(account_df: pd.DataFrame, base_capital) -> dict:
+    """
+    the summary stats of the equity curve
+
+    :param account_df: the accounts indexed by timestamp with all_value column
+    :param base_capital:
+    """
+    if account_df is None or account_df.empty:
+        return {'days': 0, 'all_value': base_capital, 'return': 0, 'max_drawdown': 0, 'sharpe': np.nan}
+
+    equity = account_df['all_value']
+    returns = equity.pct_change().dropna()
+    std = returns.std()
+
+    return {
+        'days': len(equity),
+        'all_value': equity.iloc[-1],
+        'return': equity.iloc[-1] / base_capital - 1,
+        'max_drawdown': (1 - equity / equity.cummax()).max(),
+        'sharpe': returns.mean() / std * np.sqrt(250) if std else np.nan
+    }
+
+
+def init_worker(data_path, cache_path):
+    # the worker is spawned with the default data path
+    if domain.context['data_path'] != data_path:
+        domain.set_data_path(data_path)
+
+    DataReader.data_cache = MemmapDataCache(cache_path)
+
+
+def run_trader(trader_class: Type[Trader], trader_kwargs: dict, params: dict, vectorized=True) -> pd.DataFrame:
+    """
+    run the trader in the worker
+
+    :return: the accounts indexed by timestamp
+    """
+    trader = trader_class(**trader_kwargs, **params)
+
+    account_df = None
+    if vectorized:
+        account_df = trader.run_vectorized()
+    else:
+        trader.run()
+
+    if account_df is None:
+        account_df = get_account(trader_name=trader.trader_name)
+        if account_df is not None and not account_df.empty:
+            account_df = account_df.set_index('timestamp')[['cash', 'value', 'all_value']]
+
+    return account_df
+
+
+class SweepRunner(object):
+    """
+    run the trader with the params of the grid on a process pool,the kdata is loaded once to a MemmapDataCache shared
+    by the workers.
+
+    every run is saved with the trader name {sweep_name}_{index},the runs saved before are never deleted or overwritten
+
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self,
+                 trader_class: Type[Trader],
+                 param_grid: dict,
+                 trader_kwargs: dict,
+                 sweep_name: str = None,
+                 processes: int = None,
+                 cache_path: str = None,
+                 vectorized: bool = True,
+                 base_capital=1000000) -> None:
+        """
+
+        :param trader_class: the trader accepting the params,e.g,StockMaTrader
+        :param param_grid: param name -> the values
+        :param trader_kwargs: the common params of the traders,e.g,codes,start_timestamp,end_timestamp
+        :param sweep_name: the prefix of the trader names,default is {trader class}_{now}
+        :param processes: the worker number,default is the cpu count
+        :param cache_path: the path of the kdata cache,default is a temp dir removed after running
+        :param vectorized: whether running the traders by run_vectorized
+        :param base_capital: the base capital of the trader account for the summary
+        """
+        self.trader_class = trader_class
+        self.param_grid = param_grid
+        self.trader_kwargs = dict(trader_kwargs)
+        self.processes = processes
+        self.cache_path = cache_path
+        self.vectorized = vectorized
+        self.base_capital = base_capital
+
+        if sweep_name:
+            self.sweep_name = sweep_name
+        else:
+            self.sweep_name = '{}_{}'.format(trader_class.__name__.lower(),
+                                             now_pd_timestamp().strftime('%Y%m%d%H%M%S'))
+
+        self.params_list = iterate_params(param_grid)
+
+        # the summary of every run indexed by the trader name
+        self.result_df: pd.DataFrame = None
+        # the all_value of every run,timestamp x trader name
+        self.equity_df: pd.DataFrame = None
+
+    def get_trader_name(self, index):
+        return '{}_{}'.format(self.sweep_name, index)
+
+    def prepare_cache(self, cache_path):
+        """
+        load the kdata of the traders and the adjust factors of the entities to the cache
+
+        """
+        level = IntervalLevel(self.trader_kwargs.get('level', IntervalLevel.LEVEL_1DAY))
+        data_schema = get_kdata_schema(self.trader_class.entity_type, level=level)
+        entity_ids = self.trader_kwargs.get('entity_ids')
+        provider = self.trader_kwargs.get('provider', 'joinquant')
+
+        cache = MemmapDataCache(cache_path)
+        df = cache.load(data_schema=data_schema, provider=provider, level=level, entity_ids=entity_ids,
+                        codes=None if entity_ids else self.trader_kwargs.get('codes'),
+                        start_timestamp=to_pd_timestamp(self.trader_kwargs.get('start_timestamp')),
+                        end_timestamp=to_pd_timestamp(self.trader_kwargs.get('end_timestamp')))
+
+        # the qfq prices read by the workers are computed from the factors
+        adjuster = get_adjuster(provider=provider, data_schema=data_schema)
+        if isinstance(adjuster, AdjustEngine):
+            if not entity_ids:
+                entity_ids = [] if df is None else list(df['entity_id'].unique())
+            cache.load(data_schema=StockAdjustFactor, provider=adjuster.provider, entity_ids=entity_ids)
+
+    def run(self) -> pd.DataFrame:
+        cache_path = self.cache_path
+        if not cache_path:
+            cache_path = tempfile.mkdtemp(prefix='zvt_sweep_')
+
+        try:
+            self.prepare_cache(cache_path)
+
+            summaries = []
+            equities = {}
+            with ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_worker,
+                                     initargs=(domain.context['data_path'], cache_path)) as executor:
+                futures = {}
+                for index, params in enumerate(self.params_list):
+                    trader_name = self.get_trader_name(index)
+                    # never delete the runs saved before
+                    trader_kwargs = dict(self.trader_kwargs, trader_name=trader_name, overwrite=False)
+                    future = executor.submit(run_trader, self.trader_class, trader_kwargs, params, self.vectorized)
+                    futures[future] = (index, trader_name, params)
+
+                for future in as_completed(futures):
+                    index, trader_name, params = futures[future]
+                    try:
+                        account_df = future.result()
+                    except Exception:
+                        self.logger.exception('sweep {} failed,params:{}'.format(trader_name, params))
+                        continue
+
+                    self.logger.info('sweep {} finished,params:{}'.format(trader_name, params))
+                    summaries.append(dict(index=index, trader_name=trader_name, **params,
+                                          **get_summary(account_df, self.base_capital)))
+                    if account_df is not None and not account_df.empty:
+                        equities[trader_name] = account_df['all_value']
+        finally:
+            if not self.cache_path:
+                shutil.rmtree(cache_path, ignore_errors=True)
+
+        self.result_df = pd.DataFrame(summaries)
+        if not self.result_df.empty:
+            self.result_df = self.result_df.sort_values('index').drop(columns=['index']).set_index('trader_name')
+            self.equity_df = pd.DataFrame(equities)[self.result_df.index]
+        else:
+            self.equity_df = pd.DataFrame(equities)
+
+        return self.result_df
+
+
+if __name__ == '__main__':
+    from zvt.trader.impls import StockMaTrader
+
+    runner = SweepRunner(StockMaTrader, param_grid={'short_window': [5, 10], 'long_window': [20, 30], 'limit': [5, 10]},
+                         trader_kwargs={'codes': ['000338'], 'start_timestamp': '2018-01-01',
+                                        'end_timestamp': '2019-06-30'})
+    print(runner.run())
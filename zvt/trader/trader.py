@@ -3,6 +3,7 @@ import json
 import logging
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
 import simplejson
 
@@ -16,6 +17,7 @@ from zvt.factors.technical_factor import TechnicalFactor
 from zvt.selectors.selector import TargetSelector
 from zvt.trader import TradingSignal, TradingSignalType
 from zvt.trader.account import SimAccountService
+from zvt.trader.vectorized import VectorizedBacktest, get_signal_df, get_price_df
 from zvt.utils.time_utils import to_pd_timestamp, now_pd_timestamp
 
 logger = logging.getLogger(__name__)
@@ -108,7 +110,9 @@ class Trader(object):
                  level: Union[str, IntervalLevel] = IntervalLevel.LEVEL_1DAY,
                  trader_name: str = None,
                  real_time: bool = False,
-                 kdata_use_begin_time: bool = False) -> None:
+                 kdata_use_begin_time: bool = False,
+                 flush_days: int = None,
+                 overwrite: bool = True) -> None:
 
         assert self.entity_type is not None
 
@@ -156,7 +160,11 @@ class Trader(object):
         self.account_service = SimAccountService(trader_name=self.trader_name,
                                                  timestamp=self.start_timestamp,
                                                  provider=self.provider,
-                                                 level=self.level)
+                                                 level=self.level,
+                                                 end_timestamp=self.end_timestamp,
+                                                 real_time=self.real_time,
+                                                 flush_days=flush_days,
+                                                 overwrite=overwrite)
 
         self.add_trading_signal_listener(self.account_service)
 
@@ -177,6 +185,9 @@ class Trader(object):
         trader = get_trader(session=self.session, trader_name=self.trader_name, return_type='domain', limit=1)
 
         if trader:
+            if not overwrite:
+                raise Exception('trader:{} has run before,the old result would not be overwritten'.format(
+                    self.trader_name))
             self.logger.warning("trader:{} has run before,old result would be deleted".format(self.trader_name))
             self.session.query(business.Trader).filter(business.Trader.trader_name == self.trader_name).delete()
             self.session.commit()
@@ -196,6 +207,10 @@ class Trader(object):
                 if isinstance(factor, TechnicalFactor):
                     technical_factors.append(factor)
 
+                    # the kdata loaded by the factor could be used for the prices of the account
+                    if factor.provider == self.provider and factor.level == self.level:
+                        self.account_service.price_provider.add_kdata(factor.data_df)
+
         technical_factors = simplejson.dumps(technical_factors, for_json=True)
 
         if self.entity_ids:
@@ -322,56 +337,118 @@ class Trader(object):
     def run(self):
         # iterate timestamp of the min level,e.g,9:30,9:35,9.40...for 5min level
         # timestamp represents the timestamp in kdata
+        try:
+            for timestamp in iterate_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
+                                                start_timestamp=self.start_timestamp, end_timestamp=self.end_timestamp,
+                                                level=self.level):
+
+                if not is_trading_date(entity_type=self.entity_type, exchange=self.exchanges[0], timestamp=timestamp):
+                    continue
+                if self.real_time:
+                    # all selector move on to handle the coming data
+                    if self.kdata_use_begin_time:
+                        real_end_timestamp = timestamp + pd.Timedelta(seconds=self.level.to_second())
+                    else:
+                        real_end_timestamp = timestamp
+
+                    trading_minutes = get_one_day_trading_minutes(entity_type=self.entity_type)
+                    waiting_seconds, _ = self.level.count_from_timestamp(real_end_timestamp,
+                                                                         one_day_trading_minutes=trading_minutes)
+                    # meaning the future kdata not ready yet,we could move on to check
+                    if waiting_seconds and (waiting_seconds > 0):
+                        # iterate the selector from min to max which in finished timestamp kdata
+                        for level in self.trading_level_asc:
+                            if (is_in_finished_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
+                                                          timestamp=timestamp, level=level)):
+                                for selector in self.selectors:
+                                    if selector.level == level:
+                                        selector.move_on(timestamp, self.kdata_use_begin_time,
+                                                         timeout=waiting_seconds + 20)
+
+                # on_trading_open to setup the account
+                if self.level == IntervalLevel.LEVEL_1DAY or (
+                        self.level != IntervalLevel.LEVEL_1DAY and is_open_time(entity_type=self.entity_type,
+                                                                                exchange=self.exchanges[0],
+                                                                                timestamp=timestamp)):
+                    self.account_service.on_trading_open(timestamp)
+
+                # the time always move on by min level step and we could check all level targets in the slot
+                self.handle_targets_slot(timestamp=timestamp)
+
+                for level in self.trading_level_asc:
+                    # in every cycle, all level selector do its job in its time
+                    if (is_in_finished_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
+                                                  timestamp=timestamp, level=level)):
+                        long_targets, short_targets = self.selectors_comparator.make_decision(timestamp=timestamp,
+                                                                                              trading_level=level)
+
+                        self.targets_slot.input_targets(level, long_targets, short_targets)
+
+                # on_trading_close to calculate date account
+                if self.level == IntervalLevel.LEVEL_1DAY or (
+                        self.level != IntervalLevel.LEVEL_1DAY and is_close_time(entity_type=self.entity_type,
+                                                                                 exchange=self.exchanges[0],
+                                                                                 timestamp=timestamp)):
+                    self.account_service.on_trading_close(timestamp)
+        finally:
+            # save the account kept in memory even if the backtest failed
+            self.account_service.flush()
+
+        self.on_finish()
+
+    def run_vectorized(self):
+        """
+        run the backtest on the signal matrices of the selectors by VectorizedBacktest,it's much faster than run and
+        saves the same accounts,positions and orders
+
+        only the traders using LimitSelectorsComparator with one level are supported,the others would run as usual
+
+        """
+        if self.real_time or len(self.trading_level_asc) != 1 or \
+                type(self.selectors_comparator) is not LimitSelectorsComparator:
+            self.logger.warning('trader:{} could not run vectorized,run it as usual'.format(self.trader_name))
+            return self.run()
+
+        timestamps = []
+        decided = []
+        closing = []
         for timestamp in iterate_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
                                             start_timestamp=self.start_timestamp, end_timestamp=self.end_timestamp,
                                             level=self.level):
-
             if not is_trading_date(entity_type=self.entity_type, exchange=self.exchanges[0], timestamp=timestamp):
                 continue
-            if self.real_time:
-                # all selector move on to handle the coming data
-                if self.kdata_use_begin_time:
-                    real_end_timestamp = timestamp + pd.Timedelta(seconds=self.level.to_second())
-                else:
-                    real_end_timestamp = timestamp
-
-                waiting_seconds, _ = self.level.count_from_timestamp(real_end_timestamp,
-                                                                     one_day_trading_minutes=get_one_day_trading_minutes(
-                                                                         entity_type=self.entity_type))
-                # meaning the future kdata not ready yet,we could move on to check
-                if waiting_seconds and (waiting_seconds > 0):
-                    # iterate the selector from min to max which in finished timestamp kdata
-                    for level in self.trading_level_asc:
-                        if (is_in_finished_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
-                                                      timestamp=timestamp, level=level)):
-                            for selector in self.selectors:
-                                if selector.level == level:
-                                    selector.move_on(timestamp, self.kdata_use_begin_time, timeout=waiting_seconds + 20)
-
-            # on_trading_open to setup the account
-            if self.level == IntervalLevel.LEVEL_1DAY or (
-                    self.level != IntervalLevel.LEVEL_1DAY and is_open_time(entity_type=self.entity_type,
-                                                                            exchange=self.exchanges[0],
-                                                                            timestamp=timestamp)):
-                self.account_service.on_trading_open(timestamp)
-
-            # the time always move on by min level step and we could check all level targets in the slot
-            self.handle_targets_slot(timestamp=timestamp)
-
-            for level in self.trading_level_asc:
-                # in every cycle, all level selector do its job in its time
-                if (is_in_finished_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
-                                              timestamp=timestamp, level=level)):
-                    long_targets, short_targets = self.selectors_comparator.make_decision(timestamp=timestamp,
-                                                                                          trading_level=level)
-
-                    self.targets_slot.input_targets(level, long_targets, short_targets)
-
-            # on_trading_close to calculate date account
-            if self.level == IntervalLevel.LEVEL_1DAY or (
-                    self.level != IntervalLevel.LEVEL_1DAY and is_close_time(entity_type=self.entity_type,
-                                                                             exchange=self.exchanges[0],
-                                                                             timestamp=timestamp)):
-                self.account_service.on_trading_close(timestamp)
+            timestamps.append(timestamp)
+            decided.append(is_in_finished_timestamps(entity_type=self.entity_type, exchange=self.exchanges[0],
+                                                     timestamp=timestamp, level=self.trading_level_asc[0]))
+            closing.append(self.level == IntervalLevel.LEVEL_1DAY or is_close_time(entity_type=self.entity_type,
+                                                                                   exchange=self.exchanges[0],
+                                                                                   timestamp=timestamp))
+        timestamps = pd.DatetimeIndex(timestamps)
+        decided = np.array(decided, dtype=bool)
+
+        selectors = [selector for selector in self.selectors if selector.level == self.trading_level_asc[0]]
+        signal_dfs = []
+        for target_type in ('open_long', 'open_short'):
+            signal_df = get_signal_df(selectors, target_type=target_type, timestamps=timestamps,
+                                      limit=self.selectors_comparator.limit)
+            # the targets in the slot are kept until the next decision
+            signal_df = signal_df.astype(float)
+            signal_df.loc[~decided, :] = np.nan
+            signal_dfs.append(signal_df.ffill().fillna(0).astype(bool))
+        long_signal_df, short_signal_df = signal_dfs
+
+        entity_ids = sorted(set(long_signal_df.columns) | set(short_signal_df.columns))
+        price_df, latest_price_df = get_price_df(self.account_service.price_provider, entity_ids, timestamps)
+
+        backtest = VectorizedBacktest(trader_name=self.trader_name, long_signal_df=long_signal_df,
+                                      short_signal_df=short_signal_df, price_df=price_df,
+                                      latest_price_df=latest_price_df, closing=closing,
+                                      base_capital=self.account_service.base_capital,
+                                      buy_cost=self.account_service.buy_cost,
+                                      sell_cost=self.account_service.sell_cost,
+                                      slippage=self.account_service.slippage)
+        backtest.run()
+        backtest.save(self.account_service.ledger)
 
         self.on_finish()
+        return backtest.account_df
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from zvdata.utils.pd_utils import df_is_not_null
+from zvt.api.rules import get_trading_meta
+from zvt.selectors.selector import TargetSelector
+from zvt.trader.account import ORDER_TYPE_LONG, ORDER_TYPE_CLOSE_LONG
+from zvt.trader.ledger import Ledger, AccountRecord, PositionRecord, OrderRecord
+from zvt.trader.price_provider import PriceProvider
+from zvt.utils.time_utils import to_time_str, TIME_FORMAT_ISO8601
+
+
+def get_signal_df(selectors: List[TargetSelector], target_type='open_long', timestamps=None, limit=None):
+    """
+    the dense targets matrix of the selectors,True means the entity is the target at the timestamp
+
+    :param selectors:
+    :param target_type: open_long,open_short,keep_long or keep_short
+    :param timestamps: the timestamps of the matrix,default is the timestamps of the targets
+    :param limit: keep the first limit targets of every selector at the timestamp as LimitSelectorsComparator
+    :return: the bool DataFrame indexed by timestamp with entity_id columns
+    """
+    dfs = []
+    for selector in selectors:
+        df = getattr(selector, '{}_df'.format(target_type))
+        if not df_is_not_null(df):
+            continue
+        df = df[['entity_id']]
+        if limit:
+            # the targets df is sorted by score,the order in the same timestamp is kept by cumcount
+            df = df[df.groupby(level=0).cumcount() < limit]
+        dfs.append(df)
+
+    if not dfs:
+        return pd.DataFrame(False, index=pd.DatetimeIndex(timestamps if timestamps is not None else []), columns=[])
+
+    df = pd.concat(dfs)
+    signal_df = pd.crosstab(pd.DatetimeIndex(df.index), df['entity_id'].values) > 0
+    signal_df.index.name = 'timestamp'
+    signal_df.columns.name = 'entity_id'
+
+    if timestamps is not None:
+        signal_df = signal_df.reindex(pd.DatetimeIndex(timestamps), fill_value=False)
+    return signal_df
+
+
+def get_price_df(price_provider: PriceProvider, entity_ids: List[str], timestamps):
+    """
+    the price matrices of the entities at the timestamps
+
+    :param price_provider:
+    :param entity_ids:
+    :param timestamps:
+    :return: the prices at the timestamps(NaN if no kdata) and the latest prices before or at the timestamps
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    values = timestamps.values.astype(np.int64)
+
+    prices = np.full((len(timestamps), len(entity_ids)), np.nan)
+    latest_prices = np.full((len(timestamps), len(entity_ids)), np.nan)
+
+    if len(timestamps):
+        price_provider.load(entity_ids, timestamps[-1])
+
+    for i, entity_id in enumerate(entity_ids):
+        entity_prices = price_provider.entity_prices.get(entity_id)
+        if not entity_prices or not len(entity_prices.timestamps):
+            continue
+        position = np.searchsorted(entity_prices.timestamps, values, side='right') - 1
+        found = position >= 0
+        latest_prices[found, i] = entity_prices.prices[position[found]]
+        exact = found.copy()
+        exact[found] = entity_prices.timestamps[position[found]] == values[found]
+        prices[exact, i] = entity_prices.prices[position[exact]]
+
+    return (pd.DataFrame(prices, index=timestamps, columns=entity_ids),
+            pd.DataFrame(latest_prices, index=timestamps, columns=entity_ids))
+
+
+class VectorizedBacktest(object):
+    """
+    the backtest on the dense (timestamp x entity) signal and price matrices,the positions of all the entities are
+    updated by numpy array operations in every timestamp,the result is the same as SimAccountService with the signals
+    of Trader.send_trading_signals:
+
+    the long targets at the timestamp are longed at the next timestamp with the cash divided equally,
+    the holdings in the short targets are closed at the next timestamp,
+    the positions bought are available after closing if trading_t is 1
+
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self,
+                 trader_name: str,
+                 long_signal_df: pd.DataFrame,
+                 short_signal_df: pd.DataFrame,
+                 price_df: pd.DataFrame,
+                 latest_price_df: pd.DataFrame = None,
+                 closing: np.ndarray = None,
+                 base_capital=1000000,
+                 buy_cost=0.001,
+                 sell_cost=0.001,
+                 slippage=0.001,
+                 trading_t: np.ndarray = None) -> None:
+        """
+
+        :param trader_name:
+        :param long_signal_df: the long targets decided at the timestamp
+        :param short_signal_df: the short targets decided at the timestamp
+        :param price_df: the trading prices at the timestamp,NaN means no kdata
+        :param latest_price_df: the prices for the position value,default is price_df filled forward
+        :param closing: whether closing the account at the timestamp,default is closing at every timestamp
+        :param trading_t: the trading_t of the entities,default is from get_trading_meta
+        """
+        self.trader_name = trader_name
+        self.base_capital = base_capital
+        self.buy_cost = buy_cost
+        self.sell_cost = sell_cost
+        self.slippage = slippage
+
+        # join the signals with the prices
+        self.timestamps = pd.DatetimeIndex(price_df.index)
+        self.entity_ids = list(price_df.columns)
+
+        self.long_signals = self.to_signals(long_signal_df)
+        self.short_signals = self.to_signals(short_signal_df)
+        self.prices = price_df.values.astype(np.float64)
+
+        if latest_price_df is None:
+            latest_price_df = price_df.ffill()
+        self.latest_prices = latest_price_df.reindex(index=self.timestamps, columns=self.entity_ids).values.astype(
+            np.float64)
+
+        if closing is None:
+            closing = np.ones(len(self.timestamps), dtype=bool)
+        self.closing = np.asarray(closing, dtype=bool)
+
+        if trading_t is None:
+            trading_t = [get_trading_meta(entity_id=entity_id)['trading_t'] for entity_id in self.entity_ids]
+        self.trading_t = np.asarray(trading_t, dtype=np.int64)
+
+        # the result
+        self.account_df: pd.DataFrame = None
+        self.positions = []
+        self.orders = []
+
+    def to_signals(self, signal_df: pd.DataFrame) -> np.ndarray:
+        if signal_df is None:
+            return np.zeros((len(self.timestamps), len(self.entity_ids)), dtype=bool)
+        return signal_df.reindex(index=self.timestamps, columns=self.entity_ids, fill_value=False).fillna(
+            False).values.astype(bool)
+
+    def run(self):
+        size = len(self.entity_ids)
+
+        cash = float(self.base_capital)
+        long_amount = np.zeros(size)
+        available_long = np.zeros(size)
+        average_long_price = np.zeros(size)
+        position_value = np.zeros(size)
+
+        buy_rate = 1 + self.slippage + self.buy_cost
+        sell_rate = 1 - self.slippage - self.sell_cost
+
+        accounts = []
+        self.positions = []
+        self.orders = []
+
+        for i, timestamp in enumerate(self.timestamps):
+            prices = self.prices[i]
+            valid_price = ~np.isnan(prices) & (prices != 0)
+
+            # the targets are decided at the last timestamp
+            if i > 0:
+                holdings = available_long > 0
+
+                longed = self.long_signals[i - 1] & ~holdings
+                count = longed.sum()
+                if count:
+                    order_money = cash / count
+                    order_amount = np.zeros(size)
+                    order_amount[longed & valid_price] = order_money // (prices[longed & valid_price] * buy_rate)
+
+                    bought = order_amount > 0
+                    if bought.any():
+                        cash -= (order_amount[bought] * prices[bought] * buy_rate).sum()
+
+                        amount = long_amount[bought] + order_amount[bought]
+                        average_long_price[bought] = (average_long_price[bought] * long_amount[bought] +
+                                                      prices[bought] * order_amount[bought]) / amount
+                        long_amount[bought] = amount
+
+                        t0 = bought & (self.trading_t == 0)
+                        available_long[t0] += order_amount[t0]
+
+                        self.add_orders(timestamp, bought, prices, order_amount, ORDER_TYPE_LONG)
+
+                shorted = self.short_signals[i - 1] & holdings & valid_price
+                if shorted.any():
+                    order_amount = np.where(shorted, available_long, 0)
+                    cash += (order_amount[shorted] * prices[shorted] * sell_rate).sum()
+                    available_long[shorted] = 0
+                    long_amount[shorted] -= order_amount[shorted]
+
+                    self.add_orders(timestamp, shorted, prices, order_amount, ORDER_TYPE_CLOSE_LONG)
+
+            if not self.closing[i]:
+                continue
+
+            # the T+1 positions are available after closing
+            available_long = long_amount.copy()
+
+            latest_prices = self.latest_prices[i]
+            held = long_amount > 0
+            refreshed = held & ~np.isnan(latest_prices) & (latest_prices != 0)
+            position_value[refreshed] = long_amount[refreshed] * latest_prices[refreshed]
+            value = position_value[refreshed].sum()
+
+            for idx in np.flatnonzero(held & ~refreshed):
+                self.logger.warning(
+                    'could not refresh close value for position:{},timestamp:{}'.format(self.entity_ids[idx],
+                                                                                        timestamp))
+
+            # the empty positions are removed
+            average_long_price[~held] = 0
+            position_value[~held] = 0
+
+            accounts.append((timestamp, cash, value, value + cash))
+            for idx in np.flatnonzero(held):
+                self.positions.append((timestamp, self.entity_ids[idx], long_amount[idx], available_long[idx],
+                                       average_long_price[idx], position_value[idx], self.trading_t[idx]))
+
+        self.account_df = pd.DataFrame(accounts, columns=['timestamp', 'cash', 'value', 'all_value'])
+        self.account_df = self.account_df.set_index('timestamp')
+
+        self.logger.info('trader:{} vectorized backtest finished,timestamps:{},orders:{}'.format(self.trader_name,
+                                                                                               len(self.timestamps),
+                                                                                               len(self.orders)))
+        return self.account_df
+
+    def add_orders(self, timestamp, mask, prices, order_amount, order_type):
+        for idx in np.flatnonzero(mask):
+            self.orders.append((timestamp, self.entity_ids[idx], prices[idx], order_amount[idx], order_type))
+
+    def save(self, ledger: Ledger):
+        """
+        save the accounts,positions and orders as SimAccountService
+
+        :param ledger:
+        """
+        time_strs = {}
+
+        def time_str(timestamp):
+            if timestamp not in time_strs:
+                time_strs[timestamp] = to_time_str(timestamp, TIME_FORMAT_ISO8601)
+            return time_strs[timestamp]
+
+        positions = {}
+        for timestamp, entity_id, long_amount, available_long, average_long_price, value, trading_t in self.positions:
+            the_id = '{}_{}'.format(self.trader_name, time_str(timestamp))
+            positions.setdefault(timestamp, []).append(
+                PositionRecord(id='{}_{}_{}'.format(self.trader_name, entity_id, time_str(timestamp)),
+                               trader_name=self.trader_name, entity_id=entity_id, sim_account_id=the_id,
+                               timestamp=timestamp, long_amount=float(long_amount),
+                               available_long=float(available_long), average_long_price=float(average_long_price),
+                               short_amount=0, available_short=0, average_short_price=0, profit=0,
+                               value=float(value), trading_t=int(trading_t)))
+
+        for timestamp, row in self.account_df.iterrows():
+            the_id = '{}_{}'.format(self.trader_name, time_str(timestamp))
+            ledger.add_account(AccountRecord(id=the_id, trader_name=self.trader_name, cash=float(row['cash']),
+                                             value=float(row['value']), all_value=float(row['all_value']),
+                                             timestamp=timestamp), positions.get(timestamp, []))
+
+        for timestamp, entity_id, order_price, order_amount, order_type in self.orders:
+            ledger.add_order(
+                OrderRecord(id='{}_{}_{}_{}'.format(self.trader_name, order_type, entity_id, time_str(timestamp)),
+                            trader_name=self.trader_name, entity_id=entity_id, timestamp=timestamp,
+                            order_price=float(order_price), order_amount=float(order_amount), order_type=order_type,
+                            status='success'))
+
+        ledger.flush()